@@ -11,10 +11,28 @@ LOCAL_SRC_FILES := \
     complex_numbers.c \
     matrix_operations.c \
     statistics.c \
-    unit_converter.c
+    unit_converter.c \
+    expression_compiler.c \
+    adaptive_precision.c \
+    combinatorics.c \
+    number_theory.c \
+    interval.c \
+    arena.c \
+    jit.c \
+    tiered.c \
+    history.c \
+    snapshot.c \
+    profiling.c \
+    trig.c \
+    accuracy.c \
+    polynomial.c \
+    matrix_expression.c \
+    distributions.c
 
 LOCAL_C_INCLUDES := $(LOCAL_PATH)
-LOCAL_CFLAGS := -Wall -Wextra -O2 -ffast-math -DANDROID
+LOCAL_CFLAGS := -Wall -Wextra -O2 -fno-math-errno -DANDROID
+# Engine profiling counters (profiling.h)
+# LOCAL_CFLAGS += -DCALC_ENABLE_PROFILING
 LOCAL_LDLIBS := -llog -lm
 
 include $(BUILD_SHARED_LIBRARY)
\ No newline at end of file
@@ -0,0 +1,107 @@
+package com.advanced.scientificcalculator;
+
+import android.os.Handler;
+import android.os.Looper;
+
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.atomic.AtomicLong;
+
+/**
+ * Runs native evaluations off the UI thread.
+ *
+ * Requests are coalesced: submitting a new one cancels the evaluation in
+ * flight and any request still queued is skipped, so only the latest result
+ * is ever delivered. Tasks passed to execute() are not: they run in order
+ * and always deliver. Results are posted back to the main thread.
+ *
+ * The native state is shared by the whole process, so tasks of every
+ * executor (an activity recreated on rotation gets a new one while the old
+ * worker may still be finishing) run one at a time.
+ */
+public class EvaluationExecutor {
+
+    public interface Work {
+        String run();
+    }
+
+    public interface Callback {
+        void onResult(String result);
+    }
+
+    /** Ties native evaluations to requests, so a cancel stops exactly the requests it supersedes. */
+    public interface Engine {
+        /** Evaluations on the worker thread from now on belong to this request. */
+        void beginRequest(long request);
+
+        /** Stops the evaluations of all earlier requests, started or not; called from the UI thread. */
+        void cancelBefore(long request);
+    }
+
+    // How long shutdown() waits for the cancelled request and pending tasks
+    private static final long SHUTDOWN_WAIT_MS = 1000;
+
+    private static final Object ENGINE_LOCK = new Object();
+
+    // Request ids are process-wide like the native state: the engine only
+    // ever raises its cancel bar, so a new executor must continue above the
+    // ids of the one it replaces
+    private static final AtomicLong LATEST_REQUEST = new AtomicLong();
+
+    private final ExecutorService executor = Executors.newSingleThreadExecutor();
+    private final Handler mainHandler = new Handler(Looper.getMainLooper());
+    private final Engine engine;
+
+    public EvaluationExecutor(Engine engine) {
+        this.engine = engine;
+    }
+
+    public void submit(Work work, Callback callback) {
+        final long request = LATEST_REQUEST.incrementAndGet();
+        engine.cancelBefore(request);
+        executor.execute(() -> {
+            if (request != LATEST_REQUEST.get()) {
+                return;     // superseded while queued
+            }
+            String result;
+            synchronized (ENGINE_LOCK) {
+                engine.beginRequest(request);
+                result = work.run();
+            }
+            mainHandler.post(() -> {
+                if (request == LATEST_REQUEST.get()) {
+                    callback.onResult(result);
+                }
+            });
+        });
+    }
+
+    /** Runs work on the worker thread after everything queued, without superseding it. */
+    public void execute(Work work, Callback callback) {
+        executor.execute(() -> {
+            String result;
+            synchronized (ENGINE_LOCK) {
+                result = work.run();
+            }
+            mainHandler.post(() -> callback.onResult(result));
+        });
+    }
+
+    /**
+     * Cancels the running request and drops queued ones, then lets the tasks
+     * passed to execute() finish and stops the worker thread.
+     */
+    public void shutdown() {
+        engine.cancelBefore(LATEST_REQUEST.incrementAndGet());
+        executor.shutdown();
+        try {
+            if (!executor.awaitTermination(SHUTDOWN_WAIT_MS, TimeUnit.MILLISECONDS)) {
+                executor.shutdownNow();
+            }
+        } catch (InterruptedException e) {
+            executor.shutdownNow();
+            Thread.currentThread().interrupt();
+        }
+    }
+}
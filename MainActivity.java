@@ -9,6 +9,8 @@ import androidx.appcompat.app.AppCompatActivity;
 import android.content.SharedPreferences;
 import android.view.Menu;
 import android.view.MenuItem;
+import androidx.appcompat.app.AlertDialog;
+import java.io.File;
 
 public class MainActivity extends AppCompatActivity {
 
@@ -26,26 +28,88 @@ public class MainActivity extends AppCompatActivity {
     private boolean isResultDisplayed = false;
     private boolean isDegreeMode = true;
 
+    // Evaluations that run longer than this are stopped by the engine
+    private static final int EVALUATION_TIMEOUT_MS = 5000;
+    private EvaluationExecutor evaluator;
+
     // Native method declarations
     public native String evaluateExpression(String expression, boolean degreeMode);
+    public native String previewExpression(String expression, boolean degreeMode);
+    public native void beginRequest(long request);
+    public native void cancelEvaluation(long request);
+    public native void setEvaluationTimeout(int timeoutMs);
+    public native void setAccuracy(int accuracy);
+    public native String polyroots(String expression);
+    public native String evaluateMatrix(String expression, boolean degreeMode);
     public native void storeMemory(double value);
     public native void addMemory(double value);
     public native void subtractMemory(double value);
     public native double recallMemory();
     public native void clearMemory();
     public native String getLastError();
+    public native boolean openHistory(String path);
+    public native String getHistory(int limit);
+    public native boolean restoreState(String path);
+    public native boolean saveState(String path);
+    public native String getStatsJson();
+
+    // Entries shown by the history menu
+    private static final int HISTORY_SHOWN = 200;
 
     @Override
     protected void onCreate(Bundle savedInstanceState) {
         super.onCreate(savedInstanceState);
         setContentView(R.layout.activity_main);
 
+        evaluator = new EvaluationExecutor(new EvaluationExecutor.Engine() {
+            @Override
+            public void beginRequest(long request) {
+                MainActivity.this.beginRequest(request);
+            }
+
+            @Override
+            public void cancelBefore(long request) {
+                cancelEvaluation(request);
+            }
+        });
+
         initViews();
         setupButtonListeners();
         loadSettings();
+        // Memory, ans and compiled expressions from the last session, loaded on
+        // the evaluation thread once the previous activity's worker is done
+        // with the state; the timeout is a setting of this build, so it is
+        // applied afterwards
+        final String snapshot = snapshotPath();
+        final String history = new File(getFilesDir(), "history.bin").getPath();
+        evaluator.execute(() -> {
+            restoreState(snapshot);
+            setEvaluationTimeout(EVALUATION_TIMEOUT_MS);
+            openHistory(history);
+            return String.valueOf(recallMemory());
+        }, memory -> memoryIndicator.setVisibility(Double.parseDouble(memory) != 0.0 ? View.VISIBLE : View.GONE));
         updateDisplay();
     }
 
+    @Override
+    protected void onStop() {
+        // Saved on the evaluation thread after the tasks already queued; it
+        // supersedes nothing and is never skipped, and onDestroy waits for it
+        final String path = snapshotPath();
+        evaluator.execute(() -> saveState(path) ? "" : "ERROR", result -> { });
+        super.onStop();
+    }
+
+    private String snapshotPath() {
+        return new File(getFilesDir(), "state.snap").getPath();
+    }
+
+    @Override
+    protected void onDestroy() {
+        evaluator.shutdown();
+        super.onDestroy();
+    }
+
     private void initViews() {
         displayExpression = findViewById(R.id.display_expression);
         displayResult = findViewById(R.id.display_result);
@@ -138,9 +202,9 @@ public class MainActivity extends AppCompatActivity {
             return;
         }
 
-        try {
-            String result = evaluateExpression(currentExpression, isDegreeMode);
-
+        final String expression = currentExpression;
+        final boolean degreeMode = isDegreeMode;
+        evaluator.submit(() -> evaluateExpression(expression, degreeMode), result -> {
             if (result.startsWith("ERROR:")) {
                 showError(result.substring(6));
                 return;
@@ -148,10 +212,7 @@ public class MainActivity extends AppCompatActivity {
 
             displayResult.setText(result);
             isResultDisplayed = true;
-
-        } catch (Exception e) {
-            showError("Calculation error: " + e.getMessage());
-        }
+        });
     }
 
     private void clearAll() {
@@ -179,12 +240,15 @@ public class MainActivity extends AppCompatActivity {
         }
     }
 
+    // Memory lives in the engine state, which the evaluation thread owns; the
+    // operations queue behind the running evaluation without superseding it
     private void memoryStore() {
         try {
             double value = Double.parseDouble(displayResult.getText().toString());
-            storeMemory(value);
-            memoryIndicator.setVisibility(View.VISIBLE);
-            Toast.makeText(this, "Value stored to memory", Toast.LENGTH_SHORT).show();
+            evaluator.execute(() -> { storeMemory(value); return ""; }, done -> {
+                memoryIndicator.setVisibility(View.VISIBLE);
+                Toast.makeText(this, "Value stored to memory", Toast.LENGTH_SHORT).show();
+            });
         } catch (NumberFormatException e) {
             showError("Invalid number for memory operation");
         }
@@ -193,8 +257,8 @@ public class MainActivity extends AppCompatActivity {
     private void memoryAdd() {
         try {
             double value = Double.parseDouble(displayResult.getText().toString());
-            addMemory(value);
-            Toast.makeText(this, "Value added to memory", Toast.LENGTH_SHORT).show();
+            evaluator.execute(() -> { addMemory(value); return ""; }, done ->
+                Toast.makeText(this, "Value added to memory", Toast.LENGTH_SHORT).show());
         } catch (NumberFormatException e) {
             showError("Invalid number for memory operation");
         }
@@ -203,23 +267,25 @@ public class MainActivity extends AppCompatActivity {
     private void memorySubtract() {
         try {
             double value = Double.parseDouble(displayResult.getText().toString());
-            subtractMemory(value);
-            Toast.makeText(this, "Value subtracted from memory", Toast.LENGTH_SHORT).show();
+            evaluator.execute(() -> { subtractMemory(value); return ""; }, done ->
+                Toast.makeText(this, "Value subtracted from memory", Toast.LENGTH_SHORT).show());
         } catch (NumberFormatException e) {
             showError("Invalid number for memory operation");
         }
     }
 
     private void memoryRecall() {
-        double value = recallMemory();
-        currentExpression += String.valueOf(value);
-        updateDisplay();
+        evaluator.execute(() -> String.valueOf(recallMemory()), value -> {
+            currentExpression += value;
+            updateDisplay();
+        });
     }
 
     private void memoryClear() {
-        clearMemory();
-        memoryIndicator.setVisibility(View.GONE);
-        Toast.makeText(this, "Memory cleared", Toast.LENGTH_SHORT).show();
+        evaluator.execute(() -> { clearMemory(); return ""; }, done -> {
+            memoryIndicator.setVisibility(View.GONE);
+            Toast.makeText(this, "Memory cleared", Toast.LENGTH_SHORT).show();
+        });
     }
 
     private void toggleAngleMode() {
@@ -233,7 +299,18 @@ public class MainActivity extends AppCompatActivity {
         displayExpression.setText(currentExpression.isEmpty() ? "0" : currentExpression);
 
         if (!isResultDisplayed) {
-            displayResult.setText("0");
+            if (currentExpression.isEmpty()) {
+                displayResult.setText("0");
+            } else {
+                // Live preview; the native side only re-parses the edited tail
+                final String expression = currentExpression;
+                final boolean degreeMode = isDegreeMode;
+                evaluator.submit(() -> previewExpression(expression, degreeMode), preview -> {
+                    if (!isResultDisplayed) {
+                        displayResult.setText(preview.isEmpty() ? "0" : preview);
+                    }
+                });
+            }
         }
     }
 
@@ -242,6 +319,31 @@ public class MainActivity extends AppCompatActivity {
         Toast.makeText(this, message, Toast.LENGTH_LONG).show();
     }
 
+    // The history is read on the evaluation thread, which is the one appending to it,
+    // without superseding the calculation in flight
+    private void showHistory() {
+        evaluator.execute(() -> getHistory(HISTORY_SHOWN), history -> {
+            if (history.isEmpty()) {
+                Toast.makeText(this, "No history yet", Toast.LENGTH_SHORT).show();
+                return;
+            }
+
+            final String[] lines = history.split("\n");
+            String[] items = new String[lines.length];
+            for (int i = 0; i < lines.length; i++) {
+                items[i] = lines[i].replace("\t", " = ");
+            }
+            new AlertDialog.Builder(this)
+                .setTitle("History")
+                .setItems(items, (dialog, which) -> {
+                    currentExpression = lines[which].substring(0, lines[which].indexOf('\t'));
+                    isResultDisplayed = false;
+                    updateDisplay();
+                })
+                .show();
+        });
+    }
+
     private void loadSettings() {
         SharedPreferences prefs = getSharedPreferences("CalculatorPrefs", MODE_PRIVATE);
         isDegreeMode = prefs.getBoolean("isDegreeMode", true);
@@ -264,7 +366,7 @@ public class MainActivity extends AppCompatActivity {
         int id = item.getItemId();
 
         if (id == R.id.action_history) {
-            // Open history activity
+            showHistory();
             return true;
         } else if (id == R.id.action_settings) {
             // Open settings activity
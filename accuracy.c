@@ -0,0 +1,503 @@
+#include "accuracy.h"
+#include "double_double.h"
+#include "trig.h"
+#include <float.h>
+#include <math.h>
+#include <stdint.h>
+#include <string.h>
+
+static const char* const accuracy_names[CALC_ACCURACY_COUNT] = {"faithful", "exact", "fast"};
+
+void calc_set_accuracy(calc_state_t* state, calc_accuracy_t accuracy) {
+    if (state && (unsigned)accuracy < CALC_ACCURACY_COUNT) {
+        state->accuracy = accuracy;
+    }
+}
+
+const char* calc_accuracy_name(calc_accuracy_t accuracy) {
+    return (unsigned)accuracy < CALC_ACCURACY_COUNT ? accuracy_names[accuracy] : "unknown";
+}
+
+calc_pow_fn_t calc_accuracy_pow(calc_accuracy_t accuracy) {
+    switch (accuracy) {
+        case CALC_ACCURACY_EXACT: return calc_pow_exact;
+        case CALC_ACCURACY_FAST: return calc_pow_fast;
+        default: return pow;
+    }
+}
+
+// Double-double constants
+static const calc_dd_t LN2 = {0x1.62e42fefa39efp-1, 0x1.abc9e3b39803fp-56};
+static const calc_dd_t INV_LN2 = {0x1.71547652b82fep+0, 0x1.777d0ffda0d24p-56};
+static const calc_dd_t INV_LN10 = {0x1.bcb7b1526e50ep-2, 0x1.95355baaafad3p-57};
+static const calc_dd_t DEG = {0x1.1df46a2529d39p-6, 0x1.5c1d8becdd291p-62};   // pi / 180
+static const calc_dd_t PIO2 = {0x1.921fb54442d18p+0, 0x1.1a62633145c07p-54};
+
+// 1/n! for n = 2..29
+static const calc_dd_t inverse_factorial[] = {
+    {0x1p-1, 0.0},
+    {0x1.5555555555555p-3, 0x1.5555555555555p-57},
+    {0x1.5555555555555p-5, 0x1.5555555555555p-59},
+    {0x1.1111111111111p-7, 0x1.1111111111111p-63},
+    {0x1.6c16c16c16c17p-10, -0x1.f49f49f49f49fp-65},
+    {0x1.a01a01a01a01ap-13, 0x1.a01a01a01a01ap-73},
+    {0x1.a01a01a01a01ap-16, 0x1.a01a01a01a01ap-76},
+    {0x1.71de3a556c734p-19, -0x1.c154f8ddc6c00p-73},
+    {0x1.27e4fb7789f5cp-22, 0x1.cbbc05b4fa99ap-76},
+    {0x1.ae64567f544e4p-26, -0x1.c062e06d1f209p-80},
+    {0x1.1eed8eff8d898p-29, -0x1.2aec959e14c06p-83},
+    {0x1.6124613a86d09p-33, 0x1.f28e0cc748ebep-87},
+    {0x1.93974a8c07c9dp-37, 0x1.05d6f8a2efd1fp-92},
+    {0x1.ae7f3e733b81fp-41, 0x1.1d8656b0ee8cbp-97},
+    {0x1.ae7f3e733b81fp-45, 0x1.1d8656b0ee8cbp-101},
+    {0x1.952c77030ad4ap-49, 0x1.ac981465ddc6cp-103},
+    {0x1.6827863b97d97p-53, 0x1.eec01221a8b0bp-107},
+    {0x1.2f49b46814157p-57, 0x1.2650f61dbdcb4p-112},
+    {0x1.e542ba4020225p-62, 0x1.ea72b4afe3c2fp-120},
+    {0x1.71b8ef6dcf572p-66, -0x1.d043ae40c4647p-120},
+    {0x1.0ce396db7f853p-70, -0x1.aebcdbd20331cp-124},
+    {0x1.761b41316381ap-75, -0x1.3423c7d91404fp-130},
+    {0x1.f2cf01972f578p-80, -0x1.9ada5fcc1ab14p-135},
+    {0x1.3f3ccdd165fa9p-84, -0x1.58ddadf344487p-139},
+    {0x1.88e85fc6a4e5ap-89, -0x1.71c37ebd16540p-143},
+    {0x1.d1ab1c2dccea3p-94, 0x1.054d0c78aea14p-149},
+    {0x1.0a18a2635085dp-98, 0x1.b9e2e28e1aa54p-153},
+    {0x1.259f98b4358adp-103, 0x1.eaf8c39dd9bc5p-157},
+};
+#define INVERSE_FACTORIAL(n) inverse_factorial[(n) - 2]
+
+// 1/(2k + 1) for k = 1..11, the atanh series of log
+static const calc_dd_t inverse_odd[] = {
+    {0x1.5555555555555p-2, 0x1.5555555555555p-56},
+    {0x1.999999999999ap-3, -0x1.999999999999ap-57},
+    {0x1.2492492492492p-3, 0x1.2492492492492p-57},
+    {0x1.c71c71c71c71cp-4, 0x1.c71c71c71c71cp-58},
+    {0x1.745d1745d1746p-4, -0x1.745d1745d1746p-59},
+    {0x1.3b13b13b13b14p-4, -0x1.3b13b13b13b14p-58},
+    {0x1.1111111111111p-4, 0x1.1111111111111p-60},
+    {0x1.e1e1e1e1e1e1ep-5, 0x1.e1e1e1e1e1e1ep-61},
+    {0x1.af286bca1af28p-5, 0x1.af286bca1af28p-59},
+    {0x1.8618618618618p-5, 0x1.8618618618618p-59},
+    {0x1.642c8590b2164p-5, 0x1.642c8590b2164p-60},
+};
+
+// Exact tier
+
+// exp(a) = result * 2^scale. a is reduced by k ln 2 and then by 2^-9, so
+// |r| < 7e-4 and nine Taylor terms give expm1(r) to double-double
+// precision; squaring back uses expm1(2r) = 2p + p^2, which keeps the
+// relative error of p.
+static calc_dd_t exp_dd(calc_dd_t a, int* scale) {
+    double k = floor(a.hi * INV_LN2.hi + 0.5);
+    calc_dd_t r = dd_sub(a, dd_mul_double(LN2, k));
+    r = dd_mul_double(r, 0x1p-9);
+    calc_dd_t p = INVERSE_FACTORIAL(9);
+    for (int n = 8; n >= 2; n--) {
+        p = dd_add(dd_mul(p, r), INVERSE_FACTORIAL(n));
+    }
+    p = dd_add(r, dd_mul(dd_mul(p, r), r));
+    for (int i = 0; i < 9; i++) {
+        p = dd_add(dd_mul_double(p, 2.0), dd_mul(p, p));
+    }
+    *scale = (int)k;
+    return dd_add(dd_from_double(1.0), p);
+}
+
+// log(x) for finite x > 0. Near 1 by the series 2 atanh(f / (2 + f)),
+// elsewhere by one Newton step from libm: y = y0 + log1p(x e^-y0 - 1)
+static calc_dd_t log_dd(calc_dd_t x) {
+    if (fabs(x.hi - 1.0) < 0.0625) {
+        calc_dd_t f = dd_sub(x, dd_from_double(1.0));
+        calc_dd_t s = dd_div(f, dd_add(dd_from_double(2.0), f));
+        calc_dd_t z = dd_mul(s, s);
+        int last = (int)(sizeof(inverse_odd) / sizeof(inverse_odd[0])) - 1;
+        calc_dd_t p = inverse_odd[last];
+        for (int k = last - 1; k >= 0; k--) {
+            p = dd_add(dd_mul(p, z), inverse_odd[k]);
+        }
+        calc_dd_t series = dd_add(s, dd_mul(dd_mul(s, z), p));
+        return dd_mul_double(series, 2.0);
+    }
+    double y0 = log(x.hi);
+    int scale;
+    calc_dd_t e = exp_dd(dd_from_double(-y0), &scale);
+    // x * 2^scale is near 1 / e, so it is exact
+    calc_dd_t t = dd_sub(dd_mul(e, dd_make(ldexp(x.hi, scale), ldexp(x.lo, scale))), dd_from_double(1.0));
+    t = dd_sub(t, dd_from_double(0.5 * t.hi * t.hi));
+    return dd_add(dd_from_double(y0), t);
+}
+
+double calc_exp_exact(double x) {
+    // Outside this range the result overflows or is subnormal
+    if (!(x > -708.0 && x < 709.0)) {
+        return exp(x);
+    }
+    int scale;
+    calc_dd_t e = exp_dd(dd_from_double(x), &scale);
+    return ldexp(dd_to_double(e), scale);
+}
+
+double calc_log_exact(double x) {
+    if (!(x > 0.0) || isinf(x)) {
+        return log(x);
+    }
+    return dd_to_double(log_dd(dd_from_double(x)));
+}
+
+double calc_log10_exact(double x) {
+    if (!(x > 0.0) || isinf(x)) {
+        return log10(x);
+    }
+    return dd_to_double(dd_mul(log_dd(dd_from_double(x)), INV_LN10));
+}
+
+double calc_log2_exact(double x) {
+    if (!(x > 0.0) || isinf(x)) {
+        return log2(x);
+    }
+    return dd_to_double(dd_mul(log_dd(dd_from_double(x)), INV_LN2));
+}
+
+double calc_pow_exact(double x, double y) {
+    if (!isfinite(x) || !isfinite(y) || x == 0.0 || y == 0.0 || x == 1.0) {
+        return pow(x, y);
+    }
+    bool integer = y == trunc(y);
+    if (x < 0.0 && !integer) {
+        return pow(x, y);
+    }
+    bool negative = x < 0.0 && fmod(y, 2.0) != 0.0;
+    double ax = fabs(x);
+
+    // Small integer powers by squaring, while the result stays well inside
+    // the normal range (where the low word keeps its precision)
+    if (integer && fabs(y) <= 1024.0) {
+        double r = dd_to_double(dd_powi(dd_from_double(ax), (long long)y));
+        if (isfinite(r) && fabs(r) >= 0x1p-900) {
+            return negative ? -r : r;
+        }
+    }
+
+    calc_dd_t t = dd_mul_double(log_dd(dd_from_double(ax)), y);
+    if (!(t.hi > -708.0 && t.hi < 709.0)) {
+        return pow(x, y);
+    }
+    int scale;
+    calc_dd_t e = exp_dd(t, &scale);
+    double r = ldexp(dd_to_double(e), scale);
+    return negative ? -r : r;
+}
+
+// sin(r) and cos(r) for |r| <= pi/4 by Taylor series to 1/27! and 1/28!
+static calc_dd_t sin_dd(calc_dd_t r) {
+    calc_dd_t z = dd_mul(r, r);
+    calc_dd_t p = INVERSE_FACTORIAL(27);
+    for (int n = 25; n >= 3; n -= 2) {
+        p = dd_sub(INVERSE_FACTORIAL(n), dd_mul(p, z));
+    }
+    return dd_sub(r, dd_mul(dd_mul(r, z), p));
+}
+
+static calc_dd_t cos_dd(calc_dd_t r) {
+    calc_dd_t z = dd_mul(r, r);
+    calc_dd_t p = INVERSE_FACTORIAL(28);
+    for (int n = 26; n >= 2; n -= 2) {
+        p = dd_sub(INVERSE_FACTORIAL(n), dd_mul(p, z));
+    }
+    return dd_sub(dd_from_double(1.0), dd_mul(z, p));
+}
+
+// x = quadrant * 90 degrees (pi/2) + r, |r| <= pi/4
+static int reduce_exact(double x, bool degrees, calc_dd_t* r) {
+    if (degrees) {
+        double t;
+        int quadrant = calc_reduce_degrees(x, &t);
+        *r = dd_mul_double(DEG, t);
+        return quadrant;
+    }
+    double hi, lo;
+    int quadrant = calc_rem_pio2(x, &hi, &lo);
+    *r = dd_two_sum(hi, lo);
+    return quadrant;
+}
+
+// The same for a double-double x: both words are reduced, since the low one
+// can exceed a quadrant when the high one is large, and the sum is brought
+// back into [-pi/4, pi/4]
+static int reduce_exact_dd(calc_dd_t x, bool degrees, calc_dd_t* r) {
+    int quadrant = reduce_exact(x.hi, degrees, r);
+    if (x.lo != 0.0) {
+        calc_dd_t r_lo;
+        quadrant += reduce_exact(x.lo, degrees, &r_lo);
+        *r = dd_add(*r, r_lo);
+        if (r->hi > M_PI_4) {
+            *r = dd_sub(*r, PIO2);
+            quadrant++;
+        } else if (r->hi < -M_PI_4) {
+            *r = dd_add(*r, PIO2);
+            quadrant--;
+        }
+    }
+    return quadrant & 3;
+}
+
+double calc_sin_exact(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    calc_dd_t r;
+    switch (reduce_exact(x, degrees, &r)) {
+        case 0: return dd_to_double(sin_dd(r));
+        case 1: return dd_to_double(cos_dd(r));
+        case 2: return -dd_to_double(sin_dd(r)) + 0.0;
+        default: return -dd_to_double(cos_dd(r));
+    }
+}
+
+double calc_cos_exact(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    calc_dd_t r;
+    switch (reduce_exact(x, degrees, &r)) {
+        case 0: return dd_to_double(cos_dd(r));
+        case 1: return -dd_to_double(sin_dd(r)) + 0.0;
+        case 2: return -dd_to_double(cos_dd(r));
+        default: return dd_to_double(sin_dd(r));
+    }
+}
+
+double calc_tan_exact(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    calc_dd_t r;
+    int quadrant = reduce_exact(x, degrees, &r);
+    // Poles as trig.h decides them
+    if ((quadrant & 1) && (degrees ? r.hi == 0.0 : fabs(r.hi) <= 2.0 * DBL_EPSILON * fabs(x))) {
+        return degrees ? calc_tand(x) : calc_tanr(x);
+    }
+    calc_dd_t s = sin_dd(r);
+    calc_dd_t c = cos_dd(r);
+    return (quadrant & 1) ? -dd_to_double(dd_div(c, s)) : dd_to_double(dd_div(s, c));
+}
+
+// Double-double kernels, for adaptive precision
+calc_dd_t calc_exp_dd(calc_dd_t x) {
+    if (!(x.hi > -708.0 && x.hi < 709.0)) {
+        return dd_from_double(exp(x.hi));
+    }
+    int scale;
+    calc_dd_t e = exp_dd(x, &scale);
+    return dd_make(ldexp(e.hi, scale), ldexp(e.lo, scale));
+}
+
+calc_dd_t calc_log_dd(calc_dd_t x) {
+    if (!(x.hi > 0.0) || isinf(x.hi)) {
+        return dd_from_double(log(x.hi));
+    }
+    return log_dd(x);
+}
+
+calc_dd_t calc_log10_dd(calc_dd_t x) {
+    return dd_mul(calc_log_dd(x), INV_LN10);
+}
+
+calc_dd_t calc_log2_dd(calc_dd_t x) {
+    return dd_mul(calc_log_dd(x), INV_LN2);
+}
+
+calc_dd_t calc_sin_dd(calc_dd_t x, bool degrees) {
+    if (!isfinite(x.hi)) {
+        return dd_from_double(NAN);
+    }
+    calc_dd_t r;
+    switch (reduce_exact_dd(x, degrees, &r)) {
+        case 0: return sin_dd(r);
+        case 1: return cos_dd(r);
+        case 2: return dd_neg(sin_dd(r));
+        default: return dd_neg(cos_dd(r));
+    }
+}
+
+calc_dd_t calc_cos_dd(calc_dd_t x, bool degrees) {
+    if (!isfinite(x.hi)) {
+        return dd_from_double(NAN);
+    }
+    calc_dd_t r;
+    switch (reduce_exact_dd(x, degrees, &r)) {
+        case 0: return cos_dd(r);
+        case 1: return dd_neg(sin_dd(r));
+        case 2: return dd_neg(cos_dd(r));
+        default: return sin_dd(r);
+    }
+}
+
+// Fast tier
+
+#define ROUND_TO_INTEGER 0x1.8p52
+#define INV_PIO2 0x1.45f306dc9c883p-1
+#define PIO2_1 0x1.921fb544p+0          // first 33 bits of pi/2
+#define PIO2_1T 0x1.0b4611a626331p-34   // pi/2 - PIO2_1
+#define LN2_HI 0x1.62e42feep-1
+#define LN2_LO 0x1.a39ef35793c76p-33
+#define FAST_REDUCTION_LIMIT 1.0e5     // two-part reduction is accurate below this
+
+// Minimax polynomials on [-pi/4, pi/4] and [-ln2/2, ln2/2] in r, and on
+// s = f / (2 + f) for f in [sqrt(1/2) - 1, sqrt(2) - 1]
+static double sin_poly(double r) {
+    double z = r * r;
+    return r + r * z * (-0.16666654698328462 + z * (0.008332166506401438 + z * -0.00019516079603773258));
+}
+
+static double cos_poly(double r) {
+    double z = r * r;
+    return 1.0 + z * (-0.49999885615025896 + z * (0.04165583142952129 + z * -0.0013592590756866636));
+}
+
+static double exp_poly(double r) {
+    return 1.0 + r + r * r * (0.49999993515607205 + r * (0.16666521632975406 + r * (0.04166837605450187 +
+                               r * (0.008368595151347066 + r * 0.00138148669198723))));
+}
+
+static int reduce_fast(double x, bool degrees, double* r) {
+    if (degrees) {
+        double t;
+        int quadrant = calc_reduce_degrees(x, &t);
+        *r = t * DEG.hi;
+        return quadrant;
+    }
+    if (fabs(x) < FAST_REDUCTION_LIMIT) {
+        double n = (x * INV_PIO2 + ROUND_TO_INTEGER) - ROUND_TO_INTEGER;
+        *r = (x - n * PIO2_1) - n * PIO2_1T;
+        return (int)((int64_t)n & 3);
+    }
+    double hi, lo;
+    int quadrant = calc_rem_pio2(x, &hi, &lo);
+    *r = hi;
+    return quadrant;
+}
+
+double calc_sin_fast(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    double r;
+    switch (reduce_fast(x, degrees, &r)) {
+        case 0: return sin_poly(r);
+        case 1: return cos_poly(r);
+        case 2: return -sin_poly(r) + 0.0;
+        default: return -cos_poly(r);
+    }
+}
+
+double calc_cos_fast(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    double r;
+    switch (reduce_fast(x, degrees, &r)) {
+        case 0: return cos_poly(r);
+        case 1: return -sin_poly(r) + 0.0;
+        case 2: return -cos_poly(r);
+        default: return sin_poly(r);
+    }
+}
+
+double calc_tan_fast(double x, bool degrees) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    double r;
+    int quadrant = reduce_fast(x, degrees, &r);
+    if ((quadrant & 1) && (degrees ? r == 0.0 : fabs(r) <= 2.0 * DBL_EPSILON * fabs(x))) {
+        return degrees ? calc_tand(x) : calc_tanr(x);
+    }
+    return (quadrant & 1) ? -cos_poly(r) / sin_poly(r) : sin_poly(r) / cos_poly(r);
+}
+
+double calc_exp_fast(double x) {
+    if (!(fabs(x) < 708.0)) {
+        return exp(x);
+    }
+    double k = (x * INV_LN2.hi + ROUND_TO_INTEGER) - ROUND_TO_INTEGER;
+    double r = (x - k * LN2_HI) - k * LN2_LO;
+    uint64_t bits = (uint64_t)((int64_t)k + 1023) << 52;
+    double scale;
+    memcpy(&scale, &bits, sizeof(scale));
+    return exp_poly(r) * scale;
+}
+
+// log(x) = exponent * ln 2 + the returned log(m), m in [sqrt(1/2), sqrt(2))
+static double log_fast_parts(double x, int* exponent) {
+    uint64_t bits;
+    memcpy(&bits, &x, sizeof(bits));
+    int e = (int)(bits >> 52) - 1023;
+    bits = (bits & 0x000fffffffffffffULL) | 0x3ff0000000000000ULL;
+    double m;
+    memcpy(&m, &bits, sizeof(m));
+    if (m > M_SQRT2) {
+        m *= 0.5;
+        e++;
+    }
+    *exponent = e;
+    double f = m - 1.0;
+    double s = f / (2.0 + f);
+    double z = s * s;
+    return 2.0 * s * (1.0 + z * (0.33333387635417455 + z * (0.19988843034226444 + z * 0.14933825431968473)));
+}
+
+// Subnormals, zero, negatives and non-finite arguments go to libm
+double calc_log_fast(double x) {
+    if (!(isnormal(x) && x > 0.0)) {
+        return log(x);
+    }
+    int e;
+    double lm = log_fast_parts(x, &e);
+    return (e * LN2_HI + lm) + e * LN2_LO;
+}
+
+double calc_log10_fast(double x) {
+    if (!(isnormal(x) && x > 0.0)) {
+        return log10(x);
+    }
+    int e;
+    double lm = log_fast_parts(x, &e);
+    return ((e * LN2_HI + lm) + e * LN2_LO) * INV_LN10.hi;
+}
+
+double calc_log2_fast(double x) {
+    if (!(isnormal(x) && x > 0.0)) {
+        return log2(x);
+    }
+    int e;
+    double lm = log_fast_parts(x, &e);
+    return e + lm * INV_LN2.hi;
+}
+
+double calc_pow_fast(double x, double y) {
+    if (!isfinite(x) || !isfinite(y) || x == 0.0) {
+        return pow(x, y);
+    }
+    bool integer = y == trunc(y);
+    if (integer && fabs(y) <= 64.0) {
+        double result = 1.0;
+        double base = x;
+        for (unsigned n = (unsigned)fabs(y); n; n >>= 1) {
+            if (n & 1) {
+                result *= base;
+            }
+            base *= base;
+        }
+        return y < 0.0 ? 1.0 / result : result;
+    }
+    if (x < 0.0 && !integer) {
+        return pow(x, y);
+    }
+    double t = y * calc_log_fast(fabs(x));
+    if (!(fabs(t) < 708.0)) {
+        return pow(x, y);
+    }
+    double r = calc_exp_fast(t);
+    return x < 0.0 && fmod(y, 2.0) != 0.0 ? -r : r;
+}
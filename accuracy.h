@@ -0,0 +1,73 @@
+#ifndef ACCURACY_H
+#define ACCURACY_H
+
+#include "calculator_engine.h"
+#include "double_double.h"
+#include <stdbool.h>
+
+// Accuracy tiers for the elementary functions. A state's `accuracy` selects
+// the implementation behind sin, cos, tan, exp, log, ln, log10, log2, pow and
+// the ^ operator when expressions are evaluated:
+//
+//   CALC_ACCURACY_FAITHFUL  libm (trig.h for sin, cos and tan); the default
+//   CALC_ACCURACY_EXACT     double-double evaluation rounded once: correctly
+//                           rounded except in cases too rare to have been seen,
+//                           at 15 to 35 times the cost of libm
+//   CALC_ACCURACY_FAST      degree-5 to degree-7 minimax polynomials; relative
+//                           error below 4e-8 for sin, cos, tan (away from their
+//                           zeros and poles), 4e-9 for exp and 1e-9 for log,
+//                           log10 and log2; pow below 4e-9 + 1e-9 * |y ln x|
+//
+// Only the evaluators of compiled programs switch; interval evaluation and
+// the double path of adaptive precision keep the faithful tier their error
+// bounds assume, and native (JIT) code runs only in the faithful tier.
+// Adaptive precision's double-double path uses the exact tier's kernels
+// directly, through the calc_*_dd functions below.
+
+// In every tier sin and cos are exactly 0 at multiples of 90 degrees, log2
+// of a power of two is exact, and pow with an integer exponent up to 64 is
+// exact when the power is representable.
+
+typedef double (*calc_pow_fn_t)(double x, double y);
+
+// Function prototypes
+
+// Settings
+void calc_set_accuracy(calc_state_t* state, calc_accuracy_t accuracy);
+const char* calc_accuracy_name(calc_accuracy_t accuracy);
+
+// The pow of a tier, for the ^ operator
+calc_pow_fn_t calc_accuracy_pow(calc_accuracy_t accuracy);
+
+// Correctly rounded tier. Arguments outside a function's domain give what
+// libm gives (NaN, infinity); tan returns infinity at its poles like trig.h
+double calc_sin_exact(double x, bool degrees);
+double calc_cos_exact(double x, bool degrees);
+double calc_tan_exact(double x, bool degrees);
+double calc_exp_exact(double x);
+double calc_log_exact(double x);
+double calc_log10_exact(double x);
+double calc_log2_exact(double x);
+double calc_pow_exact(double x, double y);
+
+// The exact tier's kernels on double-double arguments, accurate to a few
+// units of CALC_DD_EPSILON relative to the result. Outside their domain, and
+// for exp outside (-708, 709), they give libm's double result
+calc_dd_t calc_exp_dd(calc_dd_t x);
+calc_dd_t calc_log_dd(calc_dd_t x);
+calc_dd_t calc_log10_dd(calc_dd_t x);
+calc_dd_t calc_log2_dd(calc_dd_t x);
+calc_dd_t calc_sin_dd(calc_dd_t x, bool degrees);
+calc_dd_t calc_cos_dd(calc_dd_t x, bool degrees);
+
+// Fast tier, with the same conventions
+double calc_sin_fast(double x, bool degrees);
+double calc_cos_fast(double x, bool degrees);
+double calc_tan_fast(double x, bool degrees);
+double calc_exp_fast(double x);
+double calc_log_fast(double x);
+double calc_log10_fast(double x);
+double calc_log2_fast(double x);
+double calc_pow_fast(double x, double y);
+
+#endif // ACCURACY_H
@@ -0,0 +1,885 @@
+#include "adaptive_precision.h"
+#include "accuracy.h"
+#include "double_double.h"
+#include "combinatorics.h"
+#include <float.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+// Unit roundoff of double arithmetic (2^-53)
+#define UNIT_ROUNDOFF 1.1102230246251565e-16
+
+// Error allowance for libm functions, in ulps of the result
+#define LIBM_ULPS 4.0
+
+// Significant digits representable on each path
+#define DOUBLE_DIGITS DBL_DIG
+#define DD_DIGITS 31
+
+// Evaluation stacks up to this depth live on the C stack
+#define LOCAL_STACK_SIZE 64
+
+// Maximum arguments of a builtin function call
+#define MAX_CALL_ARGS 8
+
+// Value with an absolute error bound
+typedef struct {
+    double value;
+    double error;
+} tracked_t;
+
+typedef struct {
+    calc_dd_t value;
+    double error;
+} tracked_dd_t;
+
+// Builtin functions grouped by how much rounding error they add
+typedef enum {
+    FUNCTION_LIBM,      // within a few ulps of the exact result, trig.h included
+    FUNCTION_EXACT,     // exact for exact arguments
+    FUNCTION_PRODUCT    // perm, comb: see product_steps
+} function_class_t;
+
+static const char* const exact_functions[] = {
+    "abs", "floor", "ceil", "round", "mod", "gcd", "lcm", "min", "max",
+    "isprime", "factor", "nextprime", "phi", "primepi", NULL
+};
+
+static bool name_in(const char* name, const char* const* list) {
+    for (int i = 0; list[i] != NULL; i++) {
+        if (strcmp(name, list[i]) == 0) {
+            return true;
+        }
+    }
+    return false;
+}
+
+static function_class_t classify_function(const char* name) {
+    if (name_in(name, exact_functions)) {
+        return FUNCTION_EXACT;
+    }
+    if (strcmp(name, "perm") == 0 || strcmp(name, "comb") == 0) {
+        return FUNCTION_PRODUCT;
+    }
+    return FUNCTION_LIBM;
+}
+
+// Roundings in calc_permutation/calc_combination: a few for factorial table
+// ratios, one per factor when a permutation is multiplied out, and one for
+// a combination's double-double product
+static double product_steps(const char* name, const double* args) {
+    double n = args[0];
+    double k = args[1];
+    if (n <= CALC_MAX_FACTORIAL) {
+        return 4.0;
+    }
+    if (name[0] == 'c') {
+        return 2.0;
+    }
+    return 2.0 * fmax(k, 0.0) + 1.0;
+}
+
+static double rounding_error(function_class_t fc, const char* name, const double* args,
+                             double r, double u) {
+    switch (fc) {
+        case FUNCTION_EXACT:
+            return 0.0;
+        case FUNCTION_PRODUCT:
+            return product_steps(name, args) * u * fabs(r);
+        default:
+            return LIBM_ULPS * u * fabs(r);
+    }
+}
+
+// Integer arithmetic on exact operands is exact while the result stays below 2^53
+static bool exact_integer_result(double a, double ea, double b, double eb, double r) {
+    return ea == 0.0 && eb == 0.0 && calc_is_integer(a) && calc_is_integer(b) &&
+           calc_is_integer(r) && fabs(r) < 0x1p53;
+}
+
+// Error propagation for the arithmetic operators; u is the unit roundoff of
+// the arithmetic that produced r
+static double add_error(double a, double ea, double b, double eb, double r, double u) {
+    if (exact_integer_result(a, ea, b, eb, r)) {
+        return 0.0;
+    }
+    return ea + eb + u * fabs(r);
+}
+
+static double mul_error(double a, double ea, double b, double eb, double r, double u) {
+    if (exact_integer_result(a, ea, b, eb, r)) {
+        return 0.0;
+    }
+    return fabs(a) * eb + fabs(b) * ea + ea * eb + u * fabs(r);
+}
+
+static double div_error(double b, double ea, double eb, double r, double u) {
+    if (fabs(b) <= eb) {
+        return INFINITY;
+    }
+    return (ea + fabs(r) * eb) / (fabs(b) - eb) + u * fabs(r);
+}
+
+// fmod is exact; it is only discontinuous where the quotient changes
+static double mod_error(double a, double ea, double b, double eb, double r) {
+    if (ea == 0.0 && eb == 0.0) {
+        return 0.0;
+    }
+    double e = ea + fabs(trunc(a / b)) * eb;
+    double margin = fmin(fabs(r), fabs(b) - fabs(r));
+    return e < margin ? e : INFINITY;
+}
+
+// Relative perturbation bounds of a^b: (1 + d)^b - 1 <= expm1(|b| d)
+static double pow_error(double a, double ea, double b, double eb, double r, double u) {
+    if (b >= 0.0 && exact_integer_result(a, ea, b, eb, r)) {
+        return 0.0;
+    }
+    double rel_a = 0.0;
+    double rel_b = 0.0;
+    if (ea > 0.0) {
+        if (fabs(a) <= ea) {
+            return INFINITY;
+        }
+        rel_a = expm1(fabs(b) * ea / (fabs(a) - ea));
+    }
+    if (eb > 0.0) {
+        if (a <= 0.0) {
+            return INFINITY;
+        }
+        rel_b = expm1(fabs(log(a)) * eb);
+    }
+    return fabs(r) * (rel_a + rel_b + rel_a * rel_b) + u * fabs(r);
+}
+
+// Error of a builtin function call in double, estimated by evaluating at the
+// ends of each argument's error interval
+static double call_error(const char* name, double* args, const double* errors, int argc,
+                         double r, calc_state_t* state) {
+    function_class_t fc = classify_function(name);
+    double e = 0.0;
+
+    for (int i = 0; i < argc; i++) {
+        double width = errors[i];
+        if (width == 0.0) {
+            continue;
+        }
+        if (!isfinite(width)) {
+            return INFINITY;
+        }
+
+        double saved = args[i];
+        double worst = 0.0;
+        for (int side = -1; side <= 1; side += 2) {
+            parse_error_t error = PARSE_SUCCESS;
+            args[i] = saved + side * width;
+            double v = evaluate_function(name, args, argc, state, &error);
+            if (error != PARSE_SUCCESS || !isfinite(v)) {
+                worst = INFINITY;
+                break;
+            }
+            worst = fmax(worst, fabs(v - r));
+        }
+        args[i] = saved;
+        e += worst;
+    }
+    return e + rounding_error(fc, name, args, r, UNIT_ROUNDOFF);
+}
+
+static bool literal_is_exact(const calc_instruction_t* instr) {
+    return instr->value_lo == 0.0 && calc_is_integer(instr->value) && fabs(instr->value) <= 0x1p53;
+}
+
+// Fast path: double evaluation with a running error bound. *uncertain is set
+// when an evaluation error may be an artifact of rounding.
+static parse_error_t evaluate_tracked(const calc_program_t* program, calc_state_t* state,
+                                      const double* variables, tracked_t* stack,
+                                      tracked_t* out, bool* uncertain, int* error_position) {
+    parse_error_t error = PARSE_SUCCESS;
+    int sp = 0;
+    *uncertain = false;
+
+    for (int pc = 0; pc < program->length && error == PARSE_SUCCESS; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        error = parse_check_interrupt(state);
+        if (error != PARSE_SUCCESS) {
+            *error_position = instr->position;
+            break;
+        }
+        tracked_t* a = sp >= 2 ? &stack[sp - 2] : NULL;
+        tracked_t* b = sp >= 1 ? &stack[sp - 1] : NULL;
+
+        switch (instr->op) {
+            case OP_CONST:
+                stack[sp].value = instr->value;
+                stack[sp].error = literal_is_exact(instr) ? 0.0 :
+                    fabs(instr->value_lo) + CALC_DD_EPSILON * fabs(instr->value);
+                sp++;
+                break;
+            case OP_VARIABLE:
+                if (!variables) {
+                    error = PARSE_ERROR_INVALID_SYNTAX;
+                    break;
+                }
+                stack[sp].value = variables[instr->index];
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_ANS:
+                stack[sp].value = state->last_result;
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_MEMORY:
+                stack[sp].value = calc_memory_recall(state);
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_NEGATE:
+                b->value = -b->value;
+                break;
+            case OP_ADD:
+            case OP_SUBTRACT: {
+                double r = instr->op == OP_ADD ? a->value + b->value : a->value - b->value;
+                a->error = add_error(a->value, a->error, b->value, b->error, r, UNIT_ROUNDOFF);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_MULTIPLY: {
+                double r = a->value * b->value;
+                a->error = mul_error(a->value, a->error, b->value, b->error, r, UNIT_ROUNDOFF);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_DIVIDE: {
+                if (b->value == 0.0) {
+                    error = PARSE_ERROR_DIVISION_BY_ZERO;
+                    *uncertain = b->error > 0.0;
+                    break;
+                }
+                double r = a->value / b->value;
+                a->error = div_error(b->value, a->error, b->error, r, UNIT_ROUNDOFF);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_MODULO: {
+                if (b->value == 0.0) {
+                    error = PARSE_ERROR_DIVISION_BY_ZERO;
+                    *uncertain = b->error > 0.0;
+                    break;
+                }
+                double r = fmod(a->value, b->value);
+                a->error = mod_error(a->value, a->error, b->value, b->error, r);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_POWER: {
+                double r = pow(a->value, b->value);
+                if (!isfinite(r)) {
+                    error = PARSE_ERROR_DOMAIN_ERROR;
+                    *uncertain = a->error > 0.0 || b->error > 0.0;
+                    break;
+                }
+                a->error = pow_error(a->value, a->error, b->value, b->error, r, 2.0 * UNIT_ROUNDOFF);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_CALL: {
+                const char* name = get_function_name(instr->index);
+                double args[MAX_CALL_ARGS];
+                double errors[MAX_CALL_ARGS];
+                bool inexact = false;
+
+                if (!name) {
+                    error = PARSE_ERROR_INVALID_FUNCTION;
+                    break;
+                }
+                if (instr->argc > MAX_CALL_ARGS) {
+                    error = PARSE_ERROR_TOO_MANY_ARGUMENTS;
+                    break;
+                }
+                sp -= instr->argc;
+                for (int i = 0; i < instr->argc; i++) {
+                    args[i] = stack[sp + i].value;
+                    errors[i] = stack[sp + i].error;
+                    inexact = inexact || errors[i] > 0.0;
+                }
+
+                double r = evaluate_function(name, args, instr->argc, state, &error);
+                if (error != PARSE_SUCCESS) {
+                    *uncertain = inexact;
+                    break;
+                }
+                stack[sp].value = r;
+                stack[sp].error = call_error(name, args, errors, instr->argc, r, state);
+                sp++;
+                break;
+            }
+        }
+        if (error != PARSE_SUCCESS) {
+            *error_position = instr->position;
+        }
+    }
+
+    if (error == PARSE_SUCCESS && sp == 1) {
+        *out = stack[0];
+    } else if (error == PARSE_SUCCESS) {
+        error = PARSE_ERROR_INVALID_SYNTAX;
+    }
+    return error;
+}
+
+// Double-double helpers
+static int64_t dd_to_integer(calc_dd_t x) {
+    calc_dd_t t = dd_trunc(x);
+    if (t.hi >= 9223372036854775807.0) {
+        return INT64_MAX;
+    }
+    if (t.hi <= -9223372036854775807.0) {
+        return INT64_MIN;
+    }
+    return (int64_t)t.hi + (int64_t)t.lo;
+}
+
+static calc_dd_t dd_from_integer(int64_t n) {
+    double hi = (double)n;
+    if (hi >= 9223372036854775807.0) {
+        return dd_from_double(hi);
+    }
+    return dd_make(hi, (double)(n - (int64_t)hi));
+}
+
+// True if the integer an argument truncates to cannot change within its error
+static bool integer_argument_stable(calc_dd_t x, double error) {
+    return error == 0.0 ||
+           dd_to_integer(dd_add(x, dd_from_double(-error))) == dd_to_integer(dd_add(x, dd_from_double(error)));
+}
+
+// Distance from x to the nearest integer
+static double integer_distance(calc_dd_t x) {
+    calc_dd_t frac = dd_sub(x, dd_floor(x));
+    return fmin(frac.hi, 1.0 - frac.hi);
+}
+
+static double dd_abs_value(calc_dd_t x) {
+    return fabs(dd_to_double(x));
+}
+
+static parse_error_t dd_modulo(const tracked_dd_t* a, const tracked_dd_t* b, tracked_dd_t* out) {
+    if (b->value.hi == 0.0) {
+        return PARSE_ERROR_DIVISION_BY_ZERO;
+    }
+    calc_dd_t q = dd_trunc(dd_div(a->value, b->value));
+    calc_dd_t qb = dd_mul(q, b->value);
+    calc_dd_t r = dd_sub(a->value, qb);
+
+    // Correct a quotient that rounded across an integer; fmod takes the sign of a
+    calc_dd_t step = (a->value.hi < 0.0) == (b->value.hi < 0.0) ? b->value : dd_neg(b->value);
+    if (r.hi != 0.0 && (r.hi < 0.0) != (a->value.hi < 0.0)) {
+        r = dd_add(r, step);
+    } else if (dd_abs_value(r) >= dd_abs_value(b->value)) {
+        r = dd_sub(r, step);
+    }
+
+    out->value = r;
+    out->error = mod_error(dd_to_double(a->value), a->error, dd_to_double(b->value), b->error,
+                           dd_to_double(r)) + 2.0 * CALC_DD_EPSILON * fabs(qb.hi);
+    return PARSE_SUCCESS;
+}
+
+// Integer powers are computed in double-double; other exponents fall back to pow
+static void dd_power(const tracked_dd_t* a, const tracked_dd_t* b, tracked_dd_t* out) {
+    double base = dd_to_double(a->value);
+    double exponent = dd_to_double(b->value);
+
+    if (b->error == 0.0 && b->value.lo == 0.0 && calc_is_integer(exponent) && fabs(exponent) <= 0x1p30) {
+        double steps = 2.0 * ceil(log2(fabs(exponent) + 1.0)) + 2.0;
+        out->value = dd_powi(a->value, (long long)exponent);
+        out->error = pow_error(base, a->error, exponent, 0.0, dd_to_double(out->value),
+                               steps * CALC_DD_EPSILON);
+        return;
+    }
+
+    double r = pow(base, exponent);
+    out->value = dd_from_double(r);
+    out->error = pow_error(base, a->error + UNIT_ROUNDOFF * fabs(base),
+                           exponent, b->error + UNIT_ROUNDOFF * fabs(exponent),
+                           r, 2.0 * UNIT_ROUNDOFF);
+}
+
+// Elementary functions through the exact tier's double-double kernels
+// (accuracy.h). Arguments outside a function's domain, and results the
+// kernels do not carry to double-double precision, return false and are left
+// to the double evaluation with its error checks.
+static bool dd_elementary(const char* name, const tracked_dd_t* a, bool degrees, tracked_dd_t* out) {
+    calc_dd_t x = a->value;
+    double ea = a->error;
+
+    if (strcmp(name, "exp") == 0) {
+        // Below -600 the low word of the result would be subnormal
+        if (!(x.hi > -600.0 && x.hi < 709.0)) {
+            return false;
+        }
+        out->value = calc_exp_dd(x);
+        double r = fabs(out->value.hi);
+        out->error = r * expm1(ea) + (16.0 + fabs(x.hi)) * CALC_DD_EPSILON * r;
+        return isfinite(out->value.hi);
+    }
+    bool ln = strcmp(name, "log") == 0 || strcmp(name, "ln") == 0;
+    bool log10_ = strcmp(name, "log10") == 0;
+    bool log2_ = strcmp(name, "log2") == 0;
+    if (ln || log10_ || log2_) {
+        if (!(x.hi > 0.0) || isinf(x.hi)) {
+            return false;
+        }
+        out->value = ln ? calc_log_dd(x) : log10_ ? calc_log10_dd(x) : calc_log2_dd(x);
+        double scale = ln ? 1.0 : log10_ ? 1.0 / M_LN10 : 1.0 / M_LN2;
+        // |d/dx log x| <= 1 / (x - ea) over the argument's interval
+        double propagated = ea == 0.0 ? 0.0 : x.hi > ea ? scale * ea / (x.hi - ea) : INFINITY;
+        out->error = propagated + 8.0 * CALC_DD_EPSILON * fabs(out->value.hi);
+        return true;
+    }
+    bool sin_ = strcmp(name, "sin") == 0;
+    bool cos_ = strcmp(name, "cos") == 0;
+    bool tan_ = strcmp(name, "tan") == 0;
+    if (sin_ || cos_ || tan_) {
+        if (!isfinite(x.hi)) {
+            return false;
+        }
+        double scale = degrees ? M_PI / 180.0 : 1.0;
+        double d = ea * scale;
+        // Reducing the two words separately can cancel, to an absolute
+        // error of a few units of the smaller one's reduction
+        double reduction = 4.0 * CALC_DD_EPSILON * fmin(fabs(x.lo) * scale, 2.0);
+        calc_dd_t s = sin_ || tan_ ? calc_sin_dd(x, degrees) : dd_from_double(0.0);
+        calc_dd_t c = cos_ || tan_ ? calc_cos_dd(x, degrees) : dd_from_double(0.0);
+        if (!tan_) {
+            out->value = sin_ ? s : c;
+            out->error = d + reduction + 8.0 * CALC_DD_EPSILON * fabs(out->value.hi);
+            return true;
+        }
+        // |d/dx tan x| = 1 / cos^2 x, bounded while the interval stays off the pole
+        double cos_min = fabs(c.hi) - d - reduction;
+        if (!(cos_min > 0.5 * fabs(c.hi))) {
+            return false;
+        }
+        out->value = dd_div(s, c);
+        out->error = (d + reduction) / (cos_min * cos_min) + 16.0 * CALC_DD_EPSILON * fabs(out->value.hi);
+        return true;
+    }
+    return false;
+}
+
+// Builtins with double-double implementations. Returns false if the function
+// has none and must be evaluated in double.
+static bool dd_function(const char* name, const tracked_dd_t* args, int argc, bool degrees,
+                        tracked_dd_t* out, parse_error_t* error) {
+    if (argc == 1) {
+        const tracked_dd_t* a = &args[0];
+        double x = dd_to_double(a->value);
+
+        if (dd_elementary(name, a, degrees, out)) {
+            return true;
+        }
+
+        if (strcmp(name, "sqrt") == 0) {
+            if (a->value.hi < 0.0) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+            out->value = dd_sqrt(a->value);
+            double low = x - a->error;
+            double e = sqrt(a->error);
+            if (low > 0.0) {
+                e = fmin(e, a->error / (2.0 * sqrt(low)));
+            }
+            out->error = e + 4.0 * CALC_DD_EPSILON * fabs(out->value.hi);
+            return true;
+        }
+        if (strcmp(name, "abs") == 0) {
+            out->value = a->value.hi < 0.0 ? dd_neg(a->value) : a->value;
+            out->error = a->error;
+            return true;
+        }
+        if (strcmp(name, "floor") == 0 || strcmp(name, "ceil") == 0 || strcmp(name, "round") == 0) {
+            calc_dd_t v = a->value;
+            double boundary;
+            if (name[0] == 'f') {
+                v = dd_floor(v);
+                boundary = integer_distance(a->value);
+            } else if (name[0] == 'c') {
+                v = dd_ceil(v);
+                boundary = integer_distance(a->value);
+            } else {
+                calc_dd_t half = dd_from_double(0.5);
+                v = v.hi < 0.0 ? dd_neg(dd_floor(dd_add(dd_neg(v), half))) : dd_floor(dd_add(v, half));
+                boundary = integer_distance(dd_add(a->value, half));
+            }
+            out->value = v;
+            out->error = a->error == 0.0 ? 0.0 : (a->error < boundary ? 0.0 : INFINITY);
+            return true;
+        }
+        if (strcmp(name, "factorial") == 0) {
+            int64_t n = dd_to_integer(a->value);
+            if (n < 0 || n > CALC_MAX_FACTORIAL) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+            calc_dd_t r = dd_from_double(1.0);
+            for (int i = 2; i <= n; i++) {
+                r = dd_mul_double(r, i);
+            }
+            out->value = r;
+            out->error = integer_argument_stable(a->value, a->error) ?
+                fmax(n - 1, 0) * CALC_DD_EPSILON * r.hi : INFINITY;
+            return true;
+        }
+        return false;
+    }
+
+    if (argc == 2) {
+        const tracked_dd_t* a = &args[0];
+        const tracked_dd_t* b = &args[1];
+
+        if (strcmp(name, "mod") == 0) {
+            *error = dd_modulo(a, b, out);
+            return true;
+        }
+        if (strcmp(name, "pow") == 0) {
+            double base = dd_to_double(a->value);
+            double exponent = dd_to_double(b->value);
+            if (base == 0.0 && exponent < 0.0) {
+                *error = PARSE_ERROR_DIVISION_BY_ZERO;
+                return true;
+            }
+            if (base < 0.0 && !calc_is_integer(exponent)) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+            dd_power(a, b, out);
+            if (!isfinite(out->value.hi)) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+            }
+            return true;
+        }
+        if (strcmp(name, "perm") == 0 || strcmp(name, "comb") == 0) {
+            // The limit evaluate_function puts on integer arguments
+            if (!(fabs(a->value.hi) <= 0x1p53 && fabs(b->value.hi) <= 0x1p53)) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+            int64_t n = dd_to_integer(a->value);
+            int64_t k = dd_to_integer(b->value);
+            bool comb = name[0] == 'c';
+            if (n < 0 || k < 0 || k > n) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+            if (comb && k > n - k) {
+                k = n - k;
+            }
+            calc_result_t ln = comb ? calc_lncombination(n, k) : calc_lnpermutation(n, k);
+            if (ln.value > log(DBL_MAX)) {
+                *error = PARSE_ERROR_DOMAIN_ERROR;
+                return true;
+            }
+
+            calc_dd_t r = dd_from_double(1.0);
+            for (int64_t i = 0; i < k; i++) {
+                r = dd_mul(r, dd_from_integer(n - i));
+                if (comb) {
+                    r = dd_div(r, dd_from_double(i + 1.0));
+                }
+                if (!isfinite(r.hi)) {
+                    *error = PARSE_ERROR_DOMAIN_ERROR;
+                    return true;
+                }
+            }
+            out->value = r;
+            out->error = integer_argument_stable(a->value, a->error) &&
+                         integer_argument_stable(b->value, b->error) ?
+                (comb ? 2.0 : 1.0) * (double)k * CALC_DD_EPSILON * r.hi : INFINITY;
+            return true;
+        }
+        if (strcmp(name, "min") == 0 || strcmp(name, "max") == 0) {
+            bool a_less = dd_sub(a->value, b->value).hi < 0.0;
+            bool pick_a = (name[1] == 'i') == a_less;
+            out->value = pick_a ? a->value : b->value;
+            out->error = fmax(a->error, b->error);
+            return true;
+        }
+    }
+    return false;
+}
+
+// Slow path: the same program in double-double arithmetic
+static parse_error_t evaluate_dd(const calc_program_t* program, calc_state_t* state,
+                                 const double* variables, tracked_dd_t* stack,
+                                 tracked_dd_t* out, int* error_position) {
+    parse_error_t error = PARSE_SUCCESS;
+    int sp = 0;
+
+    for (int pc = 0; pc < program->length && error == PARSE_SUCCESS; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        error = parse_check_interrupt(state);
+        if (error != PARSE_SUCCESS) {
+            *error_position = instr->position;
+            break;
+        }
+        tracked_dd_t* a = sp >= 2 ? &stack[sp - 2] : NULL;
+        tracked_dd_t* b = sp >= 1 ? &stack[sp - 1] : NULL;
+
+        switch (instr->op) {
+            case OP_CONST:
+                stack[sp].value = dd_make(instr->value, instr->value_lo);
+                stack[sp].error = literal_is_exact(instr) ? 0.0 : CALC_DD_EPSILON * fabs(instr->value);
+                sp++;
+                break;
+            case OP_VARIABLE:
+                if (!variables) {
+                    error = PARSE_ERROR_INVALID_SYNTAX;
+                    break;
+                }
+                stack[sp].value = dd_from_double(variables[instr->index]);
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_ANS:
+                stack[sp].value = dd_from_double(state->last_result);
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_MEMORY:
+                stack[sp].value = dd_from_double(calc_memory_recall(state));
+                stack[sp].error = 0.0;
+                sp++;
+                break;
+            case OP_NEGATE:
+                b->value = dd_neg(b->value);
+                break;
+            case OP_ADD:
+            case OP_SUBTRACT: {
+                calc_dd_t r = instr->op == OP_ADD ? dd_add(a->value, b->value) : dd_sub(a->value, b->value);
+                a->error = add_error(a->value.hi, a->error, b->value.hi, b->error, r.hi, CALC_DD_EPSILON);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_MULTIPLY: {
+                calc_dd_t r = dd_mul(a->value, b->value);
+                a->error = mul_error(a->value.hi, a->error, b->value.hi, b->error, r.hi, CALC_DD_EPSILON);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_DIVIDE: {
+                if (b->value.hi == 0.0) {
+                    error = PARSE_ERROR_DIVISION_BY_ZERO;
+                    break;
+                }
+                calc_dd_t r = dd_div(a->value, b->value);
+                a->error = div_error(b->value.hi, a->error, b->error, r.hi, 2.0 * CALC_DD_EPSILON);
+                a->value = r;
+                sp--;
+                break;
+            }
+            case OP_MODULO:
+                error = dd_modulo(a, b, a);
+                sp--;
+                break;
+            case OP_POWER:
+                dd_power(a, b, a);
+                if (!isfinite(a->value.hi)) {
+                    error = PARSE_ERROR_DOMAIN_ERROR;
+                }
+                sp--;
+                break;
+            case OP_CALL: {
+                const char* name = get_function_name(instr->index);
+                if (!name) {
+                    error = PARSE_ERROR_INVALID_FUNCTION;
+                    break;
+                }
+                if (instr->argc > MAX_CALL_ARGS) {
+                    error = PARSE_ERROR_TOO_MANY_ARGUMENTS;
+                    break;
+                }
+                sp -= instr->argc;
+
+                tracked_dd_t result;
+                if (dd_function(name, &stack[sp], instr->argc, state->angle_in_degrees, &result, &error)) {
+                    stack[sp++] = result;
+                    break;
+                }
+
+                // No double-double version: evaluate in double, counting the
+                // rounding of the arguments as argument error
+                double args[MAX_CALL_ARGS];
+                double errors[MAX_CALL_ARGS];
+                for (int i = 0; i < instr->argc; i++) {
+                    args[i] = dd_to_double(stack[sp + i].value);
+                    errors[i] = stack[sp + i].error + UNIT_ROUNDOFF * fabs(args[i]);
+                }
+                double r = evaluate_function(name, args, instr->argc, state, &error);
+                if (error != PARSE_SUCCESS) {
+                    break;
+                }
+                stack[sp].value = dd_from_double(r);
+                stack[sp].error = call_error(name, args, errors, instr->argc, r, state);
+                sp++;
+                break;
+            }
+        }
+        if (error != PARSE_SUCCESS) {
+            *error_position = instr->position;
+        }
+    }
+
+    if (error == PARSE_SUCCESS && sp == 1) {
+        *out = stack[0];
+    } else if (error == PARSE_SUCCESS) {
+        error = PARSE_ERROR_INVALID_SYNTAX;
+    }
+    return error;
+}
+
+static calc_error_t map_parse_error(parse_error_t error) {
+    switch (error) {
+        case PARSE_SUCCESS:
+            return CALC_SUCCESS;
+        case PARSE_ERROR_DIVISION_BY_ZERO:
+            return CALC_ERROR_DIVISION_BY_ZERO;
+        case PARSE_ERROR_DOMAIN_ERROR:
+            return CALC_ERROR_DOMAIN_ERROR;
+        case PARSE_ERROR_INVALID_FUNCTION:
+            return CALC_ERROR_INVALID_FUNCTION;
+        case PARSE_ERROR_CANCELLED:
+            return CALC_ERROR_CANCELLED;
+        case PARSE_ERROR_TIMEOUT:
+            return CALC_ERROR_TIMEOUT;
+        case PARSE_ERROR_OUT_OF_MEMORY:
+            return CALC_ERROR_MEMORY_ERROR;
+        default:
+            return CALC_ERROR_PARSE_ERROR;
+    }
+}
+
+// Significant digits guaranteed by an absolute error bound: the largest d
+// with error <= 0.5 * 10^-d * |value|
+static int guaranteed_digits(double value, double error, int cap) {
+    if (error == 0.0) {
+        return cap;
+    }
+    if (!isfinite(error) || fabs(value) <= 2.0 * error) {
+        return 0;
+    }
+    int digits = (int)floor(log10(fabs(value) / (2.0 * error)));
+    if (digits < 0) {
+        return 0;
+    }
+    return digits > cap ? cap : digits;
+}
+
+static calc_adaptive_result_t make_adaptive_result(calc_error_t error) {
+    calc_adaptive_result_t result;
+    result.value = 0.0;
+    result.value_lo = 0.0;
+    result.error_bound = 0.0;
+    result.digits = 0;
+    result.escalated = false;
+    result.error = error;
+    return result;
+}
+
+calc_adaptive_result_t calc_program_evaluate_adaptive(const calc_program_t* program, calc_state_t* state,
+                                                      const double* variables) {
+    if (!program || program->length == 0 || !state) {
+        return make_adaptive_result(CALC_ERROR_INVALID_INPUT);
+    }
+
+    int wanted = state->precision < 1 ? 1 : state->precision;
+    int error_position = 0;
+    bool uncertain = false;
+    calc_adaptive_result_t result = make_adaptive_result(CALC_SUCCESS);
+
+    // Fast path
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    tracked_t local[LOCAL_STACK_SIZE];
+    tracked_t* stack = local;
+    if (program->max_stack > LOCAL_STACK_SIZE) {
+        stack = calc_arena_alloc(&state->arena, program->max_stack * sizeof(tracked_t));
+        if (!stack) {
+            return make_adaptive_result(CALC_ERROR_MEMORY_ERROR);
+        }
+    }
+    tracked_t fast;
+    parse_error_t error = evaluate_tracked(program, state, variables, stack, &fast, &uncertain, &error_position);
+    calc_arena_reset(&state->arena, mark);
+
+    if (error != PARSE_SUCCESS && !uncertain) {
+        return make_adaptive_result(map_parse_error(error));
+    }
+    bool fast_valid = error == PARSE_SUCCESS;
+    if (fast_valid) {
+        result.value = fast.value;
+        result.error_bound = fast.error;
+        result.digits = guaranteed_digits(fast.value, fast.error, DOUBLE_DIGITS);
+        if (result.digits >= wanted) {
+            return result;
+        }
+    }
+
+    // Slow path
+    tracked_dd_t local_dd[LOCAL_STACK_SIZE];
+    tracked_dd_t* stack_dd = local_dd;
+    if (program->max_stack > LOCAL_STACK_SIZE) {
+        stack_dd = calc_arena_alloc(&state->arena, program->max_stack * sizeof(tracked_dd_t));
+        if (!stack_dd) {
+            return make_adaptive_result(CALC_ERROR_MEMORY_ERROR);
+        }
+    }
+    tracked_dd_t slow;
+    error = evaluate_dd(program, state, variables, stack_dd, &slow, &error_position);
+    calc_arena_reset(&state->arena, mark);
+
+    if (error != PARSE_SUCCESS) {
+        return make_adaptive_result(map_parse_error(error));
+    }
+    // Double-double is not always better: keep the fast value when the slow
+    // one overflowed or has no tighter bound (e.g. floor at a step)
+    result.escalated = true;
+    if (fast_valid && (!isfinite(slow.value.hi) || !(slow.error < result.error_bound))) {
+        return result;
+    }
+    result.value = dd_to_double(slow.value);
+    result.value_lo = dd_sub(slow.value, dd_from_double(result.value)).hi;
+    result.error_bound = slow.error;
+    result.digits = guaranteed_digits(result.value, slow.error, DD_DIGITS);
+    return result;
+}
+
+calc_adaptive_result_t calc_evaluate_adaptive(const char* expression, calc_state_t* state) {
+    if (!expression || !state) {
+        return make_adaptive_result(CALC_ERROR_INVALID_INPUT);
+    }
+
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    calc_program_t program;
+    calc_program_init(&program);
+    program.arena = &state->arena;
+    parse_error_t error = calc_program_compile(expression, &program, NULL);
+    calc_adaptive_result_t result = error == PARSE_ERROR_OUT_OF_MEMORY
+        ? make_adaptive_result(CALC_ERROR_MEMORY_ERROR)
+        : make_adaptive_result(CALC_ERROR_PARSE_ERROR);
+    if (error == PARSE_SUCCESS) {
+        result = calc_program_evaluate_adaptive(&program, state, NULL);
+    }
+    calc_arena_reset(&state->arena, mark);
+    return result;
+}
@@ -0,0 +1,27 @@
+#ifndef ADAPTIVE_PRECISION_H
+#define ADAPTIVE_PRECISION_H
+
+#include "calculator_engine.h"
+#include "expression_compiler.h"
+#include <stdbool.h>
+
+// Result of an adaptive-precision evaluation. The exact value of the
+// expression lies within error_bound of value + value_lo.
+typedef struct {
+    double value;        // nearest double to the result
+    double value_lo;     // double-double tail (0 on the fast path)
+    double error_bound;  // absolute error bound
+    int digits;          // significant decimal digits guaranteed by error_bound
+    bool escalated;      // true if double precision was not enough
+    calc_error_t error;
+} calc_adaptive_result_t;
+
+// Function prototypes
+
+// Evaluates in double with a running error bound and re-evaluates in
+// double-double only when fewer than state->precision digits are guaranteed
+calc_adaptive_result_t calc_evaluate_adaptive(const char* expression, calc_state_t* state);
+calc_adaptive_result_t calc_program_evaluate_adaptive(const calc_program_t* program, calc_state_t* state,
+                                                      const double* variables);
+
+#endif // ADAPTIVE_PRECISION_H
@@ -1,8 +1,448 @@
+// Single-pass tokenizer and Pratt (precedence-climbing) parser for the
+// calculator's expressions. Each expression text is compiled once into a tree
+// of closures; evaluating it calls every node once and builds no code at run
+// time. Compiled expressions are cached by text, least recently used evicted.
+class ExpressionCompiler {
+    constructor(functions, constants, cacheSize = 64) {
+        this.functions = functions;
+        this.constants = constants;
+        this.cacheSize = cacheSize;
+        this.cache = new Map();
+        
+        // Display symbols map onto the operators they stand for
+        this.operatorAliases = { '×': '*', '÷': '/', '−': '-', '**': '^' };
+        
+        // Binding powers: higher binds tighter; ^ is right-associative and
+        // binds tighter than unary minus, so -2^2 is -4
+        this.bindingPowers = { '+': 10, '-': 10, '*': 20, '/': 20, '^': 30 };
+        this.prefixBindingPower = 25;
+    }
+    
+    compile(text) {
+        let evaluate = this.cache.get(text);
+        if (evaluate) {
+            // Move to the most recently used end
+            this.cache.delete(text);
+            this.cache.set(text, evaluate);
+            return evaluate;
+        }
+        
+        this.tokens = this.tokenize(text);
+        this.index = 0;
+        evaluate = this.parseExpression(0);
+        const token = this.tokens[this.index];
+        if (token.type !== 'end') {
+            throw new SyntaxError(`Unexpected '${token.value}' at position ${token.position}`);
+        }
+        this.tokens = null;
+        
+        this.cache.set(text, evaluate);
+        if (this.cache.size > this.cacheSize) {
+            this.cache.delete(this.cache.keys().next().value);
+        }
+        return evaluate;
+    }
+    
+    tokenize(text) {
+        const tokens = [];
+        let i = 0;
+        
+        while (i < text.length) {
+            const c = text[i];
+            const start = i;
+            
+            if (c === ' ') {
+                i++;
+            } else if (this.isDigit(c) || (c === '.' && this.isDigit(text[i + 1]))) {
+                while (this.isDigit(text[i])) i++;
+                if (text[i] === '.') {
+                    i++;
+                    while (this.isDigit(text[i])) i++;
+                }
+                // An exponent needs digits after it; a bare e is the constant
+                if (text[i] === 'e' || text[i] === 'E') {
+                    let j = i + 1;
+                    if (text[j] === '+' || text[j] === '-') j++;
+                    if (this.isDigit(text[j])) {
+                        i = j;
+                        while (this.isDigit(text[i])) i++;
+                    }
+                }
+                if (text[i] === '.' || this.isDigit(text[i])) {
+                    throw new SyntaxError(`Malformed number at position ${start}`);
+                }
+                tokens.push({ type: 'number', value: parseFloat(text.slice(start, i)), position: start });
+            } else if (c === 'π' || c === 'φ') {
+                tokens.push({ type: 'name', value: c, position: start });
+                i++;
+            } else if (this.isLetter(c)) {
+                while (this.isLetter(text[i])) i++;
+                tokens.push({ type: 'name', value: text.slice(start, i), position: start });
+            } else if (c === '*' && text[i + 1] === '*') {
+                tokens.push({ type: 'operator', value: '^', position: start });
+                i += 2;
+            } else if ('+-*/^×÷−'.includes(c)) {
+                tokens.push({ type: 'operator', value: this.operatorAliases[c] || c, position: start });
+                i++;
+            } else if (c === '(' || c === ')' || c === ',') {
+                tokens.push({ type: c, value: c, position: start });
+                i++;
+            } else {
+                throw new SyntaxError(`Unexpected '${c}' at position ${start}`);
+            }
+        }
+        
+        tokens.push({ type: 'end', value: 'end of input', position: text.length });
+        return tokens;
+    }
+    
+    isDigit(c) {
+        return c !== undefined && c >= '0' && c <= '9';
+    }
+    
+    isLetter(c) {
+        return c !== undefined && ((c >= 'a' && c <= 'z') || (c >= 'A' && c <= 'Z'));
+    }
+    
+    // Parses operators that bind tighter than minPower. A run of operators
+    // with the same power, like a long sum, becomes one node, so the closure
+    // tree stays shallow.
+    parseExpression(minPower) {
+        let operands = [this.parsePrefix()];
+        let operators = [];
+        let runPower = 0;
+        
+        for (;;) {
+            const token = this.tokens[this.index];
+            let operator;
+            if (token.type === 'operator') {
+                operator = token.value;
+            } else if (token.type === 'number' || token.type === 'name' || token.type === '(') {
+                operator = '*';     // implicit multiplication, as in 2π or 3(4+5)
+            } else {
+                break;
+            }
+            
+            const power = this.bindingPowers[operator];
+            if (power <= minPower) {
+                break;
+            }
+            if (token.type === 'operator') {
+                this.index++;
+            }
+            if (power !== runPower && operators.length > 0) {
+                operands = [this.makeRun(operators, operands)];
+                operators = [];
+            }
+            runPower = power;
+            
+            // Right-associative operators parse their right side at a lower power
+            operators.push(operator);
+            operands.push(this.parseExpression(operator === '^' ? power - 1 : power));
+        }
+        
+        return operators.length > 0 ? this.makeRun(operators, operands) : operands[0];
+    }
+    
+    parsePrefix() {
+        const token = this.tokens[this.index++];
+        
+        switch (token.type) {
+            case 'number': {
+                const value = token.value;
+                return () => value;
+            }
+            case 'name':
+                return this.parseName(token);
+            case '(': {
+                const inner = this.parseExpression(0);
+                this.expect(')');
+                return inner;
+            }
+            case 'operator':
+                if (token.value === '-') {
+                    const operand = this.parseExpression(this.prefixBindingPower);
+                    return () => -operand();
+                }
+                if (token.value === '+') {
+                    return this.parseExpression(this.prefixBindingPower);
+                }
+                break;
+        }
+        
+        throw new SyntaxError(`Unexpected '${token.value}' at position ${token.position}`);
+    }
+    
+    parseName(token) {
+        const name = token.value;
+        
+        if (Object.prototype.hasOwnProperty.call(this.constants, name)) {
+            const value = this.constants[name];
+            return () => value;
+        }
+        if (!Object.prototype.hasOwnProperty.call(this.functions, name)) {
+            throw new SyntaxError(`Unknown name '${name}' at position ${token.position}`);
+        }
+        
+        const func = this.functions[name];
+        this.expect('(');
+        const args = [this.parseExpression(0)];
+        while (this.tokens[this.index].type === ',') {
+            this.index++;
+            args.push(this.parseExpression(0));
+        }
+        this.expect(')');
+        
+        if (args.length !== func.length) {
+            throw new SyntaxError(`${name} takes ${func.length} argument(s) at position ${token.position}`);
+        }
+        if (args.length === 1) {
+            const arg = args[0];
+            return () => func(arg());
+        }
+        return () => func(...args.map(arg => arg()));
+    }
+    
+    expect(type) {
+        const token = this.tokens[this.index];
+        if (token.type !== type) {
+            throw new SyntaxError(`Expected '${type}' at position ${token.position}`);
+        }
+        this.index++;
+    }
+    
+    // operands[0] operators[0] operands[1] ..., evaluated left to right
+    makeRun(operators, operands) {
+        if (operators.length === 1) {
+            return this.makeBinary(operators[0], operands[0], operands[1]);
+        }
+        return () => {
+            let value = operands[0]();
+            for (let i = 0; i < operators.length; i++) {
+                const right = operands[i + 1]();
+                switch (operators[i]) {
+                    case '+': value += right; break;
+                    case '-': value -= right; break;
+                    case '*': value *= right; break;
+                    case '/': value /= right; break;
+                }
+            }
+            return value;
+        };
+    }
+    
+    makeBinary(operator, left, right) {
+        switch (operator) {
+            case '+': return () => left() + right();
+            case '-': return () => left() - right();
+            case '*': return () => left() * right();
+            case '/': return () => left() / right();
+            case '^': return () => Math.pow(left(), right());
+        }
+        throw new SyntaxError(`Unknown operator '${operator}'`);
+    }
+}
+
+// Calculation history in IndexedDB, with no cap on its size. Entries get
+// consecutive ids, so the n-th newest entry is found by arithmetic rather than
+// a scan; an index on the expression text serves prefix search. Without
+// IndexedDB (private windows, old browsers) entries are kept in memory.
+class HistoryStore {
+    constructor(name = 'calculator-history') {
+        this.name = name;
+        this.db = null;
+        this.memory = new Map();
+        this.firstId = 1;
+        this.nextId = 1;
+    }
+    
+    get count() {
+        return this.nextId - this.firstId;
+    }
+    
+    open() {
+        if (typeof indexedDB === 'undefined') {
+            return Promise.resolve();
+        }
+        
+        return new Promise((resolve) => {
+            const request = indexedDB.open(this.name, 1);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore('entries', { keyPath: 'id' });
+                store.createIndex('expression', 'expression');
+            };
+            request.onsuccess = () => {
+                this.db = request.result;
+                this.loadBounds().then(resolve, resolve);
+            };
+            request.onerror = () => resolve();
+        });
+    }
+    
+    // Reads the lowest and highest ids
+    loadBounds() {
+        const store = this.db.transaction('entries').objectStore('entries');
+        return Promise.all([
+            this.request(store.openKeyCursor(null, 'next')),
+            this.request(store.openKeyCursor(null, 'prev'))
+        ]).then(([first, last]) => {
+            if (first && last) {
+                this.firstId = first.key;
+                this.nextId = last.key + 1;
+            }
+        });
+    }
+    
+    request(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+    
+    // Returns the stored entry; its id is assigned at once so callers can
+    // show it before the write completes
+    add(expression, result) {
+        const entry = { id: this.nextId++, expression, result, timestamp: Date.now() };
+        if (this.db) {
+            this.db.transaction('entries', 'readwrite').objectStore('entries').add(entry);
+        } else {
+            this.memory.set(entry.id, entry);
+        }
+        return entry;
+    }
+    
+    // Entries for the given ids, in the same order (undefined where missing)
+    get(ids) {
+        if (!this.db) {
+            return Promise.resolve(ids.map(id => this.memory.get(id)));
+        }
+        const store = this.db.transaction('entries').objectStore('entries');
+        return Promise.all(ids.map(id => this.request(store.get(id))));
+    }
+    
+    // Ids of entries whose expression starts with prefix, oldest first
+    searchPrefix(prefix) {
+        if (!this.db) {
+            const ids = [];
+            this.memory.forEach((entry, id) => {
+                if (entry.expression.startsWith(prefix)) ids.push(id);
+            });
+            return Promise.resolve(ids);
+        }
+        const index = this.db.transaction('entries').objectStore('entries').index('expression');
+        const range = IDBKeyRange.bound(prefix, prefix + '\uffff');
+        return this.request(index.getAllKeys(range)).then(ids => ids.sort((a, b) => a - b));
+    }
+    
+    clear() {
+        this.firstId = this.nextId;
+        this.memory.clear();
+        if (!this.db) {
+            return Promise.resolve();
+        }
+        return this.request(this.db.transaction('entries', 'readwrite').objectStore('entries').clear());
+    }
+}
+
+// Scrolling list that keeps DOM nodes only for the rows in view (plus a few
+// either side). Rows have a fixed height; a spacer gives the scrollbar the
+// full length. Row contents are loaded on demand through loadRows.
+class VirtualList {
+    constructor(container, rowHeight, loadRows, renderRow) {
+        this.container = container;
+        this.rowHeight = rowHeight;
+        this.loadRows = loadRows;       // (first, last) => Promise of items
+        this.renderRow = renderRow;     // (node, item) => void
+        this.overscan = 4;
+        this.count = 0;
+        this.rows = new Map();          // row index -> node
+        this.pool = [];
+        this.generation = 0;
+        
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'history-spacer';
+        container.appendChild(this.spacer);
+        container.addEventListener('scroll', () => this.render());
+    }
+    
+    setCount(count) {
+        this.count = count;
+        this.spacer.style.height = `${count * this.rowHeight}px`;
+        this.refresh();
+    }
+    
+    // Drops rendered rows, e.g. after their contents changed position
+    refresh() {
+        this.rows.forEach(node => this.release(node));
+        this.rows.clear();
+        this.generation++;
+        this.render();
+    }
+    
+    release(node) {
+        node.remove();
+        this.pool.push(node);
+    }
+    
+    render() {
+        const top = this.container.scrollTop;
+        const height = this.container.clientHeight || this.rowHeight * 10;
+        const first = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+        const last = Math.min(this.count - 1, Math.ceil((top + height) / this.rowHeight) + this.overscan);
+        
+        this.rows.forEach((node, index) => {
+            if (index < first || index > last) {
+                this.release(node);
+                this.rows.delete(index);
+            }
+        });
+        if (last < first) {
+            return;
+        }
+        
+        const missing = [];
+        for (let index = first; index <= last; index++) {
+            if (!this.rows.has(index)) {
+                const node = this.pool.pop() || document.createElement('div');
+                node.className = 'history-item';
+                node.textContent = '';
+                node.style.top = `${index * this.rowHeight}px`;
+                node.dataset.index = index;
+                this.rows.set(index, node);
+                this.container.appendChild(node);
+                missing.push(index);
+            }
+        }
+        if (missing.length === 0) {
+            return;
+        }
+        
+        const generation = this.generation;
+        const lo = missing[0];
+        const hi = missing[missing.length - 1];
+        this.loadRows(lo, hi).then(items => {
+            if (generation !== this.generation) {
+                return;
+            }
+            for (let index = lo; index <= hi; index++) {
+                const node = this.rows.get(index);
+                const item = items[index - lo];
+                if (node && item && node.dataset.index === String(index)) {
+                    this.renderRow(node, item);
+                }
+            }
+        });
+    }
+}
+
 class AdvancedCalculator {
     constructor() {
         this.expression = '';
         this.result = '0';
-        this.history = [];
+        this.historyStore = new HistoryStore();
+        this.historyIds = null;     // ids matching historyPrefix, oldest first; null for all
+        this.historyPrefix = '';
         this.memory = 0;
         this.angleUnit = 'deg'; // 'deg' or 'rad'
         this.currentTab = 'basic';
@@ -14,6 +454,28 @@ class AdvancedCalculator {
             φ: (1 + Math.sqrt(5)) / 2
         };
         
+        // Trigonometric functions read angleUnit when they run, so compiled
+        // expressions stay valid when it changes
+        this.functions = {
+            'sin': (x) => Math.sin(this.toRadians(x)),
+            'cos': (x) => Math.cos(this.toRadians(x)),
+            'tan': (x) => Math.tan(this.toRadians(x)),
+            'asin': (x) => this.fromRadians(Math.asin(x)),
+            'acos': (x) => this.fromRadians(Math.acos(x)),
+            'atan': (x) => this.fromRadians(Math.atan(x)),
+            'sinh': (x) => Math.sinh(x),
+            'cosh': (x) => Math.cosh(x),
+            'tanh': (x) => Math.tanh(x),
+            'log': (x) => Math.log10(x),
+            'ln': (x) => Math.log(x),
+            'exp': (x) => Math.exp(x),
+            'sqrt': (x) => Math.sqrt(x),
+            'cbrt': (x) => Math.cbrt(x),
+            'factorial': (x) => this.factorial(Math.floor(x))
+        };
+        
+        this.compiler = new ExpressionCompiler(this.functions, this.constants);
+        
         this.unitConversions = {
             length: {
                 meters: 1,
@@ -44,6 +506,7 @@ class AdvancedCalculator {
         this.setupTabSwitching();
         this.setupConverter();
         this.setupMatrix();
+        this.setupHistory();
         this.updateDisplay();
         this.loadTheme();
     }
@@ -281,74 +744,12 @@ class AdvancedCalculator {
     
     evaluateExpression(expr) {
         try {
-            // Replace constants first
-            expr = expr.replace(/π/g, Math.PI.toString());
-            expr = expr.replace(/e(?![a-z])/g, Math.E.toString());
-            expr = expr.replace(/φ/g, ((1 + Math.sqrt(5)) / 2).toString());
-            
-            // Replace display operators
-            expr = expr.replace(/×/g, '*');
-            expr = expr.replace(/÷/g, '/');
-            expr = expr.replace(/−/g, '-');
-            
-            // Handle power operations
-            expr = expr.replace(/\^2/g, '**2');
-            expr = expr.replace(/\^3/g, '**3');
-            expr = expr.replace(/\^/g, '**');
-            
-            // Handle mathematical functions
-            expr = this.replaceMathFunctions(expr);
-            
-            // Use Function constructor for safe evaluation
-            const result = Function(`"use strict"; return (${expr})`)();
-            return result;
+            return this.compiler.compile(expr)();
         } catch (error) {
             throw new Error('Invalid expression');
         }
     }
     
-    replaceMathFunctions(expr) {
-        const mathFunctions = {
-            'sin': (x) => Math.sin(this.toRadians(x)),
-            'cos': (x) => Math.cos(this.toRadians(x)),
-            'tan': (x) => Math.tan(this.toRadians(x)),
-            'asin': (x) => this.fromRadians(Math.asin(x)),
-            'acos': (x) => this.fromRadians(Math.acos(x)),
-            'atan': (x) => this.fromRadians(Math.atan(x)),
-            'sinh': (x) => Math.sinh(x),
-            'cosh': (x) => Math.cosh(x),
-            'tanh': (x) => Math.tanh(x),
-            'log': (x) => Math.log10(x),
-            'ln': (x) => Math.log(x),
-            'exp': (x) => Math.exp(x),
-            'sqrt': (x) => Math.sqrt(x),
-            'cbrt': (x) => Math.cbrt(x),
-            'factorial': (x) => this.factorial(Math.floor(x))
-        };
-        
-        // Process functions from longest to shortest to avoid conflicts
-        const sortedFunctions = Object.keys(mathFunctions).sort((a, b) => b.length - a.length);
-        
-        for (const funcName of sortedFunctions) {
-            const func = mathFunctions[funcName];
-            // Match function calls like sin(30) or sqrt(16)
-            const regex = new RegExp(`\\b${funcName}\\(([^()]+)\\)`, 'g');
-            
-            expr = expr.replace(regex, (match, args) => {
-                try {
-                    // Recursively evaluate the argument
-                    const argValue = this.evaluateExpression(args);
-                    const result = func(argValue);
-                    return result.toString();
-                } catch (e) {
-                    throw new Error(`Error in function ${funcName}`);
-                }
-            });
-        }
-        
-        return expr;
-    }
-    
     factorial(n) {
         if (n < 0 || n !== Math.floor(n)) return NaN;
         if (n === 0 || n === 1) return 1;
@@ -441,38 +842,82 @@ class AdvancedCalculator {
         document.getElementById('result').textContent = this.result;
     }
     
-    addToHistory(expression, result) {
-        const historyItem = { expression, result, timestamp: Date.now() };
-        this.history.unshift(historyItem);
+    setupHistory() {
+        const list = document.getElementById('historyList');
+        this.historyRows = new VirtualList(list, 80,
+            (first, last) => this.loadHistoryRows(first, last),
+            (node, item) => this.renderHistoryRow(node, item));
+        
+        // One handler for every row, however many are created
+        list.addEventListener('click', (e) => {
+            const row = e.target.closest('.history-item');
+            if (row && row.entry) {
+                this.expression = row.entry.result;
+                this.isResultDisplayed = true;
+                this.updateDisplay();
+                this.toggleHistory();
+            }
+        });
         
-        // Limit history to 50 items
-        if (this.history.length > 50) {
-            this.history = this.history.slice(0, 50);
-        }
+        document.getElementById('historySearch').addEventListener('input', (e) => {
+            this.searchHistory(e.target.value.trim());
+        });
         
+        this.historyStore.open().then(() => this.updateHistoryDisplay());
+    }
+    
+    addToHistory(expression, result) {
+        const entry = this.historyStore.add(expression, result);
+        if (this.historyIds && expression.startsWith(this.historyPrefix)) {
+            this.historyIds.push(entry.id);
+        }
         this.updateHistoryDisplay();
     }
     
+    // Row 0 is the newest entry
+    historyIdAt(index) {
+        if (this.historyIds) {
+            return this.historyIds[this.historyIds.length - 1 - index];
+        }
+        return this.historyStore.nextId - 1 - index;
+    }
+    
+    loadHistoryRows(first, last) {
+        const ids = [];
+        for (let index = first; index <= last; index++) {
+            ids.push(this.historyIdAt(index));
+        }
+        return this.historyStore.get(ids);
+    }
+    
+    renderHistoryRow(node, item) {
+        node.entry = item;
+        node.innerHTML = `
+            <div class="history-expression"></div>
+            <div class="history-result"></div>
+        `;
+        node.firstElementChild.textContent = item.expression;
+        node.lastElementChild.textContent = item.result;
+    }
+    
     updateHistoryDisplay() {
-        const historyList = document.getElementById('historyList');
-        historyList.innerHTML = '';
-        
-        this.history.forEach((item, index) => {
-            const historyItem = document.createElement('div');
-            historyItem.className = 'history-item';
-            historyItem.innerHTML = `
-                <div class="history-expression">${item.expression}</div>
-                <div class="history-result">${item.result}</div>
-            `;
-            
-            historyItem.addEventListener('click', () => {
-                this.expression = item.result;
-                this.isResultDisplayed = true;
-                this.updateDisplay();
-                this.toggleHistory();
-            });
-            
-            historyList.appendChild(historyItem);
+        const count = this.historyIds ? this.historyIds.length : this.historyStore.count;
+        this.historyRows.setCount(count);
+    }
+    
+    searchHistory(prefix) {
+        this.historyPrefix = prefix;
+        if (!prefix) {
+            this.historyIds = null;
+            this.updateHistoryDisplay();
+            return;
+        }
+        this.historyStore.searchPrefix(prefix).then(ids => {
+            // Ignore answers to searches typed over since
+            if (prefix === this.historyPrefix) {
+                this.historyIds = ids;
+                this.updateHistoryDisplay();
+            }
         });
     }
     
@@ -480,10 +925,12 @@ class AdvancedCalculator {
         const panel = document.getElementById('historyPanel');
         panel.classList.toggle('active');
         panel.classList.toggle('hidden');
+        this.historyRows.render();
     }
     
     clearHistory() {
-        this.history = [];
+        this.historyStore.clear();
+        this.historyIds = this.historyIds ? [] : null;
         this.updateHistoryDisplay();
     }
     
@@ -0,0 +1,299 @@
+#include "arena.h"
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+struct calc_arena_block {
+    calc_arena_block_t* next;
+    size_t size;        // usable bytes in data
+    size_t offset;      // first free byte
+    size_t last;        // start of the most recent allocation, for in-place growth
+    unsigned char data[];   // the header is a multiple of the alignment
+};
+
+static size_t align_up(size_t size) {
+    return (size + CALC_ARENA_ALIGNMENT - 1) & ~(size_t)(CALC_ARENA_ALIGNMENT - 1);
+}
+
+void calc_arena_init(calc_arena_t* arena, size_t limit) {
+    if (arena) {
+        memset(arena, 0, sizeof(*arena));
+        arena->limit = limit;
+    }
+}
+
+static void free_blocks(calc_arena_block_t* block) {
+    while (block) {
+        calc_arena_block_t* next = block->next;
+        free(block);
+        block = next;
+    }
+}
+
+void calc_arena_free(calc_arena_t* arena) {
+    if (!arena) {
+        return;
+    }
+    free_blocks(arena->first);
+    free_blocks(arena->large);
+    calc_arena_init(arena, arena->limit);
+}
+
+// Whether size more bytes of blocks, shared or not, stay within the limit
+static bool within_limit(const calc_arena_t* arena, size_t size) {
+    size_t held = arena->reserved + arena->large_reserved;
+    return !arena->limit || (held <= arena->limit && size <= arena->limit - held);
+}
+
+// Appends a block that can hold at least size bytes after current
+static calc_arena_block_t* add_block(calc_arena_t* arena, size_t size) {
+    size_t block_size = arena->current ? arena->current->size * 2 : CALC_ARENA_FIRST_BLOCK;
+    if (block_size > CALC_ARENA_MAX_BLOCK) {
+        block_size = CALC_ARENA_MAX_BLOCK;
+    }
+    if (block_size < size) {
+        block_size = size;
+    }
+    if (block_size > SIZE_MAX - sizeof(calc_arena_block_t)) {
+        return NULL;
+    }
+    if (!within_limit(arena, block_size)) {
+        return NULL;
+    }
+
+    calc_arena_block_t* block = malloc(sizeof(calc_arena_block_t) + block_size);
+    if (!block) {
+        return NULL;
+    }
+    block->size = block_size;
+    block->offset = 0;
+    block->last = 0;
+
+    // Splice in after current; blocks kept from earlier resets follow it.
+    // Without a current block none of them had room, and it goes last, so
+    // the first block stays the small one a reset keeps.
+    if (arena->current) {
+        block->next = arena->current->next;
+        arena->current->next = block;
+    } else {
+        calc_arena_block_t** link = &arena->first;
+        while (*link) {
+            link = &(*link)->next;
+        }
+        block->next = NULL;
+        *link = block;
+    }
+    arena->reserved += block_size;
+    return block;
+}
+
+static void count_used(calc_arena_t* arena, size_t size) {
+    arena->used += size;
+    if (arena->used > arena->peak) {
+        arena->peak = arena->used;
+    }
+}
+
+void* calc_arena_alloc(calc_arena_t* arena, size_t size) {
+    if (!arena) {
+        return NULL;
+    }
+    if (size == 0) {
+        size = 1;
+    }
+    if (size > SIZE_MAX - CALC_ARENA_ALIGNMENT) {
+        return NULL;
+    }
+    size = align_up(size);
+
+    calc_arena_block_t* block = arena->current;
+    if (!block && arena->first) {
+        block = arena->first;
+        block->offset = 0;
+    }
+    // Move on to kept blocks, dropping them from use if they are too small
+    while (block && block->size - block->offset < size) {
+        block = block->next;
+        if (block) {
+            block->offset = 0;
+        }
+    }
+    if (!block) {
+        block = add_block(arena, size);
+        if (!block) {
+            return NULL;
+        }
+    }
+    arena->current = block;
+
+    void* ptr = block->data + block->offset;
+    block->last = block->offset;
+    block->offset += size;
+    count_used(arena, size);
+    return ptr;
+}
+
+void* calc_arena_calloc(calc_arena_t* arena, size_t count, size_t size) {
+    if (size && count > SIZE_MAX / size) {
+        return NULL;
+    }
+    void* ptr = calc_arena_alloc(arena, count * size);
+    if (ptr) {
+        memset(ptr, 0, count * size);
+    }
+    return ptr;
+}
+
+// Resizes an array that has a block of its own; *link points to the block
+static void* resize_large(calc_arena_t* arena, calc_arena_block_t** link, size_t size) {
+    calc_arena_block_t* block = *link;
+    if (size <= block->size) {
+        return block->data;
+    }
+    size_t old_size = block->size;
+    if (!within_limit(arena, size - old_size)) {
+        return NULL;
+    }
+    block = realloc(block, sizeof(calc_arena_block_t) + size);
+    if (!block) {
+        return NULL;
+    }
+    *link = block;
+    block->size = size;
+    block->offset = size;
+    arena->large_reserved += size - old_size;
+    count_used(arena, size - old_size);
+    return block->data;
+}
+
+// Moves an array into a block of its own
+static void* add_large(calc_arena_t* arena, const void* ptr, size_t old_size, size_t size) {
+    if (size > SIZE_MAX - sizeof(calc_arena_block_t) || !within_limit(arena, size)) {
+        return NULL;
+    }
+    calc_arena_block_t* block = malloc(sizeof(calc_arena_block_t) + size);
+    if (!block) {
+        return NULL;
+    }
+    memcpy(block->data, ptr, old_size);
+    block->size = size;
+    block->offset = size;
+    block->last = 0;
+    block->next = arena->large;
+    arena->large = block;
+    arena->large_count++;
+    arena->large_reserved += size;
+    count_used(arena, size);
+    return block->data;
+}
+
+void* calc_arena_realloc(calc_arena_t* arena, void* ptr, size_t old_size, size_t new_size) {
+    if (!ptr) {
+        return calc_arena_alloc(arena, new_size);
+    }
+    if (!arena || new_size > SIZE_MAX - CALC_ARENA_ALIGNMENT) {
+        return NULL;
+    }
+    size_t old_aligned = align_up(old_size ? old_size : 1);
+    size_t new_aligned = align_up(new_size ? new_size : 1);
+
+    for (calc_arena_block_t** link = &arena->large; *link; link = &(*link)->next) {
+        if ((*link)->data == (unsigned char*)ptr) {
+            return resize_large(arena, link, new_aligned);
+        }
+    }
+
+    calc_arena_block_t* block = arena->current;
+    bool most_recent = block && (unsigned char*)ptr == block->data + block->last &&
+                       block->last + old_aligned == block->offset;
+    if (most_recent && new_aligned <= block->size - block->last) {
+        block->offset = block->last + new_aligned;
+        arena->used -= old_aligned;
+        count_used(arena, new_aligned);
+        return ptr;
+    }
+    if (new_size <= old_size) {
+        return ptr;
+    }
+
+    // Give the old space back first when nothing follows it. The copy lands
+    // in a block of its own or a later block, so the data survives until
+    // it is copied.
+    if (most_recent) {
+        block->offset = block->last;
+        arena->used -= old_aligned;
+    }
+    void* grown = new_aligned > CALC_ARENA_MAX_BLOCK ? add_large(arena, ptr, old_size, new_aligned)
+                                                     : calc_arena_alloc(arena, new_size);
+    if (!grown) {
+        if (most_recent) {
+            arena->current = block;
+            block->offset = block->last + old_aligned;
+            arena->used += old_aligned;
+        }
+        return NULL;
+    }
+    if (new_aligned <= CALC_ARENA_MAX_BLOCK) {
+        memcpy(grown, ptr, old_size);
+    }
+    return grown;
+}
+
+calc_arena_mark_t calc_arena_mark(const calc_arena_t* arena) {
+    calc_arena_mark_t mark;
+    mark.block = arena ? arena->current : NULL;
+    mark.offset = mark.block ? mark.block->offset : 0;
+    mark.used = arena ? arena->used : 0;
+    mark.large_count = arena ? arena->large_count : 0;
+    return mark;
+}
+
+void calc_arena_reset(calc_arena_t* arena, calc_arena_mark_t mark) {
+    if (!arena) {
+        return;
+    }
+    // Blocks of grown arrays allocated since the mark are the newest
+    while (arena->large_count > mark.large_count) {
+        calc_arena_block_t* block = arena->large;
+        arena->large = block->next;
+        arena->large_count--;
+        arena->large_reserved -= block->size;
+        free(block);
+    }
+
+    if (mark.used == 0) {
+        // Nothing is left: keep the first block for the next evaluation and
+        // return the rest, so one large evaluation does not pin its peak.
+        // A first block sized for one big allocation goes as well.
+        if (arena->first && arena->first->size > CALC_ARENA_FIRST_BLOCK) {
+            free_blocks(arena->first);
+            arena->first = NULL;
+            arena->reserved = 0;
+        } else if (arena->first) {
+            calc_arena_block_t* block = arena->first->next;
+            while (block) {
+                calc_arena_block_t* next = block->next;
+                arena->reserved -= block->size;
+                free(block);
+                block = next;
+            }
+            arena->first->next = NULL;
+            arena->first->offset = 0;
+            arena->first->last = 0;
+        }
+        arena->current = NULL;
+    } else {
+        arena->current = mark.block;
+        if (mark.block) {
+            mark.block->offset = mark.offset;
+            mark.block->last = mark.offset;
+        }
+    }
+    arena->used = mark.used;
+}
+
+void calc_arena_clear_peak(calc_arena_t* arena) {
+    if (arena) {
+        arena->peak = arena->used;
+    }
+}
@@ -0,0 +1,64 @@
+#ifndef ARENA_H
+#define ARENA_H
+
+#include <stdbool.h>
+#include <stddef.h>
+
+// Size of the first block; later blocks double up to CALC_ARENA_MAX_BLOCK
+#define CALC_ARENA_FIRST_BLOCK 4096
+#define CALC_ARENA_MAX_BLOCK (1024 * 1024)
+
+// Allocation sizes are rounded up to a multiple of this many bytes
+#define CALC_ARENA_ALIGNMENT 16
+
+typedef struct calc_arena_block calc_arena_block_t;
+
+// Bump allocator. Allocations are never freed one by one: take a mark, work,
+// then reset to the mark to release everything allocated since in O(1).
+// Blocks are kept after a reset to a mark with allocations before it and
+// reused; a reset that empties the arena keeps only the first block.
+// Arrays grown by calc_arena_realloc past CALC_ARENA_MAX_BLOCK (the code of a
+// multi-megabyte expression) move to a heap block of their own, resized in
+// place from then on. The limit covers those blocks as well.
+// A zero-initialized arena is valid and has no limit.
+typedef struct {
+    calc_arena_block_t* first;
+    calc_arena_block_t* current;
+    calc_arena_block_t* large;  // blocks of single grown arrays, newest first
+    size_t large_count;
+    size_t large_reserved;      // bytes of those blocks
+    size_t limit;       // most bytes of blocks, shared or not, the arena may hold, 0 for none
+    size_t reserved;    // bytes of shared blocks held
+    size_t used;        // bytes handed out and not yet reset
+    size_t peak;        // largest `used` since init or calc_arena_clear_peak
+} calc_arena_t;
+
+// Position to reset to
+typedef struct {
+    calc_arena_block_t* block;
+    size_t offset;
+    size_t used;
+    size_t large_count;
+} calc_arena_mark_t;
+
+// Function prototypes
+
+// Lifetime
+void calc_arena_init(calc_arena_t* arena, size_t limit);
+void calc_arena_free(calc_arena_t* arena);          // returns every block to the heap
+
+// Allocation; NULL when the limit would be exceeded or the heap is exhausted
+void* calc_arena_alloc(calc_arena_t* arena, size_t size);
+void* calc_arena_calloc(calc_arena_t* arena, size_t count, size_t size);
+
+// Grows the most recent allocation in place when there is room, otherwise
+// copies it, giving the old space back if it was the most recent allocation
+// (other old copies are reclaimed at the next reset)
+void* calc_arena_realloc(calc_arena_t* arena, void* ptr, size_t old_size, size_t new_size);
+
+// Marks and resets
+calc_arena_mark_t calc_arena_mark(const calc_arena_t* arena);
+void calc_arena_reset(calc_arena_t* arena, calc_arena_mark_t mark);
+void calc_arena_clear_peak(calc_arena_t* arena);
+
+#endif // ARENA_H
@@ -0,0 +1,226 @@
+// Evaluator benchmark: parses and evaluates a few formulas with every
+// evaluation strategy and prints the time per evaluation, then the cost and
+// error of each accuracy tier's elementary functions (accuracy.h). The
+// horner column is the compiled evaluator after
+// calc_program_optimize_polynomials (polynomial.h).
+//
+//   cc -O2 -I. benchmark.c <engine sources> -lm -pthread -o calculator_benchmark
+//   ./calculator_benchmark [iterations] [--stats]
+//
+// --stats prints the engine's profiling counters as JSON afterwards; they
+// are only collected in a build with -DCALC_ENABLE_PROFILING.
+
+#include "calculator_engine.h"
+#include "accuracy.h"
+#include "expression_parser.h"
+#include "expression_compiler.h"
+#include "jit.h"
+#include "polynomial.h"
+#include "profiling.h"
+#include <ctype.h>
+#include <stdbool.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+static const char* formulas[] = {
+    "x*x+3*x-2",
+    "sin(x)*cos(x)+sqrt(x^2+1)-log(x+2)/exp(x/10)",
+    "((x+1)*(x-2)+(x+3)*(x-4))/((x+5)*(x-6)+(x+7)*(x-8)+1000)",
+    "max(x,2)+min(x,1)*atan2(x,3)+abs(x-1)",
+    "gamma(x/100+1)+comb(10,3)+tanh(x)^2",
+    "3*x^4-2*x^3+x-7"
+};
+
+// Functions with accuracy tiers and the range their arguments are drawn
+// from; pow's exponent runs over [-10, 10]
+static const struct {
+    const char* name;
+    double lo;
+    double hi;
+} tiered_functions[] = {
+    {"sin", -10.0, 10.0},
+    {"cos", -10.0, 10.0},
+    {"tan", -1.5, 1.5},
+    {"exp", -50.0, 50.0},
+    {"log", 0.001, 1000.0},
+    {"pow", 0.1, 10.0}
+};
+
+#define ACCURACY_SAMPLES 4096
+
+// Keeps timed results live
+static volatile double sink;
+
+static double seconds(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec * 1e-9;
+}
+
+// Sample points, so no strategy can reuse a result
+static double sample(long i) {
+    return (double)(i % 1000) * 0.01 + 0.5;
+}
+
+static void tier_arguments(size_t f, long i, double* args) {
+    double t = ((double)(i % ACCURACY_SAMPLES) + 0.5) / ACCURACY_SAMPLES;
+    args[0] = tiered_functions[f].lo + (tiered_functions[f].hi - tiered_functions[f].lo) * t;
+    args[1] = -10.0 + 20.0 * (double)((i * 7) % ACCURACY_SAMPLES) / ACCURACY_SAMPLES;
+}
+
+// Distance from reference in units in the last place of reference
+static double ulps(double value, double reference) {
+    double ulp = nextafter(fabs(reference), INFINITY) - fabs(reference);
+    return fabs(value - reference) / ulp;
+}
+
+// ns per call and the largest error against the exact tier, per tier
+static void benchmark_accuracy(long iterations) {
+    printf("\n%-10s", "ns / ulp");
+    for (int tier = 0; tier < CALC_ACCURACY_COUNT; tier++) {
+        printf(" %21s", calc_accuracy_name((calc_accuracy_t)tier));
+    }
+    printf("\n");
+
+    for (size_t f = 0; f < sizeof(tiered_functions) / sizeof(tiered_functions[0]); f++) {
+        int index = get_function_index(tiered_functions[f].name);
+        int argc = strcmp(tiered_functions[f].name, "pow") == 0 ? 2 : 1;
+        calc_kernel_t exact = get_accuracy_kernel(index, argc, CALC_ACCURACY_EXACT);
+        printf("%-10s", tiered_functions[f].name);
+        for (int tier = 0; tier < CALC_ACCURACY_COUNT; tier++) {
+            calc_kernel_t kernel = get_accuracy_kernel(index, argc, (calc_accuracy_t)tier);
+            double args[2];
+            double checksum = 0.0;
+            double start = seconds();
+            for (long i = 0; i < iterations; i++) {
+                tier_arguments(f, i, args);
+                checksum += kernel(args, false);
+            }
+            double elapsed = (seconds() - start) / iterations;
+
+            double worst = 0.0;
+            for (long i = 0; i < ACCURACY_SAMPLES; i++) {
+                tier_arguments(f, i, args);
+                double error = ulps(kernel(args, false), exact(args, false));
+                worst = error > worst ? error : worst;
+            }
+            sink = checksum;
+            printf(" %10.1f %10.3g", elapsed * 1e9, worst);
+        }
+        printf("\n");
+    }
+}
+
+// Copies formula into text with every standalone x replaced by value
+static void substitute(const char* formula, double value, char* text, size_t size) {
+    size_t length = 0;
+    for (const char* p = formula; *p && length + 32 < size; p++) {
+        bool letter_before = p > formula && isalpha((unsigned char)p[-1]);
+        bool letter_after = isalpha((unsigned char)p[1]);
+        if (*p == 'x' && !letter_before && !letter_after) {
+            length += snprintf(text + length, size - length, "(%.17g)", value);
+        } else {
+            text[length++] = *p;
+        }
+    }
+    text[length] = '\0';
+}
+
+int main(int argc, char** argv) {
+    long iterations = 1000000;
+    bool stats = false;
+    for (int i = 1; i < argc; i++) {
+        if (strcmp(argv[i], "--stats") == 0) {
+            stats = true;
+        } else {
+            iterations = atol(argv[i]);
+        }
+    }
+    if (iterations < 1) {
+        iterations = 1;
+    }
+    calc_state_t* state = calc_create_state();
+    if (!state) {
+        return 1;
+    }
+    state->angle_in_degrees = false;
+    printf("JIT: %s\n", calc_jit_supported() ? "native" : "interpreter fallback");
+    printf("%-56s %10s %10s %10s %10s %10s\n", "ns per evaluation", "parse", "checked", "compiled", "jit",
+           "horner");
+
+    for (size_t f = 0; f < sizeof(formulas) / sizeof(formulas[0]); f++) {
+        calc_program_t program;
+        calc_program_init(&program);
+        if (calc_program_compile(formulas[f], &program, NULL) != PARSE_SUCCESS) {
+            continue;
+        }
+        calc_program_t optimized;
+        calc_program_init(&optimized);
+        calc_program_compile(formulas[f], &optimized, NULL);
+        calc_program_optimize_polynomials(&optimized);
+        calc_jit_t* jit = calc_jit_compile(&program, state->angle_in_degrees);
+        double checksum[5] = {0.0, 0.0, 0.0, 0.0, 0.0};
+        double elapsed[5];
+
+        // parse_expression has no variables, so every call re-parses the
+        // formula with the sample value written into the text
+        char text[1024];
+        long parse_iterations = iterations / 10 > 0 ? iterations / 10 : 1;
+        double start = seconds();
+        for (long i = 0; i < parse_iterations; i++) {
+            substitute(formulas[f], sample(i), text, sizeof(text));
+            checksum[0] += parse_expression(text, state).value;
+        }
+        elapsed[0] = (seconds() - start) / parse_iterations;
+
+        start = seconds();
+        for (long i = 0; i < iterations; i++) {
+            double x = sample(i);
+            checksum[1] += calc_program_evaluate_checked(&program, state, &x).value;
+        }
+        elapsed[1] = (seconds() - start) / iterations;
+
+        start = seconds();
+        for (long i = 0; i < iterations; i++) {
+            double x = sample(i);
+            checksum[2] += calc_program_evaluate(&program, state, &x).value;
+        }
+        elapsed[2] = (seconds() - start) / iterations;
+
+        start = seconds();
+        for (long i = 0; i < iterations; i++) {
+            double x = sample(i);
+            checksum[3] += calc_jit_evaluate(jit, state, &x).value;
+        }
+        elapsed[3] = (seconds() - start) / iterations;
+
+        // Horner form rounds differently, so its checksum is not compared
+        start = seconds();
+        for (long i = 0; i < iterations; i++) {
+            double x = sample(i);
+            checksum[4] += calc_program_evaluate(&optimized, state, &x).value;
+        }
+        elapsed[4] = (seconds() - start) / iterations;
+
+        printf("%-56s %10.1f %10.1f %10.1f %10.1f %10.1f%s\n", formulas[f],
+               elapsed[0] * 1e9, elapsed[1] * 1e9, elapsed[2] * 1e9, elapsed[3] * 1e9, elapsed[4] * 1e9,
+               checksum[1] == checksum[2] && checksum[2] == checksum[3] ? "" : "  (results differ)");
+        calc_jit_free(jit);
+        calc_program_free(&optimized);
+        calc_program_free(&program);
+    }
+
+    benchmark_accuracy(iterations);
+
+    if (stats) {
+        calc_profile_stats_t counters;
+        calc_get_profile_stats(&counters);
+        char json[8192];
+        calc_profile_stats_to_json(&counters, json, sizeof(json));
+        printf("%s\n", json);
+    }
+    calc_destroy_state(state);
+    return 0;
+}
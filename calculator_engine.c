@@ -1,10 +1,16 @@
 #include "calculator_engine.h"
 #include "expression_parser.h"
+#include "adaptive_precision.h"
+#include "tiered.h"
+#include "history.h"
+#include "profiling.h"
+#include "trig.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <errno.h>
 #include <float.h>
+#include <time.h>
 
 // Mathematical constants
 const double CALC_PI = M_PI;
@@ -94,7 +100,8 @@ calc_result_t calc_nthroot(double x, int n) {
         return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
     }
 
-    double result = pow(x, 1.0 / n);
+    // Odd roots of negative numbers are real: -(|x|^(1/n))
+    double result = x < 0.0 ? -pow(-x, 1.0 / n) : pow(x, 1.0 / n);
     if (!calc_is_finite(result)) {
         return make_result(0.0, CALC_ERROR_OVERFLOW);
     }
@@ -103,31 +110,20 @@ calc_result_t calc_nthroot(double x, int n) {
 
 // Trigonometric functions
 calc_result_t calc_sin(double x, bool degrees) {
-    if (degrees) {
-        x = calc_deg_to_rad(x);
-    }
-    return make_result(sin(x), CALC_SUCCESS);
+    return make_result(degrees ? calc_sind(x) : calc_sinr(x), CALC_SUCCESS);
 }
 
 calc_result_t calc_cos(double x, bool degrees) {
-    if (degrees) {
-        x = calc_deg_to_rad(x);
-    }
-    return make_result(cos(x), CALC_SUCCESS);
+    return make_result(degrees ? calc_cosd(x) : calc_cosr(x), CALC_SUCCESS);
 }
 
 calc_result_t calc_tan(double x, bool degrees) {
-    if (degrees) {
-        x = calc_deg_to_rad(x);
-    }
-
-    // Check for undefined values (odd multiples of π/2)
-    double normalized = fmod(x, M_PI);
-    if (fabs(normalized - M_PI/2) < 1e-15 || fabs(normalized + M_PI/2) < 1e-15) {
+    // Infinite at odd multiples of 90 degrees (pi/2)
+    double result = degrees ? calc_tand(x) : calc_tanr(x);
+    if (isinf(result)) {
         return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
     }
-
-    return make_result(tan(x), CALC_SUCCESS);
+    return make_result(result, CALC_SUCCESS);
 }
 
 calc_result_t calc_sec(double x, bool degrees) {
@@ -246,7 +242,7 @@ calc_result_t calc_coth(double x) {
     if (x == 0.0) {
         return make_result(0.0, CALC_ERROR_DIVISION_BY_ZERO);
     }
-    return make_result(coth(x), CALC_SUCCESS);
+    return make_result(1.0 / tanh(x), CALC_SUCCESS);
 }
 
 // Logarithmic functions
@@ -304,21 +300,6 @@ calc_result_t calc_exp2(double x) {
 }
 
 // Special functions
-calc_result_t calc_factorial(int n) {
-    if (n < 0) {
-        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
-    }
-    if (n > 170) { // Factorial of 171 overflows double
-        return make_result(0.0, CALC_ERROR_OVERFLOW);
-    }
-
-    double result = 1.0;
-    for (int i = 2; i <= n; i++) {
-        result *= i;
-    }
-    return make_result(result, CALC_SUCCESS);
-}
-
 calc_result_t calc_gamma(double x) {
     if (x <= 0 && calc_is_integer(x)) {
         return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
@@ -353,69 +334,6 @@ calc_result_t calc_mod(double a, double b) {
     return make_result(fmod(a, b), CALC_SUCCESS);
 }
 
-// Combinatorics
-calc_result_t calc_permutation(int n, int r) {
-    if (n < 0 || r < 0 || r > n) {
-        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
-    }
-
-    double result = 1.0;
-    for (int i = n; i > n - r; i--) {
-        result *= i;
-        if (!calc_is_finite(result)) {
-            return make_result(0.0, CALC_ERROR_OVERFLOW);
-        }
-    }
-    return make_result(result, CALC_SUCCESS);
-}
-
-calc_result_t calc_combination(int n, int r) {
-    if (n < 0 || r < 0 || r > n) {
-        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
-    }
-
-    // Use symmetry property: C(n,r) = C(n, n-r)
-    if (r > n - r) {
-        r = n - r;
-    }
-
-    double result = 1.0;
-    for (int i = 0; i < r; i++) {
-        result = result * (n - i) / (i + 1);
-        if (!calc_is_finite(result)) {
-            return make_result(0.0, CALC_ERROR_OVERFLOW);
-        }
-    }
-    return make_result(result, CALC_SUCCESS);
-}
-
-// Number theory
-calc_result_t calc_gcd(int a, int b) {
-    a = abs(a);
-    b = abs(b);
-
-    while (b != 0) {
-        int temp = b;
-        b = a % b;
-        a = temp;
-    }
-    return make_result((double)a, CALC_SUCCESS);
-}
-
-calc_result_t calc_lcm(int a, int b) {
-    if (a == 0 || b == 0) {
-        return make_result(0.0, CALC_SUCCESS);
-    }
-
-    calc_result_t gcd_result = calc_gcd(a, b);
-    if (gcd_result.has_error) {
-        return gcd_result;
-    }
-
-    double result = (abs(a) * abs(b)) / gcd_result.value;
-    return make_result(result, CALC_SUCCESS);
-}
-
 // Complex number operations
 calc_complex_t calc_complex_add(calc_complex_t a, calc_complex_t b) {
     calc_complex_t result;
@@ -489,8 +407,9 @@ void calc_memory_clear(calc_state_t* state) {
 
 // State management
 calc_state_t* calc_create_state(void) {
-    calc_state_t* state = malloc(sizeof(calc_state_t));
+    calc_state_t* state = calloc(1, sizeof(calc_state_t));
     if (state) {
+        calc_arena_init(&state->arena, CALC_DEFAULT_MEMORY_LIMIT);
         calc_reset_state(state);
     }
     return state;
@@ -498,6 +417,9 @@ calc_state_t* calc_create_state(void) {
 
 void calc_destroy_state(calc_state_t* state) {
     if (state) {
+        calc_arena_free(&state->arena);
+        calc_tier_cache_destroy(state->tier_cache);
+        free(state->last_expression);
         free(state);
     }
 }
@@ -508,10 +430,130 @@ void calc_reset_state(calc_state_t* state) {
         state->last_result = 0.0;
         state->angle_in_degrees = true;
         state->precision = 10;
-        strcpy(state->last_expression, "");
+        state->adaptive_precision = false;
+        state->last_digits = 0;
+        state->accuracy = CALC_ACCURACY_FAITHFUL;
+        if (state->last_expression) {
+            state->last_expression[0] = '\0';
+        }
+        state->timeout_ms = 0.0;
+        state->deadline = 0.0;
+        state->interrupt_countdown = 0;
+        state->compile_threshold = CALC_DEFAULT_COMPILE_THRESHOLD;
+        state->native_threshold = CALC_DEFAULT_NATIVE_THRESHOLD;
+    }
+}
+
+void calc_get_memory_usage(const calc_state_t* state, calc_memory_usage_t* usage) {
+    if (!usage) {
+        return;
+    }
+    memset(usage, 0, sizeof(*usage));
+    if (state) {
+        usage->in_use = state->arena.used;
+        usage->reserved = state->arena.reserved + state->arena.large_reserved;
+        usage->peak = state->arena.peak;
+        usage->limit = state->arena.limit;
+    }
+}
+
+// Blocks kept from earlier evaluations are released, so a lower limit
+// takes effect immediately. Call between evaluations.
+void calc_set_memory_limit(calc_state_t* state, size_t bytes) {
+    if (state) {
+        calc_arena_free(&state->arena);
+        state->arena.limit = bytes;
     }
 }
 
+const char* calc_last_expression(const calc_state_t* state) {
+    return (state && state->last_expression) ? state->last_expression : "";
+}
+
+// Keeps a copy of the expression being evaluated, of any length
+static void store_last_expression(calc_state_t* state, const char* expression) {
+    size_t length = strlen(expression);
+    if (length + 1 > state->last_expression_capacity) {
+        char* copy = realloc(state->last_expression, length + 1);
+        if (!copy) {
+            if (state->last_expression) {
+                state->last_expression[0] = '\0';
+            }
+            return;
+        }
+        state->last_expression = copy;
+        state->last_expression_capacity = length + 1;
+    }
+    memcpy(state->last_expression, expression, length + 1);
+}
+
+void calc_set_last_expression(calc_state_t* state, const char* expression) {
+    if (state && expression) {
+        store_last_expression(state, expression);
+    }
+}
+
+// Cancellation and deadlines
+static double monotonic_seconds(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec * 1e-9;
+}
+
+void calc_cancel(calc_state_t* state) {
+    if (state) {
+        calc_cancel_before(state, __atomic_load_n(&state->evaluation_id, __ATOMIC_ACQUIRE) + 1);
+    }
+}
+
+void calc_cancel_before(calc_state_t* state, uint64_t id) {
+    if (!state) {
+        return;
+    }
+    // Only ever raised, so an older cancel arriving late changes nothing
+    uint64_t current = __atomic_load_n(&state->cancelled_below, __ATOMIC_RELAXED);
+    while (current < id &&
+           !__atomic_compare_exchange_n(&state->cancelled_below, &current, id, true,
+                                        __ATOMIC_RELEASE, __ATOMIC_RELAXED)) {
+    }
+}
+
+void calc_set_evaluation_id(calc_state_t* state, uint64_t id) {
+    if (state) {
+        state->next_evaluation_id = id;
+    }
+}
+
+void calc_set_timeout(calc_state_t* state, double milliseconds) {
+    if (state) {
+        state->timeout_ms = milliseconds > 0.0 ? milliseconds : 0.0;
+    }
+}
+
+void calc_begin_evaluation(calc_state_t* state) {
+    uint64_t id = state->next_evaluation_id ? state->next_evaluation_id : state->evaluation_id + 1;
+    state->next_evaluation_id = 0;
+    __atomic_store_n(&state->evaluation_id, id, __ATOMIC_RELEASE);
+    state->deadline = state->timeout_ms > 0.0 ? monotonic_seconds() + state->timeout_ms / 1000.0 : 0.0;
+    state->interrupt_countdown = 0;
+}
+
+calc_error_t calc_check_interrupt(calc_state_t* state) {
+    if (!state) {
+        return CALC_SUCCESS;
+    }
+    if (state->evaluation_id < __atomic_load_n(&state->cancelled_below, __ATOMIC_ACQUIRE)) {
+        return CALC_ERROR_CANCELLED;
+    }
+    if (state->deadline > 0.0 && --state->interrupt_countdown <= 0) {
+        state->interrupt_countdown = CALC_INTERRUPT_INTERVAL;
+        if (monotonic_seconds() >= state->deadline) {
+            return CALC_ERROR_TIMEOUT;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
 // Utility functions
 const char* calc_error_string(calc_error_t error) {
     switch (error) {
@@ -524,6 +566,9 @@ const char* calc_error_string(calc_error_t error) {
         case CALC_ERROR_MEMORY_ERROR: return "Memory error";
         case CALC_ERROR_INVALID_FUNCTION: return "Invalid function";
         case CALC_ERROR_PARSE_ERROR: return "Parse error";
+        case CALC_ERROR_CANCELLED: return "Cancelled";
+        case CALC_ERROR_TIMEOUT: return "Timed out";
+        case CALC_ERROR_PRECISION_LOSS: return "Precision lost";
         default: return "Unknown error";
     }
 }
@@ -544,23 +589,92 @@ double calc_rad_to_deg(double radians) {
     return radians * 180.0 / M_PI;
 }
 
+// Quiet NaN tagged in the upper payload bits; the low bits hold the error
+#define ERROR_NAN_TAG 0x7FF8CA1C00000000ULL
+#define ERROR_NAN_TAG_MASK 0x7FFFFFFF00000000ULL
+
+double calc_error_nan(calc_error_t error) {
+    uint64_t bits = ERROR_NAN_TAG | (uint32_t)error;
+    double x;
+    memcpy(&x, &bits, sizeof(x));
+    return x;
+}
+
+calc_error_t calc_nan_error(double x) {
+    if (!isnan(x)) {
+        return CALC_SUCCESS;
+    }
+    uint64_t bits;
+    memcpy(&bits, &x, sizeof(bits));
+    if ((bits & ERROR_NAN_TAG_MASK) != ERROR_NAN_TAG) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+    return (calc_error_t)(uint32_t)bits;
+}
+
 // Main evaluation function (uses expression parser)
-calc_result_t calc_evaluate(const char* expression, calc_state_t* state) {
+static calc_result_t evaluate(const char* expression, calc_state_t* state) {
     if (!expression || !state) {
         return make_result(0.0, CALC_ERROR_INVALID_INPUT);
     }
 
     // Store expression for reference
-    strncpy(state->last_expression, expression, sizeof(state->last_expression) - 1);
-    state->last_expression[sizeof(state->last_expression) - 1] = '\0';
+    store_last_expression(state, expression);
+    calc_begin_evaluation(state);
+    state->last_digits = 0;
+
+    if (state->adaptive_precision) {
+        CALC_PROFILE_START(mark);
+        calc_adaptive_result_t adaptive = calc_evaluate_adaptive(expression, state);
+        CALC_PROFILE_STOP(CALC_PHASE_EVAL, mark);
+        if (adaptive.error == CALC_ERROR_CANCELLED || adaptive.error == CALC_ERROR_TIMEOUT ||
+            adaptive.error == CALC_ERROR_MEMORY_ERROR) {
+            return make_result(0.0, adaptive.error);
+        }
+        if (adaptive.error != CALC_SUCCESS) {
+            return make_result(0.0, CALC_ERROR_PARSE_ERROR);
+        }
+        // Overflow shows up as inf, or NaN once infinities meet
+        if (!isfinite(adaptive.value)) {
+            return make_result(0.0, CALC_ERROR_OVERFLOW);
+        }
+        // Fewer than `precision` digits is still a result; last_digits
+        // tells the caller how far to trust it. None at all is not.
+        if (adaptive.digits == 0) {
+            return make_result(0.0, CALC_ERROR_PRECISION_LOSS);
+        }
+        state->last_result = adaptive.value;
+        state->last_digits = adaptive.digits;
+        return make_result(adaptive.value, CALC_SUCCESS);
+    }
 
-    // Use expression parser to evaluate
-    parse_result_t parse_result = parse_expression(expression, state);
+    // Interpret, or run the compiled form once the expression is hot
+    parse_result_t parse_result = calc_tiered_evaluate(expression, state);
 
+    if (parse_result.error == PARSE_ERROR_CANCELLED) {
+        return make_result(0.0, CALC_ERROR_CANCELLED);
+    }
+    if (parse_result.error == PARSE_ERROR_TIMEOUT) {
+        return make_result(0.0, CALC_ERROR_TIMEOUT);
+    }
+    if (parse_result.error == PARSE_ERROR_OUT_OF_MEMORY) {
+        return make_result(0.0, CALC_ERROR_MEMORY_ERROR);
+    }
     if (parse_result.error != PARSE_SUCCESS) {
         return make_result(0.0, CALC_ERROR_PARSE_ERROR);
     }
 
     state->last_result = parse_result.value;
     return make_result(parse_result.value, CALC_SUCCESS);
+}
+
+calc_result_t calc_evaluate(const char* expression, calc_state_t* state) {
+    calc_result_t result = evaluate(expression, state);
+    CALC_PROFILE_EVALUATION(result.error, state ? state->arena.peak : 0);
+
+    // Cancelled evaluations were abandoned by the user and are not kept
+    if (state && state->history && expression && result.error != CALC_ERROR_CANCELLED) {
+        calc_history_append(state->history, expression, result.value, result.error);
+    }
+    return result;
 }
\ No newline at end of file
@@ -5,6 +5,8 @@
 #include <complex.h>
 #include <stdbool.h>
 #include <stddef.h>
+#include <stdint.h>
+#include "arena.h"
 
 // Version information
 #define CALC_VERSION_MAJOR 1
@@ -21,7 +23,10 @@ typedef enum {
     CALC_ERROR_UNDERFLOW,
     CALC_ERROR_MEMORY_ERROR,
     CALC_ERROR_INVALID_FUNCTION,
-    CALC_ERROR_PARSE_ERROR
+    CALC_ERROR_PARSE_ERROR,
+    CALC_ERROR_CANCELLED,
+    CALC_ERROR_TIMEOUT,
+    CALC_ERROR_PRECISION_LOSS     // adaptive evaluation could not guarantee a single digit
 } calc_error_t;
 
 // Data types for different number formats
@@ -36,15 +41,54 @@ typedef struct {
     calc_error_t error;
 } calc_result_t;
 
+// Implementations behind the elementary functions (accuracy.h)
+typedef enum {
+    CALC_ACCURACY_FAITHFUL = 0,   // the platform libm, within a few ulps
+    CALC_ACCURACY_EXACT,          // double-double evaluation, correctly rounded
+    CALC_ACCURACY_FAST,           // short minimax polynomials, about 8 digits
+    CALC_ACCURACY_COUNT
+} calc_accuracy_t;
+
 // Calculator state structure
 typedef struct {
     double memory;
     double last_result;
     bool angle_in_degrees;
     int precision;
-    char last_expression[512];
+    bool adaptive_precision;   // guarantee `precision` digits (see adaptive_precision.h)
+    int last_digits;           // digits guaranteed for last_result by an adaptive evaluation, else 0
+    calc_accuracy_t accuracy;  // elementary function tier, CALC_ACCURACY_FAITHFUL by default
+    char* last_expression;            // heap copy, NULL until the first evaluation
+    size_t last_expression_capacity;
+    uint64_t evaluation_id;           // id of the running evaluation (atomic)
+    uint64_t next_evaluation_id;      // id the next one takes (calc_set_evaluation_id), 0 for the one after
+    uint64_t cancelled_below;         // evaluations with a smaller id are cancelled (atomic, any thread)
+    double timeout_ms;                // time limit per evaluation, 0 for none
+    double deadline;                  // monotonic time (s) the running evaluation must end by
+    int interrupt_countdown;          // checks left before the clock is read again
+    calc_arena_t arena;               // scratch for one evaluation, reset when it ends
+    int compile_threshold;            // evaluations of a text before it is compiled, 0 never
+    int native_threshold;             // evaluations before it is JIT-translated, 0 never
+    struct calc_tier_cache* tier_cache;   // hot expressions (tiered.h), created on first use
+    struct calc_history* history;     // calc_evaluate records into it when set (history.h); not owned
 } calc_state_t;
 
+// Memory held by a state's evaluation arena
+typedef struct {
+    size_t in_use;      // bytes allocated by the running evaluation
+    size_t reserved;    // bytes of blocks held, including those of large arrays
+    size_t peak;        // most bytes any evaluation has used
+    size_t limit;       // evaluations needing more fail with CALC_ERROR_MEMORY_ERROR
+} calc_memory_usage_t;
+
+// Default cap on the memory of a single evaluation. Compiling holds up to
+// about 60 bytes per character of input, so this admits expressions of
+// about 8 MB.
+#define CALC_DEFAULT_MEMORY_LIMIT (512 * 1024 * 1024)
+
+// Interrupt checks between two reads of the clock
+#define CALC_INTERRUPT_INTERVAL 256
+
 // Function prototypes
 
 // Core calculator operations
@@ -92,7 +136,7 @@ calc_result_t calc_exp10(double x);
 calc_result_t calc_exp2(double x);
 
 // Special mathematical functions
-calc_result_t calc_factorial(int n);
+calc_result_t calc_factorial(int64_t n);
 calc_result_t calc_gamma(double x);
 calc_result_t calc_abs(double x);
 calc_result_t calc_floor(double x);
@@ -100,13 +144,13 @@ calc_result_t calc_ceil(double x);
 calc_result_t calc_round(double x);
 calc_result_t calc_mod(double a, double b);
 
-// Combinatorics
-calc_result_t calc_permutation(int n, int r);
-calc_result_t calc_combination(int n, int r);
+// Combinatorics (implemented in combinatorics.c)
+calc_result_t calc_permutation(int64_t n, int64_t r);
+calc_result_t calc_combination(int64_t n, int64_t r);
 
-// Number theory
-calc_result_t calc_gcd(int a, int b);
-calc_result_t calc_lcm(int a, int b);
+// Number theory (implemented in number_theory.c)
+calc_result_t calc_gcd(int64_t a, int64_t b);
+calc_result_t calc_lcm(int64_t a, int64_t b);
 
 // Complex number operations
 calc_complex_t calc_complex_add(calc_complex_t a, calc_complex_t b);
@@ -126,6 +170,21 @@ void calc_memory_clear(calc_state_t* state);
 calc_state_t* calc_create_state(void);
 void calc_destroy_state(calc_state_t* state);
 void calc_reset_state(calc_state_t* state);
+void calc_get_memory_usage(const calc_state_t* state, calc_memory_usage_t* usage);
+void calc_set_memory_limit(calc_state_t* state, size_t bytes);   // 0 for no limit
+const char* calc_last_expression(const calc_state_t* state);
+void calc_set_last_expression(calc_state_t* state, const char* expression);
+
+// Cancellation and deadlines: calc_evaluate starts the clock, the parser and
+// the compiled-program evaluator poll calc_check_interrupt. Every evaluation
+// has an id; a cancel names the ids it stops, so it cannot be lost to an
+// evaluation starting late or leak into a later one
+void calc_cancel(calc_state_t* state);                          // the running evaluation
+void calc_cancel_before(calc_state_t* state, uint64_t id);      // every id below, started or not
+void calc_set_evaluation_id(calc_state_t* state, uint64_t id);  // for the next evaluation; ids increase
+void calc_set_timeout(calc_state_t* state, double milliseconds);
+void calc_begin_evaluation(calc_state_t* state);
+calc_error_t calc_check_interrupt(calc_state_t* state);
 
 // Utility functions
 const char* calc_error_string(calc_error_t error);
@@ -134,6 +193,13 @@ bool calc_is_integer(double x);
 double calc_deg_to_rad(double degrees);
 double calc_rad_to_deg(double radians);
 
+// Errors carried in NaN payloads, for kernels that return bare doubles.
+// The payload survives arithmetic and most libm functions, so the first
+// error reaches the result; calc_nan_error gives CALC_SUCCESS for numbers
+// and CALC_ERROR_DOMAIN_ERROR for a NaN without a payload.
+double calc_error_nan(calc_error_t error);
+calc_error_t calc_nan_error(double x);
+
 // Constants
 extern const double CALC_PI;
 extern const double CALC_E;
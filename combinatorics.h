@@ -0,0 +1,31 @@
+#ifndef COMBINATORICS_H
+#define COMBINATORICS_H
+
+#include "calculator_engine.h"
+#include <stdint.h>
+#include <stddef.h>
+
+// Largest n whose factorial is representable as a double
+#define CALC_MAX_FACTORIAL 170
+
+// Above the table, combinations with more factors than this are checked for
+// overflow in log space before they are multiplied out
+#define CALC_COMB_LOOP_LIMIT 32
+
+// Exact results are limited to arguments below 2^32
+#define CALC_EXACT_MAX_ARGUMENT 4294967295LL
+
+// Function prototypes
+// (calc_factorial, calc_permutation and calc_combination are declared in calculator_engine.h)
+
+// Log-space combinatorics (natural logarithm); these never overflow
+calc_result_t calc_lnfactorial(int64_t n);
+calc_result_t calc_lnpermutation(int64_t n, int64_t r);
+calc_result_t calc_lncombination(int64_t n, int64_t r);
+
+// Exact big-integer results, written to buffer as decimal strings
+calc_error_t calc_factorial_exact(int64_t n, char* buffer, size_t size);
+calc_error_t calc_permutation_exact(int64_t n, int64_t r, char* buffer, size_t size);
+calc_error_t calc_combination_exact(int64_t n, int64_t r, char* buffer, size_t size);
+
+#endif // COMBINATORICS_H
@@ -0,0 +1,711 @@
+#include "distributions.h"
+#include <float.h>
+#include <math.h>
+#include <string.h>
+
+// Iteration limits of the series and continued fractions, and of the
+// quantile solver
+#define DIST_MAX_TERMS 100000
+#define DIST_MAX_STEPS 200
+
+// Floor for the denominators of the modified Lentz algorithm
+#define DIST_TINY 1e-300
+
+#define SQRT_2PI 2.5066282746310005024
+#define LN_SQRT_2PI 0.91893853320467274178
+
+static const struct {
+    const char* prefix;
+    int params;
+} dist_names[CALC_DIST_COUNT] = {
+    {"norm", 2}, {"t", 1}, {"chi2", 1}, {"f", 2}, {"bino", 2}, {"poiss", 1}, {"gam", 2}
+};
+
+static const char* const function_suffixes[] = {"pdf", "cdf", "inv"};
+
+// A distribution with its parameters checked and the constants its
+// functions share computed once. Chi-squared is set up as a gamma.
+typedef struct {
+    calc_dist_type_t type;
+    double a;           // mean, degrees of freedom, trials or shape
+    double b;           // standard deviation, denominator degrees, probability or scale
+    double log_norm;    // log of the density's constant factor (normal, t)
+} dist_t;
+
+// Helper function to create result
+static calc_result_t make_result(double value, calc_error_t error) {
+    calc_result_t result;
+    result.value = value;
+    result.error = error;
+    result.has_error = (error != CALC_SUCCESS);
+    return result;
+}
+
+static bool positive_finite(double x) {
+    return x > 0.0 && isfinite(x);
+}
+
+static bool dist_setup(dist_t* d, calc_dist_type_t type, const double* params) {
+    if (!params || (unsigned)type >= CALC_DIST_COUNT) {
+        return false;
+    }
+    memset(d, 0, sizeof(*d));
+    d->type = type;
+    d->a = params[0];
+    d->b = dist_names[type].params > 1 ? params[1] : 0.0;
+
+    switch (type) {
+        case CALC_DIST_NORMAL:
+            if (!isfinite(d->a) || !positive_finite(d->b)) {
+                return false;
+            }
+            d->log_norm = -log(d->b) - LN_SQRT_2PI;
+            return true;
+        case CALC_DIST_STUDENT_T:
+            if (!positive_finite(d->a)) {
+                return false;
+            }
+            d->log_norm = lgamma(0.5 * (d->a + 1.0)) - lgamma(0.5 * d->a) - 0.5 * log(d->a * M_PI);
+            return true;
+        case CALC_DIST_CHI_SQUARED:
+            d->type = CALC_DIST_GAMMA;
+            d->a = 0.5 * params[0];
+            d->b = 2.0;
+            // fall through
+        case CALC_DIST_GAMMA:
+        case CALC_DIST_F:
+            return positive_finite(d->a) && positive_finite(d->b);
+        case CALC_DIST_BINOMIAL:
+            return d->a >= 0.0 && d->a <= 9007199254740992.0 && calc_is_integer(d->a) &&
+                   d->b >= 0.0 && d->b <= 1.0;
+        case CALC_DIST_POISSON:
+            return d->a >= 0.0 && isfinite(d->a);
+        default:
+            return false;
+    }
+}
+
+// Loader's saddle-point densities. stirlerr(n) is the error of Stirling's
+// formula, log(n!) - log(sqrt(2 pi n) (n/e)^n), and bd0(x, m) is the
+// deviance x log(x/m) + m - x computed without cancellation; with them the
+// binomial and Poisson masses keep full relative precision for large
+// arguments, where differences of lgamma values lose it
+static double stirlerr(double n) {
+    if (n <= 15.0) {
+        return lgamma(n + 1.0) - (n + 0.5) * log(n) + n - LN_SQRT_2PI;
+    }
+    const double s0 = 1.0 / 12, s1 = 1.0 / 360, s2 = 1.0 / 1260, s3 = 1.0 / 1680, s4 = 1.0 / 1188;
+    double nn = n * n;
+    if (n > 500.0) {
+        return (s0 - s1 / nn) / n;
+    }
+    if (n > 80.0) {
+        return (s0 - (s1 - s2 / nn) / nn) / n;
+    }
+    if (n > 35.0) {
+        return (s0 - (s1 - (s2 - s3 / nn) / nn) / nn) / n;
+    }
+    return (s0 - (s1 - (s2 - (s3 - s4 / nn) / nn) / nn) / nn) / n;
+}
+
+static double bd0(double x, double m) {
+    if (fabs(x - m) < 0.1 * (x + m)) {
+        double v = (x - m) / (x + m);
+        double s = (x - m) * v;
+        double e = 2.0 * x * v;
+        v *= v;
+        for (int j = 1; j < 1000; j++) {
+            e *= v;
+            double next = s + e / (2 * j + 1);
+            if (next == s) {
+                break;
+            }
+            s = next;
+        }
+        return s;
+    }
+    // The ratio overflows when m is subnormal
+    double r = x / m;
+    return x * (isfinite(r) && r > 0.0 ? log(r) : log(x) - log(m)) + m - x;
+}
+
+// Binomial mass at x (not necessarily an integer) with p + q = 1
+static double binomial_mass(double x, double n, double p, double q) {
+    if (p == 0.0 || q == 0.0) {
+        return x == (p == 0.0 ? 0.0 : n) ? 1.0 : 0.0;
+    }
+    if (x == 0.0 || x == n) {
+        double r = x == 0.0 ? q : p;   // probability of the outcome that always happened
+        double s = x == 0.0 ? p : q;
+        return exp(s < 0.1 ? -bd0(n, n * r) - n * s : n * log(r));
+    }
+    if (x < 0.0 || x > n) {
+        return 0.0;
+    }
+    double lc = stirlerr(n) - stirlerr(x) - stirlerr(n - x) - bd0(x, n * p) - bd0(n - x, n * q);
+    return exp(lc) * sqrt(n / (2.0 * M_PI * x * (n - x)));
+}
+
+// m^x e^-m / Γ(x + 1), the Poisson mass for real x
+static double poisson_mass(double x, double m) {
+    if (m == 0.0) {
+        return x == 0.0 ? 1.0 : 0.0;
+    }
+    if (x <= m * DBL_MIN) {
+        return exp(-m);
+    }
+    if (m < x * DBL_MIN) {
+        return exp(x * log(m) - m - lgamma(x + 1.0));
+    }
+    return exp(-stirlerr(x) - bd0(x, m)) / sqrt(2.0 * M_PI * x);
+}
+
+// Regularized incomplete gamma functions P(a, x) and Q(a, x) = 1 - P(a, x),
+// from the power series below a + 1 and the continued fraction (modified
+// Lentz) above it, each where it converges fast
+static double gamma_series(double a, double x) {
+    double term = 1.0;
+    double sum = term;
+    for (int n = 1; n < DIST_MAX_TERMS; n++) {
+        term *= x / (a + n);
+        sum += term;
+        if (term < sum * DBL_EPSILON) {
+            break;
+        }
+    }
+    return sum * poisson_mass(a, x);
+}
+
+static double gamma_fraction(double a, double x) {
+    double b = x + 1.0 - a;
+    double c = 1.0 / DIST_TINY;
+    double d = 1.0 / b;
+    double h = d;
+    for (int n = 1; n < DIST_MAX_TERMS; n++) {
+        double an = -n * (n - a);
+        b += 2.0;
+        d = an * d + b;
+        if (fabs(d) < DIST_TINY) {
+            d = DIST_TINY;
+        }
+        c = b + an / c;
+        if (fabs(c) < DIST_TINY) {
+            c = DIST_TINY;
+        }
+        d = 1.0 / d;
+        double delta = d * c;
+        h *= delta;
+        if (fabs(delta - 1.0) < DBL_EPSILON) {
+            break;
+        }
+    }
+    return h * a * poisson_mass(a, x);
+}
+
+static double gamma_p(double a, double x) {
+    if (!(x > 0.0)) {
+        return 0.0;
+    }
+    if (isinf(x)) {
+        return 1.0;
+    }
+    return x < a + 1.0 ? gamma_series(a, x) : 1.0 - gamma_fraction(a, x);
+}
+
+static double gamma_q(double a, double x) {
+    if (!(x > 0.0)) {
+        return 1.0;
+    }
+    if (isinf(x)) {
+        return 0.0;
+    }
+    return x < a + 1.0 ? 1.0 - gamma_series(a, x) : gamma_fraction(a, x);
+}
+
+// Continued fraction of the incomplete beta function (modified Lentz)
+static double beta_fraction(double a, double b, double x) {
+    double c = 1.0;
+    double d = 1.0 - (a + b) * x / (a + 1.0);
+    if (fabs(d) < DIST_TINY) {
+        d = DIST_TINY;
+    }
+    d = 1.0 / d;
+    double h = d;
+    for (int m = 1; m < DIST_MAX_TERMS; m++) {
+        double m2 = 2.0 * m;
+        double an = m * (b - m) * x / ((a - 1.0 + m2) * (a + m2));
+        d = 1.0 + an * d;
+        if (fabs(d) < DIST_TINY) {
+            d = DIST_TINY;
+        }
+        c = 1.0 + an / c;
+        if (fabs(c) < DIST_TINY) {
+            c = DIST_TINY;
+        }
+        d = 1.0 / d;
+        h *= d * c;
+        an = -(a + m) * (a + b + m) * x / ((a + m2) * (a + 1.0 + m2));
+        d = 1.0 + an * d;
+        if (fabs(d) < DIST_TINY) {
+            d = DIST_TINY;
+        }
+        c = 1.0 + an / c;
+        if (fabs(c) < DIST_TINY) {
+            c = DIST_TINY;
+        }
+        d = 1.0 / d;
+        double delta = d * c;
+        h *= delta;
+        if (fabs(delta - 1.0) < DBL_EPSILON) {
+            break;
+        }
+    }
+    return h;
+}
+
+// Regularized incomplete beta function I_x(a, b), with y = 1 - x passed in
+// so that callers can supply it without cancellation. The factor
+// x^a y^b / B(a, b) is a binomial mass, which keeps it accurate for large a, b
+static double beta_regularized(double a, double b, double x, double y) {
+    if (!(x > 0.0)) {
+        return 0.0;
+    }
+    if (!(y > 0.0)) {
+        return 1.0;
+    }
+    double mass = binomial_mass(a, a + b, x, y);
+    if (x < (a + 1.0) / (a + b + 2.0)) {
+        return mass * b / (a + b) * beta_fraction(a, b, x);
+    }
+    return 1.0 - mass * a / (a + b) * beta_fraction(b, a, y);
+}
+
+static bool is_count(double x) {
+    return x >= 0.0 && x == floor(x);
+}
+
+static double dist_pdf(const dist_t* d, double x) {
+    if (isnan(x)) {
+        return x;
+    }
+    switch (d->type) {
+        case CALC_DIST_NORMAL: {
+            double z = (x - d->a) / d->b;
+            return exp(d->log_norm - 0.5 * z * z);
+        }
+        case CALC_DIST_STUDENT_T: {
+            // log(1 + x^2/nu), without squaring a large x
+            double r = fabs(x) / sqrt(d->a);
+            double l = r > 1.0 ? 2.0 * log(r) + log1p(1.0 / (r * r)) : log1p(r * r);
+            return exp(d->log_norm - 0.5 * (d->a + 1.0) * l);
+        }
+        case CALC_DIST_GAMMA: {
+            if (x < 0.0 || isinf(x)) {
+                return 0.0;
+            }
+            if (x == 0.0) {
+                return d->a < 1.0 ? INFINITY : d->a == 1.0 ? 1.0 / d->b : 0.0;
+            }
+            double y = x / d->b;
+            return d->a < 1.0 ? poisson_mass(d->a, y) * d->a / x : poisson_mass(d->a - 1.0, y) / d->b;
+        }
+        case CALC_DIST_F: {
+            double m = d->a, n = d->b;
+            if (x < 0.0 || isinf(x)) {
+                return 0.0;
+            }
+            if (x == 0.0) {
+                return m < 2.0 ? INFINITY : m == 2.0 ? 1.0 : 0.0;
+            }
+            // The density as a binomial mass in p = m x / (n + m x)
+            double f = 1.0 / (n + m * x);
+            double q = n * f;
+            double p = m * x * f;
+            if (m >= 2.0) {
+                return m * q / 2.0 * binomial_mass((m - 2.0) / 2.0, (m + n - 2.0) / 2.0, p, q);
+            }
+            return m * m * q / (2.0 * p * (m + n)) * binomial_mass(m / 2.0, (m + n) / 2.0, p, q);
+        }
+        case CALC_DIST_BINOMIAL:
+            if (!is_count(x) || x > d->a) {
+                return 0.0;
+            }
+            return binomial_mass(x, d->a, d->b, 1.0 - d->b);
+        case CALC_DIST_POISSON:
+            if (!is_count(x) || isinf(x)) {
+                return 0.0;
+            }
+            return poisson_mass(x, d->a);
+        default:
+            return NAN;
+    }
+}
+
+// P(X <= x), or P(X > x) when upper is set, each computed directly so that
+// neither is 1 minus the other in its small tail
+static double dist_tail(const dist_t* d, double x, bool upper) {
+    if (isnan(x)) {
+        return x;
+    }
+    double lower_limit = upper ? 1.0 : 0.0;
+    switch (d->type) {
+        case CALC_DIST_NORMAL: {
+            double z = (x - d->a) / d->b;
+            return 0.5 * erfc((upper ? z : -z) * M_SQRT1_2);
+        }
+        case CALC_DIST_STUDENT_T: {
+            // Mass beyond |x| on one side, from nu / (nu + x^2) and its
+            // complement formed without squaring a large x
+            double r = fabs(x) / sqrt(d->a);
+            double s, c;
+            if (r > 1.0) {
+                double w = 1.0 / (r * r);
+                s = w / (1.0 + w);
+                c = 1.0 / (1.0 + w);
+            } else {
+                double w = r * r;
+                s = 1.0 / (1.0 + w);
+                c = w / (1.0 + w);
+            }
+            double tail = 0.5 * beta_regularized(0.5 * d->a, 0.5, s, c);
+            return (upper ? x > 0.0 : x < 0.0) ? tail : 1.0 - tail;
+        }
+        case CALC_DIST_GAMMA:
+            return upper ? gamma_q(d->a, x / d->b) : gamma_p(d->a, x / d->b);
+        case CALC_DIST_F: {
+            if (!(x > 0.0)) {
+                return lower_limit;
+            }
+            if (isinf(x)) {
+                return 1.0 - lower_limit;
+            }
+            double u = d->a * x;
+            double s = u / (u + d->b);
+            double c = d->b / (u + d->b);
+            return upper ? beta_regularized(0.5 * d->b, 0.5 * d->a, c, s)
+                         : beta_regularized(0.5 * d->a, 0.5 * d->b, s, c);
+        }
+        case CALC_DIST_BINOMIAL: {
+            double k = floor(x);
+            if (k < 0.0) {
+                return lower_limit;
+            }
+            if (k >= d->a) {
+                return 1.0 - lower_limit;
+            }
+            double n = d->a, p = d->b, q = 1.0 - d->b;
+            return upper ? beta_regularized(k + 1.0, n - k, p, q) : beta_regularized(n - k, k + 1.0, q, p);
+        }
+        case CALC_DIST_POISSON: {
+            double k = floor(x);
+            if (k < 0.0) {
+                return lower_limit;
+            }
+            if (isinf(k)) {
+                return 1.0 - lower_limit;
+            }
+            return upper ? gamma_p(k + 1.0, d->a) : gamma_q(k + 1.0, d->a);
+        }
+        default:
+            return NAN;
+    }
+}
+
+// Standard normal quantile: Acklam's rational approximation (relative error
+// below 1.2e-9) refined by one Halley step, the Newton step corrected for
+// curvature, which brings it to full precision. The upper half is the
+// negated lower one, where 1 - p is exact
+static double normal_quantile(double p) {
+    static const double a[] = {-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+                               1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00};
+    static const double b[] = {-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+                               6.680131188771972e+01, -1.328068155288572e+01};
+    static const double c[] = {-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+                               -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00};
+    static const double d[] = {7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+                               3.754408661907416e+00};
+
+    if (p > 0.5) {
+        return -normal_quantile(1.0 - p);
+    }
+    if (p == 0.0) {
+        return -INFINITY;
+    }
+    double x;
+    if (p < 0.02425) {
+        double q = sqrt(-2.0 * log(p));
+        x = (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) /
+            ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1.0);
+    } else {
+        double q = p - 0.5;
+        double r = q * q;
+        x = (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q /
+            (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1.0);
+    }
+    double e = 0.5 * erfc(-x * M_SQRT1_2) - p;
+    double u = e * SQRT_2PI * exp(0.5 * x * x);
+    if (isfinite(u)) {
+        x -= u / (1.0 + 0.5 * x * u);
+    }
+    return x;
+}
+
+// Solves for the x > 0 at which the lower tail P(X <= x), or with upper the
+// survival function P(X > x), equals target, by Newton's method from x0 on
+// log tail against log x. In those coordinates the tails are close to linear
+// (power-law tails exactly so), so the iteration reaches probabilities like
+// 1e-300 in a few steps where Newton on the CDF itself creeps. A step that
+// would leave the bracket the iterates have established bisects it instead.
+// The tail nearer zero is the one matched, so that target never rounds.
+static double solve_quantile(const dist_t* d, double target, bool upper, double x0) {
+    if (target > 0.5) {
+        target = 1.0 - target;
+        upper = !upper;
+    }
+    double log_target = log(target);
+    double u = log(x0);
+    double lo = -INFINITY, hi = INFINITY;
+    for (int i = 0; i < DIST_MAX_STEPS; i++) {
+        double x = exp(u);
+        double tail = dist_tail(d, x, upper);
+        double g = log(tail) - log_target;
+        if (g == 0.0) {
+            return x;
+        }
+        // The lower tail grows with x and the upper one falls
+        if ((g < 0.0) != upper) {
+            lo = u;
+        } else {
+            hi = u;
+        }
+        double slope = dist_pdf(d, x) * x / tail;
+        double next = u - (upper ? -g : g) / slope;
+        if (!(next > lo && next < hi)) {
+            if (isfinite(lo) && isfinite(hi)) {
+                next = 0.5 * (lo + hi);
+            } else if (isfinite(lo)) {
+                next = lo + fmax(1.0, fabs(lo));
+            } else {
+                next = hi - fmax(1.0, fabs(hi));
+            }
+        }
+        bool done = fabs(next - u) <= 4.0 * DBL_EPSILON || hi - lo <= 4.0 * DBL_EPSILON;
+        u = next;
+        if (done) {
+            break;
+        }
+    }
+    return exp(u);
+}
+
+// Smallest count whose CDF reaches p: a Cornish-Fisher guess from the
+// normal approximation, then a search outwards in doubling steps to bracket
+// the answer and bisection of the bracket
+static bool reaches(const dist_t* d, double k, double p) {
+    return p <= 0.5 ? dist_tail(d, k, false) >= p : dist_tail(d, k, true) <= 1.0 - p;
+}
+
+static double discrete_quantile(const dist_t* d, double p) {
+    bool binomial = d->type == CALC_DIST_BINOMIAL;
+    double last = binomial ? d->a : INFINITY;
+    if (p == 1.0) {
+        return last;
+    }
+    double mean = binomial ? d->a * d->b : d->a;
+    double sd = sqrt(binomial ? mean * (1.0 - d->b) : mean);
+    double k = 0.0;
+    if (sd > 0.0 && p > 0.0) {
+        double z = normal_quantile(p);
+        double skew = (binomial ? 1.0 - 2.0 * d->b : 1.0) / sd;
+        k = floor(mean + sd * (z + skew * (z * z - 1.0) / 6.0) + 0.5);
+        k = fmin(fmax(k, 0.0), last);
+    }
+    // Invariant: lo does not reach p (or is -1), hi does
+    double lo, hi;
+    if (reaches(d, k, p)) {
+        hi = k;
+        lo = k - 1.0;
+        for (double step = 1.0; lo >= 0.0 && reaches(d, lo, p); step *= 2.0) {
+            hi = lo;
+            lo = fmax(hi - 2.0 * step, -1.0);
+        }
+    } else {
+        lo = k;
+        hi = k + 1.0;
+        for (double step = 1.0; hi < last && !reaches(d, hi, p); step *= 2.0) {
+            lo = hi;
+            hi = fmin(lo + 2.0 * step, last);
+        }
+    }
+    while (hi - lo > 1.0) {
+        double mid = floor(0.5 * (lo + hi));
+        if (reaches(d, mid, p)) {
+            hi = mid;
+        } else {
+            lo = mid;
+        }
+    }
+    return hi;
+}
+
+// p must be in [0, 1]
+static double dist_quantile(const dist_t* d, double p) {
+    if (d->type == CALC_DIST_BINOMIAL || d->type == CALC_DIST_POISSON) {
+        return discrete_quantile(d, p);
+    }
+    if (d->type == CALC_DIST_NORMAL) {
+        return d->a + d->b * normal_quantile(p);
+    }
+    if (p == 0.0 || p == 1.0) {
+        double low = d->type == CALC_DIST_STUDENT_T ? -INFINITY : 0.0;
+        return p == 0.0 ? low : INFINITY;
+    }
+    switch (d->type) {
+        case CALC_DIST_STUDENT_T: {
+            if (p == 0.5) {
+                return 0.0;
+            }
+            // By symmetry, solve for the upper tail mass q beyond x > 0,
+            // from the Cornish-Fisher expansion about the normal quantile
+            double q = p < 0.5 ? p : 1.0 - p;
+            double z = -normal_quantile(q);
+            double z2 = z * z;
+            double nu = d->a;
+            double x0 = z + z * (z2 + 1.0) / (4.0 * nu) +
+                        z * ((5.0 * z2 + 16.0) * z2 + 3.0) / (96.0 * nu * nu);
+            double x = solve_quantile(d, q, true, x0);
+            return p < 0.5 ? -x : x;
+        }
+        case CALC_DIST_GAMMA: {
+            // Wilson-Hilferty, or the leading term of the lower tail where
+            // that is not positive
+            double k = d->a;
+            double z = normal_quantile(p);
+            double w = 1.0 - 1.0 / (9.0 * k) + z / (3.0 * sqrt(k));
+            double x0 = w > 0.0 && k >= 1.0 ? k * w * w * w : exp((log(p) + lgamma(k + 1.0)) / k);
+            if (!(x0 > 0.0) || isinf(x0)) {
+                x0 = k;
+            }
+            return solve_quantile(d, p, false, x0 * d->b);
+        }
+        case CALC_DIST_F:
+            return solve_quantile(d, p, false, 1.0);
+        default:
+            return NAN;
+    }
+}
+
+static bool is_probability(double p) {
+    return p >= 0.0 && p <= 1.0;
+}
+
+static double dist_apply(const dist_t* d, calc_dist_function_t function, double x) {
+    switch (function) {
+        case CALC_DIST_PDF:
+            return dist_pdf(d, x);
+        case CALC_DIST_CDF:
+            return dist_tail(d, x, false);
+        case CALC_DIST_QUANTILE:
+            return is_probability(x) ? dist_quantile(d, x) : NAN;
+        default:
+            return NAN;
+    }
+}
+
+// Names
+int calc_dist_param_count(calc_dist_type_t type) {
+    return (unsigned)type < CALC_DIST_COUNT ? dist_names[type].params : 0;
+}
+
+bool calc_dist_lookup(const char* name, calc_dist_type_t* type, calc_dist_function_t* function) {
+    if (!name) {
+        return false;
+    }
+    size_t length = strlen(name);
+    if (length <= 3) {
+        return false;
+    }
+    for (int t = 0; t < CALC_DIST_COUNT; t++) {
+        size_t prefix = strlen(dist_names[t].prefix);
+        if (prefix != length - 3 || strncmp(name, dist_names[t].prefix, prefix) != 0) {
+            continue;
+        }
+        for (int f = 0; f < 3; f++) {
+            if (strcmp(name + prefix, function_suffixes[f]) == 0) {
+                if (type) {
+                    *type = (calc_dist_type_t)t;
+                }
+                if (function) {
+                    *function = (calc_dist_function_t)f;
+                }
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
+// Single values
+calc_result_t calc_dist_evaluate(calc_dist_type_t type, calc_dist_function_t function,
+                                 const double* params, double x) {
+    dist_t d;
+    if (!dist_setup(&d, type, params) || isnan(x) ||
+        (function == CALC_DIST_QUANTILE && !is_probability(x))) {
+        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
+    }
+    double value = dist_apply(&d, function, x);
+    if (isnan(value)) {
+        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
+    }
+    if (isinf(value)) {
+        return make_result(0.0, CALC_ERROR_OVERFLOW);
+    }
+    return make_result(value, CALC_SUCCESS);
+}
+
+calc_result_t calc_dist_pdf(calc_dist_type_t type, const double* params, double x) {
+    return calc_dist_evaluate(type, CALC_DIST_PDF, params, x);
+}
+
+calc_result_t calc_dist_cdf(calc_dist_type_t type, const double* params, double x) {
+    return calc_dist_evaluate(type, CALC_DIST_CDF, params, x);
+}
+
+calc_result_t calc_dist_quantile(calc_dist_type_t type, const double* params, double p) {
+    return calc_dist_evaluate(type, CALC_DIST_QUANTILE, params, p);
+}
+
+// Batches
+static calc_error_t evaluate_array(calc_dist_type_t type, calc_dist_function_t function,
+                                   const double* params, const double* x, double* out, size_t count) {
+    if (count > 0 && (!x || !out)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    dist_t d;
+    if (!dist_setup(&d, type, params)) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+    bool valid = true;
+    for (size_t i = 0; i < count; i++) {
+        if (function == CALC_DIST_QUANTILE) {
+            valid &= is_probability(x[i]);
+        }
+        out[i] = dist_apply(&d, function, x[i]);
+    }
+    return valid ? CALC_SUCCESS : CALC_ERROR_DOMAIN_ERROR;
+}
+
+calc_error_t calc_dist_pdf_array(calc_dist_type_t type, const double* params,
+                                 const double* x, double* out, size_t count) {
+    return evaluate_array(type, CALC_DIST_PDF, params, x, out, count);
+}
+
+calc_error_t calc_dist_cdf_array(calc_dist_type_t type, const double* params,
+                                 const double* x, double* out, size_t count) {
+    return evaluate_array(type, CALC_DIST_CDF, params, x, out, count);
+}
+
+calc_error_t calc_dist_quantile_array(calc_dist_type_t type, const double* params,
+                                      const double* p, double* out, size_t count) {
+    return evaluate_array(type, CALC_DIST_QUANTILE, params, p, out, count);
+}
@@ -0,0 +1,56 @@
+#ifndef DISTRIBUTIONS_H
+#define DISTRIBUTIONS_H
+
+#include "calculator_engine.h"
+#include <stdbool.h>
+#include <stddef.h>
+
+// Most parameters taken by any distribution
+#define CALC_DIST_MAX_PARAMS 2
+
+// Parameters, in the order they are passed
+typedef enum {
+    CALC_DIST_NORMAL,       // mean, standard deviation > 0
+    CALC_DIST_STUDENT_T,    // degrees of freedom > 0
+    CALC_DIST_CHI_SQUARED,  // degrees of freedom > 0
+    CALC_DIST_F,            // numerator and denominator degrees of freedom > 0
+    CALC_DIST_BINOMIAL,     // trials (an integer >= 0), success probability in [0, 1]
+    CALC_DIST_POISSON,      // mean >= 0
+    CALC_DIST_GAMMA,        // shape > 0, scale > 0
+    CALC_DIST_COUNT
+} calc_dist_type_t;
+
+typedef enum {
+    CALC_DIST_PDF,          // density; probability mass for binomial and Poisson
+    CALC_DIST_CDF,          // P(X <= x)
+    CALC_DIST_QUANTILE      // smallest x with P(X <= x) >= p
+} calc_dist_function_t;
+
+// Function prototypes
+
+// Parser names: norm, t, chi2, f, bino, poiss or gam followed by pdf, cdf or
+// inv, called with x (or p) and then the parameters: normcdf(1.96, 0, 1)
+int calc_dist_param_count(calc_dist_type_t type);
+bool calc_dist_lookup(const char* name, calc_dist_type_t* type, calc_dist_function_t* function);
+
+// Single values. Invalid parameters and probabilities outside [0, 1] are
+// domain errors; an infinite density or quantile (norminv(0)) is an overflow
+calc_result_t calc_dist_evaluate(calc_dist_type_t type, calc_dist_function_t function,
+                                 const double* params, double x);
+calc_result_t calc_dist_pdf(calc_dist_type_t type, const double* params, double x);
+calc_result_t calc_dist_cdf(calc_dist_type_t type, const double* params, double x);
+calc_result_t calc_dist_quantile(calc_dist_type_t type, const double* params, double p);
+
+// Batches: out[i] for x[i] (out may be x). The parameters are checked and the
+// normalizing constants computed once per call; invalid parameters fail with
+// CALC_ERROR_DOMAIN_ERROR before anything is written. Infinite results are
+// stored as such. A probability outside [0, 1] gives NaN in its place and
+// the call returns CALC_ERROR_DOMAIN_ERROR once every element is done.
+calc_error_t calc_dist_pdf_array(calc_dist_type_t type, const double* params,
+                                 const double* x, double* out, size_t count);
+calc_error_t calc_dist_cdf_array(calc_dist_type_t type, const double* params,
+                                 const double* x, double* out, size_t count);
+calc_error_t calc_dist_quantile_array(calc_dist_type_t type, const double* params,
+                                      const double* p, double* out, size_t count);
+
+#endif // DISTRIBUTIONS_H
@@ -0,0 +1,133 @@
+#ifndef DOUBLE_DOUBLE_H
+#define DOUBLE_DOUBLE_H
+
+#include <math.h>
+
+// Double-double arithmetic: an unevaluated sum hi + lo with |lo| <= ulp(hi) / 2,
+// giving about 106 bits (31 decimal digits) of precision. Requires IEEE
+// semantics: do not compile users of this header with -ffast-math.
+typedef struct {
+    double hi;
+    double lo;
+} calc_dd_t;
+
+// Unit roundoff of double-double arithmetic (2^-104, a few ulps of slack included)
+#define CALC_DD_EPSILON 4.93038065763132e-32
+
+static inline calc_dd_t dd_make(double hi, double lo) {
+    calc_dd_t r;
+    r.hi = hi;
+    r.lo = lo;
+    return r;
+}
+
+static inline calc_dd_t dd_from_double(double x) {
+    return dd_make(x, 0.0);
+}
+
+static inline double dd_to_double(calc_dd_t a) {
+    return a.hi + a.lo;
+}
+
+// Error-free transformations
+static inline calc_dd_t dd_quick_two_sum(double a, double b) {
+    double s = a + b;
+    return dd_make(s, b - (s - a));
+}
+
+static inline calc_dd_t dd_two_sum(double a, double b) {
+    double s = a + b;
+    double bb = s - a;
+    return dd_make(s, (a - (s - bb)) + (b - bb));
+}
+
+static inline calc_dd_t dd_two_prod(double a, double b) {
+    double p = a * b;
+    return dd_make(p, fma(a, b, -p));
+}
+
+// Arithmetic
+static inline calc_dd_t dd_neg(calc_dd_t a) {
+    return dd_make(-a.hi, -a.lo);
+}
+
+static inline calc_dd_t dd_add(calc_dd_t a, calc_dd_t b) {
+    calc_dd_t s = dd_two_sum(a.hi, b.hi);
+    calc_dd_t t = dd_two_sum(a.lo, b.lo);
+    s.lo += t.hi;
+    s = dd_quick_two_sum(s.hi, s.lo);
+    s.lo += t.lo;
+    return dd_quick_two_sum(s.hi, s.lo);
+}
+
+static inline calc_dd_t dd_sub(calc_dd_t a, calc_dd_t b) {
+    return dd_add(a, dd_neg(b));
+}
+
+static inline calc_dd_t dd_mul(calc_dd_t a, calc_dd_t b) {
+    calc_dd_t p = dd_two_prod(a.hi, b.hi);
+    p.lo += a.hi * b.lo + a.lo * b.hi;
+    return dd_quick_two_sum(p.hi, p.lo);
+}
+
+static inline calc_dd_t dd_mul_double(calc_dd_t a, double b) {
+    calc_dd_t p = dd_two_prod(a.hi, b);
+    p.lo += a.lo * b;
+    return dd_quick_two_sum(p.hi, p.lo);
+}
+
+static inline calc_dd_t dd_div(calc_dd_t a, calc_dd_t b) {
+    double q1 = a.hi / b.hi;
+    calc_dd_t r = dd_sub(a, dd_mul_double(b, q1));
+    double q2 = r.hi / b.hi;
+    r = dd_sub(r, dd_mul_double(b, q2));
+    double q3 = r.hi / b.hi;
+    calc_dd_t q = dd_quick_two_sum(q1, q2);
+    return dd_add(q, dd_from_double(q3));
+}
+
+static inline calc_dd_t dd_sqrt(calc_dd_t a) {
+    if (a.hi <= 0.0) {
+        return dd_from_double(sqrt(a.hi));
+    }
+    double x = 1.0 / sqrt(a.hi);
+    double ax = a.hi * x;
+    calc_dd_t ax2 = dd_two_prod(ax, ax);
+    double correction = dd_sub(a, ax2).hi * (x * 0.5);
+    return dd_two_sum(ax, correction);
+}
+
+static inline calc_dd_t dd_floor(calc_dd_t a) {
+    double hi = floor(a.hi);
+    double lo = 0.0;
+    if (hi == a.hi) {
+        lo = floor(a.lo);
+    }
+    return dd_quick_two_sum(hi, lo);
+}
+
+static inline calc_dd_t dd_ceil(calc_dd_t a) {
+    return dd_neg(dd_floor(dd_neg(a)));
+}
+
+static inline calc_dd_t dd_trunc(calc_dd_t a) {
+    return a.hi >= 0.0 ? dd_floor(a) : dd_ceil(a);
+}
+
+// Integer power by repeated squaring
+static inline calc_dd_t dd_powi(calc_dd_t base, long long n) {
+    calc_dd_t result = dd_from_double(1.0);
+    unsigned long long e = n < 0 ? 0ULL - (unsigned long long)n : (unsigned long long)n;
+    while (e) {
+        if (e & 1ULL) {
+            result = dd_mul(result, base);
+        }
+        e >>= 1;
+        if (e) {
+            base = dd_mul(base, base);
+        }
+    }
+    return n < 0 ? dd_div(dd_from_double(1.0), result) : result;
+}
+
+#endif // DOUBLE_DOUBLE_H
@@ -0,0 +1,911 @@
+#include "expression_compiler.h"
+#include "accuracy.h"
+#include "double_double.h"
+#include "profiling.h"
+#include <stdio.h>
+#include <ctype.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <fenv.h>
+
+// Evaluation stacks up to this depth live on the C stack
+#define LOCAL_STACK_SIZE 64
+
+// Instructions the branch-free evaluator runs between interrupt checks
+#define UNCHECKED_CHUNK 64
+
+// Exceptions raised by a division the checked evaluator rejects (x/0, 0/0)
+#define ERROR_EXCEPTIONS (FE_INVALID | FE_DIVBYZERO)
+
+// Double-double tails of the builtin constants
+static const struct {
+    double hi;
+    double lo;
+} constant_tails[] = {
+    {3.141592653589793, 1.2246467991473532e-16},    // pi
+    {2.718281828459045, 1.4456468917292502e-16},    // e
+    {1.618033988749895, -5.432115203682506e-17},    // phi
+    {1.4142135623730951, -9.667293313452913e-17},   // sqrt2
+    {0.6931471805599453, 2.3190468138462996e-17},   // ln2
+    {2.302585092994046, -2.1707562233822494e-16},   // ln10
+};
+
+// Operator stack used by the shunting-yard compiler. Frames are never
+// modified in place: a push appends a node that points at its parent, so a
+// saved top index is a complete snapshot of the stack (see checkpoints below).
+typedef enum {
+    FRAME_OPERATOR,
+    FRAME_UNARY_MINUS,
+    FRAME_PAREN,
+    FRAME_FUNCTION
+} frame_kind_t;
+
+typedef struct {
+    frame_kind_t kind;
+    char op;
+    int index;
+    int argc;
+    int position;
+    int parent;
+} frame_t;
+
+typedef struct {
+    calc_program_t* program;
+    frame_t* frames;
+    int frame_count;
+    int frame_capacity;
+    int top;
+    int depth;
+    bool expect_operand;
+    bool out_of_memory;
+} compiler_t;
+
+// Compiler state after a token, for resuming at that token
+typedef struct {
+    int position;       // where the next token starts
+    int examined;       // last character the tokenizer looked at
+    int code_length;
+    int max_stack;
+    int depth;
+    int variable_count;
+    int frame_count;
+    int top;
+    bool expect_operand;
+} checkpoint_t;
+
+struct calc_incremental {
+    calc_program_t program;
+    compiler_t compiler;
+    char* text;
+    int text_capacity;
+    checkpoint_t* checkpoints;
+    int checkpoint_count;
+    int checkpoint_capacity;
+    int reused;
+    parse_error_t error;
+};
+
+typedef enum {
+    STEP_CONTINUE,
+    STEP_END,
+    STEP_ERROR
+} step_result_t;
+
+void calc_program_init(calc_program_t* program) {
+    if (program) {
+        memset(program, 0, sizeof(*program));
+    }
+}
+
+void calc_program_free(calc_program_t* program) {
+    if (program) {
+        calc_arena_t* arena = program->arena;
+        if (!arena) {
+            free(program->code);
+        }
+        calc_program_init(program);
+        program->arena = arena;
+    }
+}
+
+int calc_program_variable_index(const calc_program_t* program, const char* name) {
+    for (int i = 0; i < program->variable_count; i++) {
+        if (strcmp(program->variable_names[i], name) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+// Tail (value - hi) of a decimal literal, computed in double-double
+static double decimal_tail(const char* text, double hi) {
+    calc_dd_t mantissa = dd_from_double(0.0);
+    int exponent = 0;
+    int digits = 0;
+    bool seen_dot = false;
+
+    for (const char* p = text; *p; p++) {
+        if (is_digit(*p)) {
+            if (digits < 32) {
+                mantissa = dd_add(dd_mul_double(mantissa, 10.0), dd_from_double(*p - '0'));
+                if (mantissa.hi != 0.0) {
+                    digits++;
+                }
+                if (seen_dot) {
+                    exponent--;
+                }
+            } else if (!seen_dot) {
+                exponent++;
+            }
+        } else if (*p == '.') {
+            seen_dot = true;
+        } else if (*p == 'e' || *p == 'E') {
+            exponent += atoi(p + 1);
+            break;
+        }
+    }
+
+    if (mantissa.hi == 0.0 || !isfinite(hi) || abs(exponent) > 280) {
+        return 0.0;
+    }
+    calc_dd_t scale = dd_powi(dd_from_double(10.0), exponent < 0 ? -exponent : exponent);
+    calc_dd_t value = exponent < 0 ? dd_div(mantissa, scale) : dd_mul(mantissa, scale);
+    return dd_sub(value, dd_from_double(hi)).hi;
+}
+
+static double constant_tail(double hi) {
+    for (size_t i = 0; i < sizeof(constant_tails) / sizeof(constant_tails[0]); i++) {
+        if (constant_tails[i].hi == hi) {
+            return constant_tails[i].lo;
+        }
+    }
+    return 0.0;
+}
+
+// Grows an array on the heap, or in the program's arena when it has one
+static void* grow_array(calc_arena_t* arena, void* array, size_t old_size, size_t new_size) {
+    return arena ? calc_arena_realloc(arena, array, old_size, new_size) : realloc(array, new_size);
+}
+
+// Code emission
+static bool emit(compiler_t* c, calc_opcode_t op, int index, int argc, int position,
+                 double value, double value_lo) {
+    calc_program_t* program = c->program;
+    if (program->length == program->capacity) {
+        int capacity = program->capacity ? program->capacity * 2 : 16;
+        calc_instruction_t* code = grow_array(program->arena, program->code,
+                                              program->capacity * sizeof(calc_instruction_t),
+                                              capacity * sizeof(calc_instruction_t));
+        if (!code) {
+            c->out_of_memory = true;
+            return false;
+        }
+        program->code = code;
+        program->capacity = capacity;
+    }
+
+    calc_instruction_t* instr = &program->code[program->length++];
+    instr->op = op;
+    instr->index = index;
+    instr->argc = argc;
+    instr->position = position;
+    instr->value = value;
+    instr->value_lo = value_lo;
+
+    // Track the evaluation stack depth
+    switch (op) {
+        case OP_CONST:
+        case OP_VARIABLE:
+        case OP_ANS:
+        case OP_MEMORY:
+            c->depth++;
+            break;
+        case OP_NEGATE:
+            break;
+        case OP_CALL:
+            c->depth += 1 - argc;
+            break;
+        default:
+            c->depth--;
+            break;
+    }
+    if (c->depth > program->max_stack) {
+        program->max_stack = c->depth;
+    }
+    return true;
+}
+
+static bool push_frame(compiler_t* c, frame_kind_t kind, char op, int index, int argc, int position) {
+    if (c->frame_count == c->frame_capacity) {
+        int capacity = c->frame_capacity ? c->frame_capacity * 2 : 16;
+        frame_t* frames = grow_array(c->program->arena, c->frames,
+                                     c->frame_capacity * sizeof(frame_t), capacity * sizeof(frame_t));
+        if (!frames) {
+            c->out_of_memory = true;
+            return false;
+        }
+        c->frames = frames;
+        c->frame_capacity = capacity;
+    }
+    frame_t* f = &c->frames[c->frame_count];
+    f->kind = kind;
+    f->op = op;
+    f->index = index;
+    f->argc = argc;
+    f->position = position;
+    f->parent = c->top;
+    c->top = c->frame_count++;
+    return true;
+}
+
+static void pop_frame(compiler_t* c) {
+    c->top = c->frames[c->top].parent;
+}
+
+static int precedence(char op) {
+    switch (op) {
+        case '+':
+        case '-':
+            return 1;
+        case '*':
+        case '/':
+        case '%':
+            return 2;
+        case '^':
+            return 3;
+        default:
+            return 0;
+    }
+}
+
+static calc_opcode_t binary_opcode(char op) {
+    switch (op) {
+        case '+': return OP_ADD;
+        case '-': return OP_SUBTRACT;
+        case '*': return OP_MULTIPLY;
+        case '/': return OP_DIVIDE;
+        case '%': return OP_MODULO;
+        default: return OP_POWER;
+    }
+}
+
+// Emits the operators on top of the stack that bind at least as tightly as min_prec.
+// Unary minus binds tighter than every binary operator.
+static bool reduce(compiler_t* c, int min_prec) {
+    while (c->top >= 0) {
+        frame_t* top = &c->frames[c->top];
+        if (top->kind == FRAME_UNARY_MINUS) {
+            if (!emit(c, OP_NEGATE, 0, 0, top->position, 0.0, 0.0)) {
+                return false;
+            }
+        } else if (top->kind == FRAME_OPERATOR && precedence(top->op) >= min_prec) {
+            if (!emit(c, binary_opcode(top->op), 0, 0, top->position, 0.0, 0.0)) {
+                return false;
+            }
+        } else {
+            break;
+        }
+        pop_frame(c);
+    }
+    return true;
+}
+
+// Closes the innermost parenthesis or function call
+static bool close_paren(compiler_t* c, parse_error_t* error) {
+    if (!reduce(c, 0)) {
+        return false;
+    }
+    if (c->top < 0) {
+        *error = PARSE_ERROR_INVALID_SYNTAX;
+        return true;
+    }
+    frame_t f = c->frames[c->top];
+    pop_frame(c);
+    if (f.kind == FRAME_FUNCTION) {
+        return emit(c, OP_CALL, f.index, f.argc + 1, f.position, 0.0, 0.0);
+    }
+    return true;
+}
+
+static void compiler_init(compiler_t* c, calc_program_t* program) {
+    c->program = program;
+    c->frames = NULL;
+    c->frame_count = 0;
+    c->frame_capacity = 0;
+    c->top = -1;
+    c->depth = 0;
+    c->expect_operand = true;
+    c->out_of_memory = false;
+}
+
+// Error for a failed emit or push_frame
+static parse_error_t failure(const compiler_t* c) {
+    return c->out_of_memory ? PARSE_ERROR_OUT_OF_MEMORY : PARSE_ERROR_INVALID_SYNTAX;
+}
+
+// Compiles the next token (two for a function name and its parenthesis)
+static step_result_t compile_step(compiler_t* c, parse_context_t* ctx, parse_error_t* error) {
+    calc_program_t* program = c->program;
+    token_t token = get_next_token(ctx);
+    bool ok = true;
+
+    if (c->expect_operand) {
+        switch (token.type) {
+            case TOKEN_NUMBER:
+                ok = emit(c, OP_CONST, 0, 0, token.position, token.number_value,
+                          decimal_tail(token.value, token.number_value));
+                c->expect_operand = false;
+                break;
+            case TOKEN_CONSTANT:
+                ok = emit(c, OP_CONST, 0, 0, token.position, token.number_value,
+                          constant_tail(token.number_value));
+                c->expect_operand = false;
+                break;
+            case TOKEN_VARIABLE:
+                if (strcmp(token.value, "M") == 0 || strcmp(token.value, "mem") == 0) {
+                    ok = emit(c, OP_MEMORY, 0, 0, token.position, 0.0, 0.0);
+                } else if (strcmp(token.value, "ans") == 0 || strcmp(token.value, "ANS") == 0) {
+                    ok = emit(c, OP_ANS, 0, 0, token.position, 0.0, 0.0);
+                } else {
+                    int slot = calc_program_variable_index(program, token.value);
+                    if (slot < 0) {
+                        if (program->variable_count >= CALC_MAX_PROGRAM_VARIABLES ||
+                            strlen(token.value) >= CALC_VARIABLE_NAME_LENGTH) {
+                            *error = PARSE_ERROR_INVALID_SYNTAX;
+                            break;
+                        }
+                        slot = program->variable_count++;
+                        strcpy(program->variable_names[slot], token.value);
+                    }
+                    ok = emit(c, OP_VARIABLE, slot, 0, token.position, 0.0, 0.0);
+                }
+                c->expect_operand = false;
+                break;
+            case TOKEN_OPERATOR:
+                if (token.value[0] == '-') {
+                    ok = push_frame(c, FRAME_UNARY_MINUS, '-', 0, 0, token.position);
+                } else if (token.value[0] != '+') {
+                    *error = PARSE_ERROR_INVALID_SYNTAX;
+                }
+                break;
+            case TOKEN_LEFT_PAREN:
+                ok = push_frame(c, FRAME_PAREN, '(', 0, 0, token.position);
+                break;
+            case TOKEN_FUNCTION: {
+                int index = get_function_index(token.value);
+                token_t paren = get_next_token(ctx);
+                if (paren.type != TOKEN_LEFT_PAREN) {
+                    *error = PARSE_ERROR_INVALID_SYNTAX;
+                    break;
+                }
+                // Zero-argument call: f()
+                int saved = ctx->position;
+                token_t next = get_next_token(ctx);
+                if (next.type == TOKEN_RIGHT_PAREN) {
+                    ok = emit(c, OP_CALL, index, 0, token.position, 0.0, 0.0);
+                    c->expect_operand = false;
+                } else {
+                    ctx->position = saved;
+                    ok = push_frame(c, FRAME_FUNCTION, 0, index, 0, token.position);
+                }
+                break;
+            }
+            default:
+                *error = PARSE_ERROR_INVALID_SYNTAX;
+                break;
+        }
+    } else {
+        switch (token.type) {
+            case TOKEN_OPERATOR:
+                ok = reduce(c, precedence(token.value[0])) &&
+                     push_frame(c, FRAME_OPERATOR, token.value[0], 0, 0, token.position);
+                c->expect_operand = true;
+                break;
+            case TOKEN_RIGHT_PAREN:
+                ok = close_paren(c, error);
+                break;
+            case TOKEN_COMMA:
+                ok = reduce(c, 0);
+                if (!ok) {
+                    break;
+                }
+                if (c->top < 0) {
+                    *error = PARSE_ERROR_INVALID_SYNTAX;
+                } else if (c->frames[c->top].kind == FRAME_PAREN) {
+                    *error = PARSE_ERROR_MISMATCHED_PARENTHESES;
+                } else {
+                    // Replace the function frame by one with the next argument count
+                    frame_t f = c->frames[c->top];
+                    pop_frame(c);
+                    ok = push_frame(c, FRAME_FUNCTION, 0, f.index, f.argc + 1, f.position);
+                    c->expect_operand = true;
+                }
+                break;
+            case TOKEN_END:
+                return STEP_END;
+            default:
+                *error = PARSE_ERROR_INVALID_SYNTAX;
+                break;
+        }
+    }
+
+    if (!ok && *error == PARSE_SUCCESS) {
+        *error = failure(c);
+    }
+    return *error == PARSE_SUCCESS ? STEP_CONTINUE : STEP_ERROR;
+}
+
+// Emits the pending operators at the end of the input, optionally closing
+// parentheses left open (a preview of "sin(30" evaluates sin(30))
+static parse_error_t compile_finish(compiler_t* c, bool close_parentheses) {
+    if (!reduce(c, 0)) {
+        return failure(c);
+    }
+    while (close_parentheses && c->top >= 0) {
+        // After reduce the top frame is a parenthesis or a function call
+        frame_t f = c->frames[c->top];
+        pop_frame(c);
+        if (f.kind == FRAME_FUNCTION && !emit(c, OP_CALL, f.index, f.argc + 1, f.position, 0.0, 0.0)) {
+            return failure(c);
+        }
+        if (!reduce(c, 0)) {
+            return failure(c);
+        }
+    }
+    return c->top >= 0 ? PARSE_ERROR_MISMATCHED_PARENTHESES : PARSE_SUCCESS;
+}
+
+// Compiles an expression into postfix code with the shunting-yard algorithm.
+// Both stacks live on the heap, so nesting depth is not limited by the C stack.
+parse_error_t calc_program_compile(const char* expression, calc_program_t* program, int* error_position) {
+    if (!program) {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+    calc_program_free(program);
+    if (error_position) {
+        *error_position = 0;
+    }
+    if (!expression || expression[0] == '\0') {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    parse_context_t ctx;
+    ctx.expression = expression;
+    ctx.position = 0;
+    ctx.length = strlen(expression);
+    ctx.calc_state = NULL;
+
+    compiler_t c;
+    compiler_init(&c, program);
+
+    parse_error_t error = PARSE_SUCCESS;
+    step_result_t step;
+    do {
+        step = compile_step(&c, &ctx, &error);
+    } while (step == STEP_CONTINUE);
+    if (step == STEP_END) {
+        error = compile_finish(&c, false);
+    }
+
+    if (!program->arena) {
+        free(c.frames);
+    }
+    if (error != PARSE_SUCCESS) {
+        if (error_position) {
+            *error_position = ctx.position;
+        }
+        calc_program_free(program);
+    }
+    return error;
+}
+
+// Incremental compilation. A checkpoint is taken after every token; an edit
+// resumes from the last checkpoint whose tokens (and the character the
+// tokenizer peeked at after them) lie entirely in the unchanged prefix.
+
+calc_incremental_t* calc_incremental_create(void) {
+    calc_incremental_t* inc = calloc(1, sizeof(calc_incremental_t));
+    if (inc) {
+        calc_program_init(&inc->program);
+        compiler_init(&inc->compiler, &inc->program);
+        inc->error = PARSE_ERROR_INVALID_SYNTAX;
+    }
+    return inc;
+}
+
+void calc_incremental_destroy(calc_incremental_t* inc) {
+    if (inc) {
+        calc_program_free(&inc->program);
+        free(inc->compiler.frames);
+        free(inc->text);
+        free(inc->checkpoints);
+        free(inc);
+    }
+}
+
+static bool save_checkpoint(calc_incremental_t* inc, const parse_context_t* ctx) {
+    if (inc->checkpoint_count == inc->checkpoint_capacity) {
+        int capacity = inc->checkpoint_capacity ? inc->checkpoint_capacity * 2 : 32;
+        checkpoint_t* checkpoints = realloc(inc->checkpoints, capacity * sizeof(checkpoint_t));
+        if (!checkpoints) {
+            return false;
+        }
+        inc->checkpoints = checkpoints;
+        inc->checkpoint_capacity = capacity;
+    }
+    int examined = ctx->position;
+    while (examined < ctx->length && isspace((unsigned char)ctx->expression[examined])) {
+        examined++;
+    }
+
+    const compiler_t* c = &inc->compiler;
+    checkpoint_t* cp = &inc->checkpoints[inc->checkpoint_count++];
+    cp->position = ctx->position;
+    cp->examined = examined;
+    cp->code_length = inc->program.length;
+    cp->max_stack = inc->program.max_stack;
+    cp->depth = c->depth;
+    cp->variable_count = inc->program.variable_count;
+    cp->frame_count = c->frame_count;
+    cp->top = c->top;
+    cp->expect_operand = c->expect_operand;
+    return true;
+}
+
+// Rewinds to the state after checkpoint `index` (-1 for the start)
+static int restore_checkpoint(calc_incremental_t* inc, int index) {
+    compiler_t* c = &inc->compiler;
+    inc->checkpoint_count = index + 1;
+    if (index < 0) {
+        inc->program.length = 0;
+        inc->program.max_stack = 0;
+        inc->program.variable_count = 0;
+        c->frame_count = 0;
+        c->top = -1;
+        c->depth = 0;
+        c->expect_operand = true;
+        return 0;
+    }
+    const checkpoint_t* cp = &inc->checkpoints[index];
+    inc->program.length = cp->code_length;
+    inc->program.max_stack = cp->max_stack;
+    inc->program.variable_count = cp->variable_count;
+    c->frame_count = cp->frame_count;
+    c->top = cp->top;
+    c->depth = cp->depth;
+    c->expect_operand = cp->expect_operand;
+    return cp->position;
+}
+
+parse_error_t calc_incremental_update(calc_incremental_t* inc, const char* expression,
+                                      bool close_parentheses, int* error_position) {
+    if (error_position) {
+        *error_position = 0;
+    }
+    if (!inc || !expression) {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    int length = strlen(expression);
+    int common = 0;
+    if (inc->text) {
+        while (common < length && inc->text[common] == expression[common]) {
+            common++;
+        }
+    }
+    if (length + 1 > inc->text_capacity) {
+        int capacity = inc->text_capacity ? inc->text_capacity : 64;
+        while (capacity < length + 1) {
+            capacity *= 2;
+        }
+        char* text = realloc(inc->text, capacity);
+        if (!text) {
+            return PARSE_ERROR_OUT_OF_MEMORY;
+        }
+        inc->text = text;
+        inc->text_capacity = capacity;
+    }
+    memcpy(inc->text, expression, length + 1);
+
+    // Checkpoints are in text order; keep those untouched by the edit
+    int keep = inc->checkpoint_count - 1;
+    while (keep >= 0 && inc->checkpoints[keep].examined >= common) {
+        keep--;
+    }
+
+    parse_context_t ctx;
+    ctx.expression = inc->text;
+    ctx.length = length;
+    ctx.calc_state = NULL;
+    ctx.position = restore_checkpoint(inc, keep);
+    inc->reused = ctx.position;
+    inc->compiler.out_of_memory = false;
+
+    parse_error_t error = length == 0 ? PARSE_ERROR_INVALID_SYNTAX : PARSE_SUCCESS;
+    step_result_t step = length == 0 ? STEP_ERROR : STEP_CONTINUE;
+    while (step == STEP_CONTINUE) {
+        step = compile_step(&inc->compiler, &ctx, &error);
+        if (step == STEP_CONTINUE && !save_checkpoint(inc, &ctx)) {
+            error = PARSE_ERROR_OUT_OF_MEMORY;
+            step = STEP_ERROR;
+        }
+    }
+    if (step == STEP_END) {
+        // Finishing emits past the last checkpoint, which the next update discards
+        error = compile_finish(&inc->compiler, close_parentheses);
+    }
+
+    inc->error = error;
+    if (error != PARSE_SUCCESS && error_position) {
+        *error_position = ctx.position;
+    }
+    return error;
+}
+
+const calc_program_t* calc_incremental_program(const calc_incremental_t* inc) {
+    if (!inc || inc->error != PARSE_SUCCESS) {
+        return NULL;
+    }
+    return &inc->program;
+}
+
+int calc_incremental_reused_length(const calc_incremental_t* inc) {
+    return inc ? inc->reused : 0;
+}
+
+// Evaluation with a check after every instruction; stops at the first error
+parse_result_t calc_program_evaluate_checked(const calc_program_t* program, calc_state_t* state,
+                                             const double* variables) {
+    parse_result_t result;
+    result.value = 0.0;
+    result.error = PARSE_SUCCESS;
+    result.error_position = 0;
+    strcpy(result.error_message, "");
+
+    if (!program || program->length == 0 || !state) {
+        result.error = PARSE_ERROR_INVALID_SYNTAX;
+        strcpy(result.error_message, parse_error_string(result.error));
+        return result;
+    }
+
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    double local[LOCAL_STACK_SIZE];
+    double* stack = local;
+    if (program->max_stack > LOCAL_STACK_SIZE) {
+        stack = calc_arena_alloc(&state->arena, program->max_stack * sizeof(double));
+        if (!stack) {
+            result.error = PARSE_ERROR_OUT_OF_MEMORY;
+            strcpy(result.error_message, parse_error_string(result.error));
+            return result;
+        }
+    }
+
+    calc_pow_fn_t power = calc_accuracy_pow(state->accuracy);
+    parse_error_t error = PARSE_SUCCESS;
+    int sp = 0;
+    int pc;
+    for (pc = 0; pc < program->length && error == PARSE_SUCCESS; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        error = parse_check_interrupt(state);
+        if (error != PARSE_SUCCESS) {
+            result.error_position = instr->position;
+            break;
+        }
+        switch (instr->op) {
+            case OP_CONST:
+                stack[sp++] = instr->value;
+                break;
+            case OP_VARIABLE:
+                if (!variables) {
+                    error = PARSE_ERROR_INVALID_SYNTAX;
+                    break;
+                }
+                stack[sp++] = variables[instr->index];
+                break;
+            case OP_ANS:
+                stack[sp++] = state->last_result;
+                break;
+            case OP_MEMORY:
+                stack[sp++] = calc_memory_recall(state);
+                break;
+            case OP_NEGATE:
+                stack[sp - 1] = -stack[sp - 1];
+                break;
+            case OP_ADD:
+                sp--;
+                stack[sp - 1] += stack[sp];
+                break;
+            case OP_SUBTRACT:
+                sp--;
+                stack[sp - 1] -= stack[sp];
+                break;
+            case OP_MULTIPLY:
+                sp--;
+                stack[sp - 1] *= stack[sp];
+                if (instr->argc && !isfinite(stack[sp - 1])) {
+                    error = PARSE_ERROR_DOMAIN_ERROR;
+                }
+                break;
+            case OP_DIVIDE:
+                sp--;
+                if (stack[sp] == 0.0) {
+                    error = PARSE_ERROR_DIVISION_BY_ZERO;
+                    break;
+                }
+                stack[sp - 1] /= stack[sp];
+                break;
+            case OP_MODULO:
+                sp--;
+                if (stack[sp] == 0.0) {
+                    error = PARSE_ERROR_DIVISION_BY_ZERO;
+                    break;
+                }
+                stack[sp - 1] = fmod(stack[sp - 1], stack[sp]);
+                break;
+            case OP_POWER:
+                sp--;
+                stack[sp - 1] = power(stack[sp - 1], stack[sp]);
+                if (!isfinite(stack[sp - 1])) {
+                    error = PARSE_ERROR_DOMAIN_ERROR;
+                }
+                break;
+            case OP_CALL: {
+                const char* name = get_function_name(instr->index);
+                sp -= instr->argc;
+                if (!name) {
+                    error = PARSE_ERROR_INVALID_FUNCTION;
+                    break;
+                }
+                stack[sp] = evaluate_function_with_accuracy(name, &stack[sp], instr->argc, state->accuracy,
+                                                            state, &error);
+                sp++;
+                break;
+            }
+        }
+        if (error != PARSE_SUCCESS) {
+            result.error_position = instr->position;
+        }
+    }
+
+    if (error == PARSE_SUCCESS) {
+        result.value = stack[0];
+    } else {
+        result.error = error;
+        strcpy(result.error_message, parse_error_string(error));
+    }
+    calc_arena_reset(&state->arena, mark);
+    return result;
+}
+
+// Branch-free evaluation: arithmetic runs unchecked and kernels return bare
+// doubles (errors as NaN payloads). Whether anything went wrong is read once
+// at the end from the sticky IEEE flags and the finiteness of the operands
+// that can hide an error (leaves, function and power results). Only then is
+// the program replayed by the checked evaluator, which reports the same
+// error and position as always; clean evaluations never branch per instruction.
+parse_result_t calc_program_evaluate(const calc_program_t* program, calc_state_t* state,
+                                     const double* variables) {
+    if (!program || program->length == 0 || !state) {
+        return calc_program_evaluate_checked(program, state, variables);
+    }
+
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    double local[LOCAL_STACK_SIZE];
+    double* stack = local;
+    if (program->max_stack > LOCAL_STACK_SIZE) {
+        stack = calc_arena_alloc(&state->arena, program->max_stack * sizeof(double));
+        if (!stack) {
+            return calc_program_evaluate_checked(program, state, variables);
+        }
+    }
+
+    // Flags are normally clear already; clearing them costs more than testing
+    if (fetestexcept(ERROR_EXCEPTIONS)) {
+        feclearexcept(ERROR_EXCEPTIONS);
+    }
+
+    const calc_instruction_t* code = program->code;
+    bool degrees = state->angle_in_degrees;
+    calc_accuracy_t accuracy = state->accuracy;
+    calc_pow_fn_t power = calc_accuracy_pow(accuracy);
+    bool finite = true;
+    parse_error_t error = PARSE_SUCCESS;
+    int sp = 0;
+    int pc = 0;
+    while (pc < program->length) {
+        int end = pc + UNCHECKED_CHUNK < program->length ? pc + UNCHECKED_CHUNK : program->length;
+        for (; pc < end; pc++) {
+            const calc_instruction_t* instr = &code[pc];
+            switch (instr->op) {
+                case OP_CONST:
+                    stack[sp] = instr->value;
+                    finite &= isfinite(stack[sp]) != 0;
+                    sp++;
+                    break;
+                case OP_VARIABLE:
+                    stack[sp] = variables ? variables[instr->index] : NAN;
+                    finite &= isfinite(stack[sp]) != 0;
+                    sp++;
+                    break;
+                case OP_ANS:
+                    stack[sp] = state->last_result;
+                    finite &= isfinite(stack[sp]) != 0;
+                    sp++;
+                    break;
+                case OP_MEMORY:
+                    stack[sp] = state->memory;
+                    finite &= isfinite(stack[sp]) != 0;
+                    sp++;
+                    break;
+                case OP_NEGATE:
+                    stack[sp - 1] = -stack[sp - 1];
+                    break;
+                case OP_ADD:
+                    sp--;
+                    stack[sp - 1] += stack[sp];
+                    break;
+                case OP_SUBTRACT:
+                    sp--;
+                    stack[sp - 1] -= stack[sp];
+                    break;
+                case OP_MULTIPLY:
+                    sp--;
+                    stack[sp - 1] *= stack[sp];
+                    finite &= (isfinite(stack[sp - 1]) != 0) | (instr->argc == 0);
+                    break;
+                case OP_DIVIDE:
+                    sp--;
+                    stack[sp - 1] /= stack[sp];
+                    break;
+                case OP_MODULO:
+                    sp--;
+                    stack[sp - 1] = fmod(stack[sp - 1], stack[sp]);
+                    finite &= isfinite(stack[sp - 1]) != 0;
+                    break;
+                case OP_POWER:
+                    sp--;
+                    stack[sp - 1] = power(stack[sp - 1], stack[sp]);
+                    finite &= isfinite(stack[sp - 1]) != 0;
+                    break;
+                case OP_CALL:
+                    CALC_PROFILE_CALL(instr->index);
+                    sp -= instr->argc;
+                    stack[sp] = get_accuracy_kernel(instr->index, instr->argc, accuracy)(&stack[sp], degrees);
+                    finite &= isfinite(stack[sp]) != 0;
+                    sp++;
+                    break;
+            }
+        }
+        error = parse_check_interrupt(state);
+        if (error != PARSE_SUCCESS) {
+            break;
+        }
+    }
+
+    double value = stack[0];
+    bool clean = finite && isfinite(value) && !fetestexcept(ERROR_EXCEPTIONS);
+    if (!clean) {
+        feclearexcept(ERROR_EXCEPTIONS);
+    }
+    calc_arena_reset(&state->arena, mark);
+
+    if (error != PARSE_SUCCESS) {
+        parse_result_t result;
+        result.value = 0.0;
+        result.error = error;
+        result.error_position = code[pc - 1].position;
+        strcpy(result.error_message, parse_error_string(error));
+        return result;
+    }
+    if (!clean) {
+        return calc_program_evaluate_checked(program, state, variables);
+    }
+
+    parse_result_t result;
+    result.value = value;
+    result.error = PARSE_SUCCESS;
+    result.error_position = 0;
+    strcpy(result.error_message, "");
+    return result;
+}
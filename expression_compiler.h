@@ -0,0 +1,79 @@
+#ifndef EXPRESSION_COMPILER_H
+#define EXPRESSION_COMPILER_H
+
+#include "expression_parser.h"
+#include <stdbool.h>
+
+// Limits for free variables in a compiled expression
+#define CALC_MAX_PROGRAM_VARIABLES 16
+#define CALC_VARIABLE_NAME_LENGTH 32
+
+// Instruction set of the postfix (stack machine) program
+typedef enum {
+    OP_CONST,       // push value (value_lo holds the double-double tail)
+    OP_VARIABLE,    // push variables[index]
+    OP_ANS,         // push state->last_result
+    OP_MEMORY,      // push state->memory
+    OP_NEGATE,
+    OP_ADD,
+    OP_SUBTRACT,
+    OP_MULTIPLY,    // argc 1: stands for a power (polynomial.h); non-finite is a domain error
+    OP_DIVIDE,
+    OP_MODULO,
+    OP_POWER,
+    OP_CALL         // call builtin function `index` with `argc` arguments
+} calc_opcode_t;
+
+typedef struct {
+    calc_opcode_t op;
+    int index;
+    int argc;
+    int position;   // source position, for error reporting
+    double value;
+    double value_lo;
+} calc_instruction_t;
+
+// Compiled expression. With arena set (after calc_program_init), code and
+// compiler scratch come from the arena and calc_program_free leaves them to
+// the next arena reset.
+typedef struct {
+    calc_arena_t* arena;
+    calc_instruction_t* code;
+    int length;
+    int capacity;
+    int max_stack;
+    int variable_count;
+    char variable_names[CALC_MAX_PROGRAM_VARIABLES][CALC_VARIABLE_NAME_LENGTH];
+} calc_program_t;
+
+// Incremental compiler for an expression that is edited repeatedly (opaque)
+typedef struct calc_incremental calc_incremental_t;
+
+// Function prototypes
+
+// Compilation (same grammar as parse_expression)
+void calc_program_init(calc_program_t* program);
+void calc_program_free(calc_program_t* program);
+parse_error_t calc_program_compile(const char* expression, calc_program_t* program, int* error_position);
+int calc_program_variable_index(const calc_program_t* program, const char* name);
+
+// Incremental compilation: each update re-lexes only from the first token the
+// edit can affect. With close_parentheses, parentheses still open at the end
+// are closed, for previewing an expression while it is typed.
+calc_incremental_t* calc_incremental_create(void);
+void calc_incremental_destroy(calc_incremental_t* inc);
+parse_error_t calc_incremental_update(calc_incremental_t* inc, const char* expression,
+                                      bool close_parentheses, int* error_position);
+const calc_program_t* calc_incremental_program(const calc_incremental_t* inc);   // NULL after an error
+int calc_incremental_reused_length(const calc_incremental_t* inc);             // characters not re-lexed
+
+// Evaluation; variables[i] binds variable_names[i] (may be NULL if there are none).
+// calc_program_evaluate runs branch-free and falls back to the checked
+// evaluator only when IEEE flags or a non-finite value show a possible error,
+// so both report the same values and errors.
+parse_result_t calc_program_evaluate(const calc_program_t* program, calc_state_t* state,
+                                     const double* variables);
+parse_result_t calc_program_evaluate_checked(const calc_program_t* program, calc_state_t* state,
+                                             const double* variables);
+
+#endif // EXPRESSION_COMPILER_H
@@ -1,29 +1,17 @@
 #include "expression_parser.h"
+#include "accuracy.h"
+#include "combinatorics.h"
+#include "distributions.h"
+#include "number_theory.h"
+#include "expression_compiler.h"
+#include "profiling.h"
+#include "trig.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <ctype.h>
 #include <math.h>
 
-// Built-in mathematical functions
-static const struct {
-    const char* name;
-    int arg_count;
-} builtin_functions[] = {
-    {"sin", 1}, {"cos", 1}, {"tan", 1}, {"sec", 1}, {"csc", 1}, {"cot", 1},
-    {"asin", 1}, {"acos", 1}, {"atan", 1}, {"asec", 1}, {"acsc", 1}, {"acot", 1},
-    {"sinh", 1}, {"cosh", 1}, {"tanh", 1}, {"sech", 1}, {"csch", 1}, {"coth", 1},
-    {"asinh", 1}, {"acosh", 1}, {"atanh", 1},
-    {"log", 1}, {"ln", 1}, {"log10", 1}, {"log2", 1}, {"logb", 2},
-    {"exp", 1}, {"exp10", 1}, {"exp2", 1},
-    {"sqrt", 1}, {"cbrt", 1}, {"nthrt", 2}, {"pow", 2},
-    {"abs", 1}, {"floor", 1}, {"ceil", 1}, {"round", 1}, {"mod", 2},
-    {"factorial", 1}, {"gamma", 1},
-    {"perm", 2}, {"comb", 2}, {"gcd", 2}, {"lcm", 2},
-    {"min", 2}, {"max", 2}, {"atan2", 2},
-    {NULL, 0}
-};
-
 // Built-in constants
 static const struct {
     const char* name;
@@ -38,7 +26,312 @@ static const struct {
     {NULL, 0.0}
 };
 
-// Main parsing function
+// Helper function to create result
+static calc_result_t make_result(double value, calc_error_t error) {
+    calc_result_t result;
+    result.value = value;
+    result.error = error;
+    result.has_error = (error != CALC_SUCCESS);
+    return result;
+}
+
+// Integer arguments are truncated. NaN is a domain error; beyond 2^53 a double
+// no longer holds every integer, so the value may not be the one written
+// (18446744073709551557 reads as 2^64), and that is an overflow rather than
+// a wrong answer about a nearby number.
+static calc_error_t to_integer(double x, int64_t* n) {
+    if (isnan(x)) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+    if (!(fabs(x) <= 0x1p53)) {
+        return CALC_ERROR_OVERFLOW;
+    }
+    *n = (int64_t)x;
+    return CALC_SUCCESS;
+}
+
+static calc_result_t integer_call(calc_result_t (*f)(int64_t), double x) {
+    int64_t n;
+    calc_error_t error = to_integer(x, &n);
+    return error != CALC_SUCCESS ? make_result(0.0, error) : f(n);
+}
+
+static calc_result_t integer_call2(calc_result_t (*f)(int64_t, int64_t), double x, double y) {
+    int64_t n, k;
+    calc_error_t error = to_integer(x, &n);
+    if (error == CALC_SUCCESS) {
+        error = to_integer(y, &k);
+    }
+    return error != CALC_SUCCESS ? make_result(0.0, error) : f(n, k);
+}
+
+// primepi as expressions see it: capped at CALC_PRIMEPI_EXPRESSION_MAX, and
+// polling state (when there is one) while it sieves
+static calc_result_t expression_primepi(double x, calc_state_t* state) {
+    int64_t n;
+    calc_error_t error = to_integer(x, &n);
+    if (error == CALC_SUCCESS && n > CALC_PRIMEPI_EXPRESSION_MAX) {
+        error = CALC_ERROR_OVERFLOW;
+    }
+    return error != CALC_SUCCESS ? make_result(0.0, error) : calc_primepi_interruptible(n, state);
+}
+
+// Bare kernels for the branch-free evaluator (calc_program_evaluate).
+// Each mirrors its calc_* function but returns the value directly; an error
+// is returned as a NaN whose payload holds the calc_error_t (calc_error_nan).
+static double unwrap(calc_result_t result) {
+    return result.has_error ? calc_error_nan(result.error) : result.value;
+}
+
+static double overflow_checked(double value) {
+    return isfinite(value) ? value : calc_error_nan(CALC_ERROR_OVERFLOW);
+}
+
+static double angle_out(double x, bool degrees) {
+    return degrees ? calc_rad_to_deg(x) : x;
+}
+
+static double kernel_sin(const double* a, bool degrees) { return degrees ? calc_sind(a[0]) : calc_sinr(a[0]); }
+static double kernel_cos(const double* a, bool degrees) { return degrees ? calc_cosd(a[0]) : calc_cosr(a[0]); }
+static double kernel_tan(const double* a, bool degrees) { return unwrap(calc_tan(a[0], degrees)); }
+static double kernel_sec(const double* a, bool degrees) { return unwrap(calc_sec(a[0], degrees)); }
+static double kernel_csc(const double* a, bool degrees) { return unwrap(calc_csc(a[0], degrees)); }
+static double kernel_cot(const double* a, bool degrees) { return unwrap(calc_cot(a[0], degrees)); }
+
+static double kernel_asin(const double* a, bool degrees) {
+    if (a[0] < -1.0 || a[0] > 1.0) {
+        return calc_error_nan(CALC_ERROR_DOMAIN_ERROR);
+    }
+    return angle_out(asin(a[0]), degrees);
+}
+
+static double kernel_acos(const double* a, bool degrees) {
+    if (a[0] < -1.0 || a[0] > 1.0) {
+        return calc_error_nan(CALC_ERROR_DOMAIN_ERROR);
+    }
+    return angle_out(acos(a[0]), degrees);
+}
+
+static double kernel_atan(const double* a, bool degrees) { return angle_out(atan(a[0]), degrees); }
+static double kernel_atan2(const double* a, bool degrees) { return angle_out(atan2(a[0], a[1]), degrees); }
+
+static double kernel_sinh(const double* a, bool degrees) { (void)degrees; return overflow_checked(sinh(a[0])); }
+static double kernel_cosh(const double* a, bool degrees) { (void)degrees; return overflow_checked(cosh(a[0])); }
+static double kernel_tanh(const double* a, bool degrees) { (void)degrees; return tanh(a[0]); }
+
+static double kernel_sech(const double* a, bool degrees) {
+    (void)degrees;
+    return 1.0 / overflow_checked(cosh(a[0]));
+}
+
+static double kernel_csch(const double* a, bool degrees) {
+    (void)degrees;
+    if (a[0] == 0.0) {
+        return calc_error_nan(CALC_ERROR_DIVISION_BY_ZERO);
+    }
+    return 1.0 / overflow_checked(sinh(a[0]));
+}
+
+static double kernel_coth(const double* a, bool degrees) {
+    (void)degrees;
+    if (a[0] == 0.0) {
+        return calc_error_nan(CALC_ERROR_DIVISION_BY_ZERO);
+    }
+    return 1.0 / tanh(a[0]);
+}
+
+static double log_checked(double (*log_fn)(double), double x) {
+    return x <= 0.0 ? calc_error_nan(CALC_ERROR_DOMAIN_ERROR) : log_fn(x);
+}
+
+static double kernel_log(const double* a, bool degrees) { (void)degrees; return log_checked(log, a[0]); }
+static double kernel_log10(const double* a, bool degrees) { (void)degrees; return log_checked(log10, a[0]); }
+static double kernel_log2(const double* a, bool degrees) { (void)degrees; return log_checked(log2, a[0]); }
+
+static double kernel_logb(const double* a, bool degrees) {
+    (void)degrees;
+    if (a[0] <= 0.0 || a[1] <= 0.0 || a[1] == 1.0) {
+        return calc_error_nan(CALC_ERROR_DOMAIN_ERROR);
+    }
+    return log(a[0]) / log(a[1]);
+}
+
+static double kernel_exp(const double* a, bool degrees) { (void)degrees; return overflow_checked(exp(a[0])); }
+static double kernel_exp10(const double* a, bool degrees) { (void)degrees; return overflow_checked(pow(10.0, a[0])); }
+static double kernel_exp2(const double* a, bool degrees) { (void)degrees; return overflow_checked(pow(2.0, a[0])); }
+
+static double kernel_sqrt(const double* a, bool degrees) {
+    (void)degrees;
+    return a[0] < 0.0 ? calc_error_nan(CALC_ERROR_DOMAIN_ERROR) : sqrt(a[0]);
+}
+
+static double kernel_cbrt(const double* a, bool degrees) { (void)degrees; return cbrt(a[0]); }
+static double kernel_nthrt(const double* a, bool degrees) { (void)degrees; return unwrap(calc_nthroot(a[0], (int)a[1])); }
+
+static double pow_checked(calc_pow_fn_t pow_fn, const double* a) {
+    if (a[0] == 0.0 && a[1] < 0.0) {
+        return calc_error_nan(CALC_ERROR_DIVISION_BY_ZERO);
+    }
+    if (a[0] < 0.0 && !calc_is_integer(a[1])) {
+        return calc_error_nan(CALC_ERROR_DOMAIN_ERROR);
+    }
+    return overflow_checked(pow_fn(a[0], a[1]));
+}
+
+static double kernel_pow(const double* a, bool degrees) { (void)degrees; return pow_checked(pow, a); }
+
+static double kernel_abs(const double* a, bool degrees) { (void)degrees; return fabs(a[0]); }
+static double kernel_floor(const double* a, bool degrees) { (void)degrees; return floor(a[0]); }
+static double kernel_ceil(const double* a, bool degrees) { (void)degrees; return ceil(a[0]); }
+static double kernel_round(const double* a, bool degrees) { (void)degrees; return round(a[0]); }
+
+static double kernel_mod(const double* a, bool degrees) {
+    (void)degrees;
+    return a[1] == 0.0 ? calc_error_nan(CALC_ERROR_DIVISION_BY_ZERO) : fmod(a[0], a[1]);
+}
+
+static double kernel_gamma(const double* a, bool degrees) {
+    (void)degrees;
+    if (a[0] <= 0 && calc_is_integer(a[0])) {
+        return calc_error_nan(CALC_ERROR_DOMAIN_ERROR);
+    }
+    return overflow_checked(tgamma(a[0]));
+}
+
+static double kernel_min(const double* a, bool degrees) {
+    (void)degrees;
+    double x = a[0];
+    double y = a[1];
+    return fmin(x, y);
+}
+
+static double kernel_max(const double* a, bool degrees) {
+    (void)degrees;
+    double x = a[0];
+    double y = a[1];
+    return fmax(x, y);
+}
+
+// Integer functions keep their exact implementations
+static double kernel_factorial(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_factorial, a[0])); }
+static double kernel_perm(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_permutation, a[0], a[1])); }
+static double kernel_comb(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_combination, a[0], a[1])); }
+static double kernel_gcd(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_gcd, a[0], a[1])); }
+static double kernel_lcm(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_lcm, a[0], a[1])); }
+static double kernel_lnfactorial(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_lnfactorial, a[0])); }
+static double kernel_lnperm(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_lnpermutation, a[0], a[1])); }
+static double kernel_lncomb(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call2(calc_lncombination, a[0], a[1])); }
+static double kernel_isprime(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_isprime, a[0])); }
+static double kernel_factor(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_smallest_prime_factor, a[0])); }
+static double kernel_nextprime(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_nextprime, a[0])); }
+static double kernel_phi(const double* a, bool degrees) { (void)degrees; return unwrap(integer_call(calc_totient, a[0])); }
+static double kernel_primepi(const double* a, bool degrees) { (void)degrees; return unwrap(expression_primepi(a[0], NULL)); }
+
+// Distribution functions take x (or p) and then the distribution's parameters
+#define DIST_KERNELS(prefix, type) \
+    static double kernel_##prefix##pdf(const double* a, bool degrees) { (void)degrees; return unwrap(calc_dist_pdf(type, &a[1], a[0])); } \
+    static double kernel_##prefix##cdf(const double* a, bool degrees) { (void)degrees; return unwrap(calc_dist_cdf(type, &a[1], a[0])); } \
+    static double kernel_##prefix##inv(const double* a, bool degrees) { (void)degrees; return unwrap(calc_dist_quantile(type, &a[1], a[0])); }
+
+DIST_KERNELS(norm, CALC_DIST_NORMAL)
+
+// The normal with mu and sigma left out: those of the standard normal, 0 and 1
+#define NORM_DEFAULT_KERNELS(name, evaluate) \
+    static double kernel_##name##1(const double* a, bool degrees) { (void)degrees; const double p[2] = {0.0, 1.0}; return unwrap(evaluate(CALC_DIST_NORMAL, p, a[0])); } \
+    static double kernel_##name##2(const double* a, bool degrees) { (void)degrees; const double p[2] = {a[1], 1.0}; return unwrap(evaluate(CALC_DIST_NORMAL, p, a[0])); }
+
+NORM_DEFAULT_KERNELS(normpdf, calc_dist_pdf)
+NORM_DEFAULT_KERNELS(normcdf, calc_dist_cdf)
+NORM_DEFAULT_KERNELS(norminv, calc_dist_quantile)
+DIST_KERNELS(t, CALC_DIST_STUDENT_T)
+DIST_KERNELS(chi2, CALC_DIST_CHI_SQUARED)
+DIST_KERNELS(f, CALC_DIST_F)
+DIST_KERNELS(bino, CALC_DIST_BINOMIAL)
+DIST_KERNELS(poiss, CALC_DIST_POISSON)
+DIST_KERNELS(gam, CALC_DIST_GAMMA)
+
+// Names the tokenizer accepts but evaluate_function does not implement
+static double kernel_unsupported(const double* a, bool degrees) {
+    (void)a;
+    (void)degrees;
+    return calc_error_nan(CALC_ERROR_INVALID_FUNCTION);
+}
+
+// Kernels of the exact and fast tiers (accuracy.h), with the same domain
+// checks as the faithful ones
+static double pole_checked(double value) {
+    return isinf(value) ? calc_error_nan(CALC_ERROR_DOMAIN_ERROR) : value;
+}
+
+static double kernel_sin_exact(const double* a, bool degrees) { return calc_sin_exact(a[0], degrees); }
+static double kernel_cos_exact(const double* a, bool degrees) { return calc_cos_exact(a[0], degrees); }
+static double kernel_tan_exact(const double* a, bool degrees) { return pole_checked(calc_tan_exact(a[0], degrees)); }
+static double kernel_exp_exact(const double* a, bool degrees) { (void)degrees; return overflow_checked(calc_exp_exact(a[0])); }
+static double kernel_log_exact(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log_exact, a[0]); }
+static double kernel_log10_exact(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log10_exact, a[0]); }
+static double kernel_log2_exact(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log2_exact, a[0]); }
+static double kernel_pow_exact(const double* a, bool degrees) { (void)degrees; return pow_checked(calc_pow_exact, a); }
+
+static double kernel_sin_fast(const double* a, bool degrees) { return calc_sin_fast(a[0], degrees); }
+static double kernel_cos_fast(const double* a, bool degrees) { return calc_cos_fast(a[0], degrees); }
+static double kernel_tan_fast(const double* a, bool degrees) { return pole_checked(calc_tan_fast(a[0], degrees)); }
+static double kernel_exp_fast(const double* a, bool degrees) { (void)degrees; return overflow_checked(calc_exp_fast(a[0])); }
+static double kernel_log_fast(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log_fast, a[0]); }
+static double kernel_log10_fast(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log10_fast, a[0]); }
+static double kernel_log2_fast(const double* a, bool degrees) { (void)degrees; return log_checked(calc_log2_fast, a[0]); }
+static double kernel_pow_fast(const double* a, bool degrees) { (void)degrees; return pow_checked(calc_pow_fast, a); }
+
+// Built-in mathematical functions. A name taking several argument counts has
+// one entry per count, consecutive, the first of them being its index
+static const struct {
+    const char* name;
+    int arg_count;
+    calc_kernel_t kernels[CALC_ACCURACY_COUNT];   // NULL where a tier has no kernel of its own
+} builtin_functions[] = {
+    {"sin", 1, {kernel_sin, kernel_sin_exact, kernel_sin_fast}},
+    {"cos", 1, {kernel_cos, kernel_cos_exact, kernel_cos_fast}},
+    {"tan", 1, {kernel_tan, kernel_tan_exact, kernel_tan_fast}},
+    {"sec", 1, {kernel_sec}}, {"csc", 1, {kernel_csc}}, {"cot", 1, {kernel_cot}},
+    {"asin", 1, {kernel_asin}}, {"acos", 1, {kernel_acos}}, {"atan", 1, {kernel_atan}},
+    {"asec", 1, {kernel_unsupported}}, {"acsc", 1, {kernel_unsupported}}, {"acot", 1, {kernel_unsupported}},
+    {"sinh", 1, {kernel_sinh}}, {"cosh", 1, {kernel_cosh}}, {"tanh", 1, {kernel_tanh}},
+    {"sech", 1, {kernel_sech}}, {"csch", 1, {kernel_csch}}, {"coth", 1, {kernel_coth}},
+    {"asinh", 1, {kernel_unsupported}}, {"acosh", 1, {kernel_unsupported}}, {"atanh", 1, {kernel_unsupported}},
+    {"log", 1, {kernel_log, kernel_log_exact, kernel_log_fast}},
+    {"ln", 1, {kernel_log, kernel_log_exact, kernel_log_fast}},
+    {"log10", 1, {kernel_log10, kernel_log10_exact, kernel_log10_fast}},
+    {"log2", 1, {kernel_log2, kernel_log2_exact, kernel_log2_fast}},
+    {"logb", 2, {kernel_logb}},
+    {"exp", 1, {kernel_exp, kernel_exp_exact, kernel_exp_fast}},
+    {"exp10", 1, {kernel_exp10}}, {"exp2", 1, {kernel_exp2}},
+    {"sqrt", 1, {kernel_sqrt}}, {"cbrt", 1, {kernel_cbrt}}, {"nthrt", 2, {kernel_nthrt}},
+    {"pow", 2, {kernel_pow, kernel_pow_exact, kernel_pow_fast}},
+    {"abs", 1, {kernel_abs}}, {"floor", 1, {kernel_floor}}, {"ceil", 1, {kernel_ceil}},
+    {"round", 1, {kernel_round}}, {"mod", 2, {kernel_mod}},
+    {"factorial", 1, {kernel_factorial}}, {"gamma", 1, {kernel_gamma}},
+    {"perm", 2, {kernel_perm}}, {"comb", 2, {kernel_comb}}, {"gcd", 2, {kernel_gcd}}, {"lcm", 2, {kernel_lcm}},
+    {"lnfactorial", 1, {kernel_lnfactorial}}, {"lnperm", 2, {kernel_lnperm}}, {"lncomb", 2, {kernel_lncomb}},
+    {"isprime", 1, {kernel_isprime}}, {"factor", 1, {kernel_factor}}, {"nextprime", 1, {kernel_nextprime}},
+    {"phi", 1, {kernel_phi}}, {"primepi", 1, {kernel_primepi}},
+    {"min", 2, {kernel_min}}, {"max", 2, {kernel_max}}, {"atan2", 2, {kernel_atan2}},
+    {"normpdf", 1, {kernel_normpdf1}}, {"normpdf", 2, {kernel_normpdf2}}, {"normpdf", 3, {kernel_normpdf}},
+    {"normcdf", 1, {kernel_normcdf1}}, {"normcdf", 2, {kernel_normcdf2}}, {"normcdf", 3, {kernel_normcdf}},
+    {"norminv", 1, {kernel_norminv1}}, {"norminv", 2, {kernel_norminv2}}, {"norminv", 3, {kernel_norminv}},
+    {"tpdf", 2, {kernel_tpdf}}, {"tcdf", 2, {kernel_tcdf}}, {"tinv", 2, {kernel_tinv}},
+    {"chi2pdf", 2, {kernel_chi2pdf}}, {"chi2cdf", 2, {kernel_chi2cdf}}, {"chi2inv", 2, {kernel_chi2inv}},
+    {"fpdf", 3, {kernel_fpdf}}, {"fcdf", 3, {kernel_fcdf}}, {"finv", 3, {kernel_finv}},
+    {"binopdf", 3, {kernel_binopdf}}, {"binocdf", 3, {kernel_binocdf}}, {"binoinv", 3, {kernel_binoinv}},
+    {"poisspdf", 2, {kernel_poisspdf}}, {"poisscdf", 2, {kernel_poisscdf}}, {"poissinv", 2, {kernel_poissinv}},
+    {"gampdf", 3, {kernel_gampdf}}, {"gamcdf", 3, {kernel_gamcdf}}, {"gaminv", 3, {kernel_gaminv}},
+    {NULL, 0, {NULL}}
+};
+
+// Main parsing function. The expression is compiled to postfix code with the
+// shunting-yard algorithm (expression_compiler.c), whose stacks live on the
+// heap: time is linear and native stack use is constant however deep the
+// nesting. Evaluation stops at the first error in left-to-right order.
+// The program and evaluation stack are allocated from the state's arena and
+// released together on return.
 parse_result_t parse_expression(const char* expression, calc_state_t* state) {
     parse_result_t result;
     result.value = 0.0;
@@ -52,35 +345,73 @@ parse_result_t parse_expression(const char* expression, calc_state_t* state) {
         return result;
     }
 
-    parse_context_t ctx;
-    ctx.expression = expression;
-    ctx.position = 0;
-    ctx.length = strlen(expression);
-    ctx.calc_state = state;
-
-    // Get first token
-    ctx.current_token = get_next_token(&ctx);
-
-    parse_error_t error = PARSE_SUCCESS;
-    double value = parse_expression_impl(&ctx, &error);
-
-    if (error == PARSE_SUCCESS && ctx.current_token.type != TOKEN_END) {
-        error = PARSE_ERROR_INVALID_SYNTAX;
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    calc_program_t program;
+    calc_program_init(&program);
+    program.arena = &state->arena;
+    int error_position = 0;
+    CALC_PROFILE_START(parse_mark);
+    parse_error_t error = calc_program_compile(expression, &program, &error_position);
+    CALC_PROFILE_STOP(CALC_PHASE_PARSE, parse_mark);
+
+    if (error == PARSE_SUCCESS) {
+        CALC_PROFILE_START(eval_mark);
+        result = calc_program_evaluate(&program, state, NULL);
+        CALC_PROFILE_STOP(CALC_PHASE_EVAL, eval_mark);
+    } else {
+        result.error = error;
+        result.error_position = error_position;
+        strcpy(result.error_message, parse_error_string(error));
     }
 
-    result.value = value;
-    result.error = error;
-    result.error_position = ctx.position;
+    calc_arena_reset(&state->arena, mark);
+    return result;
+}
 
-    if (error != PARSE_SUCCESS) {
-        strcpy(result.error_message, parse_error_string(error));
+// Rewrites a numeric literal too long for token_t.value as 0.DDDe<exponent>
+// with its leading significant digits (more than double-double resolution)
+static void shorten_number(const char* text, int length, char* out, size_t size) {
+    char digits[41];
+    int count = 0;
+    long exponent = 0;
+    bool seen_dot = false;
+    int i = 0;
+
+    for (; i < length && text[i] != 'e' && text[i] != 'E'; i++) {
+        if (text[i] == '.') {
+            seen_dot = true;
+        } else if (count == 0 && text[i] == '0') {
+            if (seen_dot) {
+                exponent--;     // leading zero after the point
+            }
+        } else {
+            if (count < (int)sizeof(digits) - 1) {
+                digits[count++] = text[i];
+            }
+            if (!seen_dot) {
+                exponent++;     // digit before the point
+            }
+        }
+    }
+    if (i < length) {
+        long explicit_exponent = strtol(&text[i + 1], NULL, 10);
+        if (explicit_exponent > 100000) {
+            explicit_exponent = 100000;
+        } else if (explicit_exponent < -100000) {
+            explicit_exponent = -100000;
+        }
+        exponent += explicit_exponent;
     }
 
-    return result;
+    if (count == 0) {
+        snprintf(out, size, "0");
+    } else {
+        snprintf(out, size, "0.%.*se%ld", count, digits, exponent);
+    }
 }
 
 // Tokenizer implementation
-token_t get_next_token(parse_context_t* ctx) {
+static token_t scan_token(parse_context_t* ctx) {
     token_t token;
     token.type = TOKEN_UNKNOWN;
     token.value[0] = '\0';
@@ -125,9 +456,16 @@ token_t get_next_token(parse_context_t* ctx) {
         }
 
         int len = ctx->position - start;
-        strncpy(token.value, &ctx->expression[start], len);
-        token.value[len] = '\0';
-        token.number_value = strtod(token.value, NULL);
+        if (len < (int)sizeof(token.value)) {
+            strncpy(token.value, &ctx->expression[start], len);
+            token.value[len] = '\0';
+            token.number_value = strtod(token.value, NULL);
+        } else {
+            // The source span is only digits, '.', and an exponent, so strtod
+            // stops where the token ends
+            token.number_value = strtod(&ctx->expression[start], NULL);
+            shorten_number(&ctx->expression[start], len, token.value, sizeof(token.value));
+        }
         token.type = TOKEN_NUMBER;
         return token;
     }
@@ -179,11 +517,24 @@ token_t get_next_token(parse_context_t* ctx) {
             }
         }
 
+        // Longer names are cut; they cannot match a builtin and are too
+        // long for a variable either
         int len = ctx->position - start;
+        if (len >= (int)sizeof(token.value)) {
+            len = sizeof(token.value) - 1;
+        }
         strncpy(token.value, &ctx->expression[start], len);
         token.value[len] = '\0';
 
-        if (is_function_name(token.value)) {
+        // A name that is both a constant and a function ("phi") is only a
+        // function when a call follows
+        int next = ctx->position;
+        while (next < ctx->length && isspace(ctx->expression[next])) {
+            next++;
+        }
+        bool call_follows = next < ctx->length && ctx->expression[next] == '(';
+
+        if (is_function_name(token.value) && (call_follows || !is_constant_name(token.value))) {
             token.type = TOKEN_FUNCTION;
         } else if (is_constant_name(token.value)) {
             token.type = TOKEN_CONSTANT;
@@ -203,203 +554,60 @@ token_t get_next_token(parse_context_t* ctx) {
     return token;
 }
 
-// Parser implementation (recursive descent)
-double parse_expression_impl(parse_context_t* ctx, parse_error_t* error) {
-    double result = parse_term(ctx, error);
-
-    while (*error == PARSE_SUCCESS && 
-           (ctx->current_token.type == TOKEN_OPERATOR && 
-            (ctx->current_token.value[0] == '+' || ctx->current_token.value[0] == '-'))) {
-
-        char op = ctx->current_token.value[0];
-        ctx->current_token = get_next_token(ctx);
-
-        double right = parse_term(ctx, error);
-
-        if (*error == PARSE_SUCCESS) {
-            if (op == '+') {
-                result += right;
-            } else {
-                result -= right;
-            }
-        }
-    }
-
-    return result;
-}
-
-double parse_term(parse_context_t* ctx, parse_error_t* error) {
-    double result = parse_factor(ctx, error);
-
-    while (*error == PARSE_SUCCESS && 
-           (ctx->current_token.type == TOKEN_OPERATOR && 
-            (ctx->current_token.value[0] == '*' || ctx->current_token.value[0] == '/' ||
-             ctx->current_token.value[0] == '%'))) {
-
-        char op = ctx->current_token.value[0];
-        ctx->current_token = get_next_token(ctx);
-
-        double right = parse_factor(ctx, error);
-
-        if (*error == PARSE_SUCCESS) {
-            if (op == '*') {
-                result *= right;
-            } else if (op == '/') {
-                if (right == 0.0) {
-                    *error = PARSE_ERROR_DIVISION_BY_ZERO;
-                    return 0.0;
-                }
-                result /= right;
-            } else if (op == '%') {
-                if (right == 0.0) {
-                    *error = PARSE_ERROR_DIVISION_BY_ZERO;
-                    return 0.0;
-                }
-                result = fmod(result, right);
-            }
-        }
-    }
-
-    return result;
-}
-
-double parse_factor(parse_context_t* ctx, parse_error_t* error) {
-    double result = parse_primary(ctx, error);
-
-    while (*error == PARSE_SUCCESS && 
-           ctx->current_token.type == TOKEN_OPERATOR && 
-           ctx->current_token.value[0] == '^') {
-
-        ctx->current_token = get_next_token(ctx);
-        double exponent = parse_primary(ctx, error);
-
-        if (*error == PARSE_SUCCESS) {
-            result = pow(result, exponent);
-            if (!isfinite(result)) {
-                *error = PARSE_ERROR_DOMAIN_ERROR;
-                return 0.0;
-            }
-        }
-    }
-
-    return result;
+token_t get_next_token(parse_context_t* ctx) {
+    CALC_PROFILE_START(mark);
+    token_t token = scan_token(ctx);
+    CALC_PROFILE_STOP(CALC_PHASE_LEX, mark);
+    CALC_PROFILE_TOKEN();
+    return token;
 }
 
-double parse_primary(parse_context_t* ctx, parse_error_t* error) {
-    // Numbers
-    if (ctx->current_token.type == TOKEN_NUMBER) {
-        double value = ctx->current_token.number_value;
-        ctx->current_token = get_next_token(ctx);
-        return value;
-    }
-
-    // Constants
-    if (ctx->current_token.type == TOKEN_CONSTANT) {
-        double value = ctx->current_token.number_value;
-        ctx->current_token = get_next_token(ctx);
-        return value;
-    }
-
-    // Unary operators
-    if (ctx->current_token.type == TOKEN_OPERATOR) {
-        if (ctx->current_token.value[0] == '-') {
-            ctx->current_token = get_next_token(ctx);
-            return -parse_primary(ctx, error);
-        }
-        if (ctx->current_token.value[0] == '+') {
-            ctx->current_token = get_next_token(ctx);
-            return parse_primary(ctx, error);
-        }
-    }
-
-    // Parentheses
-    if (ctx->current_token.type == TOKEN_LEFT_PAREN) {
-        ctx->current_token = get_next_token(ctx);
-        double value = parse_expression_impl(ctx, error);
-
-        if (*error == PARSE_SUCCESS) {
-            if (ctx->current_token.type != TOKEN_RIGHT_PAREN) {
-                *error = PARSE_ERROR_MISMATCHED_PARENTHESES;
-                return 0.0;
-            }
-            ctx->current_token = get_next_token(ctx);
-        }
-        return value;
-    }
-
-    // Functions
-    if (ctx->current_token.type == TOKEN_FUNCTION) {
-        char func_name[64];
-        strcpy(func_name, ctx->current_token.value);
-        ctx->current_token = get_next_token(ctx);
-
-        // Check for opening parenthesis
-        if (ctx->current_token.type != TOKEN_LEFT_PAREN) {
-            *error = PARSE_ERROR_INVALID_SYNTAX;
-            return 0.0;
-        }
-        ctx->current_token = get_next_token(ctx);
-
-        // Parse function arguments
-        double args[10]; // Support up to 10 arguments
-        int arg_count = 0;
-
-        if (ctx->current_token.type != TOKEN_RIGHT_PAREN) {
-            do {
-                if (arg_count >= 10) {
-                    *error = PARSE_ERROR_TOO_MANY_ARGUMENTS;
-                    return 0.0;
-                }
-
-                args[arg_count] = parse_expression_impl(ctx, error);
-                if (*error != PARSE_SUCCESS) {
-                    return 0.0;
-                }
-                arg_count++;
-
-                if (ctx->current_token.type == TOKEN_COMMA) {
-                    ctx->current_token = get_next_token(ctx);
-                } else {
-                    break;
-                }
-            } while (true);
-        }
-
-        if (ctx->current_token.type != TOKEN_RIGHT_PAREN) {
-            *error = PARSE_ERROR_MISMATCHED_PARENTHESES;
-            return 0.0;
-        }
-        ctx->current_token = get_next_token(ctx);
-
-        return evaluate_function(func_name, args, arg_count, ctx->calc_state, error);
-    }
-
-    // Variables (memory recall)
-    if (ctx->current_token.type == TOKEN_VARIABLE) {
-        if (strcmp(ctx->current_token.value, "M") == 0 || 
-            strcmp(ctx->current_token.value, "mem") == 0) {
-            ctx->current_token = get_next_token(ctx);
-            return calc_memory_recall(ctx->calc_state);
-        }
-        if (strcmp(ctx->current_token.value, "ans") == 0 || 
-            strcmp(ctx->current_token.value, "ANS") == 0) {
-            ctx->current_token = get_next_token(ctx);
-            return ctx->calc_state->last_result;
-        }
+// Parse error for a failed function call
+static parse_error_t function_error(calc_error_t error) {
+    switch (error) {
+        case CALC_ERROR_DIVISION_BY_ZERO:
+            return PARSE_ERROR_DIVISION_BY_ZERO;
+        case CALC_ERROR_DOMAIN_ERROR:
+        case CALC_ERROR_OVERFLOW:
+        case CALC_ERROR_UNDERFLOW:
+            return PARSE_ERROR_DOMAIN_ERROR;
+        case CALC_ERROR_CANCELLED:
+            return PARSE_ERROR_CANCELLED;
+        case CALC_ERROR_TIMEOUT:
+            return PARSE_ERROR_TIMEOUT;
+        default:
+            return PARSE_ERROR_INVALID_FUNCTION;
     }
-
-    *error = PARSE_ERROR_INVALID_SYNTAX;
-    return 0.0;
 }
 
 // Function evaluation
 double evaluate_function(const char* func_name, double* args, int arg_count, 
                         calc_state_t* state, parse_error_t* error) {
+    CALC_PROFILE_CALL(get_function_index(func_name));
 
     calc_result_t result;
-
+    calc_dist_type_t distribution;
+    calc_dist_function_t dist_function;
+
+    // Distribution functions: the argument, then the parameters
+    if (calc_dist_lookup(func_name, &distribution, &dist_function)) {
+        int expected = 1 + calc_dist_param_count(distribution);
+        // The normal's mu and sigma may be left out (0 and 1)
+        int fewest = distribution == CALC_DIST_NORMAL ? 1 : expected;
+        if (arg_count < fewest || arg_count > expected) {
+            *error = arg_count < fewest ? PARSE_ERROR_TOO_FEW_ARGUMENTS : PARSE_ERROR_TOO_MANY_ARGUMENTS;
+            return 0.0;
+        }
+        double params[2] = {0.0, 1.0};
+        const double* given = &args[1];
+        if (arg_count < expected) {
+            memcpy(params, &args[1], (size_t)(arg_count - 1) * sizeof(double));
+            given = params;
+        }
+        result = calc_dist_evaluate(distribution, dist_function, given, args[0]);
+    }
     // Single argument functions
-    if (arg_count == 1) {
+    else if (arg_count == 1) {
         double x = args[0];
 
         if (strcmp(func_name, "sin") == 0) {
@@ -457,9 +665,21 @@ double evaluate_function(const char* func_name, double* args, int arg_count,
         } else if (strcmp(func_name, "round") == 0) {
             result = calc_round(x);
         } else if (strcmp(func_name, "factorial") == 0) {
-            result = calc_factorial((int)x);
+            result = integer_call(calc_factorial, x);
         } else if (strcmp(func_name, "gamma") == 0) {
             result = calc_gamma(x);
+        } else if (strcmp(func_name, "lnfactorial") == 0) {
+            result = integer_call(calc_lnfactorial, x);
+        } else if (strcmp(func_name, "isprime") == 0) {
+            result = integer_call(calc_isprime, x);
+        } else if (strcmp(func_name, "factor") == 0) {
+            result = integer_call(calc_smallest_prime_factor, x);
+        } else if (strcmp(func_name, "nextprime") == 0) {
+            result = integer_call(calc_nextprime, x);
+        } else if (strcmp(func_name, "phi") == 0) {
+            result = integer_call(calc_totient, x);
+        } else if (strcmp(func_name, "primepi") == 0) {
+            result = expression_primepi(x, state);
         } else {
             *error = PARSE_ERROR_INVALID_FUNCTION;
             return 0.0;
@@ -481,13 +701,17 @@ double evaluate_function(const char* func_name, double* args, int arg_count,
         } else if (strcmp(func_name, "atan2") == 0) {
             result = calc_atan2(x, y, state->angle_in_degrees);
         } else if (strcmp(func_name, "perm") == 0) {
-            result = calc_permutation((int)x, (int)y);
+            result = integer_call2(calc_permutation, x, y);
         } else if (strcmp(func_name, "comb") == 0) {
-            result = calc_combination((int)x, (int)y);
+            result = integer_call2(calc_combination, x, y);
+        } else if (strcmp(func_name, "lnperm") == 0) {
+            result = integer_call2(calc_lnpermutation, x, y);
+        } else if (strcmp(func_name, "lncomb") == 0) {
+            result = integer_call2(calc_lncombination, x, y);
         } else if (strcmp(func_name, "gcd") == 0) {
-            result = calc_gcd((int)x, (int)y);
+            result = integer_call2(calc_gcd, x, y);
         } else if (strcmp(func_name, "lcm") == 0) {
-            result = calc_lcm((int)x, (int)y);
+            result = integer_call2(calc_lcm, x, y);
         } else if (strcmp(func_name, "min") == 0) {
             result = make_result(fmin(x, y), CALC_SUCCESS);
         } else if (strcmp(func_name, "max") == 0) {
@@ -497,30 +721,37 @@ double evaluate_function(const char* func_name, double* args, int arg_count,
             return 0.0;
         }
     } else {
-        *error = PARSE_ERROR_TOO_FEW_ARGUMENTS;
+        *error = arg_count == 0 ? PARSE_ERROR_TOO_FEW_ARGUMENTS : PARSE_ERROR_TOO_MANY_ARGUMENTS;
         return 0.0;
     }
 
     if (result.has_error) {
-        switch (result.error) {
-            case CALC_ERROR_DIVISION_BY_ZERO:
-                *error = PARSE_ERROR_DIVISION_BY_ZERO;
-                break;
-            case CALC_ERROR_DOMAIN_ERROR:
-            case CALC_ERROR_OVERFLOW:
-            case CALC_ERROR_UNDERFLOW:
-                *error = PARSE_ERROR_DOMAIN_ERROR;
-                break;
-            default:
-                *error = PARSE_ERROR_INVALID_FUNCTION;
-                break;
-        }
+        *error = function_error(result.error);
         return 0.0;
     }
 
     return result.value;
 }
 
+double evaluate_function_with_accuracy(const char* func_name, double* args, int arg_count,
+                                       calc_accuracy_t accuracy, calc_state_t* state, parse_error_t* error) {
+    if (accuracy != CALC_ACCURACY_FAITHFUL) {
+        int index = get_function_index(func_name);
+        calc_kernel_t kernel = get_accuracy_kernel(index, arg_count, accuracy);
+        if (kernel != get_function_kernel(index, arg_count)) {
+            CALC_PROFILE_CALL(index);
+            double value = kernel(args, state->angle_in_degrees);
+            calc_error_t failure = calc_nan_error(value);
+            if (failure != CALC_SUCCESS) {
+                *error = function_error(failure);
+                return 0.0;
+            }
+            return value;
+        }
+    }
+    return evaluate_function(func_name, args, arg_count, state, error);
+}
+
 // Utility functions
 void skip_whitespace(parse_context_t* ctx) {
     while (ctx->position < ctx->length && isspace(ctx->expression[ctx->position])) {
@@ -541,6 +772,56 @@ bool is_function_name(const char* name) {
     return false;
 }
 
+int get_function_index(const char* name) {
+    for (int i = 0; builtin_functions[i].name != NULL; i++) {
+        if (strcmp(name, builtin_functions[i].name) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+// Entry of the function at index taking argc arguments, or -1
+static int function_entry(int index, int argc) {
+    if (index < 0 || index >= (int)(sizeof(builtin_functions) / sizeof(builtin_functions[0])) - 1) {
+        return -1;
+    }
+    for (int i = index; builtin_functions[i].name != NULL &&
+                        strcmp(builtin_functions[i].name, builtin_functions[index].name) == 0; i++) {
+        if (builtin_functions[i].arg_count == argc) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+// Kernel for a call with argc arguments; a wrong argument count gets a
+// kernel that reports CALC_ERROR_INVALID_FUNCTION
+calc_kernel_t get_function_kernel(int index, int argc) {
+    int entry = function_entry(index, argc);
+    return entry < 0 ? kernel_unsupported : builtin_functions[entry].kernels[CALC_ACCURACY_FAITHFUL];
+}
+
+// The same for an accuracy tier; functions without a kernel of the tier's
+// own use the faithful one
+calc_kernel_t get_accuracy_kernel(int index, int argc, calc_accuracy_t accuracy) {
+    int entry = function_entry(index, argc);
+    if (entry < 0) {
+        return kernel_unsupported;
+    }
+    if ((unsigned)accuracy < CALC_ACCURACY_COUNT && builtin_functions[entry].kernels[accuracy]) {
+        return builtin_functions[entry].kernels[accuracy];
+    }
+    return builtin_functions[entry].kernels[CALC_ACCURACY_FAITHFUL];
+}
+
+const char* get_function_name(int index) {
+    if (index < 0 || index >= (int)(sizeof(builtin_functions) / sizeof(builtin_functions[0])) - 1) {
+        return NULL;
+    }
+    return builtin_functions[index].name;
+}
+
 bool is_constant_name(const char* name) {
     for (int i = 0; builtin_constants[i].name != NULL; i++) {
         if (strcmp(name, builtin_constants[i].name) == 0) {
@@ -582,6 +863,17 @@ const char* parse_error_string(parse_error_t error) {
         case PARSE_ERROR_DOMAIN_ERROR: return "Domain error";
         case PARSE_ERROR_TOO_MANY_ARGUMENTS: return "Too many arguments";
         case PARSE_ERROR_TOO_FEW_ARGUMENTS: return "Too few arguments";
+        case PARSE_ERROR_CANCELLED: return "Cancelled";
+        case PARSE_ERROR_TIMEOUT: return "Timed out";
+        case PARSE_ERROR_OUT_OF_MEMORY: return "Out of memory";
         default: return "Unknown parse error";
     }
-}
\ No newline at end of file
+}
+
+parse_error_t parse_check_interrupt(calc_state_t* state) {
+    switch (calc_check_interrupt(state)) {
+        case CALC_ERROR_CANCELLED: return PARSE_ERROR_CANCELLED;
+        case CALC_ERROR_TIMEOUT: return PARSE_ERROR_TIMEOUT;
+        default: return PARSE_SUCCESS;
+    }
+}
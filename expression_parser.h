@@ -36,7 +36,10 @@ typedef enum {
     PARSE_ERROR_DIVISION_BY_ZERO,
     PARSE_ERROR_DOMAIN_ERROR,
     PARSE_ERROR_TOO_MANY_ARGUMENTS,
-    PARSE_ERROR_TOO_FEW_ARGUMENTS
+    PARSE_ERROR_TOO_FEW_ARGUMENTS,
+    PARSE_ERROR_CANCELLED,
+    PARSE_ERROR_TIMEOUT,
+    PARSE_ERROR_OUT_OF_MEMORY
 } parse_error_t;
 
 // Parse result
@@ -53,9 +56,11 @@ typedef struct {
     int position;
     int length;
     calc_state_t* calc_state;
-    token_t current_token;
 } parse_context_t;
 
+// Bare function kernel: returns the value, or calc_error_nan(error)
+typedef double (*calc_kernel_t)(const double* args, bool degrees);
+
 // Function prototypes
 
 // Main parsing function
@@ -65,17 +70,18 @@ parse_result_t parse_expression(const char* expression, calc_state_t* state);
 token_t get_next_token(parse_context_t* ctx);
 bool is_operator(char c);
 bool is_function_name(const char* name);
+int get_function_index(const char* name);
+const char* get_function_name(int index);
+calc_kernel_t get_function_kernel(int index, int argc);
+calc_kernel_t get_accuracy_kernel(int index, int argc, calc_accuracy_t accuracy);
 bool is_constant_name(const char* name);
 
-// Parser functions (recursive descent)
-double parse_primary(parse_context_t* ctx, parse_error_t* error);
-double parse_factor(parse_context_t* ctx, parse_error_t* error);
-double parse_term(parse_context_t* ctx, parse_error_t* error);
-double parse_expression_impl(parse_context_t* ctx, parse_error_t* error);
-
 // Function evaluation
 double evaluate_function(const char* func_name, double* args, int arg_count, 
                         calc_state_t* state, parse_error_t* error);
+// The same in an accuracy tier (accuracy.h); evaluate_function is faithful
+double evaluate_function_with_accuracy(const char* func_name, double* args, int arg_count,
+                                       calc_accuracy_t accuracy, calc_state_t* state, parse_error_t* error);
 
 // Utility functions
 void skip_whitespace(parse_context_t* ctx);
@@ -86,5 +92,6 @@ double get_constant_value(const char* name);
 
 // Error handling
 const char* parse_error_string(parse_error_t error);
+parse_error_t parse_check_interrupt(calc_state_t* state);
 
 #endif // EXPRESSION_PARSER_H
\ No newline at end of file
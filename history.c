@@ -0,0 +1,248 @@
+#include "history.h"
+#include <fcntl.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <time.h>
+#include <unistd.h>
+
+#define HISTORY_MAGIC 0x54534843u     // "CHST"
+#define HISTORY_VERSION 1
+
+// File layout: header, record ring, text ring. Sequence numbers and text
+// offsets only grow; record s lives in slot s % record_capacity and its text
+// at text_offset % text_capacity, wrapping around the end of the ring.
+typedef struct {
+    uint32_t magic;
+    uint32_t version;
+    uint64_t record_capacity;
+    uint64_t text_capacity;
+    uint64_t appended;      // records ever appended
+    uint64_t oldest;        // sequence number of the oldest record still held
+    uint64_t text_head;     // text bytes ever written
+} history_header_t;
+
+typedef struct {
+    uint64_t text_offset;
+    uint32_t text_length;
+    int32_t error;
+    double result;
+    double timestamp;
+} history_record_t;
+
+struct calc_history {
+    void* map;
+    size_t map_size;
+    bool file_backed;
+    history_header_t* header;
+    history_record_t* records;
+    unsigned char* text;
+};
+
+static size_t layout_size(size_t records, size_t text_bytes) {
+    return sizeof(history_header_t) + records * sizeof(history_record_t) + text_bytes;
+}
+
+static void init_header(history_header_t* header, size_t records, size_t text_bytes) {
+    memset(header, 0, sizeof(*header));
+    header->magic = HISTORY_MAGIC;
+    header->version = HISTORY_VERSION;
+    header->record_capacity = records;
+    header->text_capacity = text_bytes;
+}
+
+// A file written by another layout or cut short by a crash mid-header
+static bool header_valid(const history_header_t* header, size_t records, size_t text_bytes) {
+    return header->magic == HISTORY_MAGIC && header->version == HISTORY_VERSION &&
+           header->record_capacity == records && header->text_capacity == text_bytes &&
+           header->oldest <= header->appended && header->appended - header->oldest <= records;
+}
+
+calc_history_t* calc_history_open(const char* path, size_t records, size_t text_bytes) {
+    if (records == 0) {
+        records = CALC_HISTORY_DEFAULT_RECORDS;
+    }
+    if (text_bytes == 0) {
+        text_bytes = CALC_HISTORY_DEFAULT_TEXT;
+    }
+    calc_history_t* history = calloc(1, sizeof(calc_history_t));
+    if (!history) {
+        return NULL;
+    }
+    history->map_size = layout_size(records, text_bytes);
+
+    bool fresh = true;
+    if (path) {
+        int fd = open(path, O_RDWR | O_CREAT, 0600);
+        if (fd < 0) {
+            free(history);
+            return NULL;
+        }
+        struct stat st;
+        if (fstat(fd, &st) == 0 && (size_t)st.st_size == history->map_size) {
+            fresh = false;
+        } else if (ftruncate(fd, 0) != 0 || ftruncate(fd, (off_t)history->map_size) != 0) {
+            close(fd);
+            free(history);
+            return NULL;
+        }
+        history->map = mmap(NULL, history->map_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        close(fd);
+        history->file_backed = true;
+    } else {
+        history->map = mmap(NULL, history->map_size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    }
+    if (history->map == MAP_FAILED) {
+        free(history);
+        return NULL;
+    }
+
+    history->header = history->map;
+    history->records = (history_record_t*)(history->header + 1);
+    history->text = (unsigned char*)(history->records + records);
+    if (fresh || !header_valid(history->header, records, text_bytes)) {
+        init_header(history->header, records, text_bytes);
+    }
+    return history;
+}
+
+void calc_history_close(calc_history_t* history) {
+    if (history) {
+        munmap(history->map, history->map_size);
+        free(history);
+    }
+}
+
+bool calc_history_sync(calc_history_t* history) {
+    if (!history) {
+        return false;
+    }
+    return !history->file_backed || msync(history->map, history->map_size, MS_SYNC) == 0;
+}
+
+// Copies length bytes of the text ring starting at offset
+static void read_text(const calc_history_t* history, uint64_t offset, unsigned char* out, size_t length) {
+    uint64_t capacity = history->header->text_capacity;
+    size_t position = (size_t)(offset % capacity);
+    size_t first = length < capacity - position ? length : (size_t)(capacity - position);
+    memcpy(out, history->text + position, first);
+    memcpy(out + first, history->text, length - first);
+}
+
+static void write_text(calc_history_t* history, uint64_t offset, const char* text, size_t length) {
+    uint64_t capacity = history->header->text_capacity;
+    size_t position = (size_t)(offset % capacity);
+    size_t first = length < capacity - position ? length : (size_t)(capacity - position);
+    memcpy(history->text + position, text, first);
+    memcpy(history->text, text + first, length - first);
+}
+
+static double wall_clock(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_REALTIME, &now);
+    return now.tv_sec + now.tv_nsec * 1e-9;
+}
+
+bool calc_history_append(calc_history_t* history, const char* expression, double result, calc_error_t error) {
+    if (!history || !expression) {
+        return false;
+    }
+    history_header_t* header = history->header;
+    size_t length = strlen(expression);
+    if (length > header->text_capacity) {
+        length = (size_t)header->text_capacity;
+    }
+
+    // Drop the records whose slot or text the new one is about to reuse.
+    // Text offsets grow with the sequence, so this only ever advances.
+    uint64_t text_end = header->text_head + length;
+    if (header->appended - header->oldest >= header->record_capacity) {
+        header->oldest++;
+    }
+    while (header->oldest < header->appended &&
+           history->records[header->oldest % header->record_capacity].text_offset + header->text_capacity < text_end) {
+        header->oldest++;
+    }
+
+    // Record and text first, counters last, so a crash between the two leaves
+    // the previous history intact
+    history_record_t* record = &history->records[header->appended % header->record_capacity];
+    write_text(history, header->text_head, expression, length);
+    record->text_offset = header->text_head;
+    record->text_length = (uint32_t)length;
+    record->error = (int32_t)error;
+    record->result = result;
+    record->timestamp = wall_clock();
+    header->text_head = text_end;
+    header->appended++;
+    return true;
+}
+
+void calc_history_clear(calc_history_t* history) {
+    if (history) {
+        history->header->oldest = history->header->appended;
+    }
+}
+
+size_t calc_history_count(const calc_history_t* history) {
+    return history ? (size_t)(history->header->appended - history->header->oldest) : 0;
+}
+
+static const history_record_t* record_at(const calc_history_t* history, size_t index) {
+    if (index >= calc_history_count(history)) {
+        return NULL;
+    }
+    uint64_t sequence = history->header->appended - 1 - index;
+    return &history->records[sequence % history->header->record_capacity];
+}
+
+bool calc_history_get(const calc_history_t* history, size_t index, calc_history_entry_t* entry,
+                      char* expression, size_t size) {
+    const history_record_t* record = record_at(history, index);
+    if (!record) {
+        return false;
+    }
+    if (entry) {
+        entry->result = record->result;
+        entry->error = (calc_error_t)record->error;
+        entry->timestamp = record->timestamp;
+        entry->length = record->text_length;
+    }
+    if (expression && size > 0) {
+        size_t length = record->text_length < size - 1 ? record->text_length : size - 1;
+        read_text(history, record->text_offset, (unsigned char*)expression, length);
+        expression[length] = '\0';
+    }
+    return true;
+}
+
+long calc_history_find(const calc_history_t* history, const char* prefix, size_t start) {
+    if (!history || !prefix) {
+        return -1;
+    }
+    size_t prefix_length = strlen(prefix);
+    unsigned char buffer[256];
+    size_t count = calc_history_count(history);
+
+    for (size_t index = start; index < count; index++) {
+        const history_record_t* record = record_at(history, index);
+        if (record->text_length < prefix_length) {
+            continue;
+        }
+        // Compare in chunks, since the text may wrap around the ring
+        size_t compared = 0;
+        while (compared < prefix_length) {
+            size_t chunk = prefix_length - compared < sizeof(buffer) ? prefix_length - compared : sizeof(buffer);
+            read_text(history, record->text_offset + compared, buffer, chunk);
+            if (memcmp(buffer, prefix + compared, chunk) != 0) {
+                break;
+            }
+            compared += chunk;
+        }
+        if (compared == prefix_length) {
+            return (long)index;
+        }
+    }
+    return -1;
+}
@@ -0,0 +1,53 @@
+#ifndef HISTORY_H
+#define HISTORY_H
+
+#include "calculator_engine.h"
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// Default sizes of a history file: records kept, and bytes of expression
+// text shared by them (a file is about 32 * records + text bytes)
+#define CALC_HISTORY_DEFAULT_RECORDS 4096
+#define CALC_HISTORY_DEFAULT_TEXT (256 * 1024)
+
+// Calculation history (opaque). A ring of fixed-size records and a ring of
+// expression text, both inside one memory-mapped file: an append writes into
+// the mapping in O(1) and the file is the history, so nothing is serialized
+// on exit or parsed on start. The oldest records are overwritten when either
+// ring is full.
+typedef struct calc_history calc_history_t;
+
+// One calculation; the expression is copied out separately
+typedef struct {
+    double result;
+    calc_error_t error;
+    double timestamp;       // seconds since the Unix epoch
+    size_t length;          // bytes of expression text
+} calc_history_entry_t;
+
+// Function prototypes
+
+// Maps the history file at path, creating it (or starting over, if it has a
+// different layout or is damaged) with room for the given number of records
+// and text bytes; 0 selects the defaults. A NULL path keeps the history in
+// memory only. NULL if the file cannot be mapped.
+calc_history_t* calc_history_open(const char* path, size_t records, size_t text_bytes);
+void calc_history_close(calc_history_t* history);
+bool calc_history_sync(calc_history_t* history);    // flush to storage now
+
+// Appending and clearing
+bool calc_history_append(calc_history_t* history, const char* expression, double result, calc_error_t error);
+void calc_history_clear(calc_history_t* history);
+
+// Recall; index 0 is the most recent calculation. calc_history_get copies
+// the expression (NUL-terminated, truncated to size) into expression.
+size_t calc_history_count(const calc_history_t* history);
+bool calc_history_get(const calc_history_t* history, size_t index, calc_history_entry_t* entry,
+                      char* expression, size_t size);
+
+// Index of the most recent calculation at or after index start whose
+// expression begins with prefix, or -1
+long calc_history_find(const calc_history_t* history, const char* prefix, size_t start);
+
+#endif // HISTORY_H
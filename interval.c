@@ -0,0 +1,952 @@
+#include "interval.h"
+#include "combinatorics.h"
+#include <float.h>
+#include <limits.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+// Evaluation stacks up to this depth live on the C stack
+#define LOCAL_STACK_SIZE 64
+
+// Maximum arguments of a builtin function call
+#define MAX_CALL_ARGS 8
+
+// Error allowance for libm functions, in ulps of the result
+#define LIBM_ULPS 4
+
+// Initial depth of the root isolation work stack (grows on demand)
+#define ROOT_STACK_SIZE 64
+
+// 2*pi and pi/2 rounded to nearest; extrema tests allow for their error
+#define TWO_PI 6.283185307179586
+#define HALF_PI 1.5707963267948966
+
+// Degree/radian factors rounded to nearest; see angle_argument
+#define RADIANS_PER_DEGREE 0.017453292519943295
+#define DEGREES_PER_RADIAN 57.29577951308232
+
+// Minimum of gamma on x > 0
+#define GAMMA_MIN_X 1.4616321449683623
+#define GAMMA_MIN_VALUE 0.8856031944108887
+
+typedef calc_interval_t (*interval_kernel_t)(const char* name, const calc_interval_t* args,
+                                             calc_state_t* state);
+
+// Outward-rounded scalar operations. Each checks whether the round-to-nearest
+// result was exact (error-free transformations) and steps one ulp otherwise.
+
+static double next_down(double x) {
+    return nextafter(x, -INFINITY);
+}
+
+static double next_up(double x) {
+    return nextafter(x, INFINITY);
+}
+
+static double widen_down(double x, int ulps) {
+    for (int i = 0; i < ulps; i++) {
+        x = next_down(x);
+    }
+    return x;
+}
+
+static double widen_up(double x, int ulps) {
+    for (int i = 0; i < ulps; i++) {
+        x = next_up(x);
+    }
+    return x;
+}
+
+static double add_down(double a, double b) {
+    double s = a + b;
+    if (isnan(s)) {
+        return -INFINITY;
+    }
+    if (isinf(s)) {
+        return (isfinite(a) && isfinite(b) && s > 0) ? DBL_MAX : s;
+    }
+    double bb = s - a;
+    double e = (a - (s - bb)) + (b - bb);
+    return e < 0 ? next_down(s) : s;
+}
+
+static double add_up(double a, double b) {
+    return -add_down(-a, -b);
+}
+
+static double mul_down(double a, double b) {
+    if (a == 0.0 || b == 0.0) {
+        return 0.0;
+    }
+    double p = a * b;
+    if (isinf(p)) {
+        return (isfinite(a) && isfinite(b) && p > 0) ? DBL_MAX : p;
+    }
+    if (fabs(p) < DBL_MIN) {
+        return next_down(p);
+    }
+    return fma(a, b, -p) < 0 ? next_down(p) : p;
+}
+
+static double mul_up(double a, double b) {
+    return -mul_down(-a, b);
+}
+
+static double div_down(double a, double b) {
+    if (a == 0.0 || isinf(b)) {
+        return isinf(a) ? -INFINITY : 0.0;
+    }
+    double q = a / b;
+    if (isnan(q)) {
+        return -INFINITY;
+    }
+    if (isinf(q)) {
+        return (isfinite(a) && q > 0) ? DBL_MAX : q;
+    }
+    if (fabs(q) < DBL_MIN) {
+        return next_down(q);
+    }
+    // a - q*b is exact; its sign relative to b tells which side the quotient is on
+    double r = fma(-q, b, a);
+    return (r != 0.0 && (r < 0) != (b < 0)) ? next_down(q) : q;
+}
+
+static double div_up(double a, double b) {
+    return -div_down(-a, b);
+}
+
+// Construction and queries
+calc_interval_t calc_interval_make(double lo, double hi) {
+    calc_interval_t result;
+    result.lo = lo;
+    result.hi = hi;
+    return result;
+}
+
+calc_interval_t calc_interval_point(double x) {
+    return calc_interval_make(x, x);
+}
+
+calc_interval_t calc_interval_empty(void) {
+    return calc_interval_make(INFINITY, -INFINITY);
+}
+
+calc_interval_t calc_interval_entire(void) {
+    return calc_interval_make(-INFINITY, INFINITY);
+}
+
+bool calc_interval_is_empty(calc_interval_t x) {
+    return !(x.lo <= x.hi);
+}
+
+bool calc_interval_contains(calc_interval_t x, double value) {
+    return x.lo <= value && value <= x.hi;
+}
+
+double calc_interval_width(calc_interval_t x) {
+    if (calc_interval_is_empty(x)) {
+        return 0.0;
+    }
+    return add_up(x.hi, -x.lo);
+}
+
+static bool is_point(calc_interval_t x) {
+    return x.lo == x.hi;
+}
+
+static calc_interval_t widen(double lo, double hi, int ulps) {
+    return calc_interval_make(widen_down(lo, ulps), widen_up(hi, ulps));
+}
+
+// Operators
+calc_interval_t calc_interval_add(calc_interval_t a, calc_interval_t b) {
+    if (calc_interval_is_empty(a) || calc_interval_is_empty(b)) {
+        return calc_interval_empty();
+    }
+    return calc_interval_make(add_down(a.lo, b.lo), add_up(a.hi, b.hi));
+}
+
+calc_interval_t calc_interval_negate(calc_interval_t a) {
+    if (calc_interval_is_empty(a)) {
+        return a;
+    }
+    return calc_interval_make(-a.hi, -a.lo);
+}
+
+calc_interval_t calc_interval_subtract(calc_interval_t a, calc_interval_t b) {
+    return calc_interval_add(a, calc_interval_negate(b));
+}
+
+calc_interval_t calc_interval_multiply(calc_interval_t a, calc_interval_t b) {
+    if (calc_interval_is_empty(a) || calc_interval_is_empty(b)) {
+        return calc_interval_empty();
+    }
+    double lo = fmin(fmin(mul_down(a.lo, b.lo), mul_down(a.lo, b.hi)),
+                     fmin(mul_down(a.hi, b.lo), mul_down(a.hi, b.hi)));
+    double hi = fmax(fmax(mul_up(a.lo, b.lo), mul_up(a.lo, b.hi)),
+                     fmax(mul_up(a.hi, b.lo), mul_up(a.hi, b.hi)));
+    return calc_interval_make(lo, hi);
+}
+
+calc_interval_t calc_interval_divide(calc_interval_t a, calc_interval_t b) {
+    if (calc_interval_is_empty(a) || calc_interval_is_empty(b) || (b.lo == 0.0 && b.hi == 0.0)) {
+        return calc_interval_empty();
+    }
+    if (b.lo > 0.0 || b.hi < 0.0) {
+        double lo = fmin(fmin(div_down(a.lo, b.lo), div_down(a.lo, b.hi)),
+                         fmin(div_down(a.hi, b.lo), div_down(a.hi, b.hi)));
+        double hi = fmax(fmax(div_up(a.lo, b.lo), div_up(a.lo, b.hi)),
+                         fmax(div_up(a.hi, b.lo), div_up(a.hi, b.hi)));
+        return calc_interval_make(lo, hi);
+    }
+    if (a.lo == 0.0 && a.hi == 0.0) {
+        return calc_interval_point(0.0);
+    }
+    // Divisor touches zero at one end: the quotient is unbounded on one side
+    if (b.lo == 0.0) {
+        if (a.lo >= 0.0) {
+            return calc_interval_make(div_down(a.lo, b.hi), INFINITY);
+        }
+        if (a.hi <= 0.0) {
+            return calc_interval_make(-INFINITY, div_up(a.hi, b.hi));
+        }
+    } else if (b.hi == 0.0) {
+        if (a.lo >= 0.0) {
+            return calc_interval_make(-INFINITY, div_up(a.lo, b.lo));
+        }
+        if (a.hi <= 0.0) {
+            return calc_interval_make(div_down(a.hi, b.lo), INFINITY);
+        }
+    }
+    return calc_interval_entire();
+}
+
+// x^n for a non-negative integer n
+static calc_interval_t integer_power(calc_interval_t x, double n) {
+    if (n == 0.0) {
+        return calc_interval_point(1.0);
+    }
+    bool odd = fmod(n, 2.0) != 0.0;
+    if (odd) {
+        return widen(pow(x.lo, n), pow(x.hi, n), 2);
+    }
+    if (x.lo >= 0.0) {
+        return calc_interval_make(fmax(0.0, widen_down(pow(x.lo, n), 2)), widen_up(pow(x.hi, n), 2));
+    }
+    if (x.hi <= 0.0) {
+        return calc_interval_make(fmax(0.0, widen_down(pow(x.hi, n), 2)), widen_up(pow(x.lo, n), 2));
+    }
+    return calc_interval_make(0.0, widen_up(fmax(pow(x.lo, n), pow(x.hi, n)), 2));
+}
+
+calc_interval_t calc_interval_power(calc_interval_t base, calc_interval_t exponent) {
+    if (calc_interval_is_empty(base) || calc_interval_is_empty(exponent)) {
+        return calc_interval_empty();
+    }
+    if (is_point(exponent) && calc_is_integer(exponent.lo) && fabs(exponent.lo) <= 9007199254740992.0) {
+        double n = exponent.lo;
+        if (n >= 0.0) {
+            return integer_power(base, n);
+        }
+        return calc_interval_divide(calc_interval_point(1.0), integer_power(base, -n));
+    }
+
+    // Real powers are defined for base >= 0; corners of the rectangle bound x^y there
+    calc_interval_t magnitude = base;
+    if (base.lo < 0.0) {
+        magnitude = calc_interval_make(base.hi < 0.0 ? -base.hi : 0.0, fmax(-base.lo, base.hi));
+    }
+    double corners[4] = {
+        pow(magnitude.lo, exponent.lo), pow(magnitude.lo, exponent.hi),
+        pow(magnitude.hi, exponent.lo), pow(magnitude.hi, exponent.hi)
+    };
+    double lo = corners[0];
+    double hi = corners[0];
+    for (int i = 1; i < 4; i++) {
+        lo = fmin(lo, corners[i]);
+        hi = fmax(hi, corners[i]);
+    }
+    calc_interval_t result = calc_interval_make(fmax(0.0, widen_down(lo, 2)), widen_up(hi, 2));
+
+    if (base.lo < 0.0) {
+        // Negative bases only have values at integer exponents, where the sign alternates
+        bool integer_inside = floor(exponent.hi) >= exponent.lo;
+        if (!integer_inside) {
+            if (base.hi < 0.0) {
+                return calc_interval_empty();
+            }
+            // Only the non-negative part of the base contributes
+            return calc_interval_power(calc_interval_make(0.0, base.hi), exponent);
+        }
+        return calc_interval_make(-result.hi, result.hi);
+    }
+    return result;
+}
+
+calc_interval_t calc_interval_mod(calc_interval_t a, calc_interval_t b) {
+    if (calc_interval_is_empty(a) || calc_interval_is_empty(b) || (b.lo == 0.0 && b.hi == 0.0)) {
+        return calc_interval_empty();
+    }
+    if (is_point(b) && isfinite(a.lo) && isfinite(a.hi)) {
+        double divisor = fabs(b.lo);
+        double r_lo = fmod(a.lo, divisor);
+        double r_hi = fmod(a.hi, divisor);
+        // Within one period fmod is a shift (and exact); an inversion means a wrap
+        if (add_up(a.hi, -a.lo) < divisor && r_lo <= r_hi) {
+            return calc_interval_make(r_lo, r_hi);
+        }
+    }
+    // |fmod(a, b)| < |b| and |fmod(a, b)| <= |a|, with the sign of a
+    double bound = fmax(fabs(b.lo), fabs(b.hi));
+    return calc_interval_make(fmax(-bound, fmin(0.0, a.lo)), fmin(bound, fmax(0.0, a.hi)));
+}
+
+// Monotone functions: endpoints of the input clipped to the domain
+typedef struct {
+    const char* name;
+    double (*function)(double);
+    double domain_lo;
+    double domain_hi;
+    bool open_lo;           // undefined at domain_lo itself
+    bool decreasing;
+    int ulps;
+    bool angle_result;      // result is an angle (degrees when angle_in_degrees)
+} monotone_function_t;
+
+static double exp10_function(double x) {
+    return pow(10.0, x);
+}
+
+static const monotone_function_t monotone_functions[] = {
+    {"exp", exp, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"exp2", exp2, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"exp10", exp10_function, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"sinh", sinh, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"tanh", tanh, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"cbrt", cbrt, -INFINITY, INFINITY, false, false, LIBM_ULPS, false},
+    {"sqrt", sqrt, 0.0, INFINITY, false, false, 1, false},
+    {"log", log, 0.0, INFINITY, true, false, LIBM_ULPS, false},
+    {"ln", log, 0.0, INFINITY, true, false, LIBM_ULPS, false},
+    {"log10", log10, 0.0, INFINITY, true, false, LIBM_ULPS, false},
+    {"log2", log2, 0.0, INFINITY, true, false, LIBM_ULPS, false},
+    {"asin", asin, -1.0, 1.0, false, false, LIBM_ULPS, true},
+    {"acos", acos, -1.0, 1.0, false, true, LIBM_ULPS, true},
+    {"atan", atan, -INFINITY, INFINITY, false, false, LIBM_ULPS, true},
+    {"floor", floor, -INFINITY, INFINITY, false, false, 0, false},
+    {"ceil", ceil, -INFINITY, INFINITY, false, false, 0, false},
+    {"round", round, -INFINITY, INFINITY, false, false, 0, false},
+    {NULL, NULL, 0.0, 0.0, false, false, 0, false}
+};
+
+// Converts a radian result to degrees when the calculator is in degree mode
+static calc_interval_t angle_result(calc_interval_t x, const calc_state_t* state) {
+    if (!state->angle_in_degrees) {
+        return x;
+    }
+    calc_interval_t factor = calc_interval_make(next_down(DEGREES_PER_RADIAN), next_up(DEGREES_PER_RADIAN));
+    return calc_interval_multiply(x, factor);
+}
+
+// Converts an angle argument to radians
+static calc_interval_t angle_argument(calc_interval_t x, const calc_state_t* state) {
+    if (!state->angle_in_degrees) {
+        return x;
+    }
+    calc_interval_t factor = calc_interval_make(next_down(RADIANS_PER_DEGREE), next_up(RADIANS_PER_DEGREE));
+    return calc_interval_multiply(x, factor);
+}
+
+static calc_interval_t monotone_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    const monotone_function_t* f = monotone_functions;
+    while (strcmp(f->name, name) != 0) {
+        f++;
+    }
+    double lo = fmax(args[0].lo, f->domain_lo);
+    double hi = fmin(args[0].hi, f->domain_hi);
+    if (lo > hi || (f->open_lo && hi <= f->domain_lo)) {
+        return calc_interval_empty();
+    }
+    calc_interval_t result;
+    if (f->decreasing) {
+        result = widen(f->function(hi), f->function(lo), f->ulps);
+    } else {
+        result = widen(f->function(lo), f->function(hi), f->ulps);
+    }
+    if (f->angle_result) {
+        result = angle_result(result, state);
+    }
+    return result;
+}
+
+// Whether x contains offset + k*period for some integer k, allowing for the
+// rounding of offset, period and x (a false positive only loosens the bound)
+static bool contains_periodic_point(calc_interval_t x, double offset, double period) {
+    double slack = 8.0 * DBL_EPSILON * (1.0 + fabs(x.lo) + fabs(x.hi));
+    double k = floor((x.lo - offset) / period);
+    for (int i = 0; i < 3; i++) {
+        double point = offset + (k + i) * period;
+        if (point >= x.lo - slack && point <= x.hi + slack) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// sin and cos share the extremum logic; cos is sin shifted by pi/2
+static calc_interval_t sine_interval(calc_interval_t radians, double maximum_at, double minimum_at,
+                                     double (*function)(double)) {
+    if (!isfinite(radians.lo) || !isfinite(radians.hi) || calc_interval_width(radians) >= TWO_PI) {
+        return calc_interval_make(-1.0, 1.0);
+    }
+    // libm sin/cos reduce arguments exactly and are within an ulp of the result
+    double margin = 2.0 * DBL_EPSILON;
+    double a = function(radians.lo);
+    double b = function(radians.hi);
+    double lo = fmax(-1.0, fmin(a, b) - margin);
+    double hi = fmin(1.0, fmax(a, b) + margin);
+    if (contains_periodic_point(radians, maximum_at, TWO_PI)) {
+        hi = 1.0;
+    }
+    if (contains_periodic_point(radians, minimum_at, TWO_PI)) {
+        lo = -1.0;
+    }
+    return calc_interval_make(lo, hi);
+}
+
+static calc_interval_t sin_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    return sine_interval(angle_argument(args[0], state), HALF_PI, -HALF_PI, sin);
+}
+
+static calc_interval_t cos_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    return sine_interval(angle_argument(args[0], state), 0.0, M_PI, cos);
+}
+
+static calc_interval_t tan_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    calc_interval_t radians = angle_argument(args[0], state);
+    if (!isfinite(radians.lo) || !isfinite(radians.hi) || calc_interval_width(radians) >= M_PI ||
+        contains_periodic_point(radians, HALF_PI, M_PI)) {
+        return calc_interval_entire();
+    }
+    return widen(tan(radians.lo), tan(radians.hi), LIBM_ULPS);
+}
+
+static calc_interval_t reciprocal(calc_interval_t x) {
+    return calc_interval_divide(calc_interval_point(1.0), x);
+}
+
+static calc_interval_t sec_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    return reciprocal(cos_kernel(name, args, state));
+}
+
+static calc_interval_t csc_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    return reciprocal(sin_kernel(name, args, state));
+}
+
+static calc_interval_t cot_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    calc_interval_t t = tan_kernel(name, args, state);
+    if (isinf(t.lo) && isinf(t.hi)) {
+        // Across a pole of tan, cot is still finite near it
+        return calc_interval_divide(cos_kernel(name, args, state), sin_kernel(name, args, state));
+    }
+    return reciprocal(t);
+}
+
+static calc_interval_t abs_interval(calc_interval_t x) {
+    if (x.lo >= 0.0) {
+        return x;
+    }
+    if (x.hi <= 0.0) {
+        return calc_interval_negate(x);
+    }
+    return calc_interval_make(0.0, fmax(-x.lo, x.hi));
+}
+
+static calc_interval_t abs_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    (void)state;
+    return abs_interval(args[0]);
+}
+
+static calc_interval_t cosh_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    (void)state;
+    calc_interval_t magnitude = abs_interval(args[0]);
+    calc_interval_t result = widen(cosh(magnitude.lo), cosh(magnitude.hi), LIBM_ULPS);
+    result.lo = fmax(1.0, result.lo);
+    return result;
+}
+
+static calc_interval_t sech_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    return reciprocal(cosh_kernel(name, args, state));
+}
+
+static calc_interval_t csch_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    return reciprocal(monotone_kernel("sinh", args, state));
+}
+
+static calc_interval_t coth_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    return reciprocal(monotone_kernel("tanh", args, state));
+}
+
+static calc_interval_t logb_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    calc_interval_t x = monotone_kernel("log", &args[0], state);
+    calc_interval_t base = monotone_kernel("log", &args[1], state);
+    return calc_interval_divide(x, base);
+}
+
+static calc_interval_t pow_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    (void)state;
+    return calc_interval_power(args[0], args[1]);
+}
+
+static calc_interval_t mod_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    (void)state;
+    return calc_interval_mod(args[0], args[1]);
+}
+
+static calc_interval_t minmax_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)state;
+    if (strcmp(name, "min") == 0) {
+        return calc_interval_make(fmin(args[0].lo, args[1].lo), fmin(args[0].hi, args[1].hi));
+    }
+    return calc_interval_make(fmax(args[0].lo, args[1].lo), fmax(args[0].hi, args[1].hi));
+}
+
+// Evaluates the scalar function at a point; empty where it is undefined
+static calc_interval_t point_value(const char* name, const double* points, int argc, calc_state_t* state) {
+    double values[MAX_CALL_ARGS];
+    memcpy(values, points, argc * sizeof(double));
+    parse_error_t error = PARSE_SUCCESS;
+    double value = evaluate_function(name, values, argc, state, &error);
+    if (error != PARSE_SUCCESS) {
+        return calc_interval_empty();
+    }
+    return widen(value, value, LIBM_ULPS);
+}
+
+// Truncation toward zero as applied to integer arguments, saturating
+static double truncate_argument(double x) {
+    if (isnan(x)) {
+        return 0.0;
+    }
+    return fmax(-9223372036854775807.0, fmin(9223372036854775807.0, trunc(x)));
+}
+
+// Integer functions: exact only where every argument truncates to one integer
+static calc_interval_t integer_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    int argc = (strcmp(name, "perm") == 0 || strcmp(name, "comb") == 0 || strcmp(name, "gcd") == 0 ||
+                strcmp(name, "lcm") == 0 || strcmp(name, "lnperm") == 0 || strcmp(name, "lncomb") == 0) ? 2 : 1;
+    double points[2];
+    for (int i = 0; i < argc; i++) {
+        points[i] = truncate_argument(args[i].lo);
+        if (truncate_argument(args[i].hi) != points[i]) {
+            if (strcmp(name, "isprime") == 0) {
+                return calc_interval_make(0.0, 1.0);
+            }
+            return calc_interval_entire();
+        }
+    }
+    return point_value(name, points, argc, state);
+}
+
+// factorial and lnfactorial increase with the truncated argument
+static calc_interval_t factorial_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)state;
+    double lo = fmax(0.0, truncate_argument(args[0].lo));
+    double hi = truncate_argument(args[0].hi);
+    if (hi < 0.0) {
+        return calc_interval_empty();
+    }
+    bool logarithm = strcmp(name, "lnfactorial") == 0;
+    double values[2];
+    double endpoints[2] = {lo, hi};
+    for (int i = 0; i < 2; i++) {
+        calc_result_t r = logarithm ? calc_lnfactorial((int64_t)endpoints[i])
+                                    : calc_factorial((int64_t)endpoints[i]);
+        values[i] = r.has_error ? INFINITY : r.value;
+    }
+    return widen(values[0], values[1], logarithm ? LIBM_ULPS : 1);
+}
+
+static calc_interval_t gamma_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    calc_interval_t x = args[0];
+    if (x.lo <= 0.0) {
+        if (is_point(x)) {
+            return point_value(name, &x.lo, 1, state);
+        }
+        // Poles at the non-positive integers
+        return calc_interval_entire();
+    }
+    if (x.lo >= GAMMA_MIN_X) {
+        return widen(tgamma(x.lo), tgamma(x.hi), LIBM_ULPS);
+    }
+    if (x.hi <= GAMMA_MIN_X) {
+        return widen(tgamma(x.hi), tgamma(x.lo), LIBM_ULPS);
+    }
+    return widen(GAMMA_MIN_VALUE, fmax(tgamma(x.lo), tgamma(x.hi)), LIBM_ULPS);
+}
+
+static calc_interval_t nthrt_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    (void)name;
+    (void)state;
+    double n = trunc(args[1].lo);
+    if (trunc(args[1].hi) != n || fabs(n) > INT_MAX) {
+        return calc_interval_entire();
+    }
+    if (n == 0.0) {
+        return calc_interval_empty();
+    }
+    calc_interval_t exponent = calc_interval_make(div_down(1.0, n), div_up(1.0, n));
+    calc_interval_t x = args[0];
+    if (fmod(n, 2.0) != 0.0) {
+        // Odd roots are real on both sides of zero, -(|x|^(1/n)) below it;
+        // the two halves are joined (an empty half is [inf, -inf])
+        calc_interval_t above = calc_interval_empty();
+        calc_interval_t below = calc_interval_empty();
+        if (x.hi >= 0.0) {
+            above = calc_interval_power(calc_interval_make(fmax(x.lo, 0.0), x.hi), exponent);
+        }
+        if (x.lo < 0.0) {
+            below = calc_interval_negate(
+                calc_interval_power(calc_interval_make(-fmin(x.hi, 0.0), -x.lo), exponent));
+        }
+        return calc_interval_make(fmin(above.lo, below.lo), fmax(above.hi, below.hi));
+    }
+    // Even roots are real for x >= 0 only
+    x.lo = fmax(x.lo, 0.0);
+    if (x.lo > x.hi) {
+        return calc_interval_empty();
+    }
+    return calc_interval_power(x, exponent);
+}
+
+static calc_interval_t atan2_kernel(const char* name, const calc_interval_t* args, calc_state_t* state) {
+    if (is_point(args[0]) && is_point(args[1])) {
+        double points[2] = {args[0].lo, args[1].lo};
+        return point_value(name, points, 2, state);
+    }
+    return angle_result(calc_interval_make(next_down(-M_PI), next_up(M_PI)), state);
+}
+
+static const struct {
+    const char* name;
+    int arg_count;
+    interval_kernel_t kernel;
+} interval_functions[] = {
+    {"sin", 1, sin_kernel}, {"cos", 1, cos_kernel}, {"tan", 1, tan_kernel},
+    {"sec", 1, sec_kernel}, {"csc", 1, csc_kernel}, {"cot", 1, cot_kernel},
+    {"asin", 1, monotone_kernel}, {"acos", 1, monotone_kernel}, {"atan", 1, monotone_kernel},
+    {"sinh", 1, monotone_kernel}, {"cosh", 1, cosh_kernel}, {"tanh", 1, monotone_kernel},
+    {"sech", 1, sech_kernel}, {"csch", 1, csch_kernel}, {"coth", 1, coth_kernel},
+    {"log", 1, monotone_kernel}, {"ln", 1, monotone_kernel}, {"log10", 1, monotone_kernel},
+    {"log2", 1, monotone_kernel}, {"logb", 2, logb_kernel},
+    {"exp", 1, monotone_kernel}, {"exp10", 1, monotone_kernel}, {"exp2", 1, monotone_kernel},
+    {"sqrt", 1, monotone_kernel}, {"cbrt", 1, monotone_kernel}, {"nthrt", 2, nthrt_kernel},
+    {"pow", 2, pow_kernel},
+    {"abs", 1, abs_kernel}, {"floor", 1, monotone_kernel}, {"ceil", 1, monotone_kernel},
+    {"round", 1, monotone_kernel}, {"mod", 2, mod_kernel},
+    {"factorial", 1, factorial_kernel}, {"gamma", 1, gamma_kernel},
+    {"perm", 2, integer_kernel}, {"comb", 2, integer_kernel},
+    {"gcd", 2, integer_kernel}, {"lcm", 2, integer_kernel},
+    {"lnfactorial", 1, factorial_kernel}, {"lnperm", 2, integer_kernel}, {"lncomb", 2, integer_kernel},
+    {"isprime", 1, integer_kernel}, {"factor", 1, integer_kernel}, {"nextprime", 1, integer_kernel},
+    {"phi", 1, integer_kernel}, {"primepi", 1, integer_kernel},
+    {"min", 2, minmax_kernel}, {"max", 2, minmax_kernel}, {"atan2", 2, atan2_kernel},
+    {NULL, 0, NULL}
+};
+
+calc_error_t calc_interval_call(const char* name, const calc_interval_t* args, int argc,
+                                calc_state_t* state, calc_interval_t* out) {
+    if (!name || !args || !state || !out) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    for (int i = 0; interval_functions[i].name != NULL; i++) {
+        if (strcmp(name, interval_functions[i].name) != 0) {
+            continue;
+        }
+        if (argc != interval_functions[i].arg_count) {
+            return CALC_ERROR_INVALID_FUNCTION;
+        }
+        for (int j = 0; j < argc; j++) {
+            if (calc_interval_is_empty(args[j]) || isnan(args[j].lo) || isnan(args[j].hi)) {
+                *out = calc_interval_empty();
+                return CALC_SUCCESS;
+            }
+        }
+        *out = interval_functions[i].kernel(name, args, state);
+        return CALC_SUCCESS;
+    }
+    return CALC_ERROR_INVALID_FUNCTION;
+}
+
+// A literal is value + value_lo exactly; an unknown tail widens both ways
+static calc_interval_t constant_interval(double value, double value_lo) {
+    if (value_lo > 0.0) {
+        return calc_interval_make(value, next_up(value));
+    }
+    if (value_lo < 0.0) {
+        return calc_interval_make(next_down(value), value);
+    }
+    if (calc_is_integer(value)) {
+        return calc_interval_point(value);
+    }
+    return calc_interval_make(next_down(value), next_up(value));
+}
+
+calc_error_t calc_program_evaluate_interval(const calc_program_t* program, calc_state_t* state,
+                                            const calc_interval_t* variables, calc_interval_t* out) {
+    if (!program || program->length == 0 || !state || !out) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    calc_interval_t local[LOCAL_STACK_SIZE];
+    calc_interval_t* stack = local;
+    if (program->max_stack > LOCAL_STACK_SIZE) {
+        stack = calc_arena_alloc(&state->arena, program->max_stack * sizeof(calc_interval_t));
+        if (!stack) {
+            return CALC_ERROR_MEMORY_ERROR;
+        }
+    }
+
+    calc_error_t error = CALC_SUCCESS;
+    int sp = 0;
+    for (int pc = 0; pc < program->length && error == CALC_SUCCESS; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        switch (instr->op) {
+            case OP_CONST:
+                stack[sp++] = constant_interval(instr->value, instr->value_lo);
+                break;
+            case OP_VARIABLE:
+                if (!variables) {
+                    error = CALC_ERROR_INVALID_INPUT;
+                    break;
+                }
+                stack[sp++] = variables[instr->index];
+                break;
+            case OP_ANS:
+                stack[sp++] = calc_interval_point(state->last_result);
+                break;
+            case OP_MEMORY:
+                stack[sp++] = calc_interval_point(calc_memory_recall(state));
+                break;
+            case OP_NEGATE:
+                stack[sp - 1] = calc_interval_negate(stack[sp - 1]);
+                break;
+            case OP_ADD:
+                sp--;
+                stack[sp - 1] = calc_interval_add(stack[sp - 1], stack[sp]);
+                break;
+            case OP_SUBTRACT:
+                sp--;
+                stack[sp - 1] = calc_interval_subtract(stack[sp - 1], stack[sp]);
+                break;
+            case OP_MULTIPLY:
+                sp--;
+                stack[sp - 1] = calc_interval_multiply(stack[sp - 1], stack[sp]);
+                break;
+            case OP_DIVIDE:
+                sp--;
+                stack[sp - 1] = calc_interval_divide(stack[sp - 1], stack[sp]);
+                break;
+            case OP_MODULO:
+                sp--;
+                stack[sp - 1] = calc_interval_mod(stack[sp - 1], stack[sp]);
+                break;
+            case OP_POWER:
+                sp--;
+                stack[sp - 1] = calc_interval_power(stack[sp - 1], stack[sp]);
+                break;
+            case OP_CALL: {
+                const char* name = get_function_name(instr->index);
+                sp -= instr->argc;
+                if (!name) {
+                    error = CALC_ERROR_INVALID_FUNCTION;
+                    break;
+                }
+                error = calc_interval_call(name, &stack[sp], instr->argc, state, &stack[sp]);
+                sp++;
+                break;
+            }
+        }
+    }
+
+    if (error == CALC_SUCCESS) {
+        *out = stack[0];
+    }
+    calc_arena_reset(&state->arena, mark);
+    return error;
+}
+
+// Resolves the variable slots of a program that may only use the given names
+static calc_error_t bind_variables(const calc_program_t* program, const char* const* names, int count,
+                                   int* slots) {
+    for (int i = 0; i < count; i++) {
+        slots[i] = names[i] ? calc_program_variable_index(program, names[i]) : -1;
+    }
+    for (int v = 0; v < program->variable_count; v++) {
+        bool bound = false;
+        for (int i = 0; i < count; i++) {
+            bound = bound || slots[i] == v;
+        }
+        if (!bound) {
+            return CALC_ERROR_INVALID_INPUT;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_implicit_plot(const calc_program_t* program, calc_state_t* state,
+                                const char* x_name, const char* y_name,
+                                calc_plot_cell_t region, int max_depth,
+                                calc_plot_callback_t emit, void* context, size_t* evaluations) {
+    if (evaluations) {
+        *evaluations = 0;
+    }
+    if (!program || !state || !emit || max_depth < 0 || max_depth > CALC_PLOT_MAX_DEPTH ||
+        !(region.x0 < region.x1) || !(region.y0 < region.y1) ||
+        !isfinite(region.x0) || !isfinite(region.x1) || !isfinite(region.y0) || !isfinite(region.y1)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    const char* names[2] = {x_name, y_name};
+    int slots[2];
+    calc_error_t error = bind_variables(program, names, 2, slots);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+
+    // Depth-first: each level leaves at most three siblings waiting
+    struct {
+        calc_plot_cell_t cell;
+        int depth;
+    } stack[3 * CALC_PLOT_MAX_DEPTH + 1];
+    int sp = 0;
+    stack[sp].cell = region;
+    stack[sp].depth = 0;
+    sp++;
+
+    calc_interval_t variables[CALC_MAX_PROGRAM_VARIABLES];
+    size_t count = 0;
+    while (sp > 0) {
+        sp--;
+        calc_plot_cell_t cell = stack[sp].cell;
+        int depth = stack[sp].depth;
+
+        if (slots[0] >= 0) {
+            variables[slots[0]] = calc_interval_make(cell.x0, cell.x1);
+        }
+        if (slots[1] >= 0) {
+            variables[slots[1]] = calc_interval_make(cell.y0, cell.y1);
+        }
+        calc_interval_t value;
+        error = calc_program_evaluate_interval(program, state, variables, &value);
+        count++;
+        if (error != CALC_SUCCESS) {
+            break;
+        }
+        if (!calc_interval_contains(value, 0.0)) {
+            continue;
+        }
+        if (depth == max_depth) {
+            emit(&cell, context);
+            continue;
+        }
+
+        double xm = cell.x0 + (cell.x1 - cell.x0) / 2;
+        double ym = cell.y0 + (cell.y1 - cell.y0) / 2;
+        calc_plot_cell_t children[4] = {
+            {cell.x0, ym, xm, cell.y1}, {xm, ym, cell.x1, cell.y1},
+            {xm, cell.y0, cell.x1, ym}, {cell.x0, cell.y0, xm, ym}
+        };
+        // Pushed in reverse so cells are emitted bottom-left first
+        for (int i = 0; i < 4; i++) {
+            stack[sp].cell = children[i];
+            stack[sp].depth = depth + 1;
+            sp++;
+        }
+    }
+
+    if (evaluations) {
+        *evaluations = count;
+    }
+    return error;
+}
+
+calc_error_t calc_isolate_roots(const calc_program_t* program, calc_state_t* state,
+                                const char* variable, double lo, double hi, double tolerance,
+                                calc_interval_t* roots, size_t capacity, size_t* count) {
+    if (count) {
+        *count = 0;
+    }
+    if (!program || !state || !count || (capacity > 0 && !roots) ||
+        !isfinite(lo) || !isfinite(hi) || lo > hi || !(tolerance > 0.0)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    const char* names[1] = {variable};
+    int slot;
+    calc_error_t error = bind_variables(program, names, 1, &slot);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+
+    size_t stack_capacity = ROOT_STACK_SIZE;
+    calc_interval_t* stack = malloc(stack_capacity * sizeof(calc_interval_t));
+    if (!stack) {
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+    size_t sp = 0;
+    stack[sp++] = calc_interval_make(lo, hi);
+
+    calc_interval_t variables[CALC_MAX_PROGRAM_VARIABLES];
+    size_t found = 0;
+    while (sp > 0 && error == CALC_SUCCESS) {
+        calc_interval_t x = stack[--sp];
+        if (slot >= 0) {
+            variables[slot] = x;
+        }
+        calc_interval_t value;
+        error = calc_program_evaluate_interval(program, state, variables, &value);
+        if (error != CALC_SUCCESS || !calc_interval_contains(value, 0.0)) {
+            continue;
+        }
+
+        double mid = x.lo + (x.hi - x.lo) / 2;
+        if (x.hi - x.lo <= tolerance || mid <= x.lo || mid >= x.hi) {
+            // Cells arrive in ascending order; touching candidates merge
+            if (found > 0 && roots[found - 1].hi >= x.lo) {
+                roots[found - 1].hi = x.hi;
+            } else if (found == capacity) {
+                error = CALC_ERROR_OVERFLOW;
+            } else {
+                roots[found++] = x;
+            }
+            continue;
+        }
+
+        if (sp + 2 > stack_capacity) {
+            calc_interval_t* grown = realloc(stack, 2 * stack_capacity * sizeof(calc_interval_t));
+            if (!grown) {
+                error = CALC_ERROR_MEMORY_ERROR;
+                break;
+            }
+            stack = grown;
+            stack_capacity *= 2;
+        }
+        stack[sp++] = calc_interval_make(mid, x.hi);
+        stack[sp++] = calc_interval_make(x.lo, mid);
+    }
+
+    free(stack);
+    *count = found;
+    return error;
+}
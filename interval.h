@@ -0,0 +1,73 @@
+#ifndef INTERVAL_H
+#define INTERVAL_H
+
+#include "calculator_engine.h"
+#include "expression_compiler.h"
+#include <stdbool.h>
+#include <stddef.h>
+
+// Deepest quadtree level of an implicit plot (4^depth cells at most)
+#define CALC_PLOT_MAX_DEPTH 16
+
+// Closed interval [lo, hi]. Results are guaranteed enclosures: every value a
+// function takes on the input intervals lies inside the output interval.
+// The empty interval (lo > hi) stands for "undefined everywhere", e.g.
+// sqrt([-2, -1]); parts of an input outside a function's domain are dropped.
+typedef struct {
+    double lo;
+    double hi;
+} calc_interval_t;
+
+// Rectangle of an implicit plot
+typedef struct {
+    double x0;
+    double y0;
+    double x1;
+    double y1;
+} calc_plot_cell_t;
+
+// Receives each smallest cell that may contain part of the curve
+typedef void (*calc_plot_callback_t)(const calc_plot_cell_t* cell, void* context);
+
+// Function prototypes
+
+// Construction and queries
+calc_interval_t calc_interval_make(double lo, double hi);
+calc_interval_t calc_interval_point(double x);
+calc_interval_t calc_interval_empty(void);
+calc_interval_t calc_interval_entire(void);
+bool calc_interval_is_empty(calc_interval_t x);
+bool calc_interval_contains(calc_interval_t x, double value);
+double calc_interval_width(calc_interval_t x);
+
+// Operators, with outward rounding
+calc_interval_t calc_interval_add(calc_interval_t a, calc_interval_t b);
+calc_interval_t calc_interval_subtract(calc_interval_t a, calc_interval_t b);
+calc_interval_t calc_interval_multiply(calc_interval_t a, calc_interval_t b);
+calc_interval_t calc_interval_divide(calc_interval_t a, calc_interval_t b);
+calc_interval_t calc_interval_negate(calc_interval_t a);
+calc_interval_t calc_interval_mod(calc_interval_t a, calc_interval_t b);
+calc_interval_t calc_interval_power(calc_interval_t base, calc_interval_t exponent);
+
+// Any builtin function by name (same names as in expressions)
+calc_error_t calc_interval_call(const char* name, const calc_interval_t* args, int argc,
+                                calc_state_t* state, calc_interval_t* out);
+
+// Evaluates a compiled expression; variables[i] binds program->variable_names[i]
+calc_error_t calc_program_evaluate_interval(const calc_program_t* program, calc_state_t* state,
+                                            const calc_interval_t* variables, calc_interval_t* out);
+
+// Implicit curve f(x, y) = 0 by quadtree subdivision of region down to max_depth
+calc_error_t calc_implicit_plot(const calc_program_t* program, calc_state_t* state,
+                                const char* x_name, const char* y_name,
+                                calc_plot_cell_t region, int max_depth,
+                                calc_plot_callback_t emit, void* context, size_t* evaluations);
+
+// Disjoint intervals, in ascending order, that together contain every root of
+// f(variable) in [lo, hi]. Cells are bisected down to tolerance and touching
+// candidates merge, so a root cluster yields one wider interval.
+calc_error_t calc_isolate_roots(const calc_program_t* program, calc_state_t* state,
+                                const char* variable, double lo, double hi, double tolerance,
+                                calc_interval_t* roots, size_t capacity, size_t* count);
+
+#endif // INTERVAL_H
@@ -0,0 +1,785 @@
+#include "jit.h"
+#include "expression_parser.h"
+#include "trig.h"
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+#if (defined(__x86_64__) || defined(__aarch64__)) && defined(__linux__)
+#define JIT_NATIVE 1
+#include <sys/mman.h>
+#else
+#define JIT_NATIVE 0
+#endif
+
+// Generated code stores the result in out[0] and, in out[1], the sum of
+// v - v over every value that may hide an error (leaves, quotients, powers,
+// remainders and function results). That sum is 0 unless one of them was
+// not finite, in which case the checked evaluator replays the program.
+typedef void (*jit_entry_t)(const double* inputs, const double* constants, double* out);
+
+// Layout of the inputs array
+#define INPUT_ANS 0
+#define INPUT_MEMORY 1
+#define INPUT_VARIABLES 2
+
+struct calc_jit {
+    const calc_program_t* program;
+    bool degrees;
+    void* code;             // executable mapping, NULL when interpreting
+    size_t code_size;
+    double* constants;
+};
+
+typedef struct {
+    uint8_t* data;
+    size_t length;
+    size_t capacity;
+    bool failed;
+    double* constants;
+    int constant_count;
+    int constant_capacity;
+    int max_stack;          // home slots in the frame; the accumulator slot follows
+    bool degrees;
+} emitter_t;
+
+typedef double (*unary_fn_t)(double);
+
+typedef enum {
+    ANGLE_NONE,
+    ANGLE_IN,       // degrees_fn takes the argument in degrees
+    ANGLE_OUT       // result converted to degrees
+} angle_t;
+
+// Functions called straight into libm or trig.c. Each gives the same value
+// as its kernel wherever the kernel succeeds; where the kernel reports an
+// error the direct result is not finite, which triggers the checked replay.
+static const struct {
+    const char* name;
+    unary_fn_t fn;
+    angle_t angle;
+    unary_fn_t degrees_fn;
+} direct_functions[] = {
+    {"sin", calc_sinr, ANGLE_IN, calc_sind}, {"cos", calc_cosr, ANGLE_IN, calc_cosd},
+    {"atan", atan, ANGLE_OUT, NULL},
+    {"sinh", sinh, ANGLE_NONE, NULL}, {"cosh", cosh, ANGLE_NONE, NULL}, {"tanh", tanh, ANGLE_NONE, NULL},
+    {"exp", exp, ANGLE_NONE, NULL}, {"log", log, ANGLE_NONE, NULL}, {"ln", log, ANGLE_NONE, NULL},
+    {"log10", log10, ANGLE_NONE, NULL}, {"log2", log2, ANGLE_NONE, NULL}, {"cbrt", cbrt, ANGLE_NONE, NULL},
+    {"floor", floor, ANGLE_NONE, NULL}, {"ceil", ceil, ANGLE_NONE, NULL}, {"round", round, ANGLE_NONE, NULL},
+    {NULL, NULL, ANGLE_NONE, NULL}
+};
+
+// Code buffer
+static void emit_bytes(emitter_t* e, const void* bytes, size_t count) {
+    if (e->failed) {
+        return;
+    }
+    if (e->length + count > e->capacity) {
+        size_t capacity = e->capacity ? e->capacity * 2 : 1024;
+        while (capacity < e->length + count) {
+            capacity *= 2;
+        }
+        uint8_t* data = realloc(e->data, capacity);
+        if (!data) {
+            e->failed = true;
+            return;
+        }
+        e->data = data;
+        e->capacity = capacity;
+    }
+    memcpy(e->data + e->length, bytes, count);
+    e->length += count;
+}
+
+static void emit_u8(emitter_t* e, uint8_t byte) {
+    emit_bytes(e, &byte, 1);
+}
+
+static void emit_u32(emitter_t* e, uint32_t word) {
+    uint8_t bytes[4] = {word & 0xFF, (word >> 8) & 0xFF, (word >> 16) & 0xFF, word >> 24};
+    emit_bytes(e, bytes, 4);
+}
+
+// Index of a constant in the pool, shared between equal values
+static int add_constant(emitter_t* e, double value) {
+    for (int i = 0; i < e->constant_count; i++) {
+        if (memcmp(&e->constants[i], &value, sizeof(value)) == 0) {
+            return i;
+        }
+    }
+    if (e->constant_count == CALC_JIT_MAX_CONSTANTS) {
+        e->failed = true;
+        return 0;
+    }
+    if (e->constant_count == e->constant_capacity) {
+        int capacity = e->constant_capacity ? e->constant_capacity * 2 : 16;
+        double* constants = realloc(e->constants, capacity * sizeof(double));
+        if (!constants) {
+            e->failed = true;
+            return 0;
+        }
+        e->constants = constants;
+        e->constant_capacity = capacity;
+    }
+    e->constants[e->constant_count] = value;
+    return e->constant_count++;
+}
+
+static int frame_size(int max_stack) {
+    return ((max_stack + 1) * 8 + 15) & ~15;
+}
+
+#if JIT_NATIVE && defined(__x86_64__)
+
+// x86-64 (System V). Stack depths 0..5 live in xmm8..xmm13, deeper ones in
+// their frame slots; xmm14 is the accumulator and xmm0, xmm1, xmm15 scratch.
+// Every xmm register is caller-saved, so calls spill the live ones.
+#define REGISTER_SLOTS 6
+#define XMM_ACC 14
+#define XMM_SCRATCH 15
+
+enum { RAX = 0, RDX = 2, RBX = 3, RSP = 4, RSI = 6, RDI = 7, R12 = 12, R13 = 13 };
+
+#define BASE_INPUTS RBX
+#define BASE_CONSTANTS R12
+#define BASE_OUT R13
+
+static bool in_register(int depth) {
+    return depth < REGISTER_SLOTS;
+}
+
+static int slot_register(int depth) {
+    return 8 + depth;
+}
+
+static int32_t slot_offset(int depth) {
+    return depth * 8;
+}
+
+// prefix [REX] 0F opcode with a register operand
+static void sse_rr(emitter_t* e, uint8_t prefix, uint8_t opcode, int reg, int rm) {
+    emit_u8(e, prefix);
+    if (reg >= 8 || rm >= 8) {
+        emit_u8(e, 0x40 | ((reg >= 8) << 2) | (rm >= 8));
+    }
+    emit_u8(e, 0x0F);
+    emit_u8(e, opcode);
+    emit_u8(e, 0xC0 | ((reg & 7) << 3) | (rm & 7));
+}
+
+// prefix [REX] 0F opcode with a [base + disp32] operand
+static void sse_rm(emitter_t* e, uint8_t prefix, uint8_t opcode, int reg, int base, int32_t disp) {
+    emit_u8(e, prefix);
+    if (reg >= 8 || base >= 8) {
+        emit_u8(e, 0x40 | ((reg >= 8) << 2) | (base >= 8));
+    }
+    emit_u8(e, 0x0F);
+    emit_u8(e, opcode);
+    emit_u8(e, 0x80 | ((reg & 7) << 3) | (base & 7));
+    if ((base & 7) == RSP) {
+        emit_u8(e, 0x24);
+    }
+    emit_u32(e, (uint32_t)disp);
+}
+
+static void movsd_load(emitter_t* e, int xmm, int base, int32_t disp) {
+    sse_rm(e, 0xF2, 0x10, xmm, base, disp);
+}
+
+static void movsd_store(emitter_t* e, int base, int32_t disp, int xmm) {
+    sse_rm(e, 0xF2, 0x11, xmm, base, disp);
+}
+
+static void movapd(emitter_t* e, int dst, int src) {
+    if (dst != src) {
+        sse_rr(e, 0x66, 0x28, dst, src);
+    }
+}
+
+static void mov_rax_imm64(emitter_t* e, uint64_t value) {
+    emit_u8(e, 0x48);
+    emit_u8(e, 0xB8);
+    emit_u32(e, (uint32_t)value);
+    emit_u32(e, (uint32_t)(value >> 32));
+}
+
+// movq xmm, rax
+static void movq_from_rax(emitter_t* e, int xmm) {
+    emit_u8(e, 0x66);
+    emit_u8(e, 0x48 | ((xmm >= 8) << 2));
+    emit_u8(e, 0x0F);
+    emit_u8(e, 0x6E);
+    emit_u8(e, 0xC0 | ((xmm & 7) << 3) | RAX);
+}
+
+static void get_value(emitter_t* e, int xmm, int depth) {
+    if (in_register(depth)) {
+        movapd(e, xmm, slot_register(depth));
+    } else {
+        movsd_load(e, xmm, RSP, slot_offset(depth));
+    }
+}
+
+static void put_value(emitter_t* e, int depth, int xmm) {
+    if (in_register(depth)) {
+        movapd(e, slot_register(depth), xmm);
+    } else {
+        movsd_store(e, RSP, slot_offset(depth), xmm);
+    }
+}
+
+static void gen_prologue(emitter_t* e) {
+    static const uint8_t code[] = {
+        0x53,                   // push rbx
+        0x41, 0x54,             // push r12
+        0x41, 0x55,             // push r13
+        0x48, 0x89, 0xFB,       // mov rbx, rdi
+        0x49, 0x89, 0xF4,       // mov r12, rsi
+        0x49, 0x89, 0xD5,       // mov r13, rdx
+        0x48, 0x81, 0xEC        // sub rsp, imm32
+    };
+    emit_bytes(e, code, sizeof(code));
+    emit_u32(e, (uint32_t)frame_size(e->max_stack));
+    sse_rr(e, 0x66, 0x57, XMM_ACC, XMM_ACC);    // xorpd acc, acc
+}
+
+static void gen_epilogue(emitter_t* e) {
+    get_value(e, 0, 0);
+    movsd_store(e, BASE_OUT, 0, 0);
+    movsd_store(e, BASE_OUT, 8, XMM_ACC);
+    emit_u8(e, 0x48);                           // add rsp, imm32
+    emit_u8(e, 0x81);
+    emit_u8(e, 0xC4);
+    emit_u32(e, (uint32_t)frame_size(e->max_stack));
+    static const uint8_t code[] = {
+        0x41, 0x5D,             // pop r13
+        0x41, 0x5C,             // pop r12
+        0x5B,                   // pop rbx
+        0xC3                    // ret
+    };
+    emit_bytes(e, code, sizeof(code));
+}
+
+static void gen_load(emitter_t* e, int depth, bool from_constants, int index) {
+    int base = from_constants ? BASE_CONSTANTS : BASE_INPUTS;
+    if (in_register(depth)) {
+        movsd_load(e, slot_register(depth), base, index * 8);
+    } else {
+        movsd_load(e, 0, base, index * 8);
+        put_value(e, depth, 0);
+    }
+}
+
+// acc += v - v
+static void gen_check(emitter_t* e, int depth) {
+    get_value(e, XMM_SCRATCH, depth);
+    sse_rr(e, 0xF2, 0x5C, XMM_SCRATCH, XMM_SCRATCH);
+    sse_rr(e, 0xF2, 0x58, XMM_ACC, XMM_SCRATCH);
+}
+
+static void gen_binary(emitter_t* e, calc_opcode_t op, int depth) {
+    uint8_t opcode = op == OP_ADD ? 0x58 : op == OP_SUBTRACT ? 0x5C : op == OP_MULTIPLY ? 0x59 : 0x5E;
+    if (in_register(depth + 1)) {
+        sse_rr(e, 0xF2, opcode, slot_register(depth), slot_register(depth + 1));
+    } else {
+        get_value(e, 0, depth);
+        get_value(e, 1, depth + 1);
+        sse_rr(e, 0xF2, opcode, 0, 1);
+        put_value(e, depth, 0);
+    }
+}
+
+// Flips (xorpd) or clears (andpd) the sign bit
+static void gen_sign(emitter_t* e, int depth, bool negate) {
+    mov_rax_imm64(e, negate ? 0x8000000000000000ULL : 0x7FFFFFFFFFFFFFFFULL);
+    movq_from_rax(e, XMM_SCRATCH);
+    get_value(e, 0, depth);
+    sse_rr(e, 0x66, negate ? 0x57 : 0x54, 0, XMM_SCRATCH);
+    put_value(e, depth, 0);
+}
+
+static void gen_sqrt(emitter_t* e, int depth) {
+    get_value(e, 0, depth);
+    sse_rr(e, 0xF2, 0x51, 0, 0);
+    put_value(e, depth, 0);
+}
+
+// v = v * constants[multiply] / constants[divide]
+static void gen_scale(emitter_t* e, int depth, int multiply, int divide) {
+    get_value(e, 0, depth);
+    sse_rm(e, 0xF2, 0x59, 0, BASE_CONSTANTS, multiply * 8);
+    sse_rm(e, 0xF2, 0x5E, 0, BASE_CONSTANTS, divide * 8);
+    put_value(e, depth, 0);
+}
+
+// Saves the register slots below depth, and the accumulator, across a call
+static void spill(emitter_t* e, int depth, bool save) {
+    for (int d = 0; d < depth && in_register(d); d++) {
+        if (save) {
+            movsd_store(e, RSP, slot_offset(d), slot_register(d));
+        } else {
+            movsd_load(e, slot_register(d), RSP, slot_offset(d));
+        }
+    }
+    if (save) {
+        movsd_store(e, RSP, slot_offset(e->max_stack), XMM_ACC);
+    } else {
+        movsd_load(e, XMM_ACC, RSP, slot_offset(e->max_stack));
+    }
+}
+
+static void call_address(emitter_t* e, const void* target) {
+    mov_rax_imm64(e, (uint64_t)(uintptr_t)target);
+    emit_u8(e, 0xFF);                           // call rax
+    emit_u8(e, 0xD0);
+}
+
+// Result of fn(v[depth]) or fn(v[depth], v[depth + 1]) into v[depth]
+static void gen_call(emitter_t* e, const void* fn, int depth, int argc) {
+    spill(e, depth, true);
+    get_value(e, 0, depth);
+    if (argc == 2) {
+        get_value(e, 1, depth + 1);
+    }
+    call_address(e, fn);
+    put_value(e, depth, 0);
+    spill(e, depth, false);
+}
+
+// kernel(&v[depth], degrees) into v[depth]
+static void gen_call_kernel(emitter_t* e, calc_kernel_t kernel, int depth, int argc) {
+    spill(e, depth, true);
+    for (int d = depth; d < depth + argc; d++) {
+        if (in_register(d)) {
+            movsd_store(e, RSP, slot_offset(d), slot_register(d));
+        }
+    }
+    static const uint8_t lea_rdi[] = {0x48, 0x8D, 0xBC, 0x24};     // lea rdi, [rsp + disp32]
+    emit_bytes(e, lea_rdi, sizeof(lea_rdi));
+    emit_u32(e, (uint32_t)slot_offset(depth));
+    emit_u8(e, 0xBE);                                               // mov esi, imm32
+    emit_u32(e, e->degrees ? 1 : 0);
+    call_address(e, (const void*)kernel);
+    put_value(e, depth, 0);
+    spill(e, depth, false);
+}
+
+#elif JIT_NATIVE && defined(__aarch64__)
+
+// arm64 (AAPCS64). Stack depths 0..6 live in d8..d14 and d15 is the
+// accumulator; all are callee-saved, so calls spill nothing. x19, x20 and
+// x21 hold the inputs, constants and out pointers; d0, d1, d16 are scratch.
+#define REGISTER_SLOTS 7
+#define D_ACC 15
+#define D_SCRATCH 16
+
+enum { X16 = 16, X19 = 19, X20 = 20, X21 = 21, SP = 31 };
+
+#define BASE_INPUTS X19
+#define BASE_CONSTANTS X20
+#define BASE_OUT X21
+
+static bool in_register(int depth) {
+    return depth < REGISTER_SLOTS;
+}
+
+static int slot_register(int depth) {
+    return 8 + depth;
+}
+
+static int32_t slot_offset(int depth) {
+    return depth * 8;
+}
+
+// ldr/str d, [base, #offset] (offset a multiple of 8 below 32768)
+static void ldr_d(emitter_t* e, int d, int base, int32_t offset) {
+    emit_u32(e, 0xFD400000 | ((uint32_t)offset / 8) << 10 | base << 5 | d);
+}
+
+static void str_d(emitter_t* e, int d, int base, int32_t offset) {
+    emit_u32(e, 0xFD000000 | ((uint32_t)offset / 8) << 10 | base << 5 | d);
+}
+
+static void fmov(emitter_t* e, int dst, int src) {
+    if (dst != src) {
+        emit_u32(e, 0x1E604000 | src << 5 | dst);
+    }
+}
+
+static void fp_binary(emitter_t* e, uint32_t opcode, int d, int n, int m) {
+    emit_u32(e, opcode | m << 16 | n << 5 | d);
+}
+
+static void fp_unary(emitter_t* e, uint32_t opcode, int d, int n) {
+    emit_u32(e, opcode | n << 5 | d);
+}
+
+// movz/movk sequence for a 64-bit immediate
+static void mov_imm64(emitter_t* e, int reg, uint64_t value) {
+    emit_u32(e, 0xD2800000 | (uint32_t)(value & 0xFFFF) << 5 | reg);
+    for (int hw = 1; hw < 4; hw++) {
+        uint32_t part = (value >> (16 * hw)) & 0xFFFF;
+        if (part) {
+            emit_u32(e, 0xF2800000 | hw << 21 | part << 5 | reg);
+        }
+    }
+}
+
+static void get_value(emitter_t* e, int d, int depth) {
+    if (in_register(depth)) {
+        fmov(e, d, slot_register(depth));
+    } else {
+        ldr_d(e, d, SP, slot_offset(depth));
+    }
+}
+
+static void put_value(emitter_t* e, int depth, int d) {
+    if (in_register(depth)) {
+        fmov(e, slot_register(depth), d);
+    } else {
+        str_d(e, d, SP, slot_offset(depth));
+    }
+}
+
+// Register holding v[depth], loading it into scratch if it is in memory
+static int value_register(emitter_t* e, int depth, int scratch) {
+    if (in_register(depth)) {
+        return slot_register(depth);
+    }
+    ldr_d(e, scratch, SP, slot_offset(depth));
+    return scratch;
+}
+
+static void gen_prologue(emitter_t* e) {
+    static const uint32_t code[] = {
+        0xA9B97BFD,             // stp x29, x30, [sp, #-112]!
+        0x910003FD,             // mov x29, sp
+        0xA90153F3,             // stp x19, x20, [sp, #16]
+        0xA9025BF5,             // stp x21, x22, [sp, #32]
+        0x6D0327E8,             // stp d8, d9, [sp, #48]
+        0x6D042FEA,             // stp d10, d11, [sp, #64]
+        0x6D0537EC,             // stp d12, d13, [sp, #80]
+        0x6D063FEE,             // stp d14, d15, [sp, #96]
+        0xAA0003F3,             // mov x19, x0
+        0xAA0103F4,             // mov x20, x1
+        0xAA0203F5,             // mov x21, x2
+        0x9E6703EF              // fmov d15, xzr
+    };
+    for (size_t i = 0; i < sizeof(code) / sizeof(code[0]); i++) {
+        emit_u32(e, code[i]);
+    }
+    emit_u32(e, 0xD10003FF | (uint32_t)frame_size(e->max_stack) << 10);     // sub sp, sp, #frame
+}
+
+static void gen_epilogue(emitter_t* e) {
+    get_value(e, 0, 0);
+    str_d(e, 0, BASE_OUT, 0);
+    str_d(e, D_ACC, BASE_OUT, 8);
+    emit_u32(e, 0x910003FF | (uint32_t)frame_size(e->max_stack) << 10);     // add sp, sp, #frame
+    static const uint32_t code[] = {
+        0x6D463FEE,             // ldp d14, d15, [sp, #96]
+        0x6D4537EC,             // ldp d12, d13, [sp, #80]
+        0x6D442FEA,             // ldp d10, d11, [sp, #64]
+        0x6D4327E8,             // ldp d8, d9, [sp, #48]
+        0xA9425BF5,             // ldp x21, x22, [sp, #32]
+        0xA94153F3,             // ldp x19, x20, [sp, #16]
+        0xA8C77BFD,             // ldp x29, x30, [sp], #112
+        0xD65F03C0              // ret
+    };
+    for (size_t i = 0; i < sizeof(code) / sizeof(code[0]); i++) {
+        emit_u32(e, code[i]);
+    }
+}
+
+static void gen_load(emitter_t* e, int depth, bool from_constants, int index) {
+    int base = from_constants ? BASE_CONSTANTS : BASE_INPUTS;
+    if (in_register(depth)) {
+        ldr_d(e, slot_register(depth), base, index * 8);
+    } else {
+        ldr_d(e, 0, base, index * 8);
+        put_value(e, depth, 0);
+    }
+}
+
+// acc += v - v
+static void gen_check(emitter_t* e, int depth) {
+    int v = value_register(e, depth, D_SCRATCH);
+    fp_binary(e, 0x1E603800, D_SCRATCH, v, v);          // fsub
+    fp_binary(e, 0x1E602800, D_ACC, D_ACC, D_SCRATCH);  // fadd
+}
+
+static void gen_binary(emitter_t* e, calc_opcode_t op, int depth) {
+    uint32_t opcode = op == OP_ADD ? 0x1E602800 : op == OP_SUBTRACT ? 0x1E603800
+                    : op == OP_MULTIPLY ? 0x1E600800 : 0x1E601800;
+    int n = value_register(e, depth, 0);
+    int m = value_register(e, depth + 1, 1);
+    int d = in_register(depth) ? slot_register(depth) : 0;
+    fp_binary(e, opcode, d, n, m);
+    if (!in_register(depth)) {
+        put_value(e, depth, 0);
+    }
+}
+
+static void gen_unary(emitter_t* e, uint32_t opcode, int depth) {
+    int n = value_register(e, depth, 0);
+    int d = in_register(depth) ? slot_register(depth) : 0;
+    fp_unary(e, opcode, d, n);
+    if (!in_register(depth)) {
+        put_value(e, depth, 0);
+    }
+}
+
+static void gen_sign(emitter_t* e, int depth, bool negate) {
+    gen_unary(e, negate ? 0x1E614000 : 0x1E60C000, depth);     // fneg / fabs
+}
+
+static void gen_sqrt(emitter_t* e, int depth) {
+    gen_unary(e, 0x1E61C000, depth);                           // fsqrt
+}
+
+// v = v * constants[multiply] / constants[divide]
+static void gen_scale(emitter_t* e, int depth, int multiply, int divide) {
+    get_value(e, 0, depth);
+    ldr_d(e, 1, BASE_CONSTANTS, multiply * 8);
+    fp_binary(e, 0x1E600800, 0, 0, 1);                  // fmul
+    ldr_d(e, 1, BASE_CONSTANTS, divide * 8);
+    fp_binary(e, 0x1E601800, 0, 0, 1);                  // fdiv
+    put_value(e, depth, 0);
+}
+
+static void call_address(emitter_t* e, const void* target) {
+    mov_imm64(e, X16, (uint64_t)(uintptr_t)target);
+    emit_u32(e, 0xD63F0200);                            // blr x16
+}
+
+static void gen_call(emitter_t* e, const void* fn, int depth, int argc) {
+    get_value(e, 0, depth);
+    if (argc == 2) {
+        get_value(e, 1, depth + 1);
+    }
+    call_address(e, fn);
+    put_value(e, depth, 0);
+}
+
+static void gen_call_kernel(emitter_t* e, calc_kernel_t kernel, int depth, int argc) {
+    for (int d = depth; d < depth + argc; d++) {
+        if (in_register(d)) {
+            str_d(e, slot_register(d), SP, slot_offset(d));
+        }
+    }
+    emit_u32(e, 0x910003E0 | (uint32_t)slot_offset(depth) << 10);   // add x0, sp, #offset
+    emit_u32(e, 0x52800001 | (uint32_t)(e->degrees ? 1 : 0) << 5);  // mov w1, #degrees
+    call_address(e, (const void*)kernel);
+    put_value(e, depth, 0);
+}
+
+#endif
+
+#if JIT_NATIVE
+
+static int direct_function(const char* name) {
+    for (int i = 0; direct_functions[i].name; i++) {
+        if (strcmp(direct_functions[i].name, name) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+static void gen_function(emitter_t* e, const calc_instruction_t* instr, int depth) {
+    const char* name = get_function_name(instr->index);
+    if (instr->argc == 1 && name) {
+        if (strcmp(name, "sqrt") == 0) {
+            gen_sqrt(e, depth);
+            return;
+        }
+        if (strcmp(name, "abs") == 0) {
+            gen_sign(e, depth, false);
+            return;
+        }
+        int direct = direct_function(name);
+        if (direct >= 0) {
+            // Same operation order as calc_rad_to_deg
+            angle_t angle = e->degrees ? direct_functions[direct].angle : ANGLE_NONE;
+            unary_fn_t fn = angle == ANGLE_IN ? direct_functions[direct].degrees_fn : direct_functions[direct].fn;
+            gen_call(e, (const void*)fn, depth, 1);
+            if (angle == ANGLE_OUT) {
+                gen_scale(e, depth, add_constant(e, 180.0), add_constant(e, M_PI));
+            }
+            return;
+        }
+    }
+    gen_call_kernel(e, get_function_kernel(instr->index, instr->argc), depth, instr->argc);
+}
+
+static bool generate(emitter_t* e, const calc_program_t* program) {
+    gen_prologue(e);
+    int sp = 0;
+    for (int pc = 0; pc < program->length && !e->failed; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        switch (instr->op) {
+            case OP_CONST:
+                if (!isfinite(instr->value)) {
+                    return false;
+                }
+                gen_load(e, sp++, true, add_constant(e, instr->value));
+                break;
+            case OP_VARIABLE:
+                gen_load(e, sp, false, INPUT_VARIABLES + instr->index);
+                gen_check(e, sp++);
+                break;
+            case OP_ANS:
+                gen_load(e, sp, false, INPUT_ANS);
+                gen_check(e, sp++);
+                break;
+            case OP_MEMORY:
+                gen_load(e, sp, false, INPUT_MEMORY);
+                gen_check(e, sp++);
+                break;
+            case OP_NEGATE:
+                gen_sign(e, sp - 1, true);
+                break;
+            case OP_ADD:
+            case OP_SUBTRACT:
+                sp--;
+                gen_binary(e, instr->op, sp - 1);
+                break;
+            case OP_MULTIPLY:
+                sp--;
+                gen_binary(e, instr->op, sp - 1);
+                if (instr->argc) {
+                    gen_check(e, sp - 1);
+                }
+                break;
+            case OP_DIVIDE:
+                sp--;
+                gen_binary(e, instr->op, sp - 1);
+                gen_check(e, sp - 1);
+                break;
+            case OP_MODULO:
+            case OP_POWER:
+                sp--;
+                gen_call(e, instr->op == OP_POWER ? (const void*)pow : (const void*)fmod, sp - 1, 2);
+                gen_check(e, sp - 1);
+                break;
+            case OP_CALL:
+                sp -= instr->argc;
+                gen_function(e, instr, sp);
+                gen_check(e, sp++);
+                break;
+        }
+    }
+    gen_epilogue(e);
+    return !e->failed;
+}
+
+// Copies the code into a fresh mapping that is executable but not writable
+static void* install(const uint8_t* code, size_t length, size_t* size) {
+    *size = length;
+    void* memory = mmap(NULL, length, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if (memory == MAP_FAILED) {
+        return NULL;
+    }
+    memcpy(memory, code, length);
+    if (mprotect(memory, length, PROT_READ | PROT_EXEC) != 0) {
+        munmap(memory, length);
+        return NULL;
+    }
+    __builtin___clear_cache((char*)memory, (char*)memory + length);
+    return memory;
+}
+
+#endif
+
+bool calc_jit_supported(void) {
+    return JIT_NATIVE;
+}
+
+calc_jit_t* calc_jit_compile(const calc_program_t* program, bool degrees) {
+    if (!program || program->length == 0) {
+        return NULL;
+    }
+    calc_jit_t* jit = calloc(1, sizeof(calc_jit_t));
+    if (!jit) {
+        return NULL;
+    }
+    jit->program = program;
+    jit->degrees = degrees;
+
+#if JIT_NATIVE
+    if (program->max_stack <= CALC_JIT_MAX_STACK) {
+        emitter_t e;
+        memset(&e, 0, sizeof(e));
+        e.max_stack = program->max_stack;
+        e.degrees = degrees;
+        if (generate(&e, program)) {
+            jit->code = install(e.data, e.length, &jit->code_size);
+        }
+        free(e.data);
+        if (jit->code) {
+            jit->constants = e.constants;
+        } else {
+            free(e.constants);
+        }
+    }
+#endif
+    return jit;
+}
+
+void calc_jit_free(calc_jit_t* jit) {
+    if (jit) {
+#if JIT_NATIVE
+        if (jit->code) {
+            munmap(jit->code, jit->code_size);
+        }
+#endif
+        free(jit->constants);
+        free(jit);
+    }
+}
+
+bool calc_jit_is_native(const calc_jit_t* jit) {
+    return jit && jit->code;
+}
+
+parse_result_t calc_jit_evaluate(const calc_jit_t* jit, calc_state_t* state, const double* variables) {
+    if (!jit) {
+        return calc_program_evaluate(NULL, state, variables);
+    }
+    const calc_program_t* program = jit->program;
+    if (!jit->code || !state || state->angle_in_degrees != jit->degrees ||
+        state->accuracy != CALC_ACCURACY_FAITHFUL ||
+        (program->variable_count > 0 && !variables)) {
+        return calc_program_evaluate(program, state, variables);
+    }
+
+    // Straight-line code: one interrupt check covers the whole run
+    parse_error_t error = parse_check_interrupt(state);
+    if (error != PARSE_SUCCESS) {
+        return calc_program_evaluate_checked(program, state, variables);
+    }
+
+    double inputs[INPUT_VARIABLES + CALC_MAX_PROGRAM_VARIABLES];
+    inputs[INPUT_ANS] = state->last_result;
+    inputs[INPUT_MEMORY] = calc_memory_recall(state);
+    for (int i = 0; i < program->variable_count; i++) {
+        inputs[INPUT_VARIABLES + i] = variables[i];
+    }
+
+    double out[2];
+    jit_entry_t entry;
+    memcpy(&entry, &jit->code, sizeof(entry));
+    entry(inputs, jit->constants, out);
+
+    if (out[1] != 0.0 || !isfinite(out[0])) {
+        return calc_program_evaluate_checked(program, state, variables);
+    }
+
+    parse_result_t result;
+    result.value = out[0];
+    result.error = PARSE_SUCCESS;
+    result.error_position = 0;
+    strcpy(result.error_message, "");
+    return result;
+}
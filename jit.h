@@ -0,0 +1,33 @@
+#ifndef JIT_H
+#define JIT_H
+
+#include "calculator_engine.h"
+#include "expression_compiler.h"
+#include <stdbool.h>
+
+// Programs deeper than this (or with more constants) are interpreted
+#define CALC_JIT_MAX_STACK 256
+#define CALC_JIT_MAX_CONSTANTS 4096
+
+// Compiled expression (opaque). Holds a pointer to its program, which must
+// outlive it and stay unchanged.
+typedef struct calc_jit calc_jit_t;
+
+// Function prototypes
+
+// True when this build can generate machine code (x86-64 or arm64 Linux)
+bool calc_jit_supported(void);
+
+// Translates a compiled program into native code for the given angle mode.
+// Where native code is not possible the handle falls back to the
+// interpreter, so NULL is only returned for an invalid program or no memory.
+calc_jit_t* calc_jit_compile(const calc_program_t* program, bool degrees);
+void calc_jit_free(calc_jit_t* jit);
+bool calc_jit_is_native(const calc_jit_t* jit);
+
+// Same contract and results as calc_program_evaluate. A state whose angle
+// mode differs from the one compiled for, or whose accuracy tier is not
+// CALC_ACCURACY_FAITHFUL, is evaluated by the interpreter.
+parse_result_t calc_jit_evaluate(const calc_jit_t* jit, calc_state_t* state, const double* variables);
+
+#endif // JIT_H
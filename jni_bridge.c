@@ -1,7 +1,16 @@
 #include <jni.h>
+#include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
 #include <android/log.h>
 #include "calculator_engine.h"
+#include "accuracy.h"
+#include "expression_compiler.h"
+#include "history.h"
+#include "matrix_expression.h"
+#include "polynomial.h"
+#include "profiling.h"
+#include "snapshot.h"
 
 #define LOG_TAG "CalculatorNative"
 #define LOGI(...) __android_log_print(ANDROID_LOG_INFO, LOG_TAG, __VA_ARGS__)
@@ -10,6 +19,28 @@
 // Global calculator state
 static calc_state_t* g_calc_state = NULL;
 
+// Compiler state of the expression being typed, for live previews
+static calc_incremental_t* g_preview = NULL;
+
+// Calculation history, mapped from a file in the app's files directory
+static calc_history_t* g_history = NULL;
+
+// Formats a result for display
+static void format_result(double value, char* buffer, size_t size) {
+    CALC_PROFILE_START(mark);
+    if (value == (long long)value && fabs(value) < 1e15) {
+        // Integer result
+        snprintf(buffer, size, "%.0f", value);
+    } else if (fabs(value) >= 1e10 || (fabs(value) < 1e-4 && value != 0)) {
+        // Scientific notation
+        snprintf(buffer, size, "%.10e", value);
+    } else {
+        // Regular decimal
+        snprintf(buffer, size, "%.10g", value);
+    }
+    CALC_PROFILE_STOP(CALC_PHASE_FORMAT, mark);
+}
+
 // Initialize calculator state
 JNIEXPORT void JNICALL
 Java_com_advanced_scientificcalculator_MainActivity_initCalculator(JNIEnv *env, jobject thiz) {
@@ -31,6 +62,14 @@ Java_com_advanced_scientificcalculator_MainActivity_destroyCalculator(JNIEnv *en
         g_calc_state = NULL;
         LOGI("Calculator state destroyed");
     }
+    if (g_preview != NULL) {
+        calc_incremental_destroy(g_preview);
+        g_preview = NULL;
+    }
+    if (g_history != NULL) {
+        calc_history_close(g_history);
+        g_history = NULL;
+    }
 }
 
 // Evaluate mathematical expression
@@ -65,25 +104,297 @@ Java_com_advanced_scientificcalculator_MainActivity_evaluateExpression(JNIEnv *e
                 calc_error_string(result.error));
         LOGE("Calculation error: %s", calc_error_string(result.error));
     } else {
-        // Format result with appropriate precision
-        if (result.value == (long long)result.value && fabs(result.value) < 1e15) {
-            // Integer result
-            snprintf(result_str, sizeof(result_str), "%.0f", result.value);
-        } else if (fabs(result.value) >= 1e10 || (fabs(result.value) < 1e-4 && result.value != 0)) {
-            // Scientific notation
-            snprintf(result_str, sizeof(result_str), "%.10e", result.value);
+        format_result(result.value, result_str, sizeof(result_str));
+        LOGI("Calculation result: %s = %s", expr_str, result_str);
+    }
+
+    return (*env)->NewStringUTF(env, result_str);
+}
+
+// Live preview while typing: re-compiles only the edited tail of the
+// expression and closes open parentheses. Returns "" when there is no value
+// yet (incomplete or invalid input); the calculator state is not changed.
+JNIEXPORT jstring JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_previewExpression(JNIEnv *env, jobject thiz,
+                                                                       jstring expression,
+                                                                       jboolean degree_mode) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    if (g_preview == NULL) {
+        g_preview = calc_incremental_create();
+    }
+    if (g_calc_state == NULL || g_preview == NULL) {
+        return (*env)->NewStringUTF(env, "");
+    }
+
+    const char *expr_str = (*env)->GetStringUTFChars(env, expression, NULL);
+    if (expr_str == NULL) {
+        return (*env)->NewStringUTF(env, "");
+    }
+    parse_error_t error = calc_incremental_update(g_preview, expr_str, true, NULL);
+    (*env)->ReleaseStringUTFChars(env, expression, expr_str);
+
+    char result_str[256] = "";
+    const calc_program_t* program = calc_incremental_program(g_preview);
+    if (error == PARSE_SUCCESS && program != NULL) {
+        calc_begin_evaluation(g_calc_state);
+        bool degrees = g_calc_state->angle_in_degrees;
+        g_calc_state->angle_in_degrees = degree_mode;
+        parse_result_t result = calc_program_evaluate(program, g_calc_state, NULL);
+        g_calc_state->angle_in_degrees = degrees;
+        if (result.error == PARSE_SUCCESS) {
+            format_result(result.value, result_str, sizeof(result_str));
+        }
+    }
+    return (*env)->NewStringUTF(env, result_str);
+}
+
+// All roots of a polynomial expression in one variable, one per line, as
+// "a" or "a + bi"; "ERROR: ..." when it is not a polynomial
+JNIEXPORT jstring JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_polyroots(JNIEnv *env, jobject thiz, jstring expression) {
+    const char *expr_str = (*env)->GetStringUTFChars(env, expression, NULL);
+    if (expr_str == NULL) {
+        return (*env)->NewStringUTF(env, "ERROR: Invalid expression");
+    }
+    calc_complex_t roots[CALC_POLY_MAX_DEGREE];
+    int count = 0;
+    calc_error_t error = calc_expression_polyroots(expr_str, roots, &count);
+    (*env)->ReleaseStringUTFChars(env, expression, expr_str);
+
+    char lines[CALC_POLY_MAX_DEGREE * 80] = "";
+    if (error != CALC_SUCCESS) {
+        snprintf(lines, sizeof(lines), "ERROR: %s", calc_error_string(error));
+        return (*env)->NewStringUTF(env, lines);
+    }
+    size_t length = 0;
+    for (int i = 0; i < count; i++) {
+        char real_str[32], imag_str[32];
+        format_result(roots[i].real, real_str, sizeof(real_str));
+        if (roots[i].imag == 0.0) {
+            length += snprintf(lines + length, sizeof(lines) - length, "%s\n", real_str);
         } else {
-            // Regular decimal
-            snprintf(result_str, sizeof(result_str), "%.10g", result.value);
+            format_result(fabs(roots[i].imag), imag_str, sizeof(imag_str));
+            length += snprintf(lines + length, sizeof(lines) - length, "%s %c %si\n", real_str,
+                               roots[i].imag < 0.0 ? '-' : '+', imag_str);
         }
+    }
+    return (*env)->NewStringUTF(env, lines);
+}
 
-        LOGI("Calculation result: %s = %s", expr_str, result_str);
+// Value of a matrix expression without variables ("[1,2;3,4]^2"), one row per
+// line with the elements separated by spaces; "ERROR: ..." on failure
+JNIEXPORT jstring JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_evaluateMatrix(JNIEnv *env, jobject thiz,
+                                                                    jstring expression,
+                                                                    jboolean degree_mode) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    const char *expr_str = (*env)->GetStringUTFChars(env, expression, NULL);
+    if (expr_str == NULL) {
+        return (*env)->NewStringUTF(env, "ERROR: Invalid expression");
     }
+    calc_begin_evaluation(g_calc_state);
+    g_calc_state->angle_in_degrees = degree_mode;
 
-    return (*env)->NewStringUTF(env, result_str);
+    calc_matrix_expression_t expr;
+    calc_matrix_expression_init(&expr);
+    calc_error_t error = CALC_SUCCESS;
+    if (calc_matrix_expression_compile(expr_str, &expr, NULL) != PARSE_SUCCESS) {
+        error = CALC_ERROR_PARSE_ERROR;
+    } else if (expr.variable_count > 0) {
+        error = CALC_ERROR_INVALID_INPUT;
+    }
+    (*env)->ReleaseStringUTFChars(env, expression, expr_str);
+
+    size_t rows = 0, cols = 0;
+    if (error == CALC_SUCCESS) {
+        error = calc_matrix_expression_shape(&expr, NULL, &rows, &cols);
+    }
+    calc_matrix_t* value = error == CALC_SUCCESS ? calc_matrix_create(rows, cols) : NULL;
+    if (error == CALC_SUCCESS && value == NULL) {
+        error = CALC_ERROR_MEMORY_ERROR;
+    }
+    if (error == CALC_SUCCESS) {
+        error = calc_matrix_expression_evaluate(&expr, g_calc_state, NULL, value);
+    }
+    calc_matrix_expression_free(&expr);
+
+    size_t size = error == CALC_SUCCESS ? rows * cols * 32 + 1 : 64;
+    char *lines = malloc(size);
+    if (lines == NULL) {
+        calc_matrix_destroy(value);
+        return (*env)->NewStringUTF(env, "ERROR: Memory error");
+    }
+    if (error != CALC_SUCCESS) {
+        snprintf(lines, size, "ERROR: %s", calc_error_string(error));
+    } else {
+        size_t length = 0;
+        lines[0] = '\0';
+        for (size_t i = 0; i < rows; i++) {
+            for (size_t j = 0; j < cols; j++) {
+                char element[32];
+                format_result(value->data[i * cols + j], element, sizeof(element));
+                length += snprintf(lines + length, size - length, j + 1 < cols ? "%s " : "%s\n", element);
+            }
+        }
+    }
+    calc_matrix_destroy(value);
+    jstring result = (*env)->NewStringUTF(env, lines);
+    free(lines);
+    return result;
 }
 
-// Memory operations
+// Evaluations started on the executor thread from now on belong to `request`
+JNIEXPORT void JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_beginRequest(JNIEnv *env, jobject thiz, jlong request) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    if (g_calc_state != NULL) {
+        calc_set_evaluation_id(g_calc_state, (uint64_t)request);
+    }
+}
+
+// Stops the evaluations on the executor thread of every request before
+// `request`, including one that has not started yet; safe from any thread
+JNIEXPORT void JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_cancelEvaluation(JNIEnv *env, jobject thiz, jlong request) {
+    if (g_calc_state != NULL) {
+        calc_cancel_before(g_calc_state, (uint64_t)request);
+    }
+}
+
+JNIEXPORT void JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_setEvaluationTimeout(JNIEnv *env, jobject thiz,
+                                                                          jint timeout_ms) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    if (g_calc_state != NULL) {
+        calc_set_timeout(g_calc_state, timeout_ms);
+    }
+}
+
+// 0 faithful, 1 exact, 2 fast (calc_accuracy_t); other values are ignored
+JNIEXPORT void JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_setAccuracy(JNIEnv *env, jobject thiz, jint accuracy) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    if (g_calc_state != NULL) {
+        calc_set_accuracy(g_calc_state, (calc_accuracy_t)accuracy);
+    }
+}
+
+// Maps the history file; every evaluation is recorded from then on
+JNIEXPORT jboolean JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_openHistory(JNIEnv *env, jobject thiz, jstring path) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    if (g_calc_state == NULL) {
+        return JNI_FALSE;
+    }
+    if (g_history == NULL) {
+        const char *path_str = (*env)->GetStringUTFChars(env, path, NULL);
+        if (path_str == NULL) {
+            return JNI_FALSE;
+        }
+        g_history = calc_history_open(path_str, 0, 0);
+        (*env)->ReleaseStringUTFChars(env, path, path_str);
+        if (g_history == NULL) {
+            LOGE("Failed to open calculation history");
+            return JNI_FALSE;
+        }
+        LOGI("History opened with %zu entries", calc_history_count(g_history));
+    }
+    g_calc_state->history = g_history;
+    return JNI_TRUE;
+}
+
+// Most recent entries first, one "expression\tresult" line each. Call on
+// the evaluation thread, which is the one appending.
+JNIEXPORT jstring JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_getHistory(JNIEnv *env, jobject thiz, jint limit) {
+    size_t count = calc_history_count(g_history);
+    if (limit >= 0 && (size_t)limit < count) {
+        count = (size_t)limit;
+    }
+
+    size_t capacity = 1024, length = 0;
+    char *lines = malloc(capacity);
+    if (lines == NULL) {
+        return (*env)->NewStringUTF(env, "");
+    }
+    lines[0] = '\0';
+    for (size_t i = 0; i < count; i++) {
+        calc_history_entry_t entry;
+        calc_history_get(g_history, i, &entry, NULL, 0);
+
+        char result_str[256];
+        if (entry.error != CALC_SUCCESS) {
+            snprintf(result_str, sizeof(result_str), "ERROR: %s", calc_error_string(entry.error));
+        } else {
+            format_result(entry.result, result_str, sizeof(result_str));
+        }
+
+        size_t needed = length + entry.length + strlen(result_str) + 3;
+        if (needed > capacity) {
+            while (capacity < needed) {
+                capacity *= 2;
+            }
+            char *grown = realloc(lines, capacity);
+            if (grown == NULL) {
+                break;
+            }
+            lines = grown;
+        }
+        calc_history_get(g_history, i, NULL, lines + length, entry.length + 1);
+        length += entry.length;
+        length += snprintf(lines + length, capacity - length, "\t%s\n", result_str);
+    }
+
+    jstring history = (*env)->NewStringUTF(env, lines);
+    free(lines);
+    return history;
+}
+
+// Restores the engine state saved by saveState (memory, ans, settings and
+// compiled expressions); false when there is no usable snapshot
+JNIEXPORT jboolean JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_restoreState(JNIEnv *env, jobject thiz, jstring path) {
+    if (g_calc_state == NULL) {
+        Java_com_advanced_scientificcalculator_MainActivity_initCalculator(env, thiz);
+    }
+    const char *path_str = g_calc_state ? (*env)->GetStringUTFChars(env, path, NULL) : NULL;
+    if (path_str == NULL) {
+        return JNI_FALSE;
+    }
+    bool restored = calc_snapshot_load(g_calc_state, path_str);
+    (*env)->ReleaseStringUTFChars(env, path, path_str);
+    LOGI("State %s", restored ? "restored from snapshot" : "started fresh");
+    return restored ? JNI_TRUE : JNI_FALSE;
+}
+
+// Call on the evaluation thread, so no evaluation changes the state meanwhile
+JNIEXPORT jboolean JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_saveState(JNIEnv *env, jobject thiz, jstring path) {
+    const char *path_str = g_calc_state ? (*env)->GetStringUTFChars(env, path, NULL) : NULL;
+    if (path_str == NULL) {
+        return JNI_FALSE;
+    }
+    bool saved = calc_snapshot_save(g_calc_state, path_str);
+    (*env)->ReleaseStringUTFChars(env, path, path_str);
+    if (!saved) {
+        LOGE("Failed to save state snapshot");
+    }
+    return saved ? JNI_TRUE : JNI_FALSE;
+}
+
+// Memory operations. Call on the evaluation thread, which owns the state.
 JNIEXPORT void JNICALL
 Java_com_advanced_scientificcalculator_MainActivity_storeMemory(JNIEnv *env, jobject thiz, 
                                                                 jdouble value) {
@@ -136,6 +447,17 @@ Java_com_advanced_scientificcalculator_MainActivity_getLastError(JNIEnv *env, jo
     return (*env)->NewStringUTF(env, "No error");
 }
 
+// Engine profiling counters as JSON ("enabled":false unless the library was
+// built with CALC_ENABLE_PROFILING)
+JNIEXPORT jstring JNICALL
+Java_com_advanced_scientificcalculator_MainActivity_getStatsJson(JNIEnv *env, jobject thiz) {
+    calc_profile_stats_t stats;
+    calc_get_profile_stats(&stats);
+    char json[8192];
+    calc_profile_stats_to_json(&stats, json, sizeof(json));
+    return (*env)->NewStringUTF(env, json);
+}
+
 // JNI_OnLoad - called when library is loaded
 JNIEXPORT jint JNICALL JNI_OnLoad(JavaVM* vm, void* reserved) {
     LOGI("Calculator native library loaded");
@@ -148,5 +470,13 @@ JNIEXPORT void JNICALL JNI_OnUnload(JavaVM* vm, void* reserved) {
         calc_destroy_state(g_calc_state);
         g_calc_state = NULL;
     }
+    if (g_preview != NULL) {
+        calc_incremental_destroy(g_preview);
+        g_preview = NULL;
+    }
+    if (g_history != NULL) {
+        calc_history_close(g_history);
+        g_history = NULL;
+    }
     LOGI("Calculator native library unloaded");
 }
\ No newline at end of file
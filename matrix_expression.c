@@ -0,0 +1,1093 @@
+#include "matrix_expression.h"
+#include <math.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+// Elements per block of fused evaluation; a block of every stack slot stays in L1
+#define FUSED_BLOCK 256
+
+// Compiler (shunting-yard, as in expression_compiler.c)
+
+typedef enum {
+    FRAME_OPERATOR,
+    FRAME_UNARY_MINUS,
+    FRAME_PAREN,
+    FRAME_FUNCTION,     // builtin `index`, or a matrix function when `type` is set
+    FRAME_MATRIX,       // [ ... ]; rows of a nested literal are FRAME_ROW
+    FRAME_ROW
+} frame_kind_t;
+
+typedef struct {
+    frame_kind_t kind;
+    char op;
+    int index;
+    calc_matrix_node_type_t type;
+    int argc;
+    int position;
+    int elements;       // completed rows' elements (FRAME_MATRIX)
+    int row_length;     // elements of the current row
+    int cols;           // row length, 0 until the first row ends
+    bool nested;        // [[...],[...]]
+} frame_t;
+
+typedef struct {
+    calc_matrix_expression_t* expr;
+    frame_t* frames;
+    int top;                // frames in use
+    int frame_capacity;
+    int* starts;            // first node of each finished operand
+    int operands;
+    int operand_capacity;
+    bool expect_operand;
+    bool out_of_memory;
+} compiler_t;
+
+void calc_matrix_expression_init(calc_matrix_expression_t* expr) {
+    if (expr) {
+        memset(expr, 0, sizeof(*expr));
+    }
+}
+
+void calc_matrix_expression_free(calc_matrix_expression_t* expr) {
+    if (expr) {
+        free(expr->nodes);
+        calc_matrix_expression_init(expr);
+    }
+}
+
+int calc_matrix_expression_variable_index(const calc_matrix_expression_t* expr, const char* name) {
+    for (int i = 0; i < expr->variable_count; i++) {
+        if (strcmp(expr->variable_names[i], name) == 0) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+static bool emit(compiler_t* c, calc_matrix_node_type_t type, int argc, int index, int position,
+                 double value) {
+    calc_matrix_expression_t* expr = c->expr;
+    if (argc > c->operands) {
+        return false;
+    }
+    if (expr->count == expr->capacity) {
+        int capacity = expr->capacity ? expr->capacity * 2 : 16;
+        calc_matrix_node_t* nodes = realloc(expr->nodes, capacity * sizeof(calc_matrix_node_t));
+        if (!nodes) {
+            c->out_of_memory = true;
+            return false;
+        }
+        expr->nodes = nodes;
+        expr->capacity = capacity;
+    }
+    if (argc == 0 && c->operands == c->operand_capacity) {
+        int capacity = c->operand_capacity ? c->operand_capacity * 2 : 16;
+        int* starts = realloc(c->starts, capacity * sizeof(int));
+        if (!starts) {
+            c->out_of_memory = true;
+            return false;
+        }
+        c->starts = starts;
+        c->operand_capacity = capacity;
+    }
+
+    calc_matrix_node_t* node = &expr->nodes[expr->count];
+    node->type = type;
+    node->argc = argc;
+    node->index = index;
+    node->position = position;
+    node->value = value;
+    c->operands -= argc;
+    node->start = argc ? c->starts[c->operands] : expr->count;
+    c->starts[c->operands++] = node->start;
+    expr->count++;
+    return true;
+}
+
+static bool push_frame(compiler_t* c, frame_kind_t kind, char op, int position) {
+    if (c->top == c->frame_capacity) {
+        int capacity = c->frame_capacity ? c->frame_capacity * 2 : 16;
+        frame_t* frames = realloc(c->frames, capacity * sizeof(frame_t));
+        if (!frames) {
+            c->out_of_memory = true;
+            return false;
+        }
+        c->frames = frames;
+        c->frame_capacity = capacity;
+    }
+    frame_t* f = &c->frames[c->top++];
+    memset(f, 0, sizeof(*f));
+    f->kind = kind;
+    f->op = op;
+    f->position = position;
+    return true;
+}
+
+static frame_t* top_frame(compiler_t* c) {
+    return c->top > 0 ? &c->frames[c->top - 1] : NULL;
+}
+
+static int precedence(char op) {
+    switch (op) {
+        case '+':
+        case '-':
+            return 1;
+        case '*':
+        case '/':
+        case '%':
+        case '\\':
+            return 2;
+        case '^':
+            return 3;
+        default:
+            return 0;
+    }
+}
+
+static calc_matrix_node_type_t binary_type(char op) {
+    switch (op) {
+        case '+': return MATRIX_NODE_ADD;
+        case '-': return MATRIX_NODE_SUBTRACT;
+        case '*': return MATRIX_NODE_MULTIPLY;
+        case '/': return MATRIX_NODE_DIVIDE;
+        case '%': return MATRIX_NODE_MODULO;
+        case '\\': return MATRIX_NODE_SOLVE;
+        default: return MATRIX_NODE_POWER;
+    }
+}
+
+// Emits the operators on top of the stack that bind at least as tightly as
+// min_prec; unary minus binds tighter than every binary operator
+static bool reduce(compiler_t* c, int min_prec) {
+    frame_t* top;
+    while ((top = top_frame(c)) != NULL) {
+        if (top->kind == FRAME_UNARY_MINUS) {
+            if (!emit(c, MATRIX_NODE_NEGATE, 1, 0, top->position, 0.0)) {
+                return false;
+            }
+        } else if (top->kind == FRAME_OPERATOR && precedence(top->op) >= min_prec) {
+            if (!emit(c, binary_type(top->op), 2, 0, top->position, 0.0)) {
+                return false;
+            }
+        } else {
+            break;
+        }
+        c->top--;
+    }
+    return true;
+}
+
+static calc_matrix_node_type_t matrix_function(const char* name) {
+    if (strcmp(name, "inv") == 0) {
+        return MATRIX_NODE_INVERSE;
+    }
+    if (strcmp(name, "det") == 0) {
+        return MATRIX_NODE_DETERMINANT;
+    }
+    if (strcmp(name, "trace") == 0) {
+        return MATRIX_NODE_TRACE;
+    }
+    return MATRIX_NODE_CALL;
+}
+
+// Ends the current row of the literal `matrix`; false if its length differs
+static bool end_row(frame_t* matrix, int row_length) {
+    if (matrix->cols == 0) {
+        matrix->cols = row_length;
+    } else if (matrix->cols != row_length) {
+        return false;
+    }
+    matrix->elements += row_length;
+    matrix->row_length = 0;
+    return true;
+}
+
+// Handles ',' ';' ']' ')' after an operand
+static parse_error_t close_group(compiler_t* c, char close) {
+    if (!reduce(c, 0)) {
+        return PARSE_ERROR_OUT_OF_MEMORY;
+    }
+    frame_t* top = top_frame(c);
+    if (!top) {
+        return close == ')' ? PARSE_ERROR_MISMATCHED_PARENTHESES : PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    if (close == ')') {
+        frame_t f = *top;
+        if (f.kind != FRAME_PAREN && f.kind != FRAME_FUNCTION) {
+            return PARSE_ERROR_MISMATCHED_PARENTHESES;
+        }
+        c->top--;
+        if (f.kind == FRAME_FUNCTION) {
+            // Matrix functions take one argument, builtins at most three
+            if (f.argc > (f.type == MATRIX_NODE_CALL ? 2 : 0)) {
+                return PARSE_ERROR_TOO_MANY_ARGUMENTS;
+            }
+            if (!emit(c, f.type, f.argc + 1, f.index, f.position, 0.0)) {
+                return PARSE_ERROR_OUT_OF_MEMORY;
+            }
+        }
+        return PARSE_SUCCESS;
+    }
+
+    if (close == ',' && top->kind == FRAME_FUNCTION) {
+        top->argc++;
+        c->expect_operand = true;
+        return PARSE_SUCCESS;
+    }
+    if (close == ',' && top->kind == FRAME_MATRIX && top->nested) {
+        // Between the rows of [[...],[...]]
+        c->expect_operand = true;
+        return PARSE_SUCCESS;
+    }
+    if (top->kind == FRAME_ROW && close != ';') {
+        top->row_length++;
+        if (close == ',') {
+            c->expect_operand = true;
+            return PARSE_SUCCESS;
+        }
+        int row_length = top->row_length;
+        c->top--;
+        return end_row(top_frame(c), row_length) ? PARSE_SUCCESS : PARSE_ERROR_INVALID_SYNTAX;
+    }
+    if (top->kind != FRAME_MATRIX) {
+        return top->kind == FRAME_PAREN || top->kind == FRAME_FUNCTION ? PARSE_ERROR_MISMATCHED_PARENTHESES
+                                                                       : PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    if (!top->nested) {
+        top->row_length++;
+    }
+    if (close == ',') {
+        c->expect_operand = true;
+        return PARSE_SUCCESS;
+    }
+    if (top->nested ? close == ';' : !end_row(top, top->row_length)) {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+    if (close == ';') {
+        c->expect_operand = true;
+        return PARSE_SUCCESS;
+    }
+    frame_t f = *top;
+    c->top--;
+    return emit(c, MATRIX_NODE_LITERAL, f.elements, f.cols, f.position, 0.0) ? PARSE_SUCCESS
+                                                                            : PARSE_ERROR_OUT_OF_MEMORY;
+}
+
+static parse_error_t compile_operand(compiler_t* c, parse_context_t* ctx, const token_t* token) {
+    calc_matrix_expression_t* expr = c->expr;
+    frame_t* top = top_frame(c);
+    bool row_start = top && top->kind == FRAME_MATRIX &&
+                     (top->nested || (top->elements == 0 && top->row_length == 0));
+    if (top && top->kind == FRAME_MATRIX && top->nested &&
+        !(token->type == TOKEN_UNKNOWN && token->value[0] == '[')) {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    switch (token->type) {
+        case TOKEN_NUMBER:
+        case TOKEN_CONSTANT:
+            c->expect_operand = false;
+            return emit(c, MATRIX_NODE_NUMBER, 0, 0, token->position, token->number_value)
+                ? PARSE_SUCCESS : PARSE_ERROR_OUT_OF_MEMORY;
+        case TOKEN_VARIABLE:
+        case TOKEN_FUNCTION: {
+            int saved = ctx->position;
+            token_t next = get_next_token(ctx);
+            calc_matrix_node_type_t type = matrix_function(token->value);
+            if (next.type == TOKEN_LEFT_PAREN && (token->type == TOKEN_FUNCTION || type != MATRIX_NODE_CALL)) {
+                if (!push_frame(c, FRAME_FUNCTION, 0, token->position)) {
+                    return PARSE_ERROR_OUT_OF_MEMORY;
+                }
+                top_frame(c)->type = type;
+                top_frame(c)->index = get_function_index(token->value);
+                return PARSE_SUCCESS;
+            }
+            ctx->position = saved;
+            if (token->type == TOKEN_FUNCTION) {
+                return PARSE_ERROR_INVALID_SYNTAX;
+            }
+            int slot = calc_matrix_expression_variable_index(expr, token->value);
+            if (slot < 0) {
+                if (expr->variable_count >= CALC_MAX_PROGRAM_VARIABLES ||
+                    strlen(token->value) >= CALC_VARIABLE_NAME_LENGTH) {
+                    return PARSE_ERROR_INVALID_SYNTAX;
+                }
+                slot = expr->variable_count++;
+                strcpy(expr->variable_names[slot], token->value);
+            }
+            c->expect_operand = false;
+            return emit(c, MATRIX_NODE_VARIABLE, 0, slot, token->position, 0.0)
+                ? PARSE_SUCCESS : PARSE_ERROR_OUT_OF_MEMORY;
+        }
+        case TOKEN_OPERATOR:
+            if (token->value[0] == '-') {
+                return push_frame(c, FRAME_UNARY_MINUS, '-', token->position) ? PARSE_SUCCESS
+                                                                              : PARSE_ERROR_OUT_OF_MEMORY;
+            }
+            return token->value[0] == '+' ? PARSE_SUCCESS : PARSE_ERROR_INVALID_SYNTAX;
+        case TOKEN_LEFT_PAREN:
+            return push_frame(c, FRAME_PAREN, '(', token->position) ? PARSE_SUCCESS : PARSE_ERROR_OUT_OF_MEMORY;
+        case TOKEN_UNKNOWN:
+            if (token->value[0] == '[') {
+                if (row_start) {
+                    top->nested = true;
+                    return push_frame(c, FRAME_ROW, '[', token->position) ? PARSE_SUCCESS
+                                                                         : PARSE_ERROR_OUT_OF_MEMORY;
+                }
+                return push_frame(c, FRAME_MATRIX, '[', token->position) ? PARSE_SUCCESS
+                                                                        : PARSE_ERROR_OUT_OF_MEMORY;
+            }
+            return strchr("];'\\", token->value[0]) ? PARSE_ERROR_INVALID_SYNTAX : PARSE_ERROR_INVALID_CHARACTER;
+        default:
+            return PARSE_ERROR_INVALID_SYNTAX;
+    }
+}
+
+static parse_error_t compile_operator(compiler_t* c, const token_t* token) {
+    switch (token->type) {
+        case TOKEN_OPERATOR:
+            if (!reduce(c, precedence(token->value[0])) ||
+                !push_frame(c, FRAME_OPERATOR, token->value[0], token->position)) {
+                return PARSE_ERROR_OUT_OF_MEMORY;
+            }
+            c->expect_operand = true;
+            return PARSE_SUCCESS;
+        case TOKEN_RIGHT_PAREN:
+            return close_group(c, ')');
+        case TOKEN_COMMA:
+            return close_group(c, ',');
+        case TOKEN_UNKNOWN:
+            switch (token->value[0]) {
+                case ']':
+                case ';':
+                    return close_group(c, token->value[0]);
+                case '\'':
+                    return emit(c, MATRIX_NODE_TRANSPOSE, 1, 0, token->position, 0.0) ? PARSE_SUCCESS
+                                                                                      : PARSE_ERROR_OUT_OF_MEMORY;
+                case '\\':
+                    if (!reduce(c, precedence('\\')) || !push_frame(c, FRAME_OPERATOR, '\\', token->position)) {
+                        return PARSE_ERROR_OUT_OF_MEMORY;
+                    }
+                    c->expect_operand = true;
+                    return PARSE_SUCCESS;
+                default:
+                    return PARSE_ERROR_INVALID_CHARACTER;
+            }
+        default:
+            return PARSE_ERROR_INVALID_SYNTAX;
+    }
+}
+
+parse_error_t calc_matrix_expression_compile(const char* expression, calc_matrix_expression_t* expr,
+                                             int* error_position) {
+    if (!expr) {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+    calc_matrix_expression_free(expr);
+    if (error_position) {
+        *error_position = 0;
+    }
+    if (!expression || expression[0] == '\0') {
+        return PARSE_ERROR_INVALID_SYNTAX;
+    }
+
+    compiler_t c;
+    memset(&c, 0, sizeof(c));
+    c.expr = expr;
+    c.expect_operand = true;
+
+    parse_context_t ctx;
+    ctx.expression = expression;
+    ctx.position = 0;
+    ctx.length = (int)strlen(expression);
+    ctx.calc_state = NULL;
+
+    parse_error_t error = PARSE_SUCCESS;
+    int position = 0;
+    for (;;) {
+        token_t token = get_next_token(&ctx);
+        position = token.position;
+        if (token.type == TOKEN_END) {
+            break;
+        }
+        error = c.expect_operand ? compile_operand(&c, &ctx, &token) : compile_operator(&c, &token);
+        if (error != PARSE_SUCCESS) {
+            break;
+        }
+    }
+
+    if (error == PARSE_SUCCESS) {
+        if (c.expect_operand) {
+            error = PARSE_ERROR_INVALID_SYNTAX;
+        } else if (!reduce(&c, 0)) {
+            error = PARSE_ERROR_OUT_OF_MEMORY;
+        } else if (c.top > 0) {
+            error = PARSE_ERROR_MISMATCHED_PARENTHESES;
+        }
+    }
+    if (error == PARSE_SUCCESS && c.out_of_memory) {
+        error = PARSE_ERROR_OUT_OF_MEMORY;
+    }
+    free(c.frames);
+    free(c.starts);
+    if (error != PARSE_SUCCESS) {
+        calc_matrix_expression_free(expr);
+        if (error_position) {
+            *error_position = position;
+        }
+    }
+    return error;
+}
+
+// Shapes
+
+typedef struct {
+    size_t rows;
+    size_t cols;
+} shape_t;
+
+static bool is_scalar(shape_t s) {
+    return s.rows == 1 && s.cols == 1;
+}
+
+// Common shape of elementwise operands (1x1 broadcasts)
+static bool broadcast(shape_t a, shape_t b, shape_t* out) {
+    if (is_scalar(a)) {
+        *out = b;
+    } else if (is_scalar(b) || (a.rows == b.rows && a.cols == b.cols)) {
+        *out = a;
+    } else {
+        return false;
+    }
+    return true;
+}
+
+// Root of the operand before the one rooted at `operand`
+static int previous_operand(const calc_matrix_expression_t* expr, int operand) {
+    return expr->nodes[operand].start - 1;
+}
+
+static calc_error_t compute_shapes(const calc_matrix_expression_t* expr, const calc_matrix_t* const* variables,
+                                   shape_t* shapes) {
+    for (int k = 0; k < expr->count; k++) {
+        const calc_matrix_node_t* node = &expr->nodes[k];
+        shape_t a = {0, 0};
+        shape_t b = {0, 0};
+        if (node->argc >= 1) {
+            b = shapes[k - 1];
+        }
+        if (node->argc == 2) {
+            a = shapes[previous_operand(expr, k - 1)];
+        }
+        shape_t* s = &shapes[k];
+        bool ok = true;
+
+        switch (node->type) {
+            case MATRIX_NODE_NUMBER:
+                s->rows = s->cols = 1;
+                break;
+            case MATRIX_NODE_VARIABLE: {
+                const calc_matrix_t* m = variables ? variables[node->index] : NULL;
+                if (!m || !m->data || m->rows == 0 || m->cols == 0) {
+                    return CALC_ERROR_INVALID_INPUT;
+                }
+                s->rows = m->rows;
+                s->cols = m->cols;
+                break;
+            }
+            case MATRIX_NODE_LITERAL:
+                for (int e = 0, r = k - 1; e < node->argc; e++, r = previous_operand(expr, r)) {
+                    ok &= is_scalar(shapes[r]);
+                }
+                s->rows = node->argc / node->index;
+                s->cols = node->index;
+                break;
+            case MATRIX_NODE_NEGATE:
+                *s = b;
+                break;
+            case MATRIX_NODE_ADD:
+            case MATRIX_NODE_SUBTRACT:
+            case MATRIX_NODE_DIVIDE:
+            case MATRIX_NODE_MODULO:
+                ok = broadcast(a, b, s);
+                break;
+            case MATRIX_NODE_MULTIPLY:
+                if (is_scalar(a) || is_scalar(b)) {
+                    ok = broadcast(a, b, s);
+                } else {
+                    ok = a.cols == b.rows;
+                    s->rows = a.rows;
+                    s->cols = b.cols;
+                }
+                break;
+            case MATRIX_NODE_POWER:
+                ok = is_scalar(b) && a.rows == a.cols;
+                *s = a;
+                break;
+            case MATRIX_NODE_SOLVE:
+                ok = a.rows == a.cols && a.rows == b.rows;
+                s->rows = a.cols;
+                s->cols = b.cols;
+                break;
+            case MATRIX_NODE_TRANSPOSE:
+                s->rows = b.cols;
+                s->cols = b.rows;
+                break;
+            case MATRIX_NODE_INVERSE:
+                ok = b.rows == b.cols;
+                *s = b;
+                break;
+            case MATRIX_NODE_DETERMINANT:
+            case MATRIX_NODE_TRACE:
+                ok = b.rows == b.cols;
+                s->rows = s->cols = 1;
+                break;
+            case MATRIX_NODE_CALL:
+                s->rows = s->cols = 1;
+                for (int i = 0, r = k - 1; i < node->argc; i++, r = previous_operand(expr, r)) {
+                    ok &= broadcast(*s, shapes[r], s);
+                }
+                break;
+        }
+        if (!ok) {
+            return CALC_ERROR_INVALID_INPUT;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_matrix_expression_shape(const calc_matrix_expression_t* expr,
+                                          const calc_matrix_t* const* variables,
+                                          size_t* rows, size_t* cols) {
+    if (!expr || expr->count == 0 || !rows || !cols) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    shape_t* shapes = malloc(expr->count * sizeof(shape_t));
+    if (!shapes) {
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+    calc_error_t error = compute_shapes(expr, variables, shapes);
+    if (error == CALC_SUCCESS) {
+        *rows = shapes[expr->count - 1].rows;
+        *cols = shapes[expr->count - 1].cols;
+    }
+    free(shapes);
+    return error;
+}
+
+// Evaluation
+
+// Instruction of a fused elementwise region
+typedef enum {
+    FUSED_LOAD,
+    FUSED_CONST,
+    FUSED_NEGATE,
+    FUSED_ADD,
+    FUSED_SUBTRACT,
+    FUSED_MULTIPLY,
+    FUSED_DIVIDE,
+    FUSED_MODULO,
+    FUSED_CALL
+} fused_opcode_t;
+
+typedef struct {
+    fused_opcode_t op;
+    const double* data;     // FUSED_LOAD
+    shape_t shape;          // of data
+    bool transposed;
+    bool direct;            // FUSED_ADD etc.: the right operand is data, not on the stack
+    double value;           // FUSED_CONST
+    calc_kernel_t kernel;   // FUSED_CALL
+    int argc;
+} fused_op_t;
+
+typedef struct {
+    const calc_matrix_expression_t* expr;
+    const calc_matrix_t* const* variables;
+    calc_state_t* state;
+    shape_t* shapes;
+    bool* fused;            // elementwise nodes, evaluated within their region
+    const double** values;  // values of the other nodes once computed
+    int* op_marks;          // fused ops emitted before each node, while building a region
+    fused_op_t* ops;
+    calc_kernel_t power;
+} evaluator_t;
+
+static bool is_fused(const evaluator_t* ev, int k) {
+    const calc_matrix_node_t* node = &ev->expr->nodes[k];
+    switch (node->type) {
+        case MATRIX_NODE_NUMBER:
+        case MATRIX_NODE_VARIABLE:
+        case MATRIX_NODE_NEGATE:
+        case MATRIX_NODE_ADD:
+        case MATRIX_NODE_SUBTRACT:
+        case MATRIX_NODE_DIVIDE:
+        case MATRIX_NODE_MODULO:
+        case MATRIX_NODE_CALL:
+            return true;
+        case MATRIX_NODE_MULTIPLY:
+            return is_scalar(ev->shapes[k - 1]) || is_scalar(ev->shapes[previous_operand(ev->expr, k - 1)]);
+        case MATRIX_NODE_POWER:
+            return is_scalar(ev->shapes[k]);
+        case MATRIX_NODE_TRANSPOSE: {
+            // Folded into a load; a transposed expression is computed whole
+            calc_matrix_node_type_t operand = ev->expr->nodes[k - 1].type;
+            return operand == MATRIX_NODE_NUMBER || operand == MATRIX_NODE_VARIABLE ||
+                   operand == MATRIX_NODE_TRANSPOSE || !ev->fused[k - 1];
+        }
+        default:
+            return false;
+    }
+}
+
+static double* scratch(evaluator_t* ev, size_t count) {
+    return calc_arena_alloc(&ev->state->arena, count * sizeof(double));
+}
+
+static calc_error_t check_values(const double* data, size_t count) {
+    for (size_t i = 0; i < count; i++) {
+        if (!isfinite(data[i])) {
+            return isnan(data[i]) ? calc_nan_error(data[i]) : CALC_ERROR_OVERFLOW;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+static void push_load(evaluator_t* ev, int* count, const double* data, shape_t shape) {
+    fused_op_t* op = &ev->ops[(*count)++];
+    op->op = FUSED_LOAD;
+    op->data = data;
+    op->shape = shape;
+    op->transposed = false;
+}
+
+// Whole-block kernels; the restrict parameters let them vectorize
+static void fill_block(double* restrict x, double value) {
+    for (size_t e = 0; e < FUSED_BLOCK; e++) {
+        x[e] = value;
+    }
+}
+
+static void negate_block(double* restrict x) {
+    for (size_t e = 0; e < FUSED_BLOCK; e++) {
+        x[e] = -x[e];
+    }
+}
+
+static void apply_binary(fused_opcode_t code, double* restrict x, const double* restrict y) {
+    if (code == FUSED_ADD) {
+        for (size_t e = 0; e < FUSED_BLOCK; e++) {
+            x[e] += y[e];
+        }
+    } else if (code == FUSED_SUBTRACT) {
+        for (size_t e = 0; e < FUSED_BLOCK; e++) {
+            x[e] -= y[e];
+        }
+    } else {
+        for (size_t e = 0; e < FUSED_BLOCK; e++) {
+            x[e] *= y[e];
+        }
+    }
+}
+
+// Accumulates x * 0, which is NaN exactly when x is not finite
+static void probe_block(double* restrict probe, const double* restrict x) {
+    for (size_t e = 0; e < FUSED_BLOCK; e++) {
+        probe[e] += x[e] * 0.0;
+    }
+}
+
+// Pushes a binary operation, folding a plain load of its right operand into it
+static void push_binary(evaluator_t* ev, int* count, fused_opcode_t code) {
+    fused_op_t* right = &ev->ops[*count - 1];
+    if (right->op == FUSED_LOAD && !right->transposed && !is_scalar(right->shape)) {
+        right->op = code;
+        right->direct = true;
+        return;
+    }
+    fused_op_t* op = &ev->ops[(*count)++];
+    op->op = code;
+    op->direct = false;
+}
+
+// Runs the elementwise region rooted at `root` into out, block by block:
+// every operation is applied to FUSED_BLOCK elements before the next one, so
+// intermediate values only ever occupy the block stack
+static calc_error_t run_region(evaluator_t* ev, int root, double* out) {
+    const calc_matrix_expression_t* expr = ev->expr;
+    const calc_matrix_node_t* nodes = expr->nodes;
+    int count = 0;
+    for (int k = nodes[root].start; k <= root; k++) {
+        ev->op_marks[k] = count;
+        if (!ev->fused[k]) {
+            count = ev->op_marks[nodes[k].start];
+            push_load(ev, &count, ev->values[k], ev->shapes[k]);
+            continue;
+        }
+        fused_op_t* op = &ev->ops[count];
+        switch (nodes[k].type) {
+            case MATRIX_NODE_NUMBER:
+                op->op = FUSED_CONST;
+                op->value = nodes[k].value;
+                count++;
+                break;
+            case MATRIX_NODE_VARIABLE:
+                push_load(ev, &count, ev->variables[nodes[k].index]->data, ev->shapes[k]);
+                break;
+            case MATRIX_NODE_TRANSPOSE:
+                if (ev->ops[count - 1].op == FUSED_LOAD) {
+                    ev->ops[count - 1].transposed = !ev->ops[count - 1].transposed;
+                }
+                break;
+            case MATRIX_NODE_NEGATE: op->op = FUSED_NEGATE; count++; break;
+            case MATRIX_NODE_ADD: push_binary(ev, &count, FUSED_ADD); break;
+            case MATRIX_NODE_SUBTRACT: push_binary(ev, &count, FUSED_SUBTRACT); break;
+            case MATRIX_NODE_MULTIPLY: push_binary(ev, &count, FUSED_MULTIPLY); break;
+            case MATRIX_NODE_DIVIDE: op->op = FUSED_DIVIDE; count++; break;
+            case MATRIX_NODE_MODULO: op->op = FUSED_MODULO; count++; break;
+            case MATRIX_NODE_POWER:
+                op->op = FUSED_CALL;
+                op->kernel = ev->power;
+                op->argc = 2;
+                count++;
+                break;
+            case MATRIX_NODE_CALL:
+                op->op = FUSED_CALL;
+                op->kernel = get_accuracy_kernel(nodes[k].index, nodes[k].argc, ev->state->accuracy);
+                op->argc = nodes[k].argc;
+                count++;
+                break;
+            default:
+                break;
+        }
+    }
+
+    // One block per operation bounds the stack depth. The arithmetic always
+    // runs over whole blocks, which lets it vectorize; past the end of a
+    // partial last block it works on stale values that are never stored
+    calc_arena_mark_t mark = calc_arena_mark(&ev->state->arena);
+    double* stack = scratch(ev, (size_t)count * FUSED_BLOCK);
+    if (!stack) {
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+    memset(stack, 0, (size_t)count * FUSED_BLOCK * sizeof(double));
+
+    const size_t cols = ev->shapes[root].cols;
+    const size_t total = ev->shapes[root].rows * cols;
+    const bool degrees = ev->state->angle_in_degrees;
+    double probe[FUSED_BLOCK] = {0};
+    calc_error_t error = CALC_SUCCESS;
+    for (size_t base = 0; base < total && error == CALC_SUCCESS; base += FUSED_BLOCK) {
+        size_t n = total - base < FUSED_BLOCK ? total - base : FUSED_BLOCK;
+        int depth = 0;
+        for (int i = 0; i < count && error == CALC_SUCCESS; i++) {
+            const fused_op_t* op = &ev->ops[i];
+            double* top = stack + (depth > 0 ? depth - 1 : 0) * FUSED_BLOCK;
+            double* below = depth > 1 ? top - FUSED_BLOCK : stack;
+            switch (op->op) {
+                case FUSED_LOAD:
+                    top = stack + depth++ * FUSED_BLOCK;
+                    if (is_scalar(op->shape)) {
+                        fill_block(top, op->data[0]);
+                    } else if (op->transposed) {
+                        // The source is cols x rows; walk it column by column
+                        size_t row = base / cols, col = base % cols;
+                        for (size_t e = 0; e < n; e++) {
+                            top[e] = op->data[col * op->shape.cols + row];
+                            if (++col == cols) {
+                                col = 0;
+                                row++;
+                            }
+                        }
+                    } else {
+                        memcpy(top, op->data + base, n * sizeof(double));
+                    }
+                    break;
+                case FUSED_CONST:
+                    fill_block(stack + depth++ * FUSED_BLOCK, op->value);
+                    break;
+                case FUSED_NEGATE:
+                    negate_block(top);
+                    break;
+                case FUSED_ADD:
+                case FUSED_SUBTRACT:
+                case FUSED_MULTIPLY: {
+                    double* x = below;
+                    const double* y = top;
+                    if (op->direct) {
+                        // Past the end of the data, read a copy of it instead
+                        x = top;
+                        y = op->data + base;
+                        if (n < FUSED_BLOCK) {
+                            memcpy(top + FUSED_BLOCK, y, n * sizeof(double));
+                            y = top + FUSED_BLOCK;
+                        }
+                    } else {
+                        depth--;
+                    }
+                    apply_binary(op->op, x, y);
+                    break;
+                }
+                case FUSED_DIVIDE:
+                case FUSED_MODULO:
+                    for (size_t e = 0; e < n; e++) {
+                        if (top[e] == 0.0) {
+                            error = CALC_ERROR_DIVISION_BY_ZERO;
+                            break;
+                        }
+                        below[e] = op->op == FUSED_DIVIDE ? below[e] / top[e] : fmod(below[e], top[e]);
+                    }
+                    depth--;
+                    break;
+                case FUSED_CALL: {
+                    depth -= op->argc - 1;
+                    double* first = stack + (depth - 1) * FUSED_BLOCK;
+                    double args[3];
+                    for (size_t e = 0; e < n; e++) {
+                        for (int a = 0; a < op->argc; a++) {
+                            args[a] = first[a * FUSED_BLOCK + e];
+                        }
+                        first[e] = op->kernel(args, degrees);
+                    }
+                    break;
+                }
+            }
+        }
+        probe_block(probe, stack);
+        memcpy(out + base, stack, n * sizeof(double));
+
+        if ((base / FUSED_BLOCK) % 64 == 63 && error == CALC_SUCCESS) {
+            error = calc_check_interrupt(ev->state);
+        }
+    }
+    calc_arena_reset(&ev->state->arena, mark);
+
+    // Only then look for the culprit: the probe also sees the stale values
+    for (size_t e = 0; e < FUSED_BLOCK && error == CALC_SUCCESS; e++) {
+        if (probe[e] != 0.0) {
+            error = check_values(out, total);
+        }
+    }
+    return error;
+}
+
+// Value of the operand rooted at k, computing an elementwise region if needed
+static calc_error_t operand_value(evaluator_t* ev, int k, const double** value) {
+    const calc_matrix_node_t* node = &ev->expr->nodes[k];
+    if (node->type == MATRIX_NODE_NUMBER) {
+        *value = &node->value;
+    } else if (node->type == MATRIX_NODE_VARIABLE) {
+        *value = ev->variables[node->index]->data;
+    } else if (!ev->fused[k]) {
+        *value = ev->values[k];
+    } else {
+        double* data = scratch(ev, ev->shapes[k].rows * ev->shapes[k].cols);
+        if (!data) {
+            return CALC_ERROR_MEMORY_ERROR;
+        }
+        calc_error_t error = run_region(ev, k, data);
+        if (error != CALC_SUCCESS) {
+            return error;
+        }
+        *value = data;
+    }
+    return CALC_SUCCESS;
+}
+
+// Non-owning matrix view of a node's value
+static calc_matrix_t view(const evaluator_t* ev, int k, const double* data) {
+    calc_matrix_t m;
+    m.rows = ev->shapes[k].rows;
+    m.cols = ev->shapes[k].cols;
+    m.data = (double*)data;
+    return m;
+}
+
+// A^n by repeated squaring, n an integer; negative n inverts A first
+static calc_error_t matrix_power(evaluator_t* ev, calc_matrix_t* a, double exponent, calc_matrix_t* out) {
+    if (exponent != floor(exponent) || fabs(exponent) > 0x1p53) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+    size_t n = a->rows;
+    calc_matrix_t power = {n, n, scratch(ev, n * n)};
+    calc_matrix_t result = {n, n, scratch(ev, n * n)};
+    calc_matrix_t product = {n, n, scratch(ev, n * n)};
+    if (!power.data || !result.data || !product.data) {
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+    calc_error_t error = CALC_SUCCESS;
+    if (exponent < 0.0) {
+        error = calc_matrix_inverse(a, &power);
+    } else {
+        memcpy(power.data, a->data, n * n * sizeof(double));
+    }
+    memset(result.data, 0, n * n * sizeof(double));
+    for (size_t i = 0; i < n; i++) {
+        result.data[i * n + i] = 1.0;
+    }
+
+    for (double e = fabs(exponent); error == CALC_SUCCESS && e > 0.0; e = floor(e / 2.0)) {
+        if (fmod(e, 2.0) == 1.0) {
+            calc_matrix_multiply(&result, &power, &product);
+            double* swap = result.data;
+            result.data = product.data;
+            product.data = swap;
+        }
+        if (e >= 2.0) {
+            calc_matrix_multiply(&power, &power, &product);
+            double* swap = power.data;
+            power.data = product.data;
+            product.data = swap;
+        }
+        error = calc_check_interrupt(ev->state);
+    }
+    if (error == CALC_SUCCESS) {
+        memcpy(out->data, result.data, n * n * sizeof(double));
+    }
+    return error;
+}
+
+// Computes the value of a node that is not elementwise into out
+static calc_error_t compute_node(evaluator_t* ev, int k, double* out) {
+    const calc_matrix_expression_t* expr = ev->expr;
+    const calc_matrix_node_t* node = &expr->nodes[k];
+    int b = k - 1;
+    int a = node->argc == 2 ? previous_operand(expr, b) : b;
+    const double* a_data = NULL;
+    const double* b_data = NULL;
+    calc_matrix_t result = view(ev, k, out);
+    calc_error_t error;
+
+    if (node->type == MATRIX_NODE_LITERAL) {
+        // Elements in reverse, as the operands are found
+        int r = b;
+        for (int e = node->argc - 1; e >= 0; e--, r = previous_operand(expr, r)) {
+            const double* value;
+            error = operand_value(ev, r, &value);
+            if (error != CALC_SUCCESS) {
+                return error;
+            }
+            out[e] = value[0];
+        }
+        return check_values(out, node->argc);
+    }
+
+    error = operand_value(ev, a, &a_data);
+    if (error == CALC_SUCCESS && node->argc == 2) {
+        error = operand_value(ev, b, &b_data);
+    }
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+    calc_matrix_t left = view(ev, a, a_data);
+    calc_matrix_t right = node->argc == 2 ? view(ev, b, b_data) : left;
+
+    switch (node->type) {
+        case MATRIX_NODE_MULTIPLY:
+            error = calc_matrix_multiply(&left, &right, &result);
+            break;
+        case MATRIX_NODE_POWER:
+            error = matrix_power(ev, &left, b_data[0], &result);
+            break;
+        case MATRIX_NODE_SOLVE:
+            error = calc_matrix_solve(&left, &right, &result);
+            break;
+        case MATRIX_NODE_TRANSPOSE:
+            error = calc_matrix_transpose(&left, &result);
+            break;
+        case MATRIX_NODE_INVERSE:
+            error = calc_matrix_inverse(&left, &result);
+            break;
+        case MATRIX_NODE_DETERMINANT: {
+            calc_result_t det = calc_matrix_determinant(&left);
+            out[0] = det.value;
+            error = det.error;
+            break;
+        }
+        case MATRIX_NODE_TRACE:
+            out[0] = 0.0;
+            for (size_t i = 0; i < left.rows; i++) {
+                out[0] += a_data[i * left.cols + i];
+            }
+            error = CALC_SUCCESS;
+            break;
+        default:
+            error = CALC_ERROR_INVALID_INPUT;
+            break;
+    }
+    if (error == CALC_SUCCESS) {
+        error = check_values(out, result.rows * result.cols);
+    }
+    return error;
+}
+
+static bool overlaps(const calc_matrix_t* a, const calc_matrix_t* b) {
+    uintptr_t a0 = (uintptr_t)a->data, a1 = (uintptr_t)(a->data + a->rows * a->cols);
+    uintptr_t b0 = (uintptr_t)b->data, b1 = (uintptr_t)(b->data + b->rows * b->cols);
+    return a0 < b1 && b0 < a1;
+}
+
+calc_error_t calc_matrix_expression_evaluate(const calc_matrix_expression_t* expr, calc_state_t* state,
+                                             const calc_matrix_t* const* variables, calc_matrix_t* out) {
+    if (!expr || expr->count == 0 || !state || !out || !out->data) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    for (int i = 0; i < expr->variable_count; i++) {
+        if (variables && variables[i] && variables[i]->data && overlaps(out, variables[i])) {
+            return CALC_ERROR_INVALID_INPUT;
+        }
+    }
+
+    calc_arena_mark_t mark = calc_arena_mark(&state->arena);
+    int n = expr->count;
+    evaluator_t ev;
+    ev.expr = expr;
+    ev.variables = variables;
+    ev.state = state;
+    ev.shapes = calc_arena_alloc(&state->arena, n * sizeof(shape_t));
+    ev.fused = calc_arena_alloc(&state->arena, n * sizeof(bool));
+    ev.values = calc_arena_alloc(&state->arena, n * sizeof(const double*));
+    ev.op_marks = calc_arena_alloc(&state->arena, n * sizeof(int));
+    ev.ops = calc_arena_alloc(&state->arena, n * sizeof(fused_op_t));
+    ev.power = get_accuracy_kernel(get_function_index("pow"), 2, state->accuracy);
+
+    calc_error_t error = CALC_SUCCESS;
+    if (!ev.shapes || !ev.fused || !ev.values || !ev.op_marks || !ev.ops) {
+        error = CALC_ERROR_MEMORY_ERROR;
+    } else {
+        error = compute_shapes(expr, variables, ev.shapes);
+    }
+    if (error == CALC_SUCCESS &&
+        (out->rows != ev.shapes[n - 1].rows || out->cols != ev.shapes[n - 1].cols)) {
+        error = CALC_ERROR_INVALID_INPUT;
+    }
+
+    // Nodes that are not elementwise are computed in postfix order, so their
+    // operands are ready; the root writes straight into out
+    for (int k = 0; k < n && error == CALC_SUCCESS; k++) {
+        ev.fused[k] = is_fused(&ev, k);
+        ev.values[k] = NULL;
+        if (ev.fused[k] && k < n - 1) {
+            continue;
+        }
+        double* value = out->data;
+        if (k < n - 1) {
+            value = scratch(&ev, ev.shapes[k].rows * ev.shapes[k].cols);
+            if (!value) {
+                error = CALC_ERROR_MEMORY_ERROR;
+                break;
+            }
+        }
+        error = calc_check_interrupt(state);
+        if (error == CALC_SUCCESS) {
+            error = ev.fused[k] ? run_region(&ev, k, value) : compute_node(&ev, k, value);
+        }
+        ev.values[k] = value;
+    }
+
+    calc_arena_reset(&state->arena, mark);
+    return error;
+}
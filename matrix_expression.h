@@ -0,0 +1,85 @@
+#ifndef MATRIX_EXPRESSION_H
+#define MATRIX_EXPRESSION_H
+
+#include "calculator_engine.h"
+#include "expression_parser.h"
+#include "expression_compiler.h"
+#include "matrix_operations.h"
+#include <stdbool.h>
+#include <stddef.h>
+
+// Matrix-valued expressions: the scalar grammar plus
+//
+//   [[1,2],[3,4]]  [1,2;3,4]   literals (elements are scalar expressions)
+//   A  b           matrix variables, bound at evaluation
+//   A*B            matrix product (with a 1x1 operand: scaling)
+//   A'             transpose
+//   A\b            solution of A*x = b
+//   A^n            integer matrix power (negative n inverts A first)
+//   inv(A) det(A) trace(A)
+//
+// Numbers are 1x1 matrices and broadcast against any shape in + - * / % and
+// in calls of the scalar builtins, which apply elementwise (sin(A) + 1).
+
+typedef enum {
+    MATRIX_NODE_NUMBER,         // value
+    MATRIX_NODE_VARIABLE,       // variables[index]
+    MATRIX_NODE_LITERAL,        // argc elements in row-major order, index columns
+    MATRIX_NODE_NEGATE,
+    MATRIX_NODE_ADD,
+    MATRIX_NODE_SUBTRACT,
+    MATRIX_NODE_MULTIPLY,
+    MATRIX_NODE_DIVIDE,
+    MATRIX_NODE_MODULO,
+    MATRIX_NODE_POWER,
+    MATRIX_NODE_SOLVE,
+    MATRIX_NODE_TRANSPOSE,
+    MATRIX_NODE_INVERSE,
+    MATRIX_NODE_DETERMINANT,
+    MATRIX_NODE_TRACE,
+    MATRIX_NODE_CALL            // builtin function `index` with argc arguments
+} calc_matrix_node_type_t;
+
+// Expression tree in postfix order: a node's operands are the argc subtrees
+// just before it, and its own subtree is nodes[start..node]
+typedef struct {
+    calc_matrix_node_type_t type;
+    int start;
+    int argc;
+    int index;
+    int position;   // source position, for error reporting
+    double value;
+} calc_matrix_node_t;
+
+typedef struct {
+    calc_matrix_node_t* nodes;
+    int count;
+    int capacity;
+    int variable_count;
+    char variable_names[CALC_MAX_PROGRAM_VARIABLES][CALC_VARIABLE_NAME_LENGTH];
+} calc_matrix_expression_t;
+
+// Function prototypes
+
+// Compilation
+void calc_matrix_expression_init(calc_matrix_expression_t* expr);
+void calc_matrix_expression_free(calc_matrix_expression_t* expr);
+parse_error_t calc_matrix_expression_compile(const char* expression, calc_matrix_expression_t* expr,
+                                             int* error_position);
+int calc_matrix_expression_variable_index(const calc_matrix_expression_t* expr, const char* name);
+
+// Evaluation; variables[i] binds variable_names[i] (may be NULL if there are
+// none). calc_matrix_expression_shape gives the shape of the result, for
+// allocating out. Elementwise operations run fused: A+B*2-C is one pass over
+// the elements, computed in cache-sized blocks straight into out. Products,
+// inverses, solves and powers are computed whole, into out when they are the
+// outermost operation and otherwise into scratch from the state's arena.
+// Shape mismatches fail with CALC_ERROR_INVALID_INPUT, as does an out that
+// has the wrong shape or shares storage with a variable.
+calc_error_t calc_matrix_expression_shape(const calc_matrix_expression_t* expr,
+                                          const calc_matrix_t* const* variables,
+                                          size_t* rows, size_t* cols);
+calc_error_t calc_matrix_expression_evaluate(const calc_matrix_expression_t* expr, calc_state_t* state,
+                                             const calc_matrix_t* const* variables, calc_matrix_t* out);
+
+#endif // MATRIX_EXPRESSION_H
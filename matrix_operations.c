@@ -0,0 +1,587 @@
+#include "matrix_operations.h"
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+#include <float.h>
+#include <math.h>
+#include <pthread.h>
+#include <unistd.h>
+
+// Column chunk used to keep a block of U rows resident in cache
+#define MATRIX_COLUMN_CHUNK 256
+
+static int g_matrix_threads = 0;
+
+// Helper function to create result
+static calc_result_t make_result(double value, calc_error_t error) {
+    calc_result_t result;
+    result.value = value;
+    result.error = error;
+    result.has_error = (error != CALC_SUCCESS);
+    return result;
+}
+
+static size_t min_size(size_t a, size_t b) {
+    return a < b ? a : b;
+}
+
+// Simple fork/join over an index range
+typedef void (*range_fn_t)(void* ctx, size_t begin, size_t end);
+
+typedef struct {
+    range_fn_t fn;
+    void* ctx;
+    size_t begin;
+    size_t end;
+} range_task_t;
+
+static void* range_worker(void* arg) {
+    range_task_t* task = (range_task_t*)arg;
+    task->fn(task->ctx, task->begin, task->end);
+    return NULL;
+}
+
+// Runs fn over [0, count), split across threads when the problem dimension is large
+static void parallel_range(size_t count, size_t dimension, range_fn_t fn, void* ctx) {
+    size_t threads = 1;
+    if (dimension >= CALC_MATRIX_PARALLEL_THRESHOLD) {
+        threads = (size_t)calc_matrix_get_threads();
+    }
+    if (threads > count) {
+        threads = count;
+    }
+    if (threads <= 1) {
+        fn(ctx, 0, count);
+        return;
+    }
+
+    pthread_t handles[CALC_MATRIX_MAX_THREADS];
+    range_task_t tasks[CALC_MATRIX_MAX_THREADS];
+    bool started[CALC_MATRIX_MAX_THREADS];
+    size_t chunk = (count + threads - 1) / threads;
+
+    for (size_t t = 0; t < threads; t++) {
+        tasks[t].fn = fn;
+        tasks[t].ctx = ctx;
+        tasks[t].begin = min_size(t * chunk, count);
+        tasks[t].end = min_size(tasks[t].begin + chunk, count);
+        started[t] = false;
+    }
+
+    // The calling thread takes the first chunk; workers take the rest
+    for (size_t t = 1; t < threads; t++) {
+        started[t] = pthread_create(&handles[t], NULL, range_worker, &tasks[t]) == 0;
+        if (!started[t]) {
+            range_worker(&tasks[t]);
+        }
+    }
+    range_worker(&tasks[0]);
+    for (size_t t = 1; t < threads; t++) {
+        if (started[t]) {
+            pthread_join(handles[t], NULL);
+        }
+    }
+}
+
+// Threading configuration
+void calc_matrix_set_threads(int threads) {
+    if (threads < 0) {
+        threads = 0;
+    }
+    if (threads > CALC_MATRIX_MAX_THREADS) {
+        threads = CALC_MATRIX_MAX_THREADS;
+    }
+    g_matrix_threads = threads;
+}
+
+int calc_matrix_get_threads(void) {
+    if (g_matrix_threads > 0) {
+        return g_matrix_threads;
+    }
+    long online = sysconf(_SC_NPROCESSORS_ONLN);
+    if (online < 1) {
+        return 1;
+    }
+    return online > CALC_MATRIX_MAX_THREADS ? CALC_MATRIX_MAX_THREADS : (int)online;
+}
+
+// Creation and destruction
+calc_matrix_t* calc_matrix_create(size_t rows, size_t cols) {
+    if (rows == 0 || cols == 0 || rows > SIZE_MAX / sizeof(double) / cols) {
+        return NULL;
+    }
+
+    calc_matrix_t* m = malloc(sizeof(calc_matrix_t));
+    if (!m) {
+        return NULL;
+    }
+    m->rows = rows;
+    m->cols = cols;
+    m->data = calloc(rows * cols, sizeof(double));
+    if (!m->data) {
+        free(m);
+        return NULL;
+    }
+    return m;
+}
+
+calc_matrix_t* calc_matrix_identity(size_t n) {
+    calc_matrix_t* m = calc_matrix_create(n, n);
+    if (m) {
+        for (size_t i = 0; i < n; i++) {
+            m->data[i * n + i] = 1.0;
+        }
+    }
+    return m;
+}
+
+calc_matrix_t* calc_matrix_copy(const calc_matrix_t* m) {
+    if (!m) {
+        return NULL;
+    }
+    calc_matrix_t* copy = calc_matrix_create(m->rows, m->cols);
+    if (copy) {
+        memcpy(copy->data, m->data, m->rows * m->cols * sizeof(double));
+    }
+    return copy;
+}
+
+void calc_matrix_destroy(calc_matrix_t* m) {
+    if (m) {
+        free(m->data);
+        free(m);
+    }
+}
+
+// Basic operations
+static bool same_shape(const calc_matrix_t* a, const calc_matrix_t* b) {
+    return a && b && a->rows == b->rows && a->cols == b->cols;
+}
+
+calc_error_t calc_matrix_add(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out) {
+    if (!same_shape(a, b) || !same_shape(a, out)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    size_t count = a->rows * a->cols;
+    for (size_t i = 0; i < count; i++) {
+        out->data[i] = a->data[i] + b->data[i];
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_matrix_subtract(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out) {
+    if (!same_shape(a, b) || !same_shape(a, out)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    size_t count = a->rows * a->cols;
+    for (size_t i = 0; i < count; i++) {
+        out->data[i] = a->data[i] - b->data[i];
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_matrix_scale(const calc_matrix_t* a, double factor, calc_matrix_t* out) {
+    if (!same_shape(a, out)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    size_t count = a->rows * a->cols;
+    for (size_t i = 0; i < count; i++) {
+        out->data[i] = a->data[i] * factor;
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_matrix_transpose(const calc_matrix_t* a, calc_matrix_t* out) {
+    if (!a || !out || out->rows != a->cols || out->cols != a->rows || out->data == a->data) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    // Tiled so both the reads and the writes stay within a few cache lines
+    const size_t bs = CALC_MATRIX_BLOCK_SIZE / 2;
+    for (size_t ii = 0; ii < a->rows; ii += bs) {
+        size_t iend = min_size(ii + bs, a->rows);
+        for (size_t jj = 0; jj < a->cols; jj += bs) {
+            size_t jend = min_size(jj + bs, a->cols);
+            for (size_t i = ii; i < iend; i++) {
+                for (size_t j = jj; j < jend; j++) {
+                    out->data[j * a->rows + i] = a->data[i * a->cols + j];
+                }
+            }
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+// Matrix multiplication (blocked i-k-j order, parallel over row bands)
+typedef struct {
+    const double* a;
+    const double* b;
+    double* out;
+    size_t inner;
+    size_t cols;
+} multiply_ctx_t;
+
+static void multiply_rows(void* arg, size_t r0, size_t r1) {
+    const multiply_ctx_t* ctx = (const multiply_ctx_t*)arg;
+    const size_t inner = ctx->inner;
+    const size_t cols = ctx->cols;
+
+    memset(ctx->out + r0 * cols, 0, (r1 - r0) * cols * sizeof(double));
+
+    for (size_t kk = 0; kk < inner; kk += CALC_MATRIX_BLOCK_SIZE) {
+        size_t kend = min_size(kk + CALC_MATRIX_BLOCK_SIZE, inner);
+        for (size_t jj = 0; jj < cols; jj += MATRIX_COLUMN_CHUNK) {
+            size_t jend = min_size(jj + MATRIX_COLUMN_CHUNK, cols);
+            for (size_t i = r0; i < r1; i++) {
+                double* restrict crow = ctx->out + i * cols;
+                const double* arow = ctx->a + i * inner;
+                for (size_t p = kk; p < kend; p++) {
+                    const double aip = arow[p];
+                    const double* restrict brow = ctx->b + p * cols;
+                    for (size_t j = jj; j < jend; j++) {
+                        crow[j] += aip * brow[j];
+                    }
+                }
+            }
+        }
+    }
+}
+
+calc_error_t calc_matrix_multiply(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out) {
+    if (!a || !b || !out || a->cols != b->rows ||
+        out->rows != a->rows || out->cols != b->cols) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    if (out->data == a->data || out->data == b->data) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    multiply_ctx_t ctx = { a->data, b->data, out->data, a->cols, b->cols };
+    size_t dimension = a->rows > b->cols ? a->rows : b->cols;
+    parallel_range(a->rows, dimension, multiply_rows, &ctx);
+    return CALC_SUCCESS;
+}
+
+// LU factorization (right-looking, blocked, partial pivoting)
+static void swap_rows(double* a, size_t n, size_t r1, size_t r2) {
+    double* restrict x = a + r1 * n;
+    double* restrict y = a + r2 * n;
+    for (size_t j = 0; j < n; j++) {
+        double tmp = x[j];
+        x[j] = y[j];
+        y[j] = tmp;
+    }
+}
+
+// Unblocked factorization of the panel of columns [k, k + kb)
+static void factor_panel(calc_lu_t* lu, size_t k, size_t kb) {
+    const size_t n = lu->n;
+    double* a = lu->lu;
+
+    for (size_t j = k; j < k + kb; j++) {
+        size_t pivot = j;
+        double best = fabs(a[j * n + j]);
+        for (size_t i = j + 1; i < n; i++) {
+            double v = fabs(a[i * n + j]);
+            if (v > best) {
+                best = v;
+                pivot = i;
+            }
+        }
+
+        lu->pivots[j] = pivot;
+        if (best == 0.0) {
+            lu->singular = true;
+            continue;
+        }
+        if (pivot != j) {
+            swap_rows(a, n, j, pivot);
+            lu->sign = -lu->sign;
+        }
+
+        const double inv = 1.0 / a[j * n + j];
+        const double* restrict urow = a + j * n;
+        for (size_t i = j + 1; i < n; i++) {
+            double* restrict row = a + i * n;
+            double l = row[j] * inv;
+            row[j] = l;
+            for (size_t c = j + 1; c < k + kb; c++) {
+                row[c] -= l * urow[c];
+            }
+        }
+    }
+}
+
+typedef struct {
+    double* a;
+    size_t n;
+    size_t k;
+    size_t kb;
+} lu_update_ctx_t;
+
+// Trailing update A22 -= L21 * U12 for a band of rows
+static void update_trailing_rows(void* arg, size_t r0, size_t r1) {
+    const lu_update_ctx_t* ctx = (const lu_update_ctx_t*)arg;
+    const size_t n = ctx->n;
+    const size_t first = ctx->k + ctx->kb;
+    double* a = ctx->a;
+
+    for (size_t jj = first; jj < n; jj += MATRIX_COLUMN_CHUNK) {
+        size_t jend = min_size(jj + MATRIX_COLUMN_CHUNK, n);
+        for (size_t i = first + r0; i < first + r1; i++) {
+            double* restrict row = a + i * n;
+            for (size_t p = ctx->k; p < first; p++) {
+                const double l = row[p];
+                if (l == 0.0) {
+                    continue;
+                }
+                const double* restrict urow = a + p * n;
+                for (size_t j = jj; j < jend; j++) {
+                    row[j] -= l * urow[j];
+                }
+            }
+        }
+    }
+}
+
+calc_error_t calc_matrix_lu_decompose(const calc_matrix_t* a, calc_lu_t* lu) {
+    if (!a || !lu || a->rows != a->cols) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    const size_t n = a->rows;
+    lu->n = n;
+    lu->sign = 1;
+    lu->singular = false;
+    lu->lu = malloc(n * n * sizeof(double));
+    lu->pivots = malloc(n * sizeof(size_t));
+    if (!lu->lu || !lu->pivots) {
+        calc_lu_free(lu);
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+    memcpy(lu->lu, a->data, n * n * sizeof(double));
+
+    double* m = lu->lu;
+    for (size_t k = 0; k < n; k += CALC_MATRIX_BLOCK_SIZE) {
+        size_t kb = min_size(CALC_MATRIX_BLOCK_SIZE, n - k);
+        factor_panel(lu, k, kb);
+
+        size_t first = k + kb;
+        if (first >= n) {
+            break;
+        }
+
+        // U12 = L11^-1 * A12 (unit lower triangular solve within the block row)
+        for (size_t i = k + 1; i < first; i++) {
+            double* restrict row = m + i * n;
+            for (size_t p = k; p < i; p++) {
+                const double l = row[p];
+                const double* restrict urow = m + p * n;
+                for (size_t j = first; j < n; j++) {
+                    row[j] -= l * urow[j];
+                }
+            }
+        }
+
+        lu_update_ctx_t ctx = { m, n, k, kb };
+        parallel_range(n - first, n - k, update_trailing_rows, &ctx);
+    }
+
+    return CALC_SUCCESS;
+}
+
+// Forward and back substitution for a range of right-hand-side columns
+typedef struct {
+    const calc_lu_t* lu;
+    double* x;
+    size_t cols;
+} lu_solve_ctx_t;
+
+static void solve_columns(void* arg, size_t c0, size_t c1) {
+    const lu_solve_ctx_t* ctx = (const lu_solve_ctx_t*)arg;
+    const size_t n = ctx->lu->n;
+    const size_t m = ctx->cols;
+    const double* lu = ctx->lu->lu;
+    double* x = ctx->x;
+
+    // L y = P b
+    for (size_t i = 1; i < n; i++) {
+        double* restrict xi = x + i * m;
+        const double* lrow = lu + i * n;
+        for (size_t p = 0; p < i; p++) {
+            const double l = lrow[p];
+            if (l == 0.0) {
+                continue;
+            }
+            const double* restrict xp = x + p * m;
+            for (size_t c = c0; c < c1; c++) {
+                xi[c] -= l * xp[c];
+            }
+        }
+    }
+
+    // U x = y
+    for (size_t i = n; i-- > 0;) {
+        double* restrict xi = x + i * m;
+        const double* urow = lu + i * n;
+        for (size_t p = i + 1; p < n; p++) {
+            const double u = urow[p];
+            if (u == 0.0) {
+                continue;
+            }
+            const double* restrict xp = x + p * m;
+            for (size_t c = c0; c < c1; c++) {
+                xi[c] -= u * xp[c];
+            }
+        }
+        const double inv = 1.0 / urow[i];
+        for (size_t c = c0; c < c1; c++) {
+            xi[c] *= inv;
+        }
+    }
+}
+
+calc_error_t calc_lu_solve(const calc_lu_t* lu, const calc_matrix_t* b, calc_matrix_t* x) {
+    if (!lu || !lu->lu || !b || !x || b->rows != lu->n || !same_shape(b, x)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    if (lu->singular) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+
+    const size_t n = lu->n;
+    const size_t m = b->cols;
+    if (x->data != b->data) {
+        memcpy(x->data, b->data, n * m * sizeof(double));
+    }
+    for (size_t i = 0; i < n; i++) {
+        if (lu->pivots[i] != i) {
+            swap_rows(x->data, m, i, lu->pivots[i]);
+        }
+    }
+
+    lu_solve_ctx_t ctx = { lu, x->data, m };
+    parallel_range(m, m >= 64 ? n : 0, solve_columns, &ctx);
+
+    size_t count = n * m;
+    for (size_t i = 0; i < count; i++) {
+        if (!isfinite(x->data[i])) {
+            return CALC_ERROR_OVERFLOW;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+void calc_lu_free(calc_lu_t* lu) {
+    if (lu) {
+        free(lu->lu);
+        free(lu->pivots);
+        lu->lu = NULL;
+        lu->pivots = NULL;
+        lu->n = 0;
+    }
+}
+
+// Derived operations
+calc_error_t calc_matrix_log_determinant(const calc_matrix_t* a, double* log_abs_det, int* sign) {
+    if (!log_abs_det || !sign) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    calc_lu_t lu;
+    calc_error_t error = calc_matrix_lu_decompose(a, &lu);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+
+    if (lu.singular) {
+        *log_abs_det = -INFINITY;
+        *sign = 0;
+        calc_lu_free(&lu);
+        return CALC_SUCCESS;
+    }
+
+    double sum = 0.0;
+    int s = lu.sign;
+    for (size_t i = 0; i < lu.n; i++) {
+        double d = lu.lu[i * lu.n + i];
+        if (d < 0.0) {
+            s = -s;
+        }
+        sum += log(fabs(d));
+    }
+    *log_abs_det = sum;
+    *sign = s;
+    calc_lu_free(&lu);
+    return CALC_SUCCESS;
+}
+
+calc_result_t calc_matrix_determinant(const calc_matrix_t* a) {
+    calc_lu_t lu;
+    calc_error_t error = calc_matrix_lu_decompose(a, &lu);
+    if (error != CALC_SUCCESS) {
+        return make_result(0.0, error);
+    }
+    if (lu.singular) {
+        calc_lu_free(&lu);
+        return make_result(0.0, CALC_SUCCESS);
+    }
+
+    // Keep mantissa and exponent apart so intermediate products cannot overflow
+    double mantissa = (double)lu.sign;
+    long exponent = 0;
+    for (size_t i = 0; i < lu.n; i++) {
+        int e;
+        mantissa *= frexp(lu.lu[i * lu.n + i], &e);
+        exponent += e;
+        int renorm;
+        mantissa = frexp(mantissa, &renorm);
+        exponent += renorm;
+    }
+    calc_lu_free(&lu);
+
+    if (exponent > DBL_MAX_EXP) {
+        return make_result(0.0, CALC_ERROR_OVERFLOW);
+    }
+    if (exponent < DBL_MIN_EXP - DBL_MANT_DIG) {
+        return make_result(0.0, CALC_ERROR_UNDERFLOW);
+    }
+    return make_result(ldexp(mantissa, (int)exponent), CALC_SUCCESS);
+}
+
+calc_error_t calc_matrix_inverse(const calc_matrix_t* a, calc_matrix_t* out) {
+    if (!a || !same_shape(a, out) || a->rows != a->cols || out->data == a->data) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    calc_lu_t lu;
+    calc_error_t error = calc_matrix_lu_decompose(a, &lu);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+
+    const size_t n = a->rows;
+    memset(out->data, 0, n * n * sizeof(double));
+    for (size_t i = 0; i < n; i++) {
+        out->data[i * n + i] = 1.0;
+    }
+
+    error = calc_lu_solve(&lu, out, out);
+    calc_lu_free(&lu);
+    return error;
+}
+
+calc_error_t calc_matrix_solve(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* x) {
+    if (!a || !b || !x || a->rows != a->cols || b->rows != a->rows || !same_shape(b, x)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    calc_lu_t lu;
+    calc_error_t error = calc_matrix_lu_decompose(a, &lu);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+    error = calc_lu_solve(&lu, b, x);
+    calc_lu_free(&lu);
+    return error;
+}
@@ -0,0 +1,63 @@
+#ifndef MATRIX_OPERATIONS_H
+#define MATRIX_OPERATIONS_H
+
+#include "calculator_engine.h"
+#include <stdbool.h>
+#include <stddef.h>
+
+// Blocking and threading parameters
+#define CALC_MATRIX_BLOCK_SIZE 64
+#define CALC_MATRIX_PARALLEL_THRESHOLD 192
+#define CALC_MATRIX_MAX_THREADS 16
+
+// Dense matrix, stored contiguously in row-major order
+typedef struct {
+    size_t rows;
+    size_t cols;
+    double* data;
+} calc_matrix_t;
+
+// LU factorization with partial pivoting (PA = LU).
+// L (unit lower) and U are packed into a single n x n buffer.
+typedef struct {
+    size_t n;
+    double* lu;
+    size_t* pivots;     // row i was swapped with row pivots[i]
+    int sign;           // parity of the row permutation (+1 or -1)
+    bool singular;
+} calc_lu_t;
+
+// Element access
+#define CALC_MATRIX_AT(m, i, j) ((m)->data[(i) * (m)->cols + (j)])
+
+// Function prototypes
+
+// Creation and destruction
+calc_matrix_t* calc_matrix_create(size_t rows, size_t cols);
+calc_matrix_t* calc_matrix_identity(size_t n);
+calc_matrix_t* calc_matrix_copy(const calc_matrix_t* m);
+void calc_matrix_destroy(calc_matrix_t* m);
+
+// Basic operations (out must already have the right shape)
+calc_error_t calc_matrix_add(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out);
+calc_error_t calc_matrix_subtract(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out);
+calc_error_t calc_matrix_scale(const calc_matrix_t* a, double factor, calc_matrix_t* out);
+calc_error_t calc_matrix_transpose(const calc_matrix_t* a, calc_matrix_t* out);
+calc_error_t calc_matrix_multiply(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* out);
+
+// LU factorization
+calc_error_t calc_matrix_lu_decompose(const calc_matrix_t* a, calc_lu_t* lu);
+calc_error_t calc_lu_solve(const calc_lu_t* lu, const calc_matrix_t* b, calc_matrix_t* x);
+void calc_lu_free(calc_lu_t* lu);
+
+// Derived operations
+calc_result_t calc_matrix_determinant(const calc_matrix_t* a);
+calc_error_t calc_matrix_log_determinant(const calc_matrix_t* a, double* log_abs_det, int* sign);
+calc_error_t calc_matrix_inverse(const calc_matrix_t* a, calc_matrix_t* out);
+calc_error_t calc_matrix_solve(const calc_matrix_t* a, const calc_matrix_t* b, calc_matrix_t* x);
+
+// Threading (0 = use all online processors)
+void calc_matrix_set_threads(int threads);
+int calc_matrix_get_threads(void);
+
+#endif // MATRIX_OPERATIONS_H
@@ -0,0 +1,570 @@
+#include "number_theory.h"
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+
+// Sieve segment: one byte per odd number, sized to stay in L1 cache
+#define SIEVE_SEGMENT_BYTES 32768
+
+// Pollard-Brent multiplies this many differences before taking a gcd
+#define BRENT_BATCH 128
+
+// Primes used for trial division before Pollard-Brent
+static const uint32_t small_primes[] = {
+    3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97
+};
+#define SMALL_PRIME_COUNT (sizeof(small_primes) / sizeof(small_primes[0]))
+
+// Helper function to create result
+static calc_result_t make_result(double value, calc_error_t error) {
+    calc_result_t result;
+    result.value = value;
+    result.error = error;
+    result.has_error = (error != CALC_SUCCESS);
+    return result;
+}
+
+// 64x64 -> 128-bit multiplication. 32-bit ABIs (armeabi-v7a, x86) have no
+// __int128, so the product is assembled from 32-bit halves there.
+static inline void mul_wide(uint64_t a, uint64_t b, uint64_t* hi, uint64_t* lo) {
+#if defined(__SIZEOF_INT128__)
+    unsigned __int128 p = (unsigned __int128)a * b;
+    *hi = (uint64_t)(p >> 64);
+    *lo = (uint64_t)p;
+#else
+    uint64_t a_lo = (uint32_t)a;
+    uint64_t a_hi = a >> 32;
+    uint64_t b_lo = (uint32_t)b;
+    uint64_t b_hi = b >> 32;
+    uint64_t p0 = a_lo * b_lo;
+    uint64_t p1 = a_lo * b_hi;
+    uint64_t p2 = a_hi * b_lo;
+    uint64_t p3 = a_hi * b_hi;
+    uint64_t mid = (p0 >> 32) + (uint32_t)p1 + (uint32_t)p2;
+    *lo = (mid << 32) | (uint32_t)p0;
+    *hi = p3 + (p1 >> 32) + (p2 >> 32) + (mid >> 32);
+#endif
+}
+
+// (hi:lo) mod m
+static uint64_t mod_wide(uint64_t hi, uint64_t lo, uint64_t m) {
+#if defined(__SIZEOF_INT128__)
+    return (uint64_t)((((unsigned __int128)hi << 64) | lo) % m);
+#else
+    uint64_t r = hi % m;
+    for (int bit = 63; bit >= 0; bit--) {
+        // r = (2r + bit) mod m without overflowing
+        r = r >= m - r ? r - (m - r) : r + r;
+        if ((lo >> bit) & 1) {
+            r = r == m - 1 ? 0 : r + 1;
+        }
+    }
+    return r;
+#endif
+}
+
+// Montgomery arithmetic modulo an odd n, with R = 2^64
+typedef struct {
+    uint64_t n;
+    uint64_t inv;   // n^-1 mod 2^64
+    uint64_t r2;    // R^2 mod n
+    uint64_t one;   // R mod n
+} montgomery_t;
+
+static void montgomery_init(montgomery_t* m, uint64_t n) {
+    m->n = n;
+    uint64_t inv = n;   // correct to 3 bits for odd n; each step doubles that
+    for (int i = 0; i < 5; i++) {
+        inv *= 2 - n * inv;
+    }
+    m->inv = inv;
+    m->one = (0 - n) % n;
+    uint64_t r2 = m->one;
+    for (int i = 0; i < 64; i++) {
+        r2 = r2 >= n - r2 ? r2 - (n - r2) : r2 + r2;
+    }
+    m->r2 = r2;
+}
+
+// (hi:lo) * R^-1 mod n, for hi < n
+static inline uint64_t montgomery_reduce(const montgomery_t* m, uint64_t hi, uint64_t lo) {
+    uint64_t q = lo * m->inv;
+    uint64_t h, l;
+    mul_wide(q, m->n, &h, &l);
+    return hi >= h ? hi - h : hi - h + m->n;
+}
+
+static inline uint64_t montgomery_mul(const montgomery_t* m, uint64_t a, uint64_t b) {
+    uint64_t hi, lo;
+    mul_wide(a, b, &hi, &lo);
+    return montgomery_reduce(m, hi, lo);
+}
+
+static inline uint64_t montgomery_to(const montgomery_t* m, uint64_t a) {
+    return montgomery_mul(m, a % m->n, m->r2);
+}
+
+static uint64_t montgomery_pow(const montgomery_t* m, uint64_t base, uint64_t exponent) {
+    uint64_t result = m->one;
+    while (exponent) {
+        if (exponent & 1) {
+            result = montgomery_mul(m, result, base);
+        }
+        base = montgomery_mul(m, base, base);
+        exponent >>= 1;
+    }
+    return result;
+}
+
+// 64-bit primitives
+uint64_t calc_gcd_u64(uint64_t a, uint64_t b) {
+    if (a == 0) {
+        return b;
+    }
+    if (b == 0) {
+        return a;
+    }
+    int shift = __builtin_ctzll(a | b);
+    a >>= __builtin_ctzll(a);
+    do {
+        b >>= __builtin_ctzll(b);
+        if (a > b) {
+            uint64_t t = a;
+            a = b;
+            b = t;
+        }
+        b -= a;
+    } while (b != 0);
+    return a << shift;
+}
+
+uint64_t calc_mulmod_u64(uint64_t a, uint64_t b, uint64_t m) {
+    if (m == 0) {
+        return 0;
+    }
+    uint64_t hi, lo;
+    mul_wide(a, b, &hi, &lo);
+    return mod_wide(hi % m, lo, m);
+}
+
+uint64_t calc_powmod_u64(uint64_t base, uint64_t exponent, uint64_t m) {
+    if (m == 0) {
+        return 0;
+    }
+    if (m & 1) {
+        montgomery_t mont;
+        montgomery_init(&mont, m);
+        uint64_t r = montgomery_pow(&mont, montgomery_to(&mont, base), exponent);
+        return montgomery_reduce(&mont, 0, r);
+    }
+    uint64_t result = 1 % m;
+    base %= m;
+    while (exponent) {
+        if (exponent & 1) {
+            result = calc_mulmod_u64(result, base, m);
+        }
+        base = calc_mulmod_u64(base, base, m);
+        exponent >>= 1;
+    }
+    return result;
+}
+
+// Miller-Rabin with bases that are deterministic for all n < 2^64
+// (Jim Sinclair's set)
+bool calc_is_prime_u64(uint64_t n) {
+    static const uint64_t bases[] = {2, 325, 9375, 28178, 450775, 9780504, 1795265022};
+
+    if (n < 2) {
+        return false;
+    }
+    if (n % 2 == 0) {
+        return n == 2;
+    }
+    for (size_t i = 0; i < SMALL_PRIME_COUNT; i++) {
+        if (n % small_primes[i] == 0) {
+            return n == small_primes[i];
+        }
+    }
+    if (n < 97 * 97) {
+        return true;
+    }
+
+    montgomery_t m;
+    montgomery_init(&m, n);
+    uint64_t d = n - 1;
+    int s = __builtin_ctzll(d);
+    d >>= s;
+    uint64_t minus_one = n - m.one;
+
+    for (size_t i = 0; i < sizeof(bases) / sizeof(bases[0]); i++) {
+        uint64_t a = bases[i] % n;
+        if (a == 0) {
+            continue;
+        }
+        uint64_t x = montgomery_pow(&m, montgomery_to(&m, a), d);
+        if (x == m.one || x == minus_one) {
+            continue;
+        }
+        bool composite = true;
+        for (int r = 1; r < s; r++) {
+            x = montgomery_mul(&m, x, x);
+            if (x == minus_one) {
+                composite = false;
+                break;
+            }
+        }
+        if (composite) {
+            return false;
+        }
+    }
+    return true;
+}
+
+uint64_t calc_next_prime_u64(uint64_t n) {
+    if (n < 2) {
+        return 2;
+    }
+    if (n >= UINT64_C(18446744073709551557)) {   // largest 64-bit prime
+        return 0;
+    }
+    uint64_t candidate = (n + 1) | 1;
+    while (!calc_is_prime_u64(candidate)) {
+        candidate += 2;
+    }
+    return candidate;
+}
+
+// Pollard's rho with Brent's cycle detection; n must be odd and composite
+static uint64_t pollard_brent(uint64_t n) {
+    montgomery_t m;
+    montgomery_init(&m, n);
+
+    for (uint64_t seed = 1; ; seed++) {
+        uint64_t c = montgomery_to(&m, seed);
+        uint64_t y = montgomery_to(&m, seed + 1);
+        uint64_t x = y;
+        uint64_t ys = y;
+        uint64_t q = m.one;
+        uint64_t g = 1;
+
+        for (uint64_t r = 1; g == 1; r *= 2) {
+            x = y;
+            for (uint64_t i = 0; i < r; i++) {
+                y = montgomery_mul(&m, y, y) + c;
+                y = (y >= n || y < c) ? y - n : y;
+            }
+            for (uint64_t k = 0; k < r && g == 1; k += BRENT_BATCH) {
+                ys = y;
+                uint64_t steps = r - k < BRENT_BATCH ? r - k : BRENT_BATCH;
+                for (uint64_t i = 0; i < steps; i++) {
+                    y = montgomery_mul(&m, y, y) + c;
+                    y = (y >= n || y < c) ? y - n : y;
+                    q = montgomery_mul(&m, q, x > y ? x - y : y - x);
+                }
+                g = calc_gcd_u64(q, n);
+            }
+        }
+
+        // The batch overshot: replay it one step at a time
+        if (g == n) {
+            do {
+                ys = montgomery_mul(&m, ys, ys) + c;
+                ys = (ys >= n || ys < c) ? ys - n : ys;
+                g = calc_gcd_u64(x > ys ? x - ys : ys - x, n);
+            } while (g == 1);
+        }
+        if (g != n) {
+            return g;
+        }
+    }
+}
+
+static void factor_recursive(uint64_t n, uint64_t* factors, size_t* count) {
+    if (n == 1) {
+        return;
+    }
+    if (calc_is_prime_u64(n)) {
+        factors[(*count)++] = n;
+        return;
+    }
+    uint64_t d = pollard_brent(n);
+    factor_recursive(d, factors, count);
+    factor_recursive(n / d, factors, count);
+}
+
+size_t calc_factor_u64(uint64_t n, uint64_t* factors) {
+    size_t count = 0;
+    if (n < 2) {
+        return 0;
+    }
+
+    while (n % 2 == 0) {
+        factors[count++] = 2;
+        n /= 2;
+    }
+    for (size_t i = 0; i < SMALL_PRIME_COUNT && n > 1; i++) {
+        while (n % small_primes[i] == 0) {
+            factors[count++] = small_primes[i];
+            n /= small_primes[i];
+        }
+    }
+    size_t large_start = count;
+    factor_recursive(n, factors, &count);
+
+    // Pollard-Brent finds factors in no particular order
+    for (size_t i = large_start + 1; i < count; i++) {
+        uint64_t key = factors[i];
+        size_t j = i;
+        while (j > large_start && factors[j - 1] > key) {
+            factors[j] = factors[j - 1];
+            j--;
+        }
+        factors[j] = key;
+    }
+    return count;
+}
+
+uint64_t calc_totient_u64(uint64_t n) {
+    uint64_t factors[CALC_MAX_PRIME_FACTORS];
+    size_t count = calc_factor_u64(n, factors);
+    uint64_t result = n;
+    for (size_t i = 0; i < count; i++) {
+        if (i == 0 || factors[i] != factors[i - 1]) {
+            result = result / factors[i] * (factors[i] - 1);
+        }
+    }
+    return result;
+}
+
+// Segmented sieve of Eratosthenes over odd numbers
+typedef void (*prime_visitor_t)(uint64_t prime, void* context);
+
+// Odd primes up to limit, by a plain sieve
+static uint32_t* base_primes(uint32_t limit, size_t* count) {
+    *count = 0;
+    if (limit < 3) {
+        return malloc(sizeof(uint32_t));
+    }
+    size_t size = (limit - 1) / 2;   // index i represents 2i + 3
+    unsigned char* composite = calloc(size, 1);
+    uint32_t* primes = malloc((size / 2 + 16) * sizeof(uint32_t));
+    if (!composite || !primes) {
+        free(composite);
+        free(primes);
+        return NULL;
+    }
+    for (size_t i = 0; i < size; i++) {
+        if (composite[i]) {
+            continue;
+        }
+        uint64_t p = 2 * i + 3;
+        primes[(*count)++] = (uint32_t)p;
+        for (uint64_t j = (p * p - 3) / 2; j < size; j += p) {
+            composite[j] = 1;
+        }
+    }
+    free(composite);
+    return primes;
+}
+
+// state may be NULL; otherwise cancellation and the deadline are polled once
+// per segment (or per candidate above the sieve limit)
+static calc_error_t sieve_range(uint64_t low, uint64_t high, prime_visitor_t visit, void* context,
+                                calc_state_t* state) {
+    if (low <= 2 && high >= 2) {
+        visit(2, context);
+    }
+    if (low < 3) {
+        low = 3;
+    }
+    if (high < low) {
+        return CALC_SUCCESS;
+    }
+
+    // Above the sieve limit the base primes no longer fit comfortably in
+    // memory; narrow ranges are tested number by number instead
+    if (high > CALC_SIEVE_LIMIT) {
+        if (high - low > CALC_PRIME_TEST_MAX_RANGE) {
+            return CALC_ERROR_DOMAIN_ERROR;
+        }
+        for (uint64_t n = low | 1; n <= high && n >= low; n += 2) {
+            calc_error_t error = calc_check_interrupt(state);
+            if (error != CALC_SUCCESS) {
+                return error;
+            }
+            if (calc_is_prime_u64(n)) {
+                visit(n, context);
+            }
+        }
+        return CALC_SUCCESS;
+    }
+
+    size_t prime_count;
+    uint32_t* primes = base_primes((uint32_t)sqrt((double)high) + 1, &prime_count);
+    uint64_t* next = malloc((prime_count + 1) * sizeof(uint64_t));
+    unsigned char* segment = malloc(SIEVE_SEGMENT_BYTES);
+    if (!primes || !next || !segment) {
+        free(primes);
+        free(next);
+        free(segment);
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+
+    // First odd multiple of each base prime at or above max(p^2, low)
+    uint64_t start = low | 1;
+    for (size_t i = 0; i < prime_count; i++) {
+        uint64_t p = primes[i];
+        uint64_t first = p * p;
+        if (first < start) {
+            first = (start + p - 1) / p * p;
+            if (first % 2 == 0) {
+                first += p;
+            }
+        }
+        next[i] = first;
+    }
+
+    calc_error_t error = CALC_SUCCESS;
+    for (uint64_t segment_low = start; segment_low <= high; segment_low += 2 * SIEVE_SEGMENT_BYTES) {
+        error = calc_check_interrupt(state);
+        if (error != CALC_SUCCESS) {
+            break;
+        }
+        uint64_t segment_high = segment_low + 2 * (SIEVE_SEGMENT_BYTES - 1);
+        if (segment_high > high) {
+            segment_high = high;
+        }
+        size_t length = (size_t)((segment_high - segment_low) / 2 + 1);
+        memset(segment, 0, length);
+
+        for (size_t i = 0; i < prime_count; i++) {
+            uint64_t p = primes[i];
+            if (p * p > segment_high) {
+                break;
+            }
+            uint64_t j = next[i];
+            for (; j <= segment_high; j += 2 * p) {
+                segment[(j - segment_low) / 2] = 1;
+            }
+            next[i] = j;
+        }
+
+        for (size_t i = 0; i < length; i++) {
+            if (!segment[i]) {
+                visit(segment_low + 2 * i, context);
+            }
+        }
+    }
+
+    free(primes);
+    free(next);
+    free(segment);
+    return error;
+}
+
+static void count_prime(uint64_t prime, void* context) {
+    (void)prime;
+    (*(uint64_t*)context)++;
+}
+
+typedef struct {
+    uint64_t* primes;
+    size_t capacity;
+    size_t count;
+    bool truncated;
+} prime_list_t;
+
+static void collect_prime(uint64_t prime, void* context) {
+    prime_list_t* list = context;
+    if (list->count < list->capacity) {
+        list->primes[list->count++] = prime;
+    } else {
+        list->truncated = true;
+    }
+}
+
+calc_error_t calc_prime_count(uint64_t low, uint64_t high, uint64_t* count) {
+    return calc_prime_count_interruptible(low, high, count, NULL);
+}
+
+calc_error_t calc_prime_count_interruptible(uint64_t low, uint64_t high, uint64_t* count, calc_state_t* state) {
+    if (!count) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    *count = 0;
+    return sieve_range(low, high, count_prime, count, state);
+}
+
+calc_error_t calc_prime_list(uint64_t low, uint64_t high, uint64_t* primes, size_t capacity, size_t* count) {
+    if (!count || (!primes && capacity > 0)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    prime_list_t list = {primes, capacity, 0, false};
+    calc_error_t error = sieve_range(low, high, collect_prime, &list, NULL);
+    *count = list.count;
+    if (error == CALC_SUCCESS && list.truncated) {
+        error = CALC_ERROR_OVERFLOW;
+    }
+    return error;
+}
+
+// Magnitude of a signed argument; also correct for INT64_MIN
+static uint64_t magnitude(int64_t x) {
+    return x < 0 ? 0 - (uint64_t)x : (uint64_t)x;
+}
+
+// Number theory
+calc_result_t calc_gcd(int64_t a, int64_t b) {
+    return make_result((double)calc_gcd_u64(magnitude(a), magnitude(b)), CALC_SUCCESS);
+}
+
+calc_result_t calc_lcm(int64_t a, int64_t b) {
+    if (a == 0 || b == 0) {
+        return make_result(0.0, CALC_SUCCESS);
+    }
+    uint64_t x = magnitude(a);
+    uint64_t y = magnitude(b);
+    uint64_t hi, lo;
+    mul_wide(x / calc_gcd_u64(x, y), y, &hi, &lo);
+    if (hi != 0) {
+        return make_result(0.0, CALC_ERROR_OVERFLOW);
+    }
+    return make_result((double)lo, CALC_SUCCESS);
+}
+
+calc_result_t calc_isprime(int64_t n) {
+    return make_result(n > 1 && calc_is_prime_u64((uint64_t)n) ? 1.0 : 0.0, CALC_SUCCESS);
+}
+
+calc_result_t calc_smallest_prime_factor(int64_t n) {
+    if (n < 2) {
+        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
+    }
+    uint64_t factors[CALC_MAX_PRIME_FACTORS];
+    calc_factor_u64((uint64_t)n, factors);
+    return make_result((double)factors[0], CALC_SUCCESS);
+}
+
+calc_result_t calc_nextprime(int64_t n) {
+    return make_result((double)calc_next_prime_u64(n < 0 ? 0 : (uint64_t)n), CALC_SUCCESS);
+}
+
+calc_result_t calc_totient(int64_t n) {
+    if (n < 1) {
+        return make_result(0.0, CALC_ERROR_DOMAIN_ERROR);
+    }
+    return make_result((double)calc_totient_u64((uint64_t)n), CALC_SUCCESS);
+}
+
+calc_result_t calc_primepi(int64_t n) {
+    return calc_primepi_interruptible(n, NULL);
+}
+
+calc_result_t calc_primepi_interruptible(int64_t n, calc_state_t* state) {
+    uint64_t count = 0;
+    if (n < 2) {
+        return make_result(0.0, CALC_SUCCESS);
+    }
+    calc_error_t error = calc_prime_count_interruptible(0, (uint64_t)n, &count, state);
+    return make_result((double)count, error);
+}
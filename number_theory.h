@@ -0,0 +1,45 @@
+#ifndef NUMBER_THEORY_H
+#define NUMBER_THEORY_H
+
+#include "calculator_engine.h"
+#include <stdint.h>
+#include <stddef.h>
+
+// A 64-bit integer has at most 64 prime factors (counted with multiplicity)
+#define CALC_MAX_PRIME_FACTORS 64
+
+// Ranges ending above this are tested number by number instead of sieved
+#define CALC_SIEVE_LIMIT 100000000000000ULL   // 10^14
+#define CALC_PRIME_TEST_MAX_RANGE 1000000ULL
+
+// Largest primepi argument accepted in expressions. The branch-free
+// evaluator calls kernels that cannot poll for cancellation; this bounds one
+// call to a sieve of about 0.2 s (primepi(10^9) takes over two seconds)
+#define CALC_PRIMEPI_EXPRESSION_MAX 100000000LL
+
+// Function prototypes
+// (calc_gcd and calc_lcm are declared in calculator_engine.h)
+
+// 64-bit primitives
+uint64_t calc_gcd_u64(uint64_t a, uint64_t b);                  // binary GCD
+uint64_t calc_mulmod_u64(uint64_t a, uint64_t b, uint64_t m);
+uint64_t calc_powmod_u64(uint64_t base, uint64_t exponent, uint64_t m);
+bool calc_is_prime_u64(uint64_t n);                             // deterministic Miller-Rabin
+uint64_t calc_next_prime_u64(uint64_t n);                       // 0 if no prime > n fits in 64 bits
+size_t calc_factor_u64(uint64_t n, uint64_t* factors);          // ascending, with multiplicity
+uint64_t calc_totient_u64(uint64_t n);
+
+// Segmented sieve over [low, high]
+calc_error_t calc_prime_count(uint64_t low, uint64_t high, uint64_t* count);
+calc_error_t calc_prime_count_interruptible(uint64_t low, uint64_t high, uint64_t* count, calc_state_t* state);
+calc_error_t calc_prime_list(uint64_t low, uint64_t high, uint64_t* primes, size_t capacity, size_t* count);
+
+// Calculator functions (isprime, factor, nextprime, phi, primepi)
+calc_result_t calc_isprime(int64_t n);
+calc_result_t calc_smallest_prime_factor(int64_t n);
+calc_result_t calc_nextprime(int64_t n);
+calc_result_t calc_totient(int64_t n);
+calc_result_t calc_primepi(int64_t n);
+calc_result_t calc_primepi_interruptible(int64_t n, calc_state_t* state);   // state may be NULL
+
+#endif // NUMBER_THEORY_H
@@ -0,0 +1,570 @@
+#include "polynomial.h"
+#include <float.h>
+#include <math.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define ABERTH_MAX_ITERATIONS 500
+
+// Symbolic value of a subexpression: a polynomial in one variable
+typedef struct {
+    int start;              // first instruction of the subexpression
+    int variable;           // variable index, -1 while no variable occurs
+    int degree;             // -1 if the subexpression is not a polynomial
+    bool has_power;         // contains a ^
+    int power_position;     // source position of the first ^
+    double coefficients[CALC_POLY_MAX_DEGREE + 1];
+} poly_t;
+
+// Maximal polynomial subexpression to rewrite, code[start..end]
+typedef struct {
+    int end;
+    poly_t poly;
+} candidate_t;
+
+typedef struct {
+    candidate_t* items;
+    int count;
+    int capacity;
+    bool out_of_memory;
+} candidate_list_t;
+
+static void set_unknown(poly_t* p, int start) {
+    p->start = start;
+    p->variable = -1;
+    p->degree = -1;
+    p->has_power = false;
+    p->power_position = 0;
+}
+
+static void set_constant(poly_t* p, int start, double value) {
+    set_unknown(p, start);
+    if (isfinite(value)) {
+        p->degree = 0;
+        p->coefficients[0] = value;
+    }
+}
+
+static bool is_monomial(const poly_t* p) {
+    int terms = 0;
+    for (int i = 0; i <= p->degree; i++) {
+        terms += p->coefficients[i] != 0.0;
+    }
+    return terms <= 1;
+}
+
+static bool is_plain_constant(const poly_t* p) {
+    return p->degree == 0 && p->variable < 0;
+}
+
+// Drops zero leading coefficients; false if a coefficient is not finite
+static bool normalize(poly_t* p) {
+    for (int i = 0; i <= p->degree; i++) {
+        if (!isfinite(p->coefficients[i])) {
+            return false;
+        }
+    }
+    while (p->degree > 0 && p->coefficients[p->degree] == 0.0) {
+        p->degree--;
+    }
+    return true;
+}
+
+static bool multiply(poly_t* a, const poly_t* b) {
+    if (a->degree + b->degree > CALC_POLY_MAX_DEGREE) {
+        return false;
+    }
+    double product[CALC_POLY_MAX_DEGREE + 1] = {0.0};
+    for (int i = 0; i <= a->degree; i++) {
+        for (int j = 0; j <= b->degree; j++) {
+            product[i + j] += a->coefficients[i] * b->coefficients[j];
+        }
+    }
+    a->degree += b->degree;
+    memcpy(a->coefficients, product, (a->degree + 1) * sizeof(double));
+    return true;
+}
+
+// a = a op b. Without expand, products need a monomial factor and powers a
+// monomial base, so no coefficient is a sum of rounded products.
+static bool combine(poly_t* a, const poly_t* b, const calc_instruction_t* instr, bool expand) {
+    if (a->degree < 0 || b->degree < 0 ||
+        (a->variable >= 0 && b->variable >= 0 && a->variable != b->variable)) {
+        return false;
+    }
+
+    switch (instr->op) {
+        case OP_ADD:
+        case OP_SUBTRACT: {
+            double sign = instr->op == OP_ADD ? 1.0 : -1.0;
+            for (int i = a->degree + 1; i <= b->degree; i++) {
+                a->coefficients[i] = 0.0;
+            }
+            if (b->degree > a->degree) {
+                a->degree = b->degree;
+            }
+            for (int i = 0; i <= b->degree; i++) {
+                a->coefficients[i] += sign * b->coefficients[i];
+            }
+            break;
+        }
+        case OP_MULTIPLY:
+            if ((!expand && !is_monomial(a) && !is_monomial(b)) || !multiply(a, b)) {
+                return false;
+            }
+            break;
+        case OP_DIVIDE:
+            if (!is_plain_constant(b) || b->coefficients[0] == 0.0) {
+                return false;
+            }
+            for (int i = 0; i <= a->degree; i++) {
+                a->coefficients[i] /= b->coefficients[0];
+            }
+            break;
+        case OP_POWER: {
+            double n = b->coefficients[0];
+            if (!is_plain_constant(b) || n != floor(n) || n < 0.0 || n > CALC_POLY_MAX_DEGREE ||
+                (!expand && !is_monomial(a)) || a->degree * (int)n > CALC_POLY_MAX_DEGREE) {
+                return false;
+            }
+            poly_t base = *a;
+            a->degree = 0;
+            a->coefficients[0] = 1.0;
+            for (int i = 0; i < (int)n; i++) {
+                multiply(a, &base);
+            }
+            if (!a->has_power) {
+                a->power_position = b->has_power ? b->power_position : instr->position;
+            }
+            a->has_power = true;
+            break;
+        }
+        default:
+            return false;
+    }
+
+    if (a->variable < 0) {
+        a->variable = b->variable;
+    }
+    if (!a->has_power && b->has_power) {
+        a->has_power = true;
+        a->power_position = b->power_position;
+    }
+    return normalize(a);
+}
+
+// Records code[p->start..end] for rewriting if Horner form saves a ^
+static void add_candidate(candidate_list_t* list, const poly_t* p, int end) {
+    if (!list || p->degree < 2 || p->variable < 0 || !p->has_power) {
+        return;
+    }
+    if (list->count == list->capacity) {
+        int capacity = list->capacity ? list->capacity * 2 : 4;
+        candidate_t* items = realloc(list->items, capacity * sizeof(candidate_t));
+        if (!items) {
+            list->out_of_memory = true;
+            return;
+        }
+        list->items = items;
+        list->capacity = capacity;
+    }
+    list->items[list->count].end = end;
+    list->items[list->count].poly = *p;
+    list->count++;
+}
+
+// Symbolic evaluation of the program. Polynomial operands of an operation
+// whose result is not a polynomial, and the final result, are maximal
+// polynomial subexpressions and go to candidates (when not NULL). Returns
+// false when out of memory; *result is the program's value.
+static bool analyze(const calc_program_t* program, bool expand, candidate_list_t* candidates,
+                    poly_t* result) {
+    if (!program || program->length == 0 || program->max_stack <= 0) {
+        return false;
+    }
+    poly_t* stack = malloc(program->max_stack * sizeof(poly_t));
+    if (!stack) {
+        return false;
+    }
+
+    int sp = 0;
+    for (int pc = 0; pc < program->length; pc++) {
+        const calc_instruction_t* instr = &program->code[pc];
+        switch (instr->op) {
+            case OP_CONST:
+                set_constant(&stack[sp++], pc, instr->value);
+                break;
+            case OP_VARIABLE:
+                set_constant(&stack[sp], pc, 0.0);
+                stack[sp].variable = instr->index;
+                stack[sp].degree = 1;
+                stack[sp].coefficients[1] = 1.0;
+                sp++;
+                break;
+            case OP_ANS:
+            case OP_MEMORY:
+                set_unknown(&stack[sp++], pc);
+                break;
+            case OP_NEGATE:
+                for (int i = 0; i <= stack[sp - 1].degree; i++) {
+                    stack[sp - 1].coefficients[i] = -stack[sp - 1].coefficients[i];
+                }
+                break;
+            case OP_ADD:
+            case OP_SUBTRACT:
+            case OP_MULTIPLY:
+            case OP_DIVIDE:
+            case OP_MODULO:
+            case OP_POWER: {
+                poly_t* a = &stack[sp - 2];
+                const poly_t* b = &stack[sp - 1];
+                poly_t saved = *a;
+                if (!combine(a, b, instr, expand)) {
+                    add_candidate(candidates, &saved, b->start - 1);
+                    add_candidate(candidates, b, pc - 1);
+                    set_unknown(a, saved.start);
+                }
+                sp--;
+                break;
+            }
+            case OP_CALL: {
+                sp -= instr->argc;
+                for (int i = 0; i < instr->argc; i++) {
+                    int end = i + 1 < instr->argc ? stack[sp + i + 1].start - 1 : pc - 1;
+                    add_candidate(candidates, &stack[sp + i], end);
+                }
+                set_unknown(&stack[sp], instr->argc > 0 ? stack[sp].start : pc);
+                sp++;
+                break;
+            }
+        }
+    }
+
+    add_candidate(candidates, &stack[0], program->length - 1);
+    *result = stack[0];
+    free(stack);
+    return !(candidates && candidates->out_of_memory);
+}
+
+static int compare_candidates(const void* a, const void* b) {
+    return ((const candidate_t*)a)->poly.start - ((const candidate_t*)b)->poly.start;
+}
+
+static void put(calc_instruction_t* code, int* length, calc_opcode_t op, int index, int argc,
+                int position, double value) {
+    calc_instruction_t* instr = &code[(*length)++];
+    instr->op = op;
+    instr->index = index;
+    instr->argc = argc;
+    instr->position = position;
+    instr->value = value;
+    instr->value_lo = 0.0;
+}
+
+// acc + c, as a subtraction for negative c so constants stay positive
+static void put_term(calc_instruction_t* code, int* length, double c, int position) {
+    if (c != 0.0) {
+        put(code, length, OP_CONST, 0, 0, position, fabs(c));
+        put(code, length, c > 0.0 ? OP_ADD : OP_SUBTRACT, 0, 0, position, 0.0);
+    }
+}
+
+// Horner form. The multiplications carry argc = 1: they stand for powers,
+// so a non-finite product is reported like a non-finite ^ result.
+static void put_horner(calc_instruction_t* code, int* length, const poly_t* p, int position) {
+    const double* c = p->coefficients;
+    int k = p->degree;
+    if (fabs(c[k]) == 1.0) {
+        put(code, length, OP_VARIABLE, p->variable, 0, position, 0.0);
+        if (c[k] < 0.0) {
+            put(code, length, OP_NEGATE, 0, 0, position, 0.0);
+        }
+        k--;
+        put_term(code, length, c[k], position);
+    } else {
+        put(code, length, OP_CONST, 0, 0, position, fabs(c[k]));
+        if (c[k] < 0.0) {
+            put(code, length, OP_NEGATE, 0, 0, position, 0.0);
+        }
+    }
+    while (k-- > 0) {
+        put(code, length, OP_VARIABLE, p->variable, 0, position, 0.0);
+        put(code, length, OP_MULTIPLY, 0, 1, p->power_position, 0.0);
+        put_term(code, length, c[k], position);
+    }
+}
+
+int calc_program_optimize_polynomials(calc_program_t* program) {
+    candidate_list_t candidates = {NULL, 0, 0, false};
+    poly_t result;
+    if (!analyze(program, false, &candidates, &result) || candidates.count == 0) {
+        free(candidates.items);
+        return 0;
+    }
+    qsort(candidates.items, candidates.count, sizeof(candidate_t), compare_candidates);
+
+    // Horner code takes at most 2 + 4 * degree instructions
+    int capacity = program->length;
+    for (int i = 0; i < candidates.count; i++) {
+        capacity += 2 + 4 * candidates.items[i].poly.degree;
+    }
+    size_t size = capacity * sizeof(calc_instruction_t);
+    calc_instruction_t* code = program->arena ? calc_arena_alloc(program->arena, size) : malloc(size);
+    if (!code) {
+        free(candidates.items);
+        return 0;
+    }
+
+    int length = 0;
+    int pc = 0;
+    for (int i = 0; i < candidates.count; i++) {
+        const candidate_t* candidate = &candidates.items[i];
+        while (pc < candidate->poly.start) {
+            code[length++] = program->code[pc++];
+        }
+        put_horner(code, &length, &candidate->poly, program->code[pc].position);
+        pc = candidate->end + 1;
+    }
+    while (pc < program->length) {
+        code[length++] = program->code[pc++];
+    }
+
+    // The stack never grows: Horner needs two slots, the ^ it replaces had two
+    if (!program->arena) {
+        free(program->code);
+    }
+    program->code = code;
+    program->length = length;
+    program->capacity = capacity;
+    int count = candidates.count;
+    free(candidates.items);
+    return count;
+}
+
+bool calc_program_polynomial(const calc_program_t* program, double* coefficients, int* degree) {
+    poly_t result;
+    if (!coefficients || !degree || !analyze(program, true, NULL, &result) || result.degree < 0) {
+        return false;
+    }
+    memcpy(coefficients, result.coefficients, (result.degree + 1) * sizeof(double));
+    *degree = result.degree;
+    return true;
+}
+
+// Root finding
+
+// p(z) and p'(z) by Horner's rule, and the running error bound of p(z)
+static void evaluate(const double* p, int n, calc_complex_t z, calc_complex_t* value,
+                     calc_complex_t* derivative, double* bound) {
+    calc_complex_t v = {p[n], 0.0};
+    calc_complex_t d = {0.0, 0.0};
+    double magnitude = calc_complex_magnitude(z);
+    double b = fabs(p[n]);
+    for (int i = n - 1; i >= 0; i--) {
+        d = calc_complex_add(calc_complex_multiply(d, z), v);
+        v = calc_complex_multiply(v, z);
+        v.real += p[i];
+        b = b * magnitude + fabs(p[i]);
+    }
+    *value = v;
+    *derivative = d;
+    *bound = b * 4.0 * (n + 1) * DBL_EPSILON;
+}
+
+static int compare_roots(const void* a, const void* b) {
+    const calc_complex_t* x = a;
+    const calc_complex_t* y = b;
+    if (x->real != y->real) {
+        return x->real < y->real ? -1 : 1;
+    }
+    return (x->imag > y->imag) - (x->imag < y->imag);
+}
+
+// Aberth-Ehrlich iteration for the n >= 2 roots of p, none of them zero
+static bool aberth(const double* p, int n, calc_complex_t* z) {
+    bool converged[CALC_POLY_MAX_DEGREE] = {false};
+
+    // Start on a circle whose radius is the geometric mean of the roots'
+    // magnitudes, rotated off the real axis so conjugate pairs can separate
+    double radius = pow(fabs(p[0] / p[n]), 1.0 / n);
+    for (int k = 0; k < n; k++) {
+        double angle = 2.0 * M_PI * k / n + 0.4;
+        z[k].real = radius * cos(angle);
+        z[k].imag = radius * sin(angle);
+    }
+
+    for (int iteration = 0; iteration < ABERTH_MAX_ITERATIONS; iteration++) {
+        bool done = true;
+        for (int k = 0; k < n; k++) {
+            if (converged[k]) {
+                continue;
+            }
+            calc_complex_t value, derivative;
+            double bound;
+            evaluate(p, n, z[k], &value, &derivative, &bound);
+            if (calc_complex_magnitude(value) <= bound) {
+                converged[k] = true;
+                continue;
+            }
+            done = false;
+
+            calc_complex_t one = {1.0, 0.0};
+            calc_complex_t ratio = calc_complex_divide(value, derivative);
+            calc_complex_t sum = {0.0, 0.0};
+            for (int j = 0; j < n; j++) {
+                if (j != k) {
+                    calc_complex_t difference = {z[k].real - z[j].real, z[k].imag - z[j].imag};
+                    sum = calc_complex_add(sum, calc_complex_divide(one, difference));
+                }
+            }
+            calc_complex_t denominator = calc_complex_multiply(ratio, sum);
+            denominator.real = 1.0 - denominator.real;
+            denominator.imag = -denominator.imag;
+            calc_complex_t step = calc_complex_divide(ratio, denominator);
+            if (!isfinite(step.real) || !isfinite(step.imag)) {
+                // Stationary point or coincident estimates: nudge off them
+                step.real = DBL_EPSILON * (1.0 + calc_complex_magnitude(z[k])) * (k + 1);
+                step.imag = step.real;
+            }
+            z[k].real -= step.real;
+            z[k].imag -= step.imag;
+            if (calc_complex_magnitude(step) <= DBL_EPSILON * calc_complex_magnitude(z[k])) {
+                converged[k] = true;
+            }
+        }
+        if (done) {
+            return true;
+        }
+    }
+    return false;
+}
+
+// Newton steps on one root while they reduce |p|
+static void polish(const double* p, int n, calc_complex_t* z) {
+    calc_complex_t value, derivative;
+    double bound;
+    evaluate(p, n, *z, &value, &derivative, &bound);
+    double residual = calc_complex_magnitude(value);
+    for (int i = 0; i < 3 && residual > 0.0; i++) {
+        calc_complex_t step = calc_complex_divide(value, derivative);
+        calc_complex_t next = {z->real - step.real, z->imag - step.imag};
+        calc_complex_t next_value;
+        evaluate(p, n, next, &next_value, &derivative, &bound);
+        double next_residual = calc_complex_magnitude(next_value);
+        if (!(next_residual < residual)) {
+            break;
+        }
+        *z = next;
+        value = next_value;
+        residual = next_residual;
+    }
+}
+
+// Roots of a real polynomial are real or come in conjugate pairs. A root
+// whose real part is as good a root is made real (this also merges the
+// halves of a multiple real root split off the axis); the others are paired
+// with their nearest conjugate and made exact conjugates of each other.
+static void pair_conjugates(const double* p, int n, calc_complex_t* z) {
+    bool paired[CALC_POLY_MAX_DEGREE] = {false};
+    for (int k = 0; k < n; k++) {
+        calc_complex_t x = {z[k].real, 0.0};
+        calc_complex_t value, derivative;
+        double bound;
+        evaluate(p, n, x, &value, &derivative, &bound);
+        if (fabs(value.real) <= bound) {
+            z[k].imag = 0.0;
+            paired[k] = true;
+        }
+    }
+    for (int k = 0; k < n; k++) {
+        if (paired[k] || z[k].imag < 0.0) {
+            continue;
+        }
+        int nearest = -1;
+        double distance = INFINITY;
+        for (int j = 0; j < n; j++) {
+            if (!paired[j] && z[j].imag < 0.0) {
+                calc_complex_t difference = {z[j].real - z[k].real, z[j].imag + z[k].imag};
+                double d = calc_complex_magnitude(difference);
+                if (d < distance) {
+                    distance = d;
+                    nearest = j;
+                }
+            }
+        }
+        if (nearest >= 0) {
+            z[k].real = 0.5 * (z[k].real + z[nearest].real);
+            z[k].imag = 0.5 * (z[k].imag - z[nearest].imag);
+            z[nearest].real = z[k].real;
+            z[nearest].imag = -z[k].imag;
+            paired[k] = paired[nearest] = true;
+        }
+    }
+}
+
+calc_error_t calc_polyroots(const double* coefficients, int degree, calc_complex_t* roots, int* count) {
+    if (!coefficients || !roots || !count || degree < 0 || degree > CALC_POLY_MAX_DEGREE) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    *count = 0;
+    for (int i = 0; i <= degree; i++) {
+        if (!isfinite(coefficients[i])) {
+            return CALC_ERROR_INVALID_INPUT;
+        }
+    }
+    int n = degree;
+    while (n >= 0 && coefficients[n] == 0.0) {
+        n--;
+    }
+    if (n < 0) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+
+    // Zero roots are exact; divide them out
+    int zeros = 0;
+    while (coefficients[zeros] == 0.0) {
+        roots[zeros].real = 0.0;
+        roots[zeros].imag = 0.0;
+        zeros++;
+    }
+    const double* p = coefficients + zeros;
+    int m = n - zeros;
+    calc_complex_t* z = roots + zeros;
+
+    if (m == 1) {
+        z[0].real = -p[0] / p[1];
+        z[0].imag = 0.0;
+    } else if (m >= 2) {
+        if (!aberth(p, m, z)) {
+            return CALC_ERROR_DOMAIN_ERROR;
+        }
+        for (int k = 0; k < m; k++) {
+            polish(p, m, &z[k]);
+        }
+        pair_conjugates(p, m, z);
+    }
+
+    qsort(roots, n, sizeof(calc_complex_t), compare_roots);
+    *count = n;
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_expression_polyroots(const char* expression, calc_complex_t* roots, int* count) {
+    if (!expression || !roots || !count) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    calc_program_t program;
+    calc_program_init(&program);
+    if (calc_program_compile(expression, &program, NULL) != PARSE_SUCCESS) {
+        calc_program_free(&program);
+        return CALC_ERROR_PARSE_ERROR;
+    }
+    double coefficients[CALC_POLY_MAX_DEGREE + 1];
+    int degree;
+    bool polynomial = calc_program_polynomial(&program, coefficients, &degree);
+    calc_program_free(&program);
+    if (!polynomial) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    return calc_polyroots(coefficients, degree, roots, count);
+}
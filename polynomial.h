@@ -0,0 +1,50 @@
+#ifndef POLYNOMIAL_H
+#define POLYNOMIAL_H
+
+#include "calculator_engine.h"
+#include "expression_compiler.h"
+#include <stdbool.h>
+
+// Highest degree handled by the rewriting, extraction and root finding
+#define CALC_POLY_MAX_DEGREE 32
+
+// Function prototypes
+
+// Rewrites every maximal polynomial subexpression of one variable that uses ^
+// (such as 3*x^4 - 2*x^3 + x - 7) into Horner form, with the powers turned
+// into chains of multiplications. Only sums, differences, scalings and
+// products of monomials are collected, never products of polynomials, so each
+// coefficient is formed from the source constants exactly as written (up to
+// one rounding of a product of constants). Returns the number of
+// subexpressions rewritten; the program is unchanged when it is 0.
+//
+// Values afterwards differ from the original program's by rounding. A
+// non-finite product in the Horner form is a domain error at the position of
+// the first ^, as an overflowing power was; a scaled power whose scaling
+// brings it back into range (1e-300*x^2) may now give a value instead. Not
+// run by calc_program_compile: interval evaluation would lose the tightness
+// of x^2 over x*x, so callers evaluating one program for many values of a
+// variable opt in.
+int calc_program_optimize_polynomials(calc_program_t* program);
+
+// Coefficients of a program that is a polynomial in at most one variable,
+// expanding products and powers of sums; coefficients[i] multiplies x^i and
+// needs room for CALC_POLY_MAX_DEGREE + 1 entries. False if the program is
+// not such a polynomial or its degree exceeds CALC_POLY_MAX_DEGREE.
+bool calc_program_polynomial(const calc_program_t* program, double* coefficients, int* degree);
+
+// All complex roots of sum(coefficients[i] * x^i), with multiplicity, by
+// Aberth-Ehrlich iteration. roots needs room for `degree` entries; *count is
+// the degree after dropping zero leading coefficients. Real roots have an
+// imaginary part of exactly 0, and roots are sorted by real then imaginary
+// part. Fails with CALC_ERROR_INVALID_INPUT for non-finite coefficients or a
+// degree above CALC_POLY_MAX_DEGREE, and with CALC_ERROR_DOMAIN_ERROR for the
+// zero polynomial or if the iteration does not converge.
+calc_error_t calc_polyroots(const double* coefficients, int degree, calc_complex_t* roots, int* count);
+
+// calc_polyroots of an expression such as "x^3 - 2*x + 1"; roots needs room
+// for CALC_POLY_MAX_DEGREE entries. CALC_ERROR_PARSE_ERROR if the expression
+// does not compile, CALC_ERROR_INVALID_INPUT if it is not a polynomial.
+calc_error_t calc_expression_polyroots(const char* expression, calc_complex_t* roots, int* count);
+
+#endif // POLYNOMIAL_H
@@ -0,0 +1,173 @@
+#include "profiling.h"
+#include "expression_parser.h"
+#include <stdarg.h>
+#include <stdio.h>
+#include <string.h>
+#include <time.h>
+
+static const char* const phase_names[CALC_PHASE_COUNT] = {"lex", "parse", "eval", "format"};
+
+const char* calc_phase_name(calc_phase_t phase) {
+    return (unsigned)phase < CALC_PHASE_COUNT ? phase_names[phase] : "unknown";
+}
+
+#ifdef CALC_ENABLE_PROFILING
+
+static calc_profile_stats_t counters;
+
+// Time spent in finished regions on this thread; a region subtracts what
+// accumulated while it was open, so nested phases are not counted twice
+static __thread uint64_t thread_elapsed_ns;
+
+static uint64_t now_ns(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (uint64_t)now.tv_sec * 1000000000ULL + (uint64_t)now.tv_nsec;
+}
+
+static void add(uint64_t* counter, uint64_t amount) {
+    __atomic_fetch_add(counter, amount, __ATOMIC_RELAXED);
+}
+
+calc_profile_mark_t calc_profile_start(void) {
+    calc_profile_mark_t mark;
+    mark.nested_ns = thread_elapsed_ns;
+    mark.start_ns = now_ns();
+    return mark;
+}
+
+void calc_profile_stop(calc_phase_t phase, calc_profile_mark_t mark) {
+    uint64_t elapsed = now_ns() - mark.start_ns;
+    uint64_t nested = thread_elapsed_ns - mark.nested_ns;
+    add(&counters.phase_ns[phase], elapsed > nested ? elapsed - nested : 0);
+    thread_elapsed_ns = mark.nested_ns + elapsed;
+}
+
+void calc_profile_count_token(void) {
+    add(&counters.tokens, 1);
+}
+
+void calc_profile_count_call(int function_index) {
+    if (function_index >= 0 && function_index < CALC_PROFILE_MAX_FUNCTIONS) {
+        add(&counters.function_calls[function_index], 1);
+    }
+}
+
+void calc_profile_count_evaluation(calc_error_t error, size_t peak_memory) {
+    add(&counters.evaluations, 1);
+    if ((unsigned)error <= CALC_ERROR_PRECISION_LOSS) {
+        add(&counters.errors[error], 1);
+    }
+    size_t peak = __atomic_load_n(&counters.peak_memory, __ATOMIC_RELAXED);
+    while (peak_memory > peak &&
+           !__atomic_compare_exchange_n(&counters.peak_memory, &peak, peak_memory, true,
+                                        __ATOMIC_RELAXED, __ATOMIC_RELAXED)) {
+    }
+}
+
+// Counters are read one at a time: a snapshot taken during evaluations is
+// consistent per counter, not across them
+void calc_get_profile_stats(calc_profile_stats_t* stats) {
+    if (!stats) {
+        return;
+    }
+    memset(stats, 0, sizeof(*stats));
+    stats->enabled = true;
+    stats->evaluations = __atomic_load_n(&counters.evaluations, __ATOMIC_RELAXED);
+    stats->tokens = __atomic_load_n(&counters.tokens, __ATOMIC_RELAXED);
+    for (int i = 0; i < CALC_PHASE_COUNT; i++) {
+        stats->phase_ns[i] = __atomic_load_n(&counters.phase_ns[i], __ATOMIC_RELAXED);
+    }
+    for (int i = 0; i < CALC_PROFILE_MAX_FUNCTIONS; i++) {
+        stats->function_calls[i] = __atomic_load_n(&counters.function_calls[i], __ATOMIC_RELAXED);
+    }
+    for (int i = 0; i <= CALC_ERROR_PRECISION_LOSS; i++) {
+        stats->errors[i] = __atomic_load_n(&counters.errors[i], __ATOMIC_RELAXED);
+    }
+    stats->peak_memory = __atomic_load_n(&counters.peak_memory, __ATOMIC_RELAXED);
+}
+
+void calc_reset_profile_stats(void) {
+    __atomic_store_n(&counters.evaluations, 0, __ATOMIC_RELAXED);
+    __atomic_store_n(&counters.tokens, 0, __ATOMIC_RELAXED);
+    for (int i = 0; i < CALC_PHASE_COUNT; i++) {
+        __atomic_store_n(&counters.phase_ns[i], 0, __ATOMIC_RELAXED);
+    }
+    for (int i = 0; i < CALC_PROFILE_MAX_FUNCTIONS; i++) {
+        __atomic_store_n(&counters.function_calls[i], 0, __ATOMIC_RELAXED);
+    }
+    for (int i = 0; i <= CALC_ERROR_PRECISION_LOSS; i++) {
+        __atomic_store_n(&counters.errors[i], 0, __ATOMIC_RELAXED);
+    }
+    __atomic_store_n(&counters.peak_memory, 0, __ATOMIC_RELAXED);
+}
+
+#else
+
+void calc_get_profile_stats(calc_profile_stats_t* stats) {
+    if (stats) {
+        memset(stats, 0, sizeof(*stats));
+    }
+}
+
+void calc_reset_profile_stats(void) {
+}
+
+#endif // CALC_ENABLE_PROFILING
+
+// snprintf that keeps counting once the buffer is full
+typedef struct {
+    char* buffer;
+    size_t size;
+    size_t length;
+} json_writer_t;
+
+static void emit(json_writer_t* out, const char* format, ...) {
+    va_list args;
+    va_start(args, format);
+    size_t left = out->length < out->size ? out->size - out->length : 0;
+    int n = vsnprintf(left ? out->buffer + out->length : NULL, left, format, args);
+    va_end(args);
+    if (n > 0) {
+        out->length += (size_t)n;
+    }
+}
+
+int calc_profile_stats_to_json(const calc_profile_stats_t* stats, char* buffer, size_t size) {
+    if (!stats) {
+        return -1;
+    }
+    json_writer_t out = {buffer, size, 0};
+    if (buffer && size > 0) {
+        buffer[0] = '\0';
+    }
+
+    emit(&out, "{\"enabled\":%s,\"evaluations\":%llu,\"tokens\":%llu,\"phase_ns\":{",
+         stats->enabled ? "true" : "false",
+         (unsigned long long)stats->evaluations, (unsigned long long)stats->tokens);
+    for (int i = 0; i < CALC_PHASE_COUNT; i++) {
+        emit(&out, "%s\"%s\":%llu", i ? "," : "", phase_names[i], (unsigned long long)stats->phase_ns[i]);
+    }
+
+    // Only functions and errors that occurred
+    emit(&out, "},\"function_calls\":{");
+    bool first = true;
+    for (int i = 0; i < CALC_PROFILE_MAX_FUNCTIONS; i++) {
+        const char* name = get_function_name(i);
+        if (name && stats->function_calls[i] > 0) {
+            emit(&out, "%s\"%s\":%llu", first ? "" : ",", name, (unsigned long long)stats->function_calls[i]);
+            first = false;
+        }
+    }
+    emit(&out, "},\"errors\":{");
+    first = true;
+    for (int i = 1; i <= CALC_ERROR_PRECISION_LOSS; i++) {
+        if (stats->errors[i] > 0) {
+            emit(&out, "%s\"%s\":%llu", first ? "" : ",", calc_error_string((calc_error_t)i),
+                 (unsigned long long)stats->errors[i]);
+            first = false;
+        }
+    }
+    emit(&out, "},\"peak_memory\":%zu}", stats->peak_memory);
+    return (int)out.length;
+}
@@ -0,0 +1,78 @@
+#ifndef PROFILING_H
+#define PROFILING_H
+
+#include "calculator_engine.h"
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+// Engine instrumentation, compiled in only with -DCALC_ENABLE_PROFILING
+// (CMake option CALC_ENABLE_PROFILING). Without it every CALC_PROFILE_*
+// macro expands to nothing and calc_get_profile_stats reports enabled = false.
+// Counters are process-wide and safe to update from several threads.
+
+// Builtin functions counted individually, by get_function_index
+#define CALC_PROFILE_MAX_FUNCTIONS 128
+
+// Phases timed; each one's time excludes the phases nested inside it
+// (lexing inside parsing, for instance)
+typedef enum {
+    CALC_PHASE_LEX = 0,
+    CALC_PHASE_PARSE,
+    CALC_PHASE_EVAL,
+    CALC_PHASE_FORMAT,
+    CALC_PHASE_COUNT
+} calc_phase_t;
+
+typedef struct {
+    bool enabled;                   // built with CALC_ENABLE_PROFILING
+    uint64_t evaluations;           // calc_evaluate calls
+    uint64_t tokens;                // get_next_token calls
+    uint64_t phase_ns[CALC_PHASE_COUNT];
+    uint64_t function_calls[CALC_PROFILE_MAX_FUNCTIONS];  // interpreted calls; native code is not counted
+    uint64_t errors[CALC_ERROR_PRECISION_LOSS + 1];              // calc_evaluate results by calc_error_t
+    size_t peak_memory;             // largest arena peak seen by calc_evaluate
+} calc_profile_stats_t;
+
+// Start of a timed region
+typedef struct {
+    uint64_t start_ns;
+    uint64_t nested_ns;
+} calc_profile_mark_t;
+
+// Function prototypes
+
+// Statistics
+void calc_get_profile_stats(calc_profile_stats_t* stats);
+void calc_reset_profile_stats(void);
+const char* calc_phase_name(calc_phase_t phase);
+
+// Writes stats as a JSON object; returns the length it needs, like snprintf
+int calc_profile_stats_to_json(const calc_profile_stats_t* stats, char* buffer, size_t size);
+
+#ifdef CALC_ENABLE_PROFILING
+
+// Recording, used through the macros below
+calc_profile_mark_t calc_profile_start(void);
+void calc_profile_stop(calc_phase_t phase, calc_profile_mark_t mark);
+void calc_profile_count_token(void);
+void calc_profile_count_call(int function_index);
+void calc_profile_count_evaluation(calc_error_t error, size_t peak_memory);
+
+#define CALC_PROFILE_START(mark) calc_profile_mark_t mark = calc_profile_start()
+#define CALC_PROFILE_STOP(phase, mark) calc_profile_stop(phase, mark)
+#define CALC_PROFILE_TOKEN() calc_profile_count_token()
+#define CALC_PROFILE_CALL(index) calc_profile_count_call(index)
+#define CALC_PROFILE_EVALUATION(error, peak) calc_profile_count_evaluation(error, peak)
+
+#else
+
+#define CALC_PROFILE_START(mark) ((void)0)
+#define CALC_PROFILE_STOP(phase, mark) ((void)0)
+#define CALC_PROFILE_TOKEN() ((void)0)
+#define CALC_PROFILE_CALL(index) ((void)0)
+#define CALC_PROFILE_EVALUATION(error, peak) ((void)0)
+
+#endif // CALC_ENABLE_PROFILING
+
+#endif // PROFILING_H
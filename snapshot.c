@@ -0,0 +1,381 @@
+#include "snapshot.h"
+#include "tiered.h"
+#include <fcntl.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#define SNAPSHOT_MAGIC 0x504E5343u    // "CSNP"
+
+// File layout: header, state, last expression, then for each compiled
+// expression a program record, its variable names, text and instructions.
+// Text is padded to 8 bytes so the instructions can be read in place.
+// Numbers are in the writer's native layout; instruction_size and the
+// version reject a file from a different build. Calls hold indices into the
+// builtin function table, so the hash of its names rejects a file written
+// by a build that added or reordered functions.
+typedef struct {
+    uint32_t magic;
+    uint32_t version;
+    uint32_t instruction_size;
+    uint32_t program_count;
+    uint64_t payload_size;      // bytes after the header
+    uint64_t checksum;          // FNV-1a of the payload
+    uint64_t function_table;    // FNV-1a of the builtin function names, in index order
+} snapshot_header_t;
+
+typedef struct {
+    double memory;
+    double last_result;
+    double timeout_ms;
+    uint64_t memory_limit;
+    int32_t precision;
+    int32_t compile_threshold;
+    int32_t native_threshold;
+    uint8_t angle_in_degrees;
+    uint8_t adaptive_precision;
+    uint8_t accuracy;           // calc_accuracy_t; zero (faithful) in older snapshots
+    uint8_t reserved;
+    uint64_t last_expression_length;
+} snapshot_state_t;
+
+typedef struct {
+    uint64_t count;             // evaluations so far, for the tier thresholds
+    uint32_t text_length;
+    int32_t length;
+    int32_t max_stack;
+    int32_t variable_count;
+} snapshot_program_t;
+
+// Growable output buffer
+typedef struct {
+    unsigned char* data;
+    size_t size;
+    size_t capacity;
+    bool failed;
+    uint32_t program_count;
+} writer_t;
+
+// Bounds-checked input
+typedef struct {
+    const unsigned char* data;
+    size_t left;
+} reader_t;
+
+static uint64_t checksum_update(uint64_t hash, const unsigned char* data, size_t size) {
+    for (size_t i = 0; i < size; i++) {
+        hash ^= data[i];
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
+
+static uint64_t checksum(const unsigned char* data, size_t size) {
+    return checksum_update(1469598103934665603ULL, data, size);
+}
+
+// Every function name with its terminator, so the index of each is fixed
+static uint64_t function_table_hash(void) {
+    uint64_t hash = 1469598103934665603ULL;
+    const char* name;
+    for (int i = 0; (name = get_function_name(i)) != NULL; i++) {
+        hash = checksum_update(hash, (const unsigned char*)name, strlen(name) + 1);
+    }
+    return hash;
+}
+
+static void put(writer_t* writer, const void* data, size_t size) {
+    if (writer->failed) {
+        return;
+    }
+    if (writer->size + size > writer->capacity) {
+        size_t capacity = writer->capacity ? writer->capacity : 4096;
+        while (capacity < writer->size + size) {
+            capacity *= 2;
+        }
+        unsigned char* grown = realloc(writer->data, capacity);
+        if (!grown) {
+            writer->failed = true;
+            return;
+        }
+        writer->data = grown;
+        writer->capacity = capacity;
+    }
+    memcpy(writer->data + writer->size, data, size);
+    writer->size += size;
+}
+
+// Text followed by zeros up to the next multiple of 8 bytes
+static void put_text(writer_t* writer, const char* text, size_t length) {
+    static const char zeros[8];
+    put(writer, text, length);
+    put(writer, zeros, (8 - length % 8) % 8);
+}
+
+static const void* take(reader_t* reader, size_t size) {
+    if (size > reader->left) {
+        return NULL;
+    }
+    const void* data = reader->data;
+    reader->data += size;
+    reader->left -= size;
+    return data;
+}
+
+static const char* take_text(reader_t* reader, size_t length) {
+    const char* text = take(reader, length);
+    if (!text || !take(reader, (8 - length % 8) % 8)) {
+        return NULL;
+    }
+    return text;
+}
+
+static void write_program(const char* text, uint64_t count, const calc_program_t* program, void* context) {
+    writer_t* writer = context;
+    snapshot_program_t record;
+    memset(&record, 0, sizeof(record));
+    record.count = count;
+    record.text_length = (uint32_t)strlen(text);
+    record.length = program->length;
+    record.max_stack = program->max_stack;
+    record.variable_count = program->variable_count;
+
+    put(writer, &record, sizeof(record));
+    put(writer, program->variable_names, (size_t)program->variable_count * CALC_VARIABLE_NAME_LENGTH);
+    put_text(writer, text, record.text_length);
+    put(writer, program->code, (size_t)program->length * sizeof(calc_instruction_t));
+    writer->program_count++;
+}
+
+bool calc_snapshot_save(const calc_state_t* state, const char* path) {
+    if (!state || !path) {
+        return false;
+    }
+
+    writer_t writer;
+    memset(&writer, 0, sizeof(writer));
+    snapshot_header_t header;
+    memset(&header, 0, sizeof(header));
+    put(&writer, &header, sizeof(header));
+
+    const char* last_expression = calc_last_expression(state);
+    snapshot_state_t saved;
+    memset(&saved, 0, sizeof(saved));
+    saved.memory = state->memory;
+    saved.last_result = state->last_result;
+    saved.timeout_ms = state->timeout_ms;
+    saved.memory_limit = state->arena.limit;
+    saved.precision = state->precision;
+    saved.compile_threshold = state->compile_threshold;
+    saved.native_threshold = state->native_threshold;
+    saved.angle_in_degrees = state->angle_in_degrees;
+    saved.adaptive_precision = state->adaptive_precision;
+    saved.accuracy = (uint8_t)state->accuracy;
+    saved.last_expression_length = strlen(last_expression);
+    put(&writer, &saved, sizeof(saved));
+    put_text(&writer, last_expression, saved.last_expression_length);
+    calc_tier_cache_visit(state, write_program, &writer);
+    if (writer.failed) {
+        free(writer.data);
+        return false;
+    }
+
+    header.magic = SNAPSHOT_MAGIC;
+    header.version = CALC_SNAPSHOT_VERSION;
+    header.instruction_size = sizeof(calc_instruction_t);
+    header.program_count = writer.program_count;
+    header.payload_size = writer.size - sizeof(header);
+    header.checksum = checksum(writer.data + sizeof(header), header.payload_size);
+    header.function_table = function_table_hash();
+    memcpy(writer.data, &header, sizeof(header));
+
+    // Write beside the target, flush, then rename over it
+    size_t path_length = strlen(path);
+    char* temporary = malloc(path_length + 5);
+    if (!temporary) {
+        free(writer.data);
+        return false;
+    }
+    memcpy(temporary, path, path_length);
+    memcpy(temporary + path_length, ".tmp", 5);
+
+    bool ok = false;
+    int fd = open(temporary, O_WRONLY | O_CREAT | O_TRUNC, 0600);
+    if (fd >= 0) {
+        size_t written = 0;
+        while (written < writer.size) {
+            ssize_t n = write(fd, writer.data + written, writer.size - written);
+            if (n <= 0) {
+                break;
+            }
+            written += (size_t)n;
+        }
+        ok = written == writer.size && fsync(fd) == 0;
+        ok = close(fd) == 0 && ok;
+        ok = ok && rename(temporary, path) == 0;
+        if (!ok) {
+            unlink(temporary);
+        }
+    }
+
+    free(temporary);
+    free(writer.data);
+    return ok;
+}
+
+// Checks one program record: the evaluator trusts opcodes, function
+// indices and max_stack, so they are verified by simulating the stack
+static bool program_valid(const snapshot_program_t* record, const calc_instruction_t* code) {
+    if (record->length <= 0 || record->max_stack <= 0 || record->variable_count != 0 ||
+        record->text_length == 0 || record->text_length > CALC_TIER_MAX_TEXT) {
+        return false;
+    }
+    int depth = 0;
+    for (int i = 0; i < record->length; i++) {
+        const calc_instruction_t* instruction = &code[i];
+        switch (instruction->op) {
+            case OP_CONST:
+            case OP_ANS:
+            case OP_MEMORY:
+                depth++;
+                break;
+            case OP_NEGATE:
+                break;
+            case OP_ADD:
+            case OP_SUBTRACT:
+            case OP_MULTIPLY:
+            case OP_DIVIDE:
+            case OP_MODULO:
+            case OP_POWER:
+                depth--;
+                break;
+            case OP_CALL:
+                if (!get_function_name(instruction->index) || instruction->argc < 1) {
+                    return false;
+                }
+                depth -= instruction->argc - 1;
+                break;
+            default:
+                return false;
+        }
+        if (depth < 1 || depth > record->max_stack) {
+            return false;
+        }
+    }
+    return depth == 1;
+}
+
+// Walks the payload; with state NULL it only validates
+static bool read_payload(reader_t reader, uint32_t program_count, calc_state_t* state) {
+    const snapshot_state_t* saved_data = take(&reader, sizeof(snapshot_state_t));
+    if (!saved_data) {
+        return false;
+    }
+    snapshot_state_t saved;
+    memcpy(&saved, saved_data, sizeof(saved));
+    const char* last_expression = take_text(&reader, saved.last_expression_length);
+    if (!last_expression) {
+        return false;
+    }
+
+    if (state) {
+        state->memory = saved.memory;
+        state->last_result = saved.last_result;
+        state->timeout_ms = saved.timeout_ms;
+        state->precision = saved.precision;
+        state->compile_threshold = saved.compile_threshold;
+        state->native_threshold = saved.native_threshold;
+        state->angle_in_degrees = saved.angle_in_degrees != 0;
+        state->adaptive_precision = saved.adaptive_precision != 0;
+        state->accuracy = saved.accuracy < CALC_ACCURACY_COUNT ? (calc_accuracy_t)saved.accuracy
+                                                               : CALC_ACCURACY_FAITHFUL;
+        if (saved.memory_limit != state->arena.limit) {
+            calc_set_memory_limit(state, (size_t)saved.memory_limit);
+        }
+        char* copy = malloc(saved.last_expression_length + 1);
+        if (copy) {
+            memcpy(copy, last_expression, saved.last_expression_length);
+            copy[saved.last_expression_length] = '\0';
+            calc_set_last_expression(state, copy);
+            free(copy);
+        }
+    }
+
+    for (uint32_t p = 0; p < program_count; p++) {
+        const snapshot_program_t* record_data = take(&reader, sizeof(snapshot_program_t));
+        if (!record_data) {
+            return false;
+        }
+        snapshot_program_t record;
+        memcpy(&record, record_data, sizeof(record));
+        if (record.length <= 0 || record.variable_count < 0 || record.variable_count > CALC_MAX_PROGRAM_VARIABLES) {
+            return false;
+        }
+        const char* names = take(&reader, (size_t)record.variable_count * CALC_VARIABLE_NAME_LENGTH);
+        const char* text = take_text(&reader, record.text_length);
+        const calc_instruction_t* code = take(&reader, (size_t)record.length * sizeof(calc_instruction_t));
+        if (!names || !text || !code || !program_valid(&record, code)) {
+            return false;
+        }
+
+        if (state) {
+            char buffer[CALC_TIER_MAX_TEXT + 1];
+            memcpy(buffer, text, record.text_length);
+            buffer[record.text_length] = '\0';
+
+            // The restore copies the instructions out of the mapping
+            calc_program_t program;
+            calc_program_init(&program);
+            program.code = (calc_instruction_t*)code;
+            program.length = record.length;
+            program.capacity = record.length;
+            program.max_stack = record.max_stack;
+            calc_tier_cache_restore(state, buffer, record.count, &program);
+        }
+    }
+    return reader.left == 0;
+}
+
+bool calc_snapshot_load(calc_state_t* state, const char* path) {
+    if (!state || !path) {
+        return false;
+    }
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) {
+        return false;
+    }
+    struct stat st;
+    if (fstat(fd, &st) != 0 || (size_t)st.st_size < sizeof(snapshot_header_t)) {
+        close(fd);
+        return false;
+    }
+    size_t size = (size_t)st.st_size;
+    void* map = mmap(NULL, size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (map == MAP_FAILED) {
+        return false;
+    }
+
+    snapshot_header_t header;
+    memcpy(&header, map, sizeof(header));
+    const unsigned char* payload = (const unsigned char*)map + sizeof(header);
+    bool ok = header.magic == SNAPSHOT_MAGIC && header.version == CALC_SNAPSHOT_VERSION &&
+              header.instruction_size == sizeof(calc_instruction_t) &&
+              header.function_table == function_table_hash() &&
+              header.payload_size == size - sizeof(header) &&
+              header.checksum == checksum(payload, header.payload_size);
+
+    reader_t reader;
+    reader.data = payload;
+    reader.left = size - sizeof(header);
+    ok = ok && read_payload(reader, header.program_count, NULL);
+    if (ok) {
+        read_payload(reader, header.program_count, state);
+    }
+
+    munmap(map, size);
+    return ok;
+}
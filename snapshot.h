@@ -0,0 +1,23 @@
+#ifndef SNAPSHOT_H
+#define SNAPSHOT_H
+
+#include "calculator_engine.h"
+#include <stdbool.h>
+
+// Bumped whenever the snapshot layout changes; older files are ignored
+#define CALC_SNAPSHOT_VERSION 2
+
+// Function prototypes
+
+// Writes the engine state to path: memory, ans, angle mode, precision,
+// thresholds, limits, the last expression and every compiled expression in
+// the tier cache (tiered.h). The file is written beside path and renamed
+// over it, so a reader sees either the old snapshot or the new one.
+bool calc_snapshot_save(const calc_state_t* state, const char* path);
+
+// Maps a snapshot and restores it into state. Compiled expressions are
+// copied back as programs, so nothing is parsed or compiled again. Returns
+// false, leaving state unchanged, for a missing, damaged or foreign file.
+bool calc_snapshot_load(calc_state_t* state, const char* path);
+
+#endif // SNAPSHOT_H
@@ -0,0 +1,667 @@
+#include "statistics.h"
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <math.h>
+#include <pthread.h>
+#include <unistd.h>
+
+// Elements summarized at a time by calc_stats_push_array (fits in L1)
+#define STATS_BLOCK_SIZE 2048
+
+// Helper function to create result
+static calc_result_t make_result(double value, calc_error_t error) {
+    calc_result_t result;
+    result.value = value;
+    result.error = error;
+    result.has_error = (error != CALC_SUCCESS);
+    return result;
+}
+
+// Neumaier compensated addition into (sum, compensation)
+static void add_compensated(double* sum, double* compensation, double x) {
+    double t = *sum + x;
+    if (fabs(*sum) >= fabs(x)) {
+        *compensation += (*sum - t) + x;
+    } else {
+        *compensation += (x - t) + *sum;
+    }
+    *sum = t;
+}
+
+// Accumulation
+void calc_stats_init(calc_stats_t* stats) {
+    if (stats) {
+        memset(stats, 0, sizeof(*stats));
+        stats->min = INFINITY;
+        stats->max = -INFINITY;
+    }
+}
+
+void calc_stats_push(calc_stats_t* stats, double x) {
+    if (!stats) {
+        return;
+    }
+
+    // Welford's update extended to third and fourth moments
+    double n1 = (double)stats->count;
+    stats->count++;
+    double n = (double)stats->count;
+    double delta = x - stats->mean;
+    double delta_n = delta / n;
+    double delta_n2 = delta_n * delta_n;
+    double term1 = delta * delta_n * n1;
+
+    stats->mean += delta_n;
+    stats->m4 += term1 * delta_n2 * (n * n - 3.0 * n + 3.0)
+               + 6.0 * delta_n2 * stats->m2 - 4.0 * delta_n * stats->m3;
+    stats->m3 += term1 * delta_n * (n - 2.0) - 3.0 * delta_n * stats->m2;
+    stats->m2 += term1;
+
+    add_compensated(&stats->sum, &stats->sum_compensation, x);
+    if (x < stats->min) {
+        stats->min = x;
+    }
+    if (x > stats->max) {
+        stats->max = x;
+    }
+}
+
+void calc_stats_merge(calc_stats_t* stats, const calc_stats_t* other) {
+    if (!stats || !other || other->count == 0) {
+        return;
+    }
+    if (stats->count == 0) {
+        *stats = *other;
+        return;
+    }
+
+    // Pairwise combination (Chan et al., Pebay)
+    double na = (double)stats->count;
+    double nb = (double)other->count;
+    double n = na + nb;
+    double delta = other->mean - stats->mean;
+    double delta2 = delta * delta;
+    double delta3 = delta2 * delta;
+    double delta4 = delta2 * delta2;
+
+    double m2 = stats->m2 + other->m2 + delta2 * na * nb / n;
+    double m3 = stats->m3 + other->m3
+              + delta3 * na * nb * (na - nb) / (n * n)
+              + 3.0 * delta * (na * other->m2 - nb * stats->m2) / n;
+    double m4 = stats->m4 + other->m4
+              + delta4 * na * nb * (na * na - na * nb + nb * nb) / (n * n * n)
+              + 6.0 * delta2 * (na * na * other->m2 + nb * nb * stats->m2) / (n * n)
+              + 4.0 * delta * (na * other->m3 - nb * stats->m3) / n;
+
+    stats->mean += delta * nb / n;
+    stats->m2 = m2;
+    stats->m3 = m3;
+    stats->m4 = m4;
+    stats->count += other->count;
+    add_compensated(&stats->sum, &stats->sum_compensation, other->sum);
+    stats->sum_compensation += other->sum_compensation;
+    if (other->min < stats->min) {
+        stats->min = other->min;
+    }
+    if (other->max > stats->max) {
+        stats->max = other->max;
+    }
+}
+
+// Exact two-pass summary of one cache-resident block; the loops carry no
+// divisions, so the compiler can vectorize them.
+static void summarize_block(const double* data, size_t count, calc_stats_t* block) {
+    double sum = 0.0;
+    double lo = data[0];
+    double hi = data[0];
+    for (size_t i = 0; i < count; i++) {
+        double x = data[i];
+        sum += x;
+        lo = x < lo ? x : lo;
+        hi = x > hi ? x : hi;
+    }
+
+    double mean = sum / (double)count;
+    double m2 = 0.0, m3 = 0.0, m4 = 0.0;
+    for (size_t i = 0; i < count; i++) {
+        double d = data[i] - mean;
+        double d2 = d * d;
+        m2 += d2;
+        m3 += d2 * d;
+        m4 += d2 * d2;
+    }
+
+    block->count = count;
+    block->sum = sum;
+    block->sum_compensation = 0.0;
+    block->mean = mean;
+    block->m2 = m2;
+    block->m3 = m3;
+    block->m4 = m4;
+    block->min = lo;
+    block->max = hi;
+}
+
+void calc_stats_push_array(calc_stats_t* stats, const double* data, size_t count) {
+    if (!stats || !data) {
+        return;
+    }
+
+    calc_stats_t block;
+    for (size_t start = 0; start < count; start += STATS_BLOCK_SIZE) {
+        size_t len = count - start < STATS_BLOCK_SIZE ? count - start : STATS_BLOCK_SIZE;
+        summarize_block(data + start, len, &block);
+        calc_stats_merge(stats, &block);
+    }
+}
+
+// Parallel summary
+typedef struct {
+    const double* data;
+    size_t count;
+    calc_stats_t partial;
+} stats_task_t;
+
+static void* stats_worker(void* arg) {
+    stats_task_t* task = (stats_task_t*)arg;
+    calc_stats_init(&task->partial);
+    calc_stats_push_array(&task->partial, task->data, task->count);
+    return NULL;
+}
+
+void calc_stats_compute(const double* data, size_t count, int threads, calc_stats_t* stats) {
+    if (!stats) {
+        return;
+    }
+    calc_stats_init(stats);
+    if (!data || count == 0) {
+        return;
+    }
+
+    if (threads <= 0) {
+        long online = sysconf(_SC_NPROCESSORS_ONLN);
+        threads = online > 0 ? (int)online : 1;
+    }
+    if (threads > CALC_STATS_MAX_THREADS) {
+        threads = CALC_STATS_MAX_THREADS;
+    }
+    size_t max_threads = count / CALC_STATS_PARALLEL_MIN_CHUNK;
+    if ((size_t)threads > max_threads) {
+        threads = max_threads > 0 ? (int)max_threads : 1;
+    }
+    if (threads == 1) {
+        calc_stats_push_array(stats, data, count);
+        return;
+    }
+
+    pthread_t handles[CALC_STATS_MAX_THREADS];
+    stats_task_t tasks[CALC_STATS_MAX_THREADS];
+    int started[CALC_STATS_MAX_THREADS];
+    size_t chunk = (count + threads - 1) / threads;
+
+    for (int t = 0; t < threads; t++) {
+        size_t begin = (size_t)t * chunk;
+        tasks[t].data = data + begin;
+        tasks[t].count = begin >= count ? 0 : (count - begin < chunk ? count - begin : chunk);
+    }
+    for (int t = 1; t < threads; t++) {
+        started[t] = pthread_create(&handles[t], NULL, stats_worker, &tasks[t]) == 0;
+        if (!started[t]) {
+            stats_worker(&tasks[t]);
+        }
+    }
+    stats_worker(&tasks[0]);
+
+    // Merge in a fixed order so results do not depend on thread timing
+    calc_stats_merge(stats, &tasks[0].partial);
+    for (int t = 1; t < threads; t++) {
+        if (started[t]) {
+            pthread_join(handles[t], NULL);
+        }
+        calc_stats_merge(stats, &tasks[t].partial);
+    }
+}
+
+// Results
+size_t calc_stats_count(const calc_stats_t* stats) {
+    return stats ? stats->count : 0;
+}
+
+double calc_stats_sum(const calc_stats_t* stats) {
+    return stats ? stats->sum + stats->sum_compensation : 0.0;
+}
+
+calc_result_t calc_stats_mean(const calc_stats_t* stats) {
+    if (!stats || stats->count == 0) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    return make_result(stats->mean, CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_min(const calc_stats_t* stats) {
+    if (!stats || stats->count == 0) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    return make_result(stats->min, CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_max(const calc_stats_t* stats) {
+    if (!stats || stats->count == 0) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    return make_result(stats->max, CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_variance(const calc_stats_t* stats) {
+    if (!stats || stats->count == 0) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    return make_result(stats->m2 / (double)stats->count, CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_sample_variance(const calc_stats_t* stats) {
+    if (!stats || stats->count < 2) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    return make_result(stats->m2 / (double)(stats->count - 1), CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_stddev(const calc_stats_t* stats) {
+    calc_result_t variance = calc_stats_variance(stats);
+    if (variance.has_error) {
+        return variance;
+    }
+    return make_result(sqrt(variance.value), CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_sample_stddev(const calc_stats_t* stats) {
+    calc_result_t variance = calc_stats_sample_variance(stats);
+    if (variance.has_error) {
+        return variance;
+    }
+    return make_result(sqrt(variance.value), CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_skewness(const calc_stats_t* stats) {
+    if (!stats || stats->count < 2) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    if (stats->m2 == 0.0) {
+        return make_result(0.0, CALC_ERROR_DIVISION_BY_ZERO);
+    }
+    double n = (double)stats->count;
+    return make_result(sqrt(n) * stats->m3 / pow(stats->m2, 1.5), CALC_SUCCESS);
+}
+
+calc_result_t calc_stats_kurtosis(const calc_stats_t* stats) {
+    if (!stats || stats->count < 2) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    if (stats->m2 == 0.0) {
+        return make_result(0.0, CALC_ERROR_DIVISION_BY_ZERO);
+    }
+    double n = (double)stats->count;
+    return make_result(n * stats->m4 / (stats->m2 * stats->m2) - 3.0, CALC_SUCCESS);
+}
+
+// Order statistics
+static void swap_doubles(double* a, size_t i, size_t j) {
+    double tmp = a[i];
+    a[i] = a[j];
+    a[j] = tmp;
+}
+
+static void insertion_sort(double* a, size_t lo, size_t hi) {
+    for (size_t i = lo + 1; i < hi; i++) {
+        double x = a[i];
+        size_t j = i;
+        while (j > lo && a[j - 1] > x) {
+            a[j] = a[j - 1];
+            j--;
+        }
+        a[j] = x;
+    }
+}
+
+static void sift_down(double* a, size_t lo, size_t root, size_t size) {
+    for (;;) {
+        size_t child = 2 * root + 1;
+        if (child >= size) {
+            return;
+        }
+        if (child + 1 < size && a[lo + child + 1] > a[lo + child]) {
+            child++;
+        }
+        if (a[lo + root] >= a[lo + child]) {
+            return;
+        }
+        swap_doubles(a, lo + root, lo + child);
+        root = child;
+    }
+}
+
+// Worst-case fallback once the partitioning depth budget is exhausted
+static void heap_sort(double* a, size_t lo, size_t hi) {
+    size_t size = hi - lo;
+    for (size_t i = size / 2; i-- > 0;) {
+        sift_down(a, lo, i, size);
+    }
+    for (size_t end = size; end-- > 1;) {
+        swap_doubles(a, lo, lo + end);
+        sift_down(a, lo, 0, end);
+    }
+}
+
+static double median_of_three(double x, double y, double z) {
+    if (x < y) {
+        return y < z ? y : (x < z ? z : x);
+    }
+    return x < z ? x : (y < z ? z : y);
+}
+
+static double choose_pivot(const double* a, size_t lo, size_t hi) {
+    size_t n = hi - lo;
+    size_t mid = lo + n / 2;
+    if (n < 128) {
+        return median_of_three(a[lo], a[mid], a[hi - 1]);
+    }
+    // Tukey's ninther for larger ranges
+    size_t step = n / 8;
+    return median_of_three(median_of_three(a[lo], a[lo + step], a[lo + 2 * step]),
+                           median_of_three(a[mid - step], a[mid], a[mid + step]),
+                           median_of_three(a[hi - 1 - 2 * step], a[hi - 1 - step], a[hi - 1]));
+}
+
+// Three-way partition: [lo, lt) < pivot, [lt, gt) == pivot, [gt, hi) > pivot
+static void partition3(double* a, size_t lo, size_t hi, double pivot, size_t* lt_out, size_t* gt_out) {
+    size_t lt = lo, i = lo, gt = hi;
+    while (i < gt) {
+        if (a[i] < pivot) {
+            swap_doubles(a, lt++, i++);
+        } else if (a[i] > pivot) {
+            swap_doubles(a, i, --gt);
+        } else {
+            i++;
+        }
+    }
+    *lt_out = lt;
+    *gt_out = gt;
+}
+
+static int depth_budget(size_t count) {
+    int depth = 0;
+    while (count > 1) {
+        count >>= 1;
+        depth += 2;
+    }
+    return depth;
+}
+
+// Places the order statistics for every rank in ranks[0..rank_count) (sorted)
+// at their final positions with a single shared partitioning pass.
+static void multiselect(double* a, size_t lo, size_t hi, const size_t* ranks, size_t rank_count, int depth) {
+    while (rank_count > 0) {
+        if (hi - lo <= CALC_STATS_SELECT_CUTOFF) {
+            insertion_sort(a, lo, hi);
+            return;
+        }
+        if (depth-- == 0) {
+            heap_sort(a, lo, hi);
+            return;
+        }
+
+        size_t lt, gt;
+        partition3(a, lo, hi, choose_pivot(a, lo, hi), &lt, &gt);
+
+        // Ranks below lt go left, ranks at or above gt go right
+        size_t left = 0;
+        while (left < rank_count && ranks[left] < lt) {
+            left++;
+        }
+        size_t right = left;
+        while (right < rank_count && ranks[right] < gt) {
+            right++;
+        }
+
+        if (left > 0 && right < rank_count) {
+            multiselect(a, lo, lt, ranks, left, depth);
+        } else if (left > 0) {
+            hi = lt;
+            rank_count = left;
+            continue;
+        }
+        lo = gt;
+        ranks += right;
+        rank_count -= right;
+    }
+}
+
+calc_result_t calc_stats_select(double* data, size_t count, size_t k) {
+    if (!data || k >= count) {
+        return make_result(0.0, CALC_ERROR_INVALID_INPUT);
+    }
+    multiselect(data, 0, count, &k, 1, depth_budget(count));
+    return make_result(data[k], CALC_SUCCESS);
+}
+
+// Copies the input into a scratch buffer, rejecting NaN
+static double* copy_for_selection(const double* data, size_t count, calc_error_t* error) {
+    if (!data || count == 0) {
+        *error = CALC_ERROR_INVALID_INPUT;
+        return NULL;
+    }
+    double* scratch = malloc(count * sizeof(double));
+    if (!scratch) {
+        *error = CALC_ERROR_MEMORY_ERROR;
+        return NULL;
+    }
+    for (size_t i = 0; i < count; i++) {
+        if (isnan(data[i])) {
+            free(scratch);
+            *error = CALC_ERROR_INVALID_INPUT;
+            return NULL;
+        }
+        scratch[i] = data[i];
+    }
+    *error = CALC_SUCCESS;
+    return scratch;
+}
+
+static int compare_sizes(const void* a, const void* b) {
+    size_t x = *(const size_t*)a;
+    size_t y = *(const size_t*)b;
+    return (x > y) - (x < y);
+}
+
+calc_error_t calc_stats_percentiles(const double* data, size_t count,
+                                    const double* percents, size_t percent_count,
+                                    double* results) {
+    if (!percents || !results || percent_count == 0) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    for (size_t i = 0; i < percent_count; i++) {
+        if (!(percents[i] >= 0.0 && percents[i] <= 100.0)) {
+            return CALC_ERROR_DOMAIN_ERROR;
+        }
+    }
+
+    calc_error_t error;
+    double* scratch = copy_for_selection(data, count, &error);
+    if (!scratch) {
+        return error;
+    }
+    size_t* ranks = malloc(2 * percent_count * sizeof(size_t));
+    if (!ranks) {
+        free(scratch);
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+
+    // Linear interpolation between closest ranks (h = (n - 1) * p)
+    size_t rank_count = 0;
+    for (size_t i = 0; i < percent_count; i++) {
+        double h = (double)(count - 1) * percents[i] / 100.0;
+        size_t k = (size_t)h;
+        ranks[rank_count++] = k;
+        if (k + 1 < count && h > (double)k) {
+            ranks[rank_count++] = k + 1;
+        }
+    }
+    qsort(ranks, rank_count, sizeof(size_t), compare_sizes);
+    size_t unique = 0;
+    for (size_t i = 0; i < rank_count; i++) {
+        if (unique == 0 || ranks[unique - 1] != ranks[i]) {
+            ranks[unique++] = ranks[i];
+        }
+    }
+
+    multiselect(scratch, 0, count, ranks, unique, depth_budget(count));
+
+    for (size_t i = 0; i < percent_count; i++) {
+        double h = (double)(count - 1) * percents[i] / 100.0;
+        size_t k = (size_t)h;
+        double fraction = h - (double)k;
+        results[i] = scratch[k];
+        if (fraction > 0.0 && k + 1 < count) {
+            results[i] += fraction * (scratch[k + 1] - scratch[k]);
+        }
+    }
+
+    free(ranks);
+    free(scratch);
+    return CALC_SUCCESS;
+}
+
+calc_result_t calc_stats_percentile(const double* data, size_t count, double percent) {
+    double value = 0.0;
+    calc_error_t error = calc_stats_percentiles(data, count, &percent, 1, &value);
+    return make_result(error == CALC_SUCCESS ? value : 0.0, error);
+}
+
+calc_result_t calc_stats_median(const double* data, size_t count) {
+    return calc_stats_percentile(data, count, 50.0);
+}
+
+calc_error_t calc_stats_quartiles(const double* data, size_t count, double quartiles[3]) {
+    static const double percents[3] = { 25.0, 50.0, 75.0 };
+    return calc_stats_percentiles(data, count, percents, 3, quartiles);
+}
+
+// Mode (open-addressing hash table keyed by the bit pattern of each value)
+typedef struct {
+    uint64_t key;
+    size_t count;
+} mode_slot_t;
+
+static uint64_t hash_bits(uint64_t x) {
+    x ^= x >> 33;
+    x *= 0xff51afd7ed558ccdULL;
+    x ^= x >> 33;
+    x *= 0xc4ceb9fe1a85ec53ULL;
+    x ^= x >> 33;
+    return x;
+}
+
+static int compare_doubles(const void* a, const void* b) {
+    double x = *(const double*)a;
+    double y = *(const double*)b;
+    return (x > y) - (x < y);
+}
+
+// Orders slots by the values their keys hold
+static int compare_mode_keys(const void* a, const void* b) {
+    double x;
+    double y;
+    memcpy(&x, &((const mode_slot_t*)a)->key, sizeof(x));
+    memcpy(&y, &((const mode_slot_t*)b)->key, sizeof(y));
+    return compare_doubles(&x, &y);
+}
+
+// Inserts key (or bumps its count); returns the updated count
+static size_t mode_table_add(mode_slot_t* table, size_t capacity, uint64_t key, size_t amount) {
+    size_t slot = (size_t)hash_bits(key) & (capacity - 1);
+    while (table[slot].count != 0 && table[slot].key != key) {
+        slot = (slot + 1) & (capacity - 1);
+    }
+    table[slot].key = key;
+    table[slot].count += amount;
+    return table[slot].count;
+}
+
+static mode_slot_t* mode_table_grow(mode_slot_t* table, size_t* capacity) {
+    size_t new_capacity = *capacity * 2;
+    mode_slot_t* grown = calloc(new_capacity, sizeof(mode_slot_t));
+    if (!grown) {
+        free(table);
+        return NULL;
+    }
+    for (size_t slot = 0; slot < *capacity; slot++) {
+        if (table[slot].count != 0) {
+            mode_table_add(grown, new_capacity, table[slot].key, table[slot].count);
+        }
+    }
+    free(table);
+    *capacity = new_capacity;
+    return grown;
+}
+
+calc_error_t calc_stats_mode(const double* data, size_t count,
+                             double* modes, size_t max_modes,
+                             size_t* mode_count, size_t* frequency) {
+    if (!data || count == 0 || !mode_count || (max_modes > 0 && !modes)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    // Sized by the number of distinct values, not by the input length
+    size_t capacity = 64;
+    size_t distinct = 0;
+    mode_slot_t* table = calloc(capacity, sizeof(mode_slot_t));
+    if (!table) {
+        return CALC_ERROR_MEMORY_ERROR;
+    }
+
+    size_t best = 0;
+    for (size_t i = 0; i < count; i++) {
+        double x = data[i];
+        if (isnan(x)) {
+            free(table);
+            return CALC_ERROR_INVALID_INPUT;
+        }
+        if (x == 0.0) {
+            x = 0.0;  // fold -0.0 into +0.0
+        }
+        uint64_t key;
+        memcpy(&key, &x, sizeof(key));
+
+        size_t n = mode_table_add(table, capacity, key, 1);
+        if (n == 1 && ++distinct * 2 > capacity) {
+            table = mode_table_grow(table, &capacity);
+            if (!table) {
+                return CALC_ERROR_MEMORY_ERROR;
+            }
+        }
+        if (n > best) {
+            best = n;
+        }
+    }
+
+    // Gather every mode at the front of the table and sort them all, so a
+    // short modes array gets the smallest ones
+    size_t found = 0;
+    for (size_t slot = 0; slot < capacity; slot++) {
+        if (table[slot].count == best) {
+            table[found++].key = table[slot].key;
+        }
+    }
+    qsort(table, found, sizeof(mode_slot_t), compare_mode_keys);
+    for (size_t i = 0; i < found && i < max_modes; i++) {
+        memcpy(&modes[i], &table[i].key, sizeof(double));
+    }
+    free(table);
+
+    *mode_count = found;
+    if (frequency) {
+        *frequency = best;
+    }
+    return CALC_SUCCESS;
+}
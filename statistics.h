@@ -0,0 +1,68 @@
+#ifndef STATISTICS_H
+#define STATISTICS_H
+
+#include "calculator_engine.h"
+#include <stddef.h>
+
+// Parallel summaries split the data into at least this many elements per thread
+#define CALC_STATS_PARALLEL_MIN_CHUNK 65536
+#define CALC_STATS_MAX_THREADS 16
+
+// Ranges at or below this size are finished with insertion sort during selection
+#define CALC_STATS_SELECT_CUTOFF 16
+
+// Streaming accumulator for the first four moments.
+// Central moments are kept as sums (m2 = sum of (x - mean)^2, ...), so two
+// accumulators built over disjoint data can be merged exactly.
+typedef struct {
+    size_t count;
+    double sum;
+    double sum_compensation;
+    double mean;
+    double m2;
+    double m3;
+    double m4;
+    double min;
+    double max;
+} calc_stats_t;
+
+// Function prototypes
+
+// Accumulation
+void calc_stats_init(calc_stats_t* stats);
+void calc_stats_push(calc_stats_t* stats, double x);
+void calc_stats_push_array(calc_stats_t* stats, const double* data, size_t count);
+void calc_stats_merge(calc_stats_t* stats, const calc_stats_t* other);
+
+// One-shot summary of an array, split across threads (threads <= 0 uses all cores)
+void calc_stats_compute(const double* data, size_t count, int threads, calc_stats_t* stats);
+
+// Results
+size_t calc_stats_count(const calc_stats_t* stats);
+double calc_stats_sum(const calc_stats_t* stats);
+calc_result_t calc_stats_mean(const calc_stats_t* stats);
+calc_result_t calc_stats_min(const calc_stats_t* stats);
+calc_result_t calc_stats_max(const calc_stats_t* stats);
+calc_result_t calc_stats_variance(const calc_stats_t* stats);          // Population
+calc_result_t calc_stats_sample_variance(const calc_stats_t* stats);   // Bessel-corrected
+calc_result_t calc_stats_stddev(const calc_stats_t* stats);
+calc_result_t calc_stats_sample_stddev(const calc_stats_t* stats);
+calc_result_t calc_stats_skewness(const calc_stats_t* stats);
+calc_result_t calc_stats_kurtosis(const calc_stats_t* stats);          // Excess kurtosis
+
+// Order statistics (introselect, O(n) expected; data must not contain NaN)
+calc_result_t calc_stats_select(double* data, size_t count, size_t k);  // k-th smallest, in place
+calc_result_t calc_stats_median(const double* data, size_t count);
+calc_result_t calc_stats_percentile(const double* data, size_t count, double percent);
+calc_error_t calc_stats_percentiles(const double* data, size_t count,
+                                    const double* percents, size_t percent_count,
+                                    double* results);
+calc_error_t calc_stats_quartiles(const double* data, size_t count, double quartiles[3]);
+
+// Mode: every value that occurs with the highest frequency, in ascending order.
+// Writes the smallest max_modes of them; mode_count receives the total number of modes.
+calc_error_t calc_stats_mode(const double* data, size_t count,
+                             double* modes, size_t max_modes,
+                             size_t* mode_count, size_t* frequency);
+
+#endif // STATISTICS_H
@@ -0,0 +1,305 @@
+#include "tiered.h"
+#include "jit.h"
+#include "profiling.h"
+#include <stdlib.h>
+#include <string.h>
+
+// Remembered expression. program and jit are only valid from the tier that
+// uses them up; jit points at program, so entries never move.
+typedef struct {
+    char* text;             // NULL for a free slot
+    uint64_t hash;
+    uint64_t count;         // evaluations so far
+    uint64_t last_used;
+    calc_tier_t tier;
+    bool no_compile;        // compilation failed or needs variables: stays interpreted
+    bool no_native;         // the JIT could not translate it: stays compiled
+    bool jit_degrees;       // angle mode the native code was generated for
+    calc_program_t program;
+    calc_jit_t* jit;
+} tier_entry_t;
+
+struct calc_tier_cache {
+    tier_entry_t entries[CALC_TIER_CACHE_SIZE];
+    uint64_t clock;
+    calc_tier_stats_t stats;
+};
+
+#define TIER_WAYS 2
+
+// FNV-1a
+static uint64_t hash_text(const char* text, size_t length) {
+    uint64_t hash = 1469598103934665603ULL;
+    for (size_t i = 0; i < length; i++) {
+        hash ^= (unsigned char)text[i];
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
+
+static tier_entry_t* bucket_of(calc_tier_cache_t* cache, uint64_t hash) {
+    return &cache->entries[(hash % (CALC_TIER_CACHE_SIZE / TIER_WAYS)) * TIER_WAYS];
+}
+
+static void release_entry(tier_entry_t* entry) {
+    calc_jit_free(entry->jit);
+    calc_program_free(&entry->program);
+    free(entry->text);
+    memset(entry, 0, sizeof(*entry));
+}
+
+static tier_entry_t* find_entry(calc_tier_cache_t* cache, const char* text, size_t length, uint64_t hash) {
+    tier_entry_t* bucket = bucket_of(cache, hash);
+    for (int way = 0; way < TIER_WAYS; way++) {
+        tier_entry_t* entry = &bucket[way];
+        if (entry->text && entry->hash == hash && strncmp(entry->text, text, length + 1) == 0) {
+            return entry;
+        }
+    }
+    return NULL;
+}
+
+// Takes a free slot of the bucket, or the least recently used one
+static tier_entry_t* insert_entry(calc_tier_cache_t* cache, const char* text, size_t length, uint64_t hash) {
+    char* copy = malloc(length + 1);
+    if (!copy) {
+        return NULL;
+    }
+    memcpy(copy, text, length + 1);
+
+    tier_entry_t* bucket = bucket_of(cache, hash);
+    tier_entry_t* victim = &bucket[0];
+    for (int way = 0; way < TIER_WAYS; way++) {
+        if (!bucket[way].text) {
+            victim = &bucket[way];
+            break;
+        }
+        if (bucket[way].last_used < victim->last_used) {
+            victim = &bucket[way];
+        }
+    }
+    if (victim->text) {
+        release_entry(victim);
+        cache->stats.evictions++;
+        cache->stats.cached--;
+    }
+
+    victim->text = copy;
+    victim->hash = hash;
+    victim->tier = CALC_TIER_INTERPRETED;
+    calc_program_init(&victim->program);
+    cache->stats.cached++;
+    return victim;
+}
+
+static void promote_to_compiled(calc_tier_cache_t* cache, tier_entry_t* entry) {
+    CALC_PROFILE_START(mark);
+    parse_error_t error = calc_program_compile(entry->text, &entry->program, NULL);
+    CALC_PROFILE_STOP(CALC_PHASE_PARSE, mark);
+    if (error != PARSE_SUCCESS || entry->program.variable_count > 0) {
+        calc_program_free(&entry->program);
+        entry->no_compile = true;
+        return;
+    }
+    entry->tier = CALC_TIER_COMPILED;
+    cache->stats.compilations++;
+}
+
+static bool translate(tier_entry_t* entry, bool degrees) {
+    calc_jit_free(entry->jit);
+    entry->jit = calc_jit_compile(&entry->program, degrees);
+    if (!entry->jit || !calc_jit_is_native(entry->jit)) {
+        calc_jit_free(entry->jit);
+        entry->jit = NULL;
+        return false;
+    }
+    entry->jit_degrees = degrees;
+    return true;
+}
+
+static void promote_to_native(calc_tier_cache_t* cache, tier_entry_t* entry, bool degrees) {
+    if (!calc_jit_supported() || !translate(entry, degrees)) {
+        entry->no_native = true;
+        return;
+    }
+    entry->tier = CALC_TIER_NATIVE;
+    cache->stats.native_compilations++;
+}
+
+static calc_tier_cache_t* cache_of(calc_state_t* state) {
+    if (!state->tier_cache) {
+        state->tier_cache = calloc(1, sizeof(calc_tier_cache_t));
+    }
+    return state->tier_cache;
+}
+
+parse_result_t calc_tiered_evaluate(const char* expression, calc_state_t* state) {
+    if (!expression || !state || state->compile_threshold <= 0) {
+        return parse_expression(expression, state);
+    }
+    size_t length = strlen(expression);
+    if (length == 0 || length > CALC_TIER_MAX_TEXT) {
+        return parse_expression(expression, state);
+    }
+    calc_tier_cache_t* cache = cache_of(state);
+    if (!cache) {
+        return parse_expression(expression, state);
+    }
+    uint64_t hash = hash_text(expression, length);
+    tier_entry_t* entry = find_entry(cache, expression, length, hash);
+    if (!entry) {
+        entry = insert_entry(cache, expression, length, hash);
+        if (!entry) {
+            cache->stats.evaluations[CALC_TIER_INTERPRETED]++;
+            return parse_expression(expression, state);
+        }
+    }
+    entry->last_used = ++cache->clock;
+
+    // Promote on the first evaluation past a threshold
+    if (entry->tier == CALC_TIER_INTERPRETED && !entry->no_compile &&
+        entry->count >= (uint64_t)state->compile_threshold) {
+        promote_to_compiled(cache, entry);
+    }
+    if (entry->tier == CALC_TIER_COMPILED && !entry->no_native && state->native_threshold > 0 &&
+        entry->count >= (uint64_t)state->native_threshold) {
+        promote_to_native(cache, entry, state->angle_in_degrees);
+    }
+    if (entry->tier == CALC_TIER_NATIVE && entry->jit_degrees != state->angle_in_degrees &&
+        !translate(entry, state->angle_in_degrees)) {
+        entry->tier = CALC_TIER_COMPILED;
+        entry->no_native = true;
+    }
+    entry->count++;
+    cache->stats.evaluations[entry->tier]++;
+
+    if (entry->tier == CALC_TIER_INTERPRETED) {
+        return parse_expression(expression, state);
+    }
+    CALC_PROFILE_START(mark);
+    parse_result_t result = entry->tier == CALC_TIER_NATIVE ? calc_jit_evaluate(entry->jit, state, NULL)
+                                                            : calc_program_evaluate(&entry->program, state, NULL);
+    CALC_PROFILE_STOP(CALC_PHASE_EVAL, mark);
+    return result;
+}
+
+void calc_set_tier_thresholds(calc_state_t* state, int compile_after, int native_after) {
+    if (state) {
+        state->compile_threshold = compile_after > 0 ? compile_after : 0;
+        state->native_threshold = native_after > 0 ? native_after : 0;
+    }
+}
+
+calc_tier_t calc_expression_tier(const calc_state_t* state, const char* expression) {
+    if (!state || !state->tier_cache || !expression) {
+        return CALC_TIER_INTERPRETED;
+    }
+    size_t length = strlen(expression);
+    tier_entry_t* entry = find_entry(state->tier_cache, expression, length, hash_text(expression, length));
+    return entry ? entry->tier : CALC_TIER_INTERPRETED;
+}
+
+void calc_get_tier_stats(const calc_state_t* state, calc_tier_stats_t* stats) {
+    if (!stats) {
+        return;
+    }
+    memset(stats, 0, sizeof(*stats));
+    if (state && state->tier_cache) {
+        *stats = state->tier_cache->stats;
+    }
+}
+
+void calc_clear_tier_stats(calc_state_t* state) {
+    if (state && state->tier_cache) {
+        int cached = state->tier_cache->stats.cached;
+        memset(&state->tier_cache->stats, 0, sizeof(calc_tier_stats_t));
+        state->tier_cache->stats.cached = cached;
+    }
+}
+
+void calc_tier_cache_clear(calc_state_t* state) {
+    if (state && state->tier_cache) {
+        for (int i = 0; i < CALC_TIER_CACHE_SIZE; i++) {
+            if (state->tier_cache->entries[i].text) {
+                release_entry(&state->tier_cache->entries[i]);
+            }
+        }
+        state->tier_cache->stats.cached = 0;
+    }
+}
+
+void calc_tier_cache_destroy(calc_tier_cache_t* cache) {
+    if (cache) {
+        for (int i = 0; i < CALC_TIER_CACHE_SIZE; i++) {
+            if (cache->entries[i].text) {
+                release_entry(&cache->entries[i]);
+            }
+        }
+        free(cache);
+    }
+}
+
+void calc_tier_cache_visit(const calc_state_t* state, calc_tier_visit_t visit, void* context) {
+    if (!state || !state->tier_cache || !visit) {
+        return;
+    }
+    // Selection by last_used; the cache is small
+    const calc_tier_cache_t* cache = state->tier_cache;
+    uint64_t after = 0;
+    for (;;) {
+        const tier_entry_t* next = NULL;
+        for (int i = 0; i < CALC_TIER_CACHE_SIZE; i++) {
+            const tier_entry_t* entry = &cache->entries[i];
+            if (entry->text && entry->tier != CALC_TIER_INTERPRETED && entry->last_used > after &&
+                (!next || entry->last_used < next->last_used)) {
+                next = entry;
+            }
+        }
+        if (!next) {
+            return;
+        }
+        visit(next->text, next->count, &next->program, context);
+        after = next->last_used;
+    }
+}
+
+bool calc_tier_cache_restore(calc_state_t* state, const char* text, uint64_t count, const calc_program_t* program) {
+    if (!state || !text || !program || program->length <= 0 || program->variable_count > 0) {
+        return false;
+    }
+    size_t length = strlen(text);
+    calc_tier_cache_t* cache = cache_of(state);
+    if (length == 0 || length > CALC_TIER_MAX_TEXT || !cache) {
+        return false;
+    }
+
+    calc_instruction_t* code = malloc(program->length * sizeof(calc_instruction_t));
+    if (!code) {
+        return false;
+    }
+    uint64_t hash = hash_text(text, length);
+    tier_entry_t* entry = find_entry(cache, text, length, hash);
+    if (entry) {
+        calc_jit_free(entry->jit);
+        entry->jit = NULL;
+        calc_program_free(&entry->program);
+    } else {
+        entry = insert_entry(cache, text, length, hash);
+        if (!entry) {
+            free(code);
+            return false;
+        }
+    }
+
+    memcpy(code, program->code, program->length * sizeof(calc_instruction_t));
+    entry->program = *program;
+    entry->program.arena = NULL;
+    entry->program.code = code;
+    entry->program.capacity = program->length;
+    entry->tier = CALC_TIER_COMPILED;
+    entry->no_compile = false;
+    entry->no_native = false;
+    entry->count = count;
+    entry->last_used = ++cache->clock;
+    return true;
+}
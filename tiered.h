@@ -0,0 +1,63 @@
+#ifndef TIERED_H
+#define TIERED_H
+
+#include "calculator_engine.h"
+#include "expression_compiler.h"
+#include <stdbool.h>
+#include <stdint.h>
+
+// Expressions remembered per state (two per hash bucket, least recently used
+// evicted) and the longest text worth remembering
+#define CALC_TIER_CACHE_SIZE 128
+#define CALC_TIER_MAX_TEXT 1024
+
+// Evaluations of the same text before it is compiled, and before the
+// compiled program is translated to native code
+#define CALC_DEFAULT_COMPILE_THRESHOLD 3
+#define CALC_DEFAULT_NATIVE_THRESHOLD 32
+
+// How an expression is evaluated
+typedef enum {
+    CALC_TIER_INTERPRETED = 0,  // parsed and evaluated from the text every time
+    CALC_TIER_COMPILED,         // cached program, branch-free evaluator
+    CALC_TIER_NATIVE            // cached program translated by the JIT
+} calc_tier_t;
+
+// Counters since the state was created or calc_clear_tier_stats
+typedef struct {
+    uint64_t evaluations[3];    // evaluations run in each calc_tier_t
+    uint64_t compilations;      // promotions from interpreted to compiled
+    uint64_t native_compilations;   // promotions from compiled to native
+    uint64_t evictions;         // remembered expressions dropped for new ones
+    int cached;                 // expressions remembered now
+} calc_tier_stats_t;
+
+// Per-state cache of expression counts and promoted programs (opaque)
+typedef struct calc_tier_cache calc_tier_cache_t;
+
+// Function prototypes
+
+// Evaluates like parse_expression, counting evaluations of each expression
+// text and moving it to a faster tier once it crosses the state's thresholds.
+// Every tier returns the same value and error.
+parse_result_t calc_tiered_evaluate(const char* expression, calc_state_t* state);
+
+// Thresholds; 0 disables a tier. Promotion to native code needs a platform
+// where calc_jit_supported() is true.
+void calc_set_tier_thresholds(calc_state_t* state, int compile_after, int native_after);
+calc_tier_t calc_expression_tier(const calc_state_t* state, const char* expression);
+
+// Statistics and cleanup
+void calc_get_tier_stats(const calc_state_t* state, calc_tier_stats_t* stats);
+void calc_clear_tier_stats(calc_state_t* state);
+void calc_tier_cache_clear(calc_state_t* state);        // forgets every expression
+void calc_tier_cache_destroy(calc_tier_cache_t* cache);
+
+// Snapshot support (snapshot.h): visits every compiled expression, least
+// recently used first, and re-creates one from a saved program without
+// compiling it again (the JIT tier is re-entered at the next evaluation)
+typedef void (*calc_tier_visit_t)(const char* text, uint64_t count, const calc_program_t* program, void* context);
+void calc_tier_cache_visit(const calc_state_t* state, calc_tier_visit_t visit, void* context);
+bool calc_tier_cache_restore(calc_state_t* state, const char* text, uint64_t count, const calc_program_t* program);
+
+#endif // TIERED_H
@@ -0,0 +1,349 @@
+#include "trig.h"
+#include <float.h>
+#include <math.h>
+#include <stdbool.h>
+#include <stdint.h>
+#include <string.h>
+
+// pi/180 as a 25-bit head, so t*DEG_HEAD is exact for a 27-bit t, and a tail
+#define DEG_HEAD 0x1.1df46ap-6
+#define DEG_TAIL 0x1.294e9c8ae0ec6p-33
+
+// pi/2 in 33-bit pieces: n*piece is exact for n < 2^20
+#define PIO2_1 0x1.921fb544p+0
+#define PIO2_2 0x1.0b4611a6p-34
+#define PIO2_3 0x1.3198a2ep-69
+#define PIO2_3T 0x1.b839a252049c1p-104
+
+// pi/2 as a double-double, for the Payne–Hanek result
+#define PIO2_HI 0x1.921fb54442d18p+0
+#define PIO2_LO 0x1.1a62633145c07p-54
+
+#define INV_PIO2 0x1.45f306dc9c883p-1
+
+// Adding and subtracting this rounds a double below 2^51 to an integer
+#define ROUND_TO_INTEGER 0x1.8p52
+
+// Binary expansion of 2/pi, 1280 bits: enough for any finite double
+static const uint32_t two_over_pi[40] = {
+    0xA2F9836E, 0x4E441529, 0xFC2757D1, 0xF534DDC0, 0xDB629599, 0x3C439041, 0xFE5163AB, 0xDEBBC561,
+    0xB7246E3A, 0x424DD2E0, 0x06492EEA, 0x09D1921C, 0xFE1DEB1C, 0xB129A73E, 0xE88235F5, 0x2EBB4484,
+    0xE99C7026, 0xB45F7E41, 0x3991D639, 0x835339F4, 0x9C845F8B, 0xBDF9283B, 0x1FF897FF, 0xDE05980F,
+    0xEF2F118B, 0x5A0A6D1F, 0x6D367ECF, 0x27CB09B7, 0x4F463F66, 0x9E5FEA2D, 0x7527BAC7, 0xEBE5F17B,
+    0x3D0739F7, 0x8A5292EA, 0x6BFB5FB1, 0x1F8D5D08, 0x56033046, 0xFC7B6BAB, 0xF0CFBC20, 0x9AF4361D
+};
+
+// Minimax polynomials for sin and cos on [-pi/4, pi/4] (as in fdlibm); y is
+// the low part of the argument
+static double kernel_sin(double x, double y) {
+    const double s1 = -1.66666666666666324348e-01;
+    const double s2 = 8.33333333332248946124e-03;
+    const double s3 = -1.98412698298579493134e-04;
+    const double s4 = 2.75573137070700676789e-06;
+    const double s5 = -2.50507602534068634195e-08;
+    const double s6 = 1.58969099521155010221e-10;
+    double z = x * x;
+    double v = z * x;
+    double r = s2 + z * (s3 + z * (s4 + z * (s5 + z * s6)));
+    return x - ((z * (0.5 * y - v * r) - y) - v * s1);
+}
+
+static double kernel_cos(double x, double y) {
+    const double c1 = 4.16666666666666019037e-02;
+    const double c2 = -1.38888888888741095749e-03;
+    const double c3 = 2.48015872894767294178e-05;
+    const double c4 = -2.75573143513906633035e-07;
+    const double c5 = 2.08757232129817482790e-09;
+    const double c6 = -1.13596475577881948265e-11;
+    double z = x * x;
+    double r = z * (c1 + z * (c2 + z * (c3 + z * (c4 + z * (c5 + z * c6)))));
+    double hz = 0.5 * z;
+    double w = 1.0 - hz;
+    return w + (((1.0 - w) - hz) + (z * r - x * y));
+}
+
+// Error-free a - b = *s + *e
+static void two_diff(double a, double b, double* s, double* e) {
+    *s = a - b;
+    double bb = a - *s;
+    *e = (a - (*s + bb)) + (bb - b);
+}
+
+// Splits a double into a 26-bit head and the rest
+static void split(double a, double* head, double* tail) {
+    double t = 134217729.0 * a;     // 2^27 + 1
+    *head = t - (t - a);
+    *tail = a - *head;
+}
+
+// Error-free a * b = *p + *e (Dekker)
+static void two_prod(double a, double b, double* p, double* e) {
+    double ah, al, bh, bl;
+    *p = a * b;
+    split(a, &ah, &al);
+    split(b, &bh, &bl);
+    *e = ((ah * bh - *p) + ah * bl + al * bh) + al * bl;
+}
+
+// --- Degrees ---
+
+// Exact: below 2^46 q*90 is exact and x - q*90 cancels exactly; larger x
+// are first reduced modulo 360, which fmod does exactly
+int calc_reduce_degrees(double x, double* t) {
+    if (fabs(x) >= 0x1p46) {
+        x = fmod(x, 360.0);
+    }
+    double q = (x * (1.0 / 90.0) + ROUND_TO_INTEGER) - ROUND_TO_INTEGER;
+    *t = x - q * 90.0;
+    return (int)((int64_t)q & 3);
+}
+
+// t in degrees, |t| <= 45, to radians as hi + lo
+static void degrees_to_radians(double t, double* hi, double* lo) {
+    double head, tail;
+    split(t, &head, &tail);
+    double p = head * DEG_HEAD;
+    double q = tail * DEG_HEAD + t * DEG_TAIL;
+    *hi = p + q;
+    *lo = q - (*hi - p);
+}
+
+// sin and cos of t degrees, |t| <= 45, exact where the value is representable
+static double sin_degrees(double t) {
+    if (t == 0.0) {
+        return 0.0;
+    }
+    if (fabs(t) == 30.0) {
+        return copysign(0.5, t);
+    }
+    if (fabs(t) == 45.0) {
+        return copysign(M_SQRT1_2, t);
+    }
+    double hi, lo;
+    degrees_to_radians(t, &hi, &lo);
+    return kernel_sin(hi, lo);
+}
+
+static double cos_degrees(double t) {
+    if (t == 0.0) {
+        return 1.0;
+    }
+    if (fabs(t) == 45.0) {
+        return M_SQRT1_2;
+    }
+    double hi, lo;
+    degrees_to_radians(t, &hi, &lo);
+    return kernel_cos(hi, lo);
+}
+
+double calc_sind(double x) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    if (x == 0.0) {
+        return x;
+    }
+    double t;
+    switch (calc_reduce_degrees(x, &t)) {
+        case 0: return sin_degrees(t);
+        case 1: return cos_degrees(t);
+        case 2: return -sin_degrees(t) + 0.0;
+        default: return -cos_degrees(t);
+    }
+}
+
+double calc_cosd(double x) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    double t;
+    switch (calc_reduce_degrees(x, &t)) {
+        case 0: return cos_degrees(t);
+        case 1: return -sin_degrees(t) + 0.0;
+        case 2: return -cos_degrees(t);
+        default: return sin_degrees(t);
+    }
+}
+
+double calc_tand(double x) {
+    if (!isfinite(x)) {
+        return NAN;
+    }
+    if (x == 0.0) {
+        return x;
+    }
+    double t;
+    int q = calc_reduce_degrees(x, &t);
+    if (t == 0.0) {
+        return q & 1 ? INFINITY : 0.0;
+    }
+    if (fabs(t) == 45.0) {
+        return q & 1 ? -copysign(1.0, t) : copysign(1.0, t);
+    }
+    double hi, lo;
+    degrees_to_radians(t, &hi, &lo);
+    double s = kernel_sin(hi, lo);
+    double c = kernel_cos(hi, lo);
+    return q & 1 ? -c / s : s / c;
+}
+
+// --- Radians ---
+
+// 32 bits of 2/pi starting at bit offset start (bits before the point are 0)
+static uint32_t two_over_pi_bits(int start) {
+    if (start < 0) {
+        return start > -32 ? two_over_pi[0] >> -start : 0;
+    }
+    int word = start / 32;
+    int shift = start % 32;
+    uint32_t bits = two_over_pi[word] << shift;
+    return shift ? bits | two_over_pi[word + 1] >> (32 - shift) : bits;
+}
+
+// 2^k for a k in the normal range
+static double power_of_two(int k) {
+    uint64_t bits = (uint64_t)(k + 1023) << 52;
+    double value;
+    memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
+// Payne–Hanek: with x = m * 2^e, only 192 bits of 2/pi starting near bit e
+// affect x * 2/pi modulo 4; the product with m is done in 32-bit limbs.
+// x is positive and at least CALC_TRIG_HUGE, so normal.
+static int payne_hanek(double x, double* hi, double* lo) {
+    uint64_t bits;
+    memcpy(&bits, &x, sizeof(bits));
+    uint64_t m = (bits & 0xFFFFFFFFFFFFFull) | 0x10000000000000ull;
+    int e = (int)(bits >> 52) - 1075;
+
+    // Window of 2/pi bits e-1 .. e+190 (1-based), least significant limb first
+    uint32_t window[6];
+    for (int k = 0; k < 6; k++) {
+        window[k] = two_over_pi_bits(e - 2 + 32 * (5 - k));
+    }
+
+    // m * window mod 2^192 is x * 2/pi mod 4, scaled by 2^190
+    uint32_t p[6];
+    uint32_t m_lo = (uint32_t)m;
+    uint32_t m_hi = (uint32_t)(m >> 32);
+    uint64_t carry = 0;
+    for (int k = 0; k < 6; k++) {
+        carry += (uint64_t)window[k] * m_lo;
+        p[k] = (uint32_t)carry;
+        carry >>= 32;
+    }
+    carry = 0;
+    for (int k = 1; k < 6; k++) {
+        carry += (uint64_t)p[k] + (uint64_t)window[k - 1] * m_hi;
+        p[k] = (uint32_t)carry;
+        carry >>= 32;
+    }
+
+    // Round to the nearest quadrant; a fraction of one half or more becomes
+    // the negative remainder to the next one
+    int n = (int)(p[5] >> 30);
+    p[5] &= 0x3FFFFFFF;
+    bool negative = (p[5] & 0x20000000) != 0;
+    if (negative) {
+        n++;
+        uint64_t borrow = 1;
+        for (int k = 0; k < 6; k++) {
+            borrow += (uint64_t)(uint32_t)~p[k];
+            p[k] = (uint32_t)borrow;
+            borrow >>= 32;
+        }
+        p[5] &= 0x3FFFFFFF;
+    }
+
+    // Leading 128 bits of the fraction as a double-double, in quarter turns
+    int top = 5;
+    while (top > 0 && p[top] == 0) {
+        top--;
+    }
+    double parts[4];
+    for (int k = 0; k < 4; k++) {
+        parts[k] = top - k >= 0 ? (double)p[top - k] * power_of_two(32 * (top - k) - 190) : 0.0;
+    }
+    double f_hi = parts[0] + parts[1];
+    double f_lo = (parts[0] - f_hi) + parts[1] + parts[2] + parts[3];
+    if (negative) {
+        f_hi = -f_hi;
+        f_lo = -f_lo;
+    }
+
+    // Times pi/2
+    double r, error;
+    two_prod(f_hi, PIO2_HI, &r, &error);
+    error += f_hi * PIO2_LO + f_lo * PIO2_HI;
+    *hi = r + error;
+    *lo = error - (*hi - r);
+    return n & 3;
+}
+
+int calc_rem_pio2(double x, double* hi, double* lo) {
+    if (!isfinite(x)) {
+        *hi = NAN;
+        *lo = 0.0;
+        return 0;
+    }
+    double ax = fabs(x);
+    int n;
+    if (ax < CALC_TRIG_HUGE) {
+        // Cody–Waite: ax - n*PIO2_1 and each n*piece are exact
+        double k = floor(ax * INV_PIO2 + 0.5);
+        double s = ax - k * PIO2_1;
+        double e1, e2;
+        two_diff(s, k * PIO2_2, &s, &e1);
+        two_diff(s, k * PIO2_3, &s, &e2);
+        double e = e1 + e2 - k * PIO2_3T;
+        *hi = s + e;
+        *lo = e - (*hi - s);
+        n = (int)k & 3;
+    } else {
+        n = payne_hanek(ax, hi, lo);
+    }
+    if (x < 0.0) {
+        *hi = -*hi;
+        *lo = -*lo;
+        n = -n & 3;
+    }
+    return n;
+}
+
+// sin (cos_shift 0) or cos (cos_shift 1) of a huge argument
+static double huge_sin_cos(double x, int cos_shift) {
+    double hi, lo;
+    switch ((calc_rem_pio2(x, &hi, &lo) + cos_shift) & 3) {
+        case 0: return kernel_sin(hi, lo);
+        case 1: return kernel_cos(hi, lo);
+        case 2: return -kernel_sin(hi, lo);
+        default: return -kernel_cos(hi, lo);
+    }
+}
+
+double calc_sinr(double x) {
+    return fabs(x) < CALC_TRIG_HUGE ? sin(x) : huge_sin_cos(x, 0);
+}
+
+double calc_cosr(double x) {
+    return fabs(x) < CALC_TRIG_HUGE ? cos(x) : huge_sin_cos(x, 1);
+}
+
+double calc_tanr(double x) {
+    double ax = fabs(x);
+    if (!isfinite(x) || ax < 1.0) {
+        return tan(x);
+    }
+    double hi, lo;
+    int n = calc_rem_pio2(x, &hi, &lo);
+    if ((n & 1) && ax < 0x1p26 && fabs(hi) <= 2.0 * DBL_EPSILON * ax) {
+        return INFINITY;
+    }
+    if (ax < CALC_TRIG_HUGE) {
+        return tan(x);
+    }
+    double s = kernel_sin(hi, lo);
+    double c = kernel_cos(hi, lo);
+    return n & 1 ? -c / s : s / c;
+}
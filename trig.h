@@ -0,0 +1,34 @@
+#ifndef TRIG_H
+#define TRIG_H
+
+// Radian arguments of at least this size are reduced by Payne–Hanek; below
+// it a four-part Cody–Waite reduction is exact enough
+#define CALC_TRIG_HUGE 1.0e6
+
+// Function prototypes
+
+// Degree-domain sine, cosine and tangent. The argument is reduced exactly
+// modulo 360 and 90, so multiples of 30 and 45 give exact results: sind(180)
+// is 0 and tand(45) is 1. calc_tand returns infinity at odd multiples of 90.
+double calc_sind(double x);
+double calc_cosd(double x);
+double calc_tand(double x);
+
+// Radian sine, cosine and tangent: libm below CALC_TRIG_HUGE, the engine's
+// own reduction and kernels above it, so huge arguments give the same result
+// on every platform. calc_tanr returns infinity within rounding error of an
+// odd multiple of pi/2 (for |x| < 2^26, where that still means something).
+double calc_sinr(double x);
+double calc_cosr(double x);
+double calc_tanr(double x);
+
+// Reduces x degrees to *t in [-45, 45] with x = 90q + t exactly and
+// returns q mod 4
+int calc_reduce_degrees(double x, double* t);
+
+// Reduces x to r = *hi + *lo in [-pi/4, pi/4] with x = n*pi/2 + r and
+// returns n mod 4. r is accurate to far more than double precision, even
+// for the doubles closest to a multiple of pi/2.
+int calc_rem_pio2(double x, double* hi, double* lo);
+
+#endif // TRIG_H
@@ -0,0 +1,267 @@
+#include "unit_converter.h"
+#include <stdint.h>
+#include <string.h>
+#include <math.h>
+#include <pthread.h>
+
+// Unit registry. Each unit maps to its category's SI base unit as
+// base = value * scale + offset.
+typedef struct {
+    const char* name;
+    const char* plural;
+    const char* symbol;
+    calc_unit_category_t category;
+    long double scale;
+    long double offset;
+} unit_definition_t;
+
+static const unit_definition_t unit_table[] = {
+    // Length (meter)
+    {"meter", "meters", "m", CALC_UNIT_LENGTH, 1.0L, 0.0L},
+    {"kilometer", "kilometers", "km", CALC_UNIT_LENGTH, 1000.0L, 0.0L},
+    {"centimeter", "centimeters", "cm", CALC_UNIT_LENGTH, 0.01L, 0.0L},
+    {"millimeter", "millimeters", "mm", CALC_UNIT_LENGTH, 0.001L, 0.0L},
+    {"micrometer", "micrometers", "um", CALC_UNIT_LENGTH, 1e-6L, 0.0L},
+    {"nanometer", "nanometers", "nm", CALC_UNIT_LENGTH, 1e-9L, 0.0L},
+    {"inch", "inches", "in", CALC_UNIT_LENGTH, 0.0254L, 0.0L},
+    {"foot", "feet", "ft", CALC_UNIT_LENGTH, 0.3048L, 0.0L},
+    {"yard", "yards", "yd", CALC_UNIT_LENGTH, 0.9144L, 0.0L},
+    {"mile", "miles", "mi", CALC_UNIT_LENGTH, 1609.344L, 0.0L},
+    {"nautical_mile", "nautical_miles", "nmi", CALC_UNIT_LENGTH, 1852.0L, 0.0L},
+
+    // Area (square meter)
+    {"square_meter", "square_meters", "m2", CALC_UNIT_AREA, 1.0L, 0.0L},
+    {"square_kilometer", "square_kilometers", "km2", CALC_UNIT_AREA, 1e6L, 0.0L},
+    {"square_centimeter", "square_centimeters", "cm2", CALC_UNIT_AREA, 1e-4L, 0.0L},
+    {"square_millimeter", "square_millimeters", "mm2", CALC_UNIT_AREA, 1e-6L, 0.0L},
+    {"hectare", "hectares", "ha", CALC_UNIT_AREA, 1e4L, 0.0L},
+    {"acre", "acres", "ac", CALC_UNIT_AREA, 4046.8564224L, 0.0L},
+    {"square_inch", "square_inches", "in2", CALC_UNIT_AREA, 0.00064516L, 0.0L},
+    {"square_foot", "square_feet", "ft2", CALC_UNIT_AREA, 0.09290304L, 0.0L},
+    {"square_yard", "square_yards", "yd2", CALC_UNIT_AREA, 0.83612736L, 0.0L},
+    {"square_mile", "square_miles", "mi2", CALC_UNIT_AREA, 2589988.110336L, 0.0L},
+
+    // Volume (cubic meter)
+    {"cubic_meter", "cubic_meters", "m3", CALC_UNIT_VOLUME, 1.0L, 0.0L},
+    {"liter", "liters", "L", CALC_UNIT_VOLUME, 1e-3L, 0.0L},
+    {"milliliter", "milliliters", "mL", CALC_UNIT_VOLUME, 1e-6L, 0.0L},
+    {"cubic_centimeter", "cubic_centimeters", "cm3", CALC_UNIT_VOLUME, 1e-6L, 0.0L},
+    {"cubic_inch", "cubic_inches", "in3", CALC_UNIT_VOLUME, 1.6387064e-5L, 0.0L},
+    {"cubic_foot", "cubic_feet", "ft3", CALC_UNIT_VOLUME, 0.028316846592L, 0.0L},
+    {"gallon", "gallons", "gal", CALC_UNIT_VOLUME, 0.003785411784L, 0.0L},
+    {"quart", "quarts", "qt", CALC_UNIT_VOLUME, 0.000946352946L, 0.0L},
+    {"pint", "pints", "pt", CALC_UNIT_VOLUME, 0.000473176473L, 0.0L},
+    {"cup", "cups", "cup", CALC_UNIT_VOLUME, 0.0002365882365L, 0.0L},
+    {"fluid_ounce", "fluid_ounces", "floz", CALC_UNIT_VOLUME, 2.95735295625e-5L, 0.0L},
+    {"imperial_gallon", "imperial_gallons", "impgal", CALC_UNIT_VOLUME, 0.00454609L, 0.0L},
+
+    // Mass (kilogram)
+    {"kilogram", "kilograms", "kg", CALC_UNIT_MASS, 1.0L, 0.0L},
+    {"gram", "grams", "g", CALC_UNIT_MASS, 1e-3L, 0.0L},
+    {"milligram", "milligrams", "mg", CALC_UNIT_MASS, 1e-6L, 0.0L},
+    {"tonne", "tonnes", "t", CALC_UNIT_MASS, 1000.0L, 0.0L},
+    {"pound", "pounds", "lb", CALC_UNIT_MASS, 0.45359237L, 0.0L},
+    {"ounce", "ounces", "oz", CALC_UNIT_MASS, 0.028349523125L, 0.0L},
+    {"stone", "stones", "st", CALC_UNIT_MASS, 6.35029318L, 0.0L},
+
+    // Temperature (kelvin)
+    {"kelvin", "kelvins", "K", CALC_UNIT_TEMPERATURE, 1.0L, 0.0L},
+    {"celsius", "celsius", "C", CALC_UNIT_TEMPERATURE, 1.0L, 273.15L},
+    {"fahrenheit", "fahrenheit", "F", CALC_UNIT_TEMPERATURE, 5.0L / 9.0L, 459.67L * 5.0L / 9.0L},
+    {"rankine", "rankine", "R", CALC_UNIT_TEMPERATURE, 5.0L / 9.0L, 0.0L},
+
+    // Time (second)
+    {"second", "seconds", "s", CALC_UNIT_TIME, 1.0L, 0.0L},
+    {"millisecond", "milliseconds", "ms", CALC_UNIT_TIME, 1e-3L, 0.0L},
+    {"microsecond", "microseconds", "us", CALC_UNIT_TIME, 1e-6L, 0.0L},
+    {"minute", "minutes", "min", CALC_UNIT_TIME, 60.0L, 0.0L},
+    {"hour", "hours", "h", CALC_UNIT_TIME, 3600.0L, 0.0L},
+    {"day", "days", "d", CALC_UNIT_TIME, 86400.0L, 0.0L},
+    {"week", "weeks", "wk", CALC_UNIT_TIME, 604800.0L, 0.0L},
+    {"year", "years", "yr", CALC_UNIT_TIME, 31557600.0L, 0.0L},
+
+    // Speed (meter per second)
+    {"meter_per_second", "meters_per_second", "m/s", CALC_UNIT_SPEED, 1.0L, 0.0L},
+    {"kilometer_per_hour", "kilometers_per_hour", "km/h", CALC_UNIT_SPEED, 1.0L / 3.6L, 0.0L},
+    {"mile_per_hour", "miles_per_hour", "mph", CALC_UNIT_SPEED, 0.44704L, 0.0L},
+    {"knot", "knots", "kn", CALC_UNIT_SPEED, 1852.0L / 3600.0L, 0.0L},
+    {"foot_per_second", "feet_per_second", "ft/s", CALC_UNIT_SPEED, 0.3048L, 0.0L},
+
+    // Energy (joule)
+    {"joule", "joules", "J", CALC_UNIT_ENERGY, 1.0L, 0.0L},
+    {"kilojoule", "kilojoules", "kJ", CALC_UNIT_ENERGY, 1e3L, 0.0L},
+    {"calorie", "calories", "cal", CALC_UNIT_ENERGY, 4.184L, 0.0L},
+    {"kilocalorie", "kilocalories", "kcal", CALC_UNIT_ENERGY, 4184.0L, 0.0L},
+    {"watt_hour", "watt_hours", "Wh", CALC_UNIT_ENERGY, 3600.0L, 0.0L},
+    {"kilowatt_hour", "kilowatt_hours", "kWh", CALC_UNIT_ENERGY, 3.6e6L, 0.0L},
+    {"electronvolt", "electronvolts", "eV", CALC_UNIT_ENERGY, 1.602176634e-19L, 0.0L},
+    {"btu", "btus", "BTU", CALC_UNIT_ENERGY, 1055.05585262L, 0.0L},
+
+    // Pressure (pascal)
+    {"pascal", "pascals", "Pa", CALC_UNIT_PRESSURE, 1.0L, 0.0L},
+    {"kilopascal", "kilopascals", "kPa", CALC_UNIT_PRESSURE, 1e3L, 0.0L},
+    {"bar", "bars", "bar", CALC_UNIT_PRESSURE, 1e5L, 0.0L},
+    {"atmosphere", "atmospheres", "atm", CALC_UNIT_PRESSURE, 101325.0L, 0.0L},
+    {"psi", "psi", "psi", CALC_UNIT_PRESSURE, 6894.757293168361L, 0.0L},
+    {"millimeter_of_mercury", "millimeters_of_mercury", "mmHg", CALC_UNIT_PRESSURE, 133.322387415L, 0.0L},
+    {"torr", "torr", "Torr", CALC_UNIT_PRESSURE, 101325.0L / 760.0L, 0.0L},
+};
+
+#define UNIT_COUNT (sizeof(unit_table) / sizeof(unit_table[0]))
+
+// Name lookup: open-addressing table over every name, plural and symbol
+#define NAME_TABLE_SIZE 512
+
+typedef struct {
+    const char* key;
+    calc_unit_id_t unit;
+} name_slot_t;
+
+static name_slot_t name_table[NAME_TABLE_SIZE];
+
+// Every (from, to) pair, precomputed in extended precision and rounded once
+static calc_conversion_t pair_table[UNIT_COUNT][UNIT_COUNT];
+
+static pthread_once_t registry_once = PTHREAD_ONCE_INIT;
+
+static uint32_t hash_name(const char* s) {
+    uint32_t h = 2166136261u;
+    while (*s) {
+        h ^= (unsigned char)*s++;
+        h *= 16777619u;
+    }
+    return h;
+}
+
+static void intern_name(const char* key, calc_unit_id_t unit) {
+    uint32_t slot = hash_name(key) & (NAME_TABLE_SIZE - 1);
+    while (name_table[slot].key != NULL) {
+        if (strcmp(name_table[slot].key, key) == 0) {
+            return;  // first registration wins
+        }
+        slot = (slot + 1) & (NAME_TABLE_SIZE - 1);
+    }
+    name_table[slot].key = key;
+    name_table[slot].unit = unit;
+}
+
+static void build_registry(void) {
+    for (size_t i = 0; i < UNIT_COUNT; i++) {
+        intern_name(unit_table[i].name, (calc_unit_id_t)i);
+        intern_name(unit_table[i].plural, (calc_unit_id_t)i);
+        intern_name(unit_table[i].symbol, (calc_unit_id_t)i);
+    }
+
+    for (size_t from = 0; from < UNIT_COUNT; from++) {
+        for (size_t to = 0; to < UNIT_COUNT; to++) {
+            const unit_definition_t* a = &unit_table[from];
+            const unit_definition_t* b = &unit_table[to];
+            if (a->category != b->category) {
+                pair_table[from][to].scale = NAN;
+                pair_table[from][to].offset = NAN;
+                continue;
+            }
+            // to = (from * sa + oa - ob) / sb
+            pair_table[from][to].scale = (double)(a->scale / b->scale);
+            pair_table[from][to].offset = (double)((a->offset - b->offset) / b->scale);
+        }
+    }
+}
+
+static bool valid_unit(calc_unit_id_t unit) {
+    return unit >= 0 && (size_t)unit < UNIT_COUNT;
+}
+
+// Registry
+calc_unit_id_t calc_unit_lookup(const char* name) {
+    if (!name) {
+        return CALC_UNIT_INVALID;
+    }
+    pthread_once(&registry_once, build_registry);
+
+    uint32_t slot = hash_name(name) & (NAME_TABLE_SIZE - 1);
+    while (name_table[slot].key != NULL) {
+        if (strcmp(name_table[slot].key, name) == 0) {
+            return name_table[slot].unit;
+        }
+        slot = (slot + 1) & (NAME_TABLE_SIZE - 1);
+    }
+    return CALC_UNIT_INVALID;
+}
+
+size_t calc_unit_count(void) {
+    return UNIT_COUNT;
+}
+
+const char* calc_unit_name(calc_unit_id_t unit) {
+    return valid_unit(unit) ? unit_table[unit].name : NULL;
+}
+
+const char* calc_unit_symbol(calc_unit_id_t unit) {
+    return valid_unit(unit) ? unit_table[unit].symbol : NULL;
+}
+
+calc_unit_category_t calc_unit_category(calc_unit_id_t unit) {
+    return valid_unit(unit) ? unit_table[unit].category : CALC_UNIT_CATEGORY_COUNT;
+}
+
+// Conversion
+calc_error_t calc_unit_conversion(calc_unit_id_t from, calc_unit_id_t to, calc_conversion_t* conversion) {
+    if (!conversion || !valid_unit(from) || !valid_unit(to)) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+    if (unit_table[from].category != unit_table[to].category) {
+        return CALC_ERROR_DOMAIN_ERROR;
+    }
+    pthread_once(&registry_once, build_registry);
+    *conversion = pair_table[from][to];
+    return CALC_SUCCESS;
+}
+
+calc_result_t calc_unit_convert(double value, calc_unit_id_t from, calc_unit_id_t to) {
+    calc_result_t result;
+    calc_conversion_t conversion;
+    result.error = calc_unit_conversion(from, to, &conversion);
+    result.has_error = (result.error != CALC_SUCCESS);
+    result.value = 0.0;
+    if (!result.has_error) {
+        result.value = value * conversion.scale + conversion.offset;
+        if (!isfinite(result.value)) {
+            result.value = 0.0;
+            result.error = CALC_ERROR_OVERFLOW;
+            result.has_error = true;
+        }
+    }
+    return result;
+}
+
+calc_error_t calc_unit_convert_array_to(const double* input, double* output, size_t count,
+                                        calc_unit_id_t from, calc_unit_id_t to) {
+    if ((!input || !output) && count > 0) {
+        return CALC_ERROR_INVALID_INPUT;
+    }
+
+    calc_conversion_t conversion;
+    calc_error_t error = calc_unit_conversion(from, to, &conversion);
+    if (error != CALC_SUCCESS) {
+        return error;
+    }
+
+    const double scale = conversion.scale;
+    const double offset = conversion.offset;
+    if (offset == 0.0) {
+        for (size_t i = 0; i < count; i++) {
+            output[i] = input[i] * scale;
+        }
+    } else {
+        for (size_t i = 0; i < count; i++) {
+            output[i] = input[i] * scale + offset;
+        }
+    }
+    return CALC_SUCCESS;
+}
+
+calc_error_t calc_unit_convert_array(double* values, size_t count,
+                                     calc_unit_id_t from, calc_unit_id_t to) {
+    return calc_unit_convert_array_to(values, values, count, from, to);
+}
@@ -0,0 +1,48 @@
+#ifndef UNIT_CONVERTER_H
+#define UNIT_CONVERTER_H
+
+#include "calculator_engine.h"
+#include <stddef.h>
+
+// Unit categories; conversions are only defined within a category
+typedef enum {
+    CALC_UNIT_LENGTH = 0,
+    CALC_UNIT_AREA,
+    CALC_UNIT_VOLUME,
+    CALC_UNIT_MASS,
+    CALC_UNIT_TEMPERATURE,
+    CALC_UNIT_TIME,
+    CALC_UNIT_SPEED,
+    CALC_UNIT_ENERGY,
+    CALC_UNIT_PRESSURE,
+    CALC_UNIT_CATEGORY_COUNT
+} calc_unit_category_t;
+
+// Interned unit identifier (index into the unit registry)
+typedef int calc_unit_id_t;
+#define CALC_UNIT_INVALID (-1)
+
+// Affine conversion: to_value = from_value * scale + offset
+typedef struct {
+    double scale;
+    double offset;
+} calc_conversion_t;
+
+// Function prototypes
+
+// Registry
+calc_unit_id_t calc_unit_lookup(const char* name);   // name, plural or symbol
+size_t calc_unit_count(void);
+const char* calc_unit_name(calc_unit_id_t unit);
+const char* calc_unit_symbol(calc_unit_id_t unit);
+calc_unit_category_t calc_unit_category(calc_unit_id_t unit);
+
+// Conversion
+calc_error_t calc_unit_conversion(calc_unit_id_t from, calc_unit_id_t to, calc_conversion_t* conversion);
+calc_result_t calc_unit_convert(double value, calc_unit_id_t from, calc_unit_id_t to);
+calc_error_t calc_unit_convert_array(double* values, size_t count,
+                                     calc_unit_id_t from, calc_unit_id_t to);   // in place
+calc_error_t calc_unit_convert_array_to(const double* input, double* output, size_t count,
+                                        calc_unit_id_t from, calc_unit_id_t to);
+
+#endif // UNIT_CONVERTER_H